@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# /ai_backends.py
+# AI処理の呼び出し先（Bedrock / ネットワークを使わない決定的なローカルスタブ）
+# なぜ: Bedrock と AWS 認証情報がないと AI処理を動かせず、並列度・まとめ処理・キャッシュの変更を負荷試験できなかったため
+# 関連: ai_processing_batch.py, ai_executor.py, scripts/benchmark_ai.py
+"""
+AI処理のバックエンド
+
+BedrockAIProcessor は bedrock-runtime クライアントと同じ形のオブジェクト
+（invoke_model / invoke_model_with_response_stream）を呼び出す。create_ai_client で
+環境変数 AI_BACKEND に応じて実クライアントかローカルスタブを返す。
+
+LocalStubRuntimeClient:
+  - プロンプトの JSON形式（SUMMARY_JSON_TEMPLATE）どおりの要約を返す
+    （複数商品プロンプトなら商品IDごと）
+  - 遅延・エラー率・スロットリング率を指定でき、成否は (seed, リクエスト, 試行回数) で決まるため
+    スレッドの実行順によらず再現できる
+  - usage（入出力トークン数、プロンプトキャッシュの読み込み・作成）も Bedrock と同じ形で返す
+
+環境変数:
+  - AI_BACKEND: bedrock（既定）/ local
+  - AI_STUB_LATENCY_MS: 1回の呼び出しの遅延（既定 0）
+  - AI_STUB_JITTER_MS: 遅延のばらつき（既定 0）
+  - AI_STUB_ERROR_RATE: モデルエラーの割合（既定 0）
+  - AI_STUB_THROTTLE_RATE: スロットリングの割合（既定 0）
+  - AI_STUB_SEED: 乱数の種（既定 0）
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+BACKENDS = ('bedrock', 'local')
+
+
+def create_ai_client(backend: Optional[str] = None, region_name: str = 'us-east-1'):
+    """
+    AI処理の呼び出し先を作成
+
+    Args:
+        backend: bedrock / local（既定: 環境変数 AI_BACKEND または bedrock）
+        region_name: Bedrock のリージョン
+    """
+    backend = (backend or os.getenv('AI_BACKEND') or 'bedrock').lower()
+    if backend == 'local':
+        return LocalStubRuntimeClient.from_env()
+    if backend != 'bedrock':
+        raise ValueError(f"Unknown AI backend: {backend} (expected one of {BACKENDS})")
+    return boto3.client('bedrock-runtime', region_name=region_name)
+
+
+class LocalStubRuntimeClient:
+    """bedrock-runtime と同じ呼び出し方で決定的な要約を返すローカルスタブ"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        seed: int = 0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._attempts: Counter = Counter()
+        self._cached_prefixes = set()
+        self.calls = 0
+        self.throttled = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> 'LocalStubRuntimeClient':
+        return cls(
+            latency_ms=float(os.getenv('AI_STUB_LATENCY_MS', '0')),
+            jitter_ms=float(os.getenv('AI_STUB_JITTER_MS', '0')),
+            error_rate=float(os.getenv('AI_STUB_ERROR_RATE', '0')),
+            throttle_rate=float(os.getenv('AI_STUB_THROTTLE_RATE', '0')),
+            seed=int(os.getenv('AI_STUB_SEED', '0')),
+        )
+
+    def invoke_model(self, modelId: str, body: str) -> Dict[str, Any]:
+        text, usage = self._respond(modelId, body, 'InvokeModel')
+        payload = {
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'usage': usage,
+        }
+        return {'body': io.BytesIO(json.dumps(payload, ensure_ascii=False).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str) -> Dict[str, Any]:
+        text, usage = self._respond(modelId, body, 'InvokeModelWithResponseStream')
+        return {'body': self._stream_events(text, usage)}
+
+    def _respond(self, model_id: str, body: str, operation: str):
+        request = json.loads(body)
+        digest = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        with self._lock:
+            self.calls += 1
+            self._attempts[digest] += 1
+            attempt = self._attempts[digest]
+        rng = random.Random(f"{self.seed}:{digest}:{attempt}")
+
+        roll = rng.random()
+        if roll < self.throttle_rate:
+            with self._lock:
+                self.throttled += 1
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded (stub)'}}, operation)
+        if roll < self.throttle_rate + self.error_rate:
+            with self._lock:
+                self.errors += 1
+            raise ClientError({'Error': {'Code': 'ModelErrorException', 'Message': 'Model error (stub)'}}, operation)
+
+        delay = self.latency_ms + (rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            self._sleep(delay / 1000.0)
+
+        text = self._summary_text(request, digest)
+        return text, self._usage(request, text)
+
+    def _summary_text(self, request: Dict, digest: str) -> str:
+        prompt = request['messages'][0]['content']
+        keys = re.findall(r'^### 商品 (p\d+)$', prompt, flags=re.MULTILINE)
+        if keys:
+            answer: Dict[str, Any] = {key: self._summary(f"{digest}:{key}") for key in keys}
+        else:
+            answer = self._summary(digest)
+        prefill = ''.join(m['content'] for m in request['messages'][1:] if m['role'] == 'assistant')
+        text = '```json\n' + json.dumps(answer, ensure_ascii=False, indent=2) + '\n```'
+        # assistant の書き出しがあれば、その続きだけを返す（ストリーミングの再試行と同じ形）
+        return text[len(prefill):] if prefill and text.startswith(prefill) else text
+
+    @staticmethod
+    def _summary(seed: str) -> Dict[str, Any]:
+        from ai_processing_batch import SUMMARY_JSON_TEMPLATE
+
+        summary = json.loads(SUMMARY_JSON_TEMPLATE)
+        tag = hashlib.sha256(seed.encode('utf-8')).hexdigest()[:8]
+        summary['product_analysis']['executive_summary'] = f"スタブ要約 {tag}"
+        return summary
+
+    def _usage(self, request: Dict, text: str) -> Dict[str, int]:
+        system = request.get('system') or []
+        prefix = ''.join(block.get('text', '') for block in system)
+        message_chars = sum(len(m['content']) for m in request['messages'])
+        usage = {'input_tokens': message_chars // 2, 'output_tokens': len(text) // 2}
+        if any('cache_control' in block for block in system):
+            key = hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+            with self._lock:
+                hit = key in self._cached_prefixes
+                self._cached_prefixes.add(key)
+            usage['cache_read_input_tokens' if hit else 'cache_creation_input_tokens'] = len(prefix) // 2
+        else:
+            usage['input_tokens'] += len(prefix) // 2
+        return usage
+
+    @staticmethod
+    def _stream_events(text: str, usage: Dict[str, int], chunk_chars: int = 64) -> Iterator[Dict[str, Any]]:
+        def event(payload):
+            return {'chunk': {'bytes': json.dumps(payload, ensure_ascii=False).encode('utf-8')}}
+
+        input_usage = {k: v for k, v in usage.items() if k != 'output_tokens'}
+        events: List[Dict[str, Any]] = [event({'type': 'message_start', 'message': {'usage': input_usage}})]
+        for i in range(0, len(text), chunk_chars):
+            events.append(event({
+                'type': 'content_block_delta', 'index': 0,
+                'delta': {'type': 'text_delta', 'text': text[i:i + chunk_chars]},
+            }))
+        events.append(event({'type': 'message_delta', 'usage': {'output_tokens': usage['output_tokens']}}))
+        events.append(event({'type': 'message_stop'}))
+        return iter(events)
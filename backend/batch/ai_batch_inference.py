@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# /ai_batch_inference.py
+# Bedrock バッチ推論による AI処理（大量の raw_loan_data の再要約用）
+# なぜ: プロンプト変更後の全件再処理などで、同期 invoke_model を1件ずつ呼ぶと遅く高価なため
+# 関連: ai_processing_batch.py, ai_executor.py, loanpedia_scraper/database/work_queue.py
+"""
+AI処理のバッチ推論モード
+
+1. submit: 対象行のプロンプトを Bedrock バッチ推論のレコード形式
+   （{"recordId": ..., "modelInput": {...}}）の JSONL に書き出してジョブを投入
+2. wait: ジョブの状態をポーリング
+3. ingest: 出力レコードを chunk_size 件ごとに1トランザクションで processed_loan_data へ取り込む
+
+対象:
+  - pending: ワークキューの未処理行（AI_BATCH_LEASE_SECONDS の長いリースで取得）
+  - backfill: 現在の PROMPT_VERSION で処理済みの結果がない全行
+
+構造化データが同じ行（要約キャッシュキーが同じ行）は1レコードにまとめ、キャッシュ済みの
+ものはジョブに含めずその場で取り込む。ジョブ投入から取り込みまでは別プロセスでも
+よいように、recordId と raw_loan_data の対応はマニフェストとしてジョブと一緒に保存する。
+
+バックエンド:
+  - BedrockBatchBackend: S3 + bedrock の create_model_invocation_job
+  - LocalBatchBackend: ディレクトリ上の JSONL を読み書きするローカル実装
+    （bedrock-runtime 互換クライアントで1件ずつ処理し、出力を同じ形式で書く）
+
+使い方:
+  python ai_batch_inference.py run --mode backfill --local-dir ./batch_jobs
+  python ai_batch_inference.py submit --mode pending --limit 5000
+  python ai_batch_inference.py ingest --job-id <jobArn>
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ai_processing_batch import PROMPT_VERSION, AIProcessingBatch, summary_cache_key
+
+try:
+    from database.work_queue import RawDataWorkQueue
+except ImportError:
+    from loanpedia_scraper.database.work_queue import RawDataWorkQueue
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {'Completed', 'PartiallyCompleted', 'Failed', 'Stopped', 'Expired'}
+
+BACKFILL_SELECT_SQL = """
+    SELECT r.id FROM raw_loan_data r
+    WHERE NOT EXISTS (
+        SELECT 1 FROM processed_loan_data p
+        WHERE p.raw_data_id = r.id AND p.processing_version = %s AND p.processing_status = 'completed'
+    )
+    ORDER BY r.id
+    LIMIT %s
+"""
+
+
+def _dump_jsonl(records: List[Dict[str, Any]]) -> bytes:
+    return ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')
+
+
+def _load_jsonl(data: bytes) -> Iterator[Dict[str, Any]]:
+    for line in data.decode('utf-8').splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+class BatchInferenceBackend(ABC):
+    """バッチ推論ジョブの投入・状態取得・結果取得の共通インターフェース"""
+
+    @abstractmethod
+    def submit(self, job_name: str, records: List[Dict[str, Any]], manifest: Dict[str, Any]) -> str:
+        """レコードとマニフェストを保存してジョブを投入し、ジョブIDを返す"""
+
+    @abstractmethod
+    def status(self, job_id: str) -> str:
+        """ジョブの状態（Bedrock の status と同じ値）"""
+
+    @abstractmethod
+    def results(self, job_id: str) -> Iterator[Dict[str, Any]]:
+        """出力レコード（recordId / modelOutput または error）"""
+
+    @abstractmethod
+    def manifest(self, job_id: str) -> Dict[str, Any]:
+        """submit で保存したマニフェスト"""
+
+
+class LocalBatchBackend(BatchInferenceBackend):
+    """
+    ディレクトリ上の JSONL で動くローカル実装
+
+    <root>/<job_name>/input.jsonl, manifest.json を書き、最初の status() で
+    bedrock-runtime 互換クライアントの invoke_model で各レコードを処理して
+    output/input.jsonl.out を書く（Bedrock の出力と同じレコード形式）。
+    """
+
+    def __init__(self, root: str, runtime_client, model_id: str):
+        self.root = Path(root)
+        self.client = runtime_client
+        self.model_id = model_id
+
+    def _job_dir(self, job_id: str) -> Path:
+        return self.root / job_id
+
+    def submit(self, job_name: str, records: List[Dict[str, Any]], manifest: Dict[str, Any]) -> str:
+        job_dir = self._job_dir(job_name)
+        job_dir.mkdir(parents=True, exist_ok=True)
+        (job_dir / 'input.jsonl').write_bytes(_dump_jsonl(records))
+        (job_dir / 'manifest.json').write_text(json.dumps(manifest, ensure_ascii=False), encoding='utf-8')
+        return job_name
+
+    def _execute(self, job_dir: Path) -> None:
+        outputs = []
+        for record in _load_jsonl((job_dir / 'input.jsonl').read_bytes()):
+            out = {'recordId': record['recordId'], 'modelInput': record['modelInput']}
+            try:
+                response = self.client.invoke_model(modelId=self.model_id, body=json.dumps(record['modelInput']))
+                out['modelOutput'] = json.loads(response['body'].read())
+            except Exception as e:
+                out['error'] = {'errorCode': type(e).__name__, 'errorMessage': str(e)}
+            outputs.append(out)
+        output_dir = job_dir / 'output'
+        output_dir.mkdir(exist_ok=True)
+        (output_dir / 'input.jsonl.out').write_bytes(_dump_jsonl(outputs))
+
+    def status(self, job_id: str) -> str:
+        job_dir = self._job_dir(job_id)
+        if not (job_dir / 'input.jsonl').exists():
+            return 'Failed'
+        if not (job_dir / 'output' / 'input.jsonl.out').exists():
+            self._execute(job_dir)
+        return 'Completed'
+
+    def results(self, job_id: str) -> Iterator[Dict[str, Any]]:
+        for path in sorted((self._job_dir(job_id) / 'output').glob('*.jsonl.out')):
+            yield from _load_jsonl(path.read_bytes())
+
+    def manifest(self, job_id: str) -> Dict[str, Any]:
+        return json.loads((self._job_dir(job_id) / 'manifest.json').read_text(encoding='utf-8'))
+
+
+class BedrockBatchBackend(BatchInferenceBackend):
+    """
+    Bedrock バッチ推論（create_model_invocation_job）
+
+    入力は s3://<bucket>/<prefix>/<job_name>/input.jsonl、出力は
+    s3://<bucket>/<prefix>/<job_name>/output/<ジョブID>/input.jsonl.out に置かれる。
+    """
+
+    def __init__(self, bucket: str, prefix: str, role_arn: str, model_id: str,
+                 bedrock_client=None, s3_client=None, region_name: str = 'us-east-1'):
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.role_arn = role_arn
+        self.model_id = model_id
+        self.bedrock = bedrock_client or boto3.client('bedrock', region_name=region_name)
+        self.s3 = s3_client or boto3.client('s3', region_name=region_name)
+
+    def _key(self, job_name: str, name: str) -> str:
+        return f"{self.prefix}/{job_name}/{name}" if self.prefix else f"{job_name}/{name}"
+
+    def submit(self, job_name: str, records: List[Dict[str, Any]], manifest: Dict[str, Any]) -> str:
+        self.s3.put_object(Bucket=self.bucket, Key=self._key(job_name, 'input.jsonl'), Body=_dump_jsonl(records))
+        self.s3.put_object(
+            Bucket=self.bucket, Key=self._key(job_name, 'manifest.json'),
+            Body=json.dumps(manifest, ensure_ascii=False).encode('utf-8'),
+        )
+        response = self.bedrock.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=self.model_id,
+            inputDataConfig={'s3InputDataConfig': {
+                's3Uri': f"s3://{self.bucket}/{self._key(job_name, 'input.jsonl')}", 's3InputFormat': 'JSONL',
+            }},
+            outputDataConfig={'s3OutputDataConfig': {
+                's3Uri': f"s3://{self.bucket}/{self._key(job_name, 'output/')}",
+            }},
+        )
+        return response['jobArn']
+
+    def _job(self, job_id: str) -> Dict[str, Any]:
+        return self.bedrock.get_model_invocation_job(jobIdentifier=job_id)
+
+    def status(self, job_id: str) -> str:
+        return self._job(job_id)['status']
+
+    def results(self, job_id: str) -> Iterator[Dict[str, Any]]:
+        job = self._job(job_id)
+        output_uri = job['outputDataConfig']['s3OutputDataConfig']['s3Uri']
+        prefix = output_uri.split('/', 3)[3]
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('.jsonl.out'):
+                    body = self.s3.get_object(Bucket=self.bucket, Key=obj['Key'])['Body'].read()
+                    yield from _load_jsonl(body)
+
+    def manifest(self, job_id: str) -> Dict[str, Any]:
+        job_name = self._job(job_id)['jobName']
+        body = self.s3.get_object(Bucket=self.bucket, Key=self._key(job_name, 'manifest.json'))['Body'].read()
+        return json.loads(body)
+
+
+class BatchInferenceRunner:
+    """AIProcessingBatch の接続とプロンプトを使ってバッチ推論を実行する"""
+
+    def __init__(
+        self,
+        batch: AIProcessingBatch,
+        backend: BatchInferenceBackend,
+        chunk_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+        sleep=time.sleep,
+    ):
+        self.batch = batch
+        self.backend = backend
+        self.chunk_size = chunk_size or int(os.getenv('AI_BATCH_INGEST_CHUNK', '100'))
+        self.poll_interval = poll_interval if poll_interval is not None else float(
+            os.getenv('AI_BATCH_POLL_SECONDS', '60')
+        )
+        self._sleep = sleep
+
+    def _select_ids(self, mode: str, limit: int) -> Tuple[List[int], Optional[str]]:
+        if mode == 'pending':
+            queue = RawDataWorkQueue(
+                self.batch.connection, lease_seconds=int(os.getenv('AI_BATCH_LEASE_SECONDS', '86400'))
+            )
+            return queue.claim(limit), queue.worker_id
+        if mode == 'backfill':
+            self.batch.cursor.execute(BACKFILL_SELECT_SQL, (PROMPT_VERSION, limit))
+            return [row['id'] for row in self.batch.cursor.fetchall()], None
+        raise ValueError(f"Unknown mode: {mode}")
+
+    def submit(self, mode: str = 'pending', limit: int = 10000, job_name: Optional[str] = None) -> Optional[str]:
+        """
+        対象行をレコードにしてジョブを投入（キャッシュ済みの行はその場で取り込む）
+
+        Returns:
+            Optional[str]: ジョブID（投入するレコードがなければ None）
+        """
+        processor = self.batch.ai_processor
+        ids, worker_id = self._select_ids(mode, limit)
+        raw_data_list = self.batch.load_raw_data(ids)
+
+        groups: Dict[str, List[Any]] = {}
+        for raw_data in raw_data_list:
+            groups.setdefault(summary_cache_key(raw_data, processor.model_id), []).append(raw_data)
+        cached = self.batch.find_cached_summaries(list(groups.keys()))
+        if cached:
+            self._ingest_results(
+                [(key, [(r.id, r.institution_id) for r in groups[key]], result) for key, result in cached.items()],
+                mode, worker_id,
+            )
+
+        misses = {key: rows for key, rows in groups.items() if key not in cached}
+        if not misses:
+            logger.info(f"No records to submit ({len(cached)} cache keys ingested)")
+            return None
+
+        for rows in misses.values():
+            processor.check_prompt_size(rows[0])
+        records = [
+            {'recordId': key, 'modelInput': processor.build_request_body(rows[0])}
+            for key, rows in misses.items()
+        ]
+        manifest = {
+            'mode': mode,
+            'worker_id': worker_id,
+            'model_id': processor.model_id,
+            'prompt_version': PROMPT_VERSION,
+            'records': {key: [[r.id, r.institution_id] for r in rows] for key, rows in misses.items()},
+        }
+        job_name = job_name or f"loanpedia-ai-{PROMPT_VERSION}-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        job_id = self.backend.submit(job_name, records, manifest)
+        logger.info(f"Submitted batch inference job {job_id}: {len(records)} records for {len(ids)} rows")
+        return job_id
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> str:
+        """ジョブが終了状態になるまでポーリング"""
+        started = time.monotonic()
+        while True:
+            status = self.backend.status(job_id)
+            if status in TERMINAL_STATUSES:
+                logger.info(f"Batch inference job {job_id} finished: {status}")
+                return status
+            if timeout is not None and time.monotonic() - started > timeout:
+                return status
+            logger.info(f"Batch inference job {job_id} is {status}; polling again in {self.poll_interval}s")
+            self._sleep(self.poll_interval)
+
+    def ingest(self, job_id: str) -> Dict[str, int]:
+        """出力レコードを processed_loan_data へ取り込む"""
+        manifest = self.backend.manifest(job_id)
+        if manifest.get('prompt_version') != PROMPT_VERSION:
+            raise ValueError(
+                f"Job {job_id} was built with prompt {manifest.get('prompt_version')}, current is {PROMPT_VERSION}"
+            )
+        processor = self.batch.ai_processor
+        items = []
+        seen = set()
+        for record in self.backend.results(job_id):
+            key = record.get('recordId')
+            rows = manifest['records'].get(key)
+            if not rows:
+                continue
+            seen.add(key)
+            if 'modelOutput' in record:
+                try:
+                    result = processor.result_from_response(record['modelOutput'])
+                except Exception as e:
+                    result = processor.failed_result(f"Invalid model output: {e}")
+            else:
+                error = record.get('error') or {}
+                result = processor.failed_result(error.get('errorMessage') or 'No output')
+            items.append((key, [tuple(r) for r in rows], result))
+
+        stats = self._ingest_results(items, manifest['mode'], manifest.get('worker_id'))
+        missing = [key for key in manifest['records'] if key not in seen]
+        stats['missing'] = len(missing)
+        if missing and manifest['mode'] == 'pending':
+            # 出力のない行（ジョブ失敗など）はリース切れを待たずにキューへ戻す
+            queue = RawDataWorkQueue(self.batch.connection, worker_id=manifest.get('worker_id'))
+            for key in missing:
+                for raw_data_id, _ in manifest['records'][key]:
+                    queue.release(raw_data_id)
+        return stats
+
+    def _ingest_results(
+        self, items: List[Tuple[str, List[Tuple[int, int]], Dict[str, Any]]], mode: str, worker_id: Optional[str]
+    ) -> Dict[str, int]:
+        """
+        (キャッシュキー, [(raw_data_id, institution_id)], 結果) を chunk_size 行ごとに1トランザクションで保存
+
+        backfill では失敗した結果は保存しない（前の要約を残し、次回の backfill で再処理する）。
+        pending ではリースを保持している行だけをロックして保存・完了にする（リース切れで
+        他のワーカーが取得した行は、そのワーカーの結果と重複しないよう保存しない）。
+        """
+        queue = RawDataWorkQueue(self.batch.connection, worker_id=worker_id) if mode == 'pending' else None
+        rows: List[Tuple[tuple, bool]] = []
+        stats = {'saved': 0, 'failed': 0, 'lost': 0, 'chunks': 0}
+
+        def flush():
+            if not rows:
+                return
+            try:
+                stored = rows
+                if queue is not None:
+                    held = set(queue.lock_held([row[0] for row, _ in rows]))
+                    stored = [(row, ok) for row, ok in rows if row[0] in held]
+                    if len(stored) != len(rows):
+                        logger.warning(f"{len(rows) - len(stored)} rows lost their lease before ingest; skipped")
+                    queue.complete_many([row[0] for row, _ in stored])
+                self.batch.save_processed_data_many([row for row, _ in stored])
+                self.batch.connection.commit()
+            except Exception:
+                self.batch.connection.rollback()
+                raise
+            stats['chunks'] += 1
+            stats['lost'] += len(rows) - len(stored)
+            for _, ok in stored:
+                stats['saved' if ok else 'failed'] += 1
+            rows.clear()
+
+        for key, targets, result in items:
+            ok = result.get('processing_status') == 'completed'
+            if not ok and mode == 'backfill':
+                stats['failed'] += len(targets)
+                continue
+            for index, (raw_data_id, institution_id) in enumerate(targets):
+                # 呼び出しの計測値は代表の行にだけ保存する
+                if index:
+                    result = {k: v for k, v in result.items() if k != 'usage'}
+                rows.append((self.batch._processed_row(raw_data_id, institution_id, result, key), ok))
+                if len(rows) >= self.chunk_size:
+                    flush()
+        flush()
+        logger.info(f"Ingested batch results: {stats}")
+        return stats
+
+
+def _build_backend(args, processor) -> BatchInferenceBackend:
+    local_dir = args.local_dir or os.getenv('AI_BATCH_LOCAL_DIR')
+    if local_dir:
+        return LocalBatchBackend(local_dir, processor.bedrock, processor.model_id)
+    bucket = os.getenv('AI_BATCH_BUCKET')
+    role_arn = os.getenv('AI_BATCH_ROLE_ARN')
+    if not bucket or not role_arn:
+        raise SystemExit("AI_BATCH_BUCKET and AI_BATCH_ROLE_ARN are required (or use --local-dir)")
+    return BedrockBatchBackend(bucket, os.getenv('AI_BATCH_PREFIX', 'ai-batch'), role_arn, processor.model_id)
+
+
+def main():
+    """メイン処理"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='AI処理バッチ（Bedrock バッチ推論）')
+    parser.add_argument('command', choices=['submit', 'wait', 'ingest', 'run'])
+    parser.add_argument('--mode', choices=['pending', 'backfill'], default='pending')
+    parser.add_argument('--limit', type=int, default=10000, help='対象行数の上限 (default: 10000)')
+    parser.add_argument('--job-id', type=str, help='wait / ingest の対象ジョブ')
+    parser.add_argument('--local-dir', type=str, help='ローカル実装のジョブディレクトリ')
+    args = parser.parse_args()
+
+    batch = AIProcessingBatch()
+    runner = BatchInferenceRunner(batch, _build_backend(args, batch.ai_processor))
+    batch.connect_database()
+    try:
+        job_id = args.job_id
+        if args.command in ('submit', 'run'):
+            job_id = runner.submit(args.mode, args.limit)
+            print(f"job_id={job_id}")
+        if job_id and args.command in ('wait', 'run'):
+            print(f"status={runner.wait(job_id)}")
+        if job_id and args.command in ('ingest', 'run'):
+            print(f"ingest={runner.ingest(job_id)}")
+    finally:
+        batch.close_database()
+
+
+if __name__ == '__main__':
+    main()
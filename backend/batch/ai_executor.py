@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# /ai_executor.py
+# Bedrock 呼び出しの並列実行（トークンバケット + AIMD による流量制御）
+# なぜ: 1件ずつの直列呼び出しでは処理量がクォータではなく応答待ち時間で決まってしまうため
+# 関連: ai_processing_batch.py, template.yaml
+"""
+AI呼び出しの並列実行器
+
+- TokenBucket: 1分あたりのリクエスト数・トークン数の上限
+- AIMDLimiter: 同時実行数を成功で少しずつ増やし、スロットリングで半減させる
+- ConcurrentAIExecutor: スレッドプールで呼び出し、完了した順に結果を返す
+  （結果のDB保存は呼び出し元スレッドで行うため、接続をスレッド間で共有しない）
+
+環境変数:
+  - AI_MAX_CONCURRENCY: 同時実行数の上限（既定 8）
+  - AI_INITIAL_CONCURRENCY: 同時実行数の初期値（既定 2）
+  - AI_MAX_RPM: 1分あたりのリクエスト数上限（既定 50。0 で無制限）
+  - AI_MAX_TPM: 1分あたりのトークン数上限（既定 100000。0 で無制限）
+  - AI_THROTTLE_RETRY_MAX: スロットリング時の最大再試行回数（既定 5）
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+THROTTLING_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+}
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """Bedrock のスロットリング（再試行で回復する）エラーか判定"""
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code in THROTTLING_ERROR_CODES or type(error).__name__ in THROTTLING_ERROR_CODES
+
+
+class TokenBucket:
+    """1分あたりの上限で補充されるトークンバケット（rate_per_minute が 0 なら無制限）"""
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1) -> float:
+        """
+        amount 分のトークンを取得（足りなければ補充を待つ）
+
+        Returns:
+            float: 待った秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        # バケット容量を超える要求は容量分として扱う（永久に待たないため）
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                wait = (amount - self.tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+
+class AIMDLimiter:
+    """加算増加・乗算減少で同時実行数を調整するリミッター"""
+
+    def __init__(self, initial: int = 2, maximum: int = 8, minimum: int = 1, decrease_factor: float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        """成功ごとに 1/limit 増やす（同時実行数分の成功でおよそ +1）"""
+        with self._cond:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            logger.info(f"Throttled; concurrency limit reduced to {int(self.limit)}")
+
+
+class ConcurrentAIExecutor:
+    """AI呼び出しを並列実行し、完了順に (item, result, error) を返す"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        initial_concurrency: int = 2,
+        requests_per_minute: float = 50,
+        tokens_per_minute: float = 100000,
+        retry_max: int = 5,
+        retry_base_delay: float = 1.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limiter = AIMDLimiter(initial_concurrency, self.max_concurrency)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.retry_max = retry_max
+        self.retry_base_delay = retry_base_delay
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.throttled_count = 0
+
+    @classmethod
+    def from_env(cls) -> 'ConcurrentAIExecutor':
+        """環境変数から設定を読み込んで生成"""
+        return cls(
+            max_concurrency=int(os.getenv('AI_MAX_CONCURRENCY', '8')),
+            initial_concurrency=int(os.getenv('AI_INITIAL_CONCURRENCY', '2')),
+            requests_per_minute=float(os.getenv('AI_MAX_RPM', '50')),
+            tokens_per_minute=float(os.getenv('AI_MAX_TPM', '100000')),
+            retry_max=int(os.getenv('AI_THROTTLE_RETRY_MAX', '5')),
+        )
+
+    def _call(self, fn: Callable[[Any], Any], item: Any, tokens: float) -> Any:
+        for attempt in range(self.retry_max + 1):
+            self.limiter.acquire()
+            try:
+                self.request_bucket.acquire(1)
+                self.token_bucket.acquire(tokens)
+                result = fn(item)
+            except Exception as e:
+                if not is_throttling_error(e) or attempt >= self.retry_max:
+                    raise
+                self.limiter.on_throttle()
+                with self._lock:
+                    self.throttled_count += 1
+            else:
+                self.limiter.on_success()
+                return result
+            finally:
+                self.limiter.release()
+
+            # 全スレッドが一斉に再試行しないようジッターを入れる
+            delay = self.retry_base_delay * (2 ** attempt) * (0.5 + random.random())
+            logger.info(f"Retrying throttled AI call in {delay:.1f}s (attempt {attempt + 2})")
+            self._sleep(delay)
+
+    def map(
+        self,
+        fn: Callable[[Any], Any],
+        items: Iterable[Any],
+        estimate_tokens: Optional[Callable[[Any], float]] = None,
+    ) -> Iterator[Tuple[Any, Any, Optional[BaseException]]]:
+        """
+        items を並列に fn で処理し、完了した順に (item, result, error) を返す
+
+        Args:
+            fn: 1件を処理する関数（スロットリング時は例外を送出すること）
+            items: 処理対象
+            estimate_tokens: 1件あたりの消費トークン見積もり（TPM 制御用）
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='ai') as pool:
+            futures = {
+                pool.submit(self._call, fn, item, estimate_tokens(item) if estimate_tokens else 0): item
+                for item in items
+            }
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
@@ -2,7 +2,7 @@
 # /ai_processing_batch.py
 # Bedrockを用いたAI処理バッチ（raw_loan_data → processed_loan_data）
 # なぜ: 生データをAI要約・構造化し、統合処理の入力を作るため
-# 関連: product_integration_batch.py, loanpedia_scraper/database/loan_database.py, template.yaml, docker-compose.yml
+# 関連: ai_backends.py, ai_executor.py, ai_streaming.py, ai_usage.py, product_integration_batch.py, loanpedia_scraper/database/loan_database.py, template.yaml, docker-compose.yml
 """
 AI処理バッチ: BedRock APIを使用してローンデータを要約・構造化
 """
@@ -10,12 +10,13 @@ AI処理バッチ: BedRock APIを使用してローンデータを要約・構
 import os
 import sys
 import json
+import hashlib
+import time
 import pymysql
-import boto3
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from dataclasses import dataclass, field
 
 # ログ設定
 logging.basicConfig(
@@ -24,142 +25,84 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
-class RawLoanData:
-    """生ローンデータ"""
-    id: int
-    institution_id: int
-    institution_name: str
-    source_url: str
-    page_title: str
-    html_content: str
-    structured_data: dict
-    scraped_at: datetime
-
-class BedrockAIProcessor:
-    """BedRock API を使用したAI処理クラス"""
-    
-    def __init__(self, region_name: str = 'us-east-1'):
-        self.bedrock = boto3.client('bedrock-runtime', region_name=region_name)
-        self.model_id = 'anthropic.claude-3-sonnet-20240229-v1:0'
-    
-    def summarize_loan_data(self, raw_data: RawLoanData) -> Dict:
-        """ローンデータをAIで要約・構造化"""
-        
-        # プロンプト構築
-        prompt = self._build_prompt(raw_data)
-        
-        try:
-            # BedRock API呼び出し
-            response = self.bedrock.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-25",
-                    "max_tokens": 4000,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ]
-                })
-            )
-            
-            # レスポンス解析
-            result = json.loads(response['body'].read())
-            ai_summary_text = result['content'][0]['text']
-            
-            # JSON形式で構造化データを抽出
-            ai_summary = self._parse_ai_response(ai_summary_text)
-            
-            return {
-                'ai_summary': ai_summary,
-                'ai_model': self.model_id,
-                'processing_status': 'completed',
-                'validation_status': 'valid',
-                'raw_response': ai_summary_text
-            }
-            
-        except Exception as e:
-            logger.error(f"AI processing failed for raw_data_id {raw_data.id}: {e}")
-            return {
-                'ai_summary': {},
-                'ai_model': self.model_id,
-                'processing_status': 'failed',
-                'validation_status': 'error',
-                'error_message': str(e)
-            }
-    
-    def _build_prompt(self, raw_data: RawLoanData) -> str:
-        """商品要約用プロンプトを構築"""
-        return f"""
-あなたは金融商品の専門コンサルタントです。Scrapyで精密に抽出済みの構造化データを基に、顧客向けの商品要約と分析を行ってください。
+from ai_backends import BACKENDS, create_ai_client
+from ai_executor import ConcurrentAIExecutor, is_throttling_error
+from ai_streaming import stream_summary
+from ai_usage import UsageMetrics
+from product_integration_batch import ProcessedLoanData, ProductIntegrationBatch
 
-## 入力データ
-**金融機関**: {raw_data.institution_name}
-**商品ページURL**: {raw_data.source_url}
+try:
+    from database.connection_pool import get_connection_pool
+    from database.content_store import read_content
+    from database.work_queue import RawDataWorkQueue
+except ImportError:
+    from loanpedia_scraper.database.connection_pool import get_connection_pool
+    from loanpedia_scraper.database.content_store import read_content
+    from loanpedia_scraper.database.work_queue import RawDataWorkQueue
 
-**Scrapyで抽出済みの正確な構造化データ**:
-```json
-{json.dumps(raw_data.structured_data, ensure_ascii=False, indent=2)}
-```
-
-**補足情報** (ページタイトル): {raw_data.page_title}
+PROCESSED_INSERT_SQL = """
+    INSERT INTO processed_loan_data (
+        raw_data_id, institution_id, ai_summary, ai_model, processing_version, summary_cache_key,
+        input_tokens, output_tokens, cache_read_input_tokens, latency_ms, ai_retries,
+        processing_status, validation_status, validation_messages, 
+        error_message, processed_at, created_at, updated_at
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
 
-## 分析要求
-上記の構造化データは信頼できる正確な情報です。このデータを基に、以下のJSON形式で商品要約と分析を行ってください：
+# プロンプトテンプレートを変更したら上げる（processing_version と要約キャッシュのキーに使う）
+# v2: 固定の指示・JSON形式を system に移し、商品ごとの入力だけを user に置く構成
+PROMPT_VERSION = 'v2'
 
-```json
-{{
-  "product_analysis": {{
+# 要約のJSON形式（単一商品・複数商品のプロンプトで共通）
+SUMMARY_JSON_TEMPLATE = """{
+  "product_analysis": {
     "executive_summary": "商品の核心を3-4行で要約",
     "competitive_advantages": ["この商品の強み1", "強み2", "強み3"],
     "potential_concerns": ["注意すべき点1", "注意点2"],
     "best_fit_customers": ["最適な顧客像1", "顧客像2", "顧客像3"]
-  }},
-  "customer_guide": {{
+  },
+  "customer_guide": {
     "simple_explanation": "一般消費者向けの分かりやすい商品説明（200文字程度）",
     "key_benefits": ["顧客メリット1", "メリット2", "メリット3"],
     "application_difficulty": "申込の難易度（簡単/普通/やや難しい/難しい）",
     "recommended_use_cases": ["おすすめの利用場面1", "場面2", "場面3"]
-  }},
-  "market_positioning": {{
+  },
+  "market_positioning": {
     "interest_rate_competitiveness": "金利の市場競争力評価（高い/普通/低い）",
     "unique_selling_points": ["他行との差別化ポイント1", "ポイント2"],
     "target_market_segment": "ターゲット市場セグメント（プレミアム/スタンダード/エコノミー）"
-  }},
-  "risk_assessment": {{
+  },
+  "risk_assessment": {
     "borrower_risks": ["借入者が注意すべきリスク1", "リスク2"],
     "flexibility_score": "借入条件の柔軟性スコア（1-10）",
     "total_cost_transparency": "総コストの透明性（高い/普通/低い）"
-  }},
-  "financial_summary": {{
-    "validated_conditions": {{
+  },
+  "financial_summary": {
+    "validated_conditions": {
       "interest_rate_range": "抽出データから確認済みの金利範囲",
       "loan_amount_range": "確認済みの融資額範囲", 
       "loan_period_range": "確認済みの融資期間",
       "key_requirements": "主要な申込条件のまとめ"
-    }},
-    "cost_simulation": {{
+    },
+    "cost_simulation": {
       "typical_case": "標準的なケースでの概算コスト例",
       "best_case": "最も有利な条件での概算コスト",
       "worst_case": "最も不利な条件での概算コスト"
-    }}
-  }},
-  "actionable_insights": {{
+    }
+  },
+  "actionable_insights": {
     "pre_application_checklist": ["申込前に確認すべき項目1", "項目2", "項目3"],
     "negotiation_points": ["交渉可能と思われるポイント1", "ポイント2"],
     "alternative_considerations": ["検討すべき他の選択肢1", "選択肢2"]
-  }},
-  "data_confidence": {{
+  },
+  "data_confidence": {
     "analysis_reliability": "分析の信頼度（1-10）",
     "missing_information": ["より詳細な分析に必要な追加情報"],
     "last_updated_estimate": "データの鮮度に関する評価"
-  }}
-}}
-```
+  }
+}"""
 
-## 分析方針
+ANALYSIS_GUIDELINES = """## 分析方針
 1. **データの信頼**: 構造化データは正確なものとして扱い、再検証は不要
 2. **付加価値の創出**: 単純な情報整理ではなく、顧客視点での価値ある分析を提供
 3. **実用性重視**: 実際にローンを検討する顧客が意思決定に使える情報を生成
@@ -170,6 +113,305 @@ class BedrockAIProcessor:
 - 抽出済みデータの数値や事実は変更せず、そのまま使用してください
 - 推測や憶測ではなく、データに基づいた分析を行ってください
 - 顧客の立場に立った、実用的で価値のある要約を心がけてください
+"""
+
+# 全呼び出しで同一の system プロンプト（プロンプトキャッシュの対象。商品ごとの入力は含めない）
+SYSTEM_PROMPT = f"""あなたは金融商品の専門コンサルタントです。Scrapyで精密に抽出済みの構造化データを基に、顧客向けの商品要約と分析を行ってください。
+
+## 分析要求
+入力データの構造化データは信頼できる正確な情報です。このデータを基に、商品ごとに以下のJSON形式で商品要約と分析を行ってください：
+
+```json
+{SUMMARY_JSON_TEMPLATE}
+```
+
+{ANALYSIS_GUIDELINES}"""
+
+@dataclass(slots=True)
+class RawLoanData:
+    """
+    生ローンデータ（プロンプトに使う列のみ保持）
+
+    HTML本文はプロンプトに使わないため読み込まず、html_content を参照したときに
+    html_loader で1件ずつ取得する。
+    """
+    id: int
+    institution_id: int
+    institution_name: str
+    source_url: str
+    page_title: str
+    structured_data: dict
+    scraped_at: datetime
+    html_loader: Optional[Callable[[int], str]] = field(default=None, repr=False, compare=False)
+    _html_content: Optional[str] = field(default=None, repr=False, compare=False)
+
+    @property
+    def html_content(self) -> str:
+        """HTML本文（初回参照時に読み込む）"""
+        if self._html_content is None:
+            self._html_content = self.html_loader(self.id) if self.html_loader else ''
+        return self._html_content
+
+def summary_cache_key(raw_data: RawLoanData, model_id: str, prompt_version: str = PROMPT_VERSION) -> str:
+    """
+    要約キャッシュのキー
+    
+    正規化した structured_data・金融機関・モデル・プロンプトのバージョンのハッシュ。
+    月次の再取得で新しい行ができても、構造化データが同じなら同じキーになる。
+    """
+    canonical = json.dumps(
+        raw_data.structured_data, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str
+    )
+    payload = '\x1f'.join([canonical, str(raw_data.institution_id), model_id, prompt_version])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _product_input(raw_data: RawLoanData) -> str:
+    """プロンプトの入力データ部分（1商品分）"""
+    return f"""**金融機関**: {raw_data.institution_name}
+**商品ページURL**: {raw_data.source_url}
+
+**Scrapyで抽出済みの正確な構造化データ**:
+```json
+{json.dumps(raw_data.structured_data, ensure_ascii=False, indent=2)}
+```
+
+**補足情報** (ページタイトル): {raw_data.page_title}"""
+
+def _pack_key(index: int) -> str:
+    """複数商品プロンプトでの商品ID"""
+    return f"p{index + 1}"
+
+def pack_products(raw_data_list: List[RawLoanData], pack_size: int) -> List[List[RawLoanData]]:
+    """同じ金融機関・ローン種別の商品を pack_size 件ずつにまとめる"""
+    groups: Dict[tuple, List[RawLoanData]] = {}
+    for raw_data in raw_data_list:
+        loan_category = raw_data.structured_data.get('loan_category')
+        groups.setdefault((raw_data.institution_id, loan_category), []).append(raw_data)
+    return [
+        rows[i:i + pack_size]
+        for rows in groups.values()
+        for i in range(0, len(rows), pack_size)
+    ]
+
+class BedrockAIProcessor:
+    """BedRock API を使用したAI処理クラス"""
+    
+    def __init__(
+        self,
+        region_name: str = 'us-east-1',
+        client=None,
+        streaming: Optional[bool] = None,
+        prompt_cache: Optional[bool] = None,
+    ):
+        # bedrock-runtime と同じ呼び出し方のクライアント（既定: 環境変数 AI_BACKEND に応じて作成）
+        self.bedrock = client or create_ai_client(region_name=region_name)
+        self.model_id = os.getenv('BEDROCK_MODEL_ID', 'anthropic.claude-3-sonnet-20240229-v1:0')
+        self.max_tokens = 4000
+        # 複数商品をまとめた呼び出しの最大出力トークン数
+        self.pack_max_tokens = int(os.getenv('AI_PACK_MAX_TOKENS', '4096'))
+        # ストリーミング応答を逐次検証し、スキーマ外の出力を早期に打ち切る（環境変数 AI_STREAMING）
+        if streaming is None:
+            streaming = os.getenv('AI_STREAMING', 'false').lower() in ('true', '1', 'yes')
+        self.streaming = streaming
+        # system プロンプトにキャッシュ指定を付ける（環境変数 AI_PROMPT_CACHE。対応モデルのみ）
+        if prompt_cache is None:
+            prompt_cache = os.getenv('AI_PROMPT_CACHE', 'false').lower() in ('true', '1', 'yes')
+        self.prompt_cache = prompt_cache
+        self.usage = UsageMetrics()
+    
+    def estimate_tokens(self, raw_data: RawLoanData) -> int:
+        """1回の呼び出しで消費するトークン数の見積もり（入力 + 最大出力。TPM 制御用）"""
+        # 日本語が中心のため、おおよそ2文字で1トークンとして扱う
+        return (len(SYSTEM_PROMPT) + len(self._build_prompt(raw_data))) // 2 + self.max_tokens
+    
+    def estimate_pack_tokens(self, raw_data_list: List[RawLoanData]) -> int:
+        """summarize_pack 1回分のトークン数の見積もり"""
+        if len(raw_data_list) == 1:
+            return self.estimate_tokens(raw_data_list[0])
+        return (len(SYSTEM_PROMPT) + len(self._build_multi_prompt(raw_data_list))) // 2 + self.pack_max_tokens
+    
+    def _request_body(self, prompt: str, max_tokens: int) -> Dict:
+        system = {"type": "text", "text": SYSTEM_PROMPT}
+        if self.prompt_cache:
+            system["cache_control"] = {"type": "ephemeral"}
+        return {
+            "anthropic_version": "bedrock-2023-05-25",
+            "max_tokens": max_tokens,
+            "system": [system],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        }
+    
+    def build_request_body(self, raw_data: RawLoanData) -> Dict:
+        """invoke_model / バッチ推論の modelInput に渡すリクエストボディ"""
+        return self._request_body(self._build_prompt(raw_data), self.max_tokens)
+    
+    def result_from_response(self, result: Dict, latency_ms: Optional[int] = None, retries: int = 0) -> Dict:
+        """モデルの応答ボディ（JSON）から AI処理結果を作る（usage に呼び出しの計測値を入れる）"""
+        ai_summary_text = result['content'][0]['text']
+        
+        # JSON形式で構造化データを抽出
+        ai_summary = self._parse_ai_response(ai_summary_text)
+        
+        return {
+            'ai_summary': ai_summary,
+            'ai_model': self.model_id,
+            'processing_status': 'completed',
+            'validation_status': 'valid',
+            'raw_response': ai_summary_text,
+            'usage': self.usage.record(result.get('usage'), latency_ms, retries, self.model_id)
+        }
+    
+    def failed_result(self, error_message: str) -> Dict:
+        """失敗時の AI処理結果"""
+        return {
+            'ai_summary': {},
+            'ai_model': self.model_id,
+            'processing_status': 'failed',
+            'validation_status': 'error',
+            'error_message': error_message
+        }
+    
+    def check_prompt_size(self, raw_data: RawLoanData) -> Optional[Dict]:
+        """送信前に structured_data の大きさを確認（しきい値超えは警告してレポートに集計）"""
+        return self.usage.check_prompt(raw_data.id, raw_data.structured_data)
+    
+    def summarize_loan_data(self, raw_data: RawLoanData) -> Dict:
+        """
+        ローンデータをAIで要約・構造化
+        
+        スロットリングは並列実行器で再試行するため例外のまま送出する。
+        """
+        self.usage.note_attempt(raw_data.id)
+        try:
+            if self.streaming:
+                return self._summarize_streaming(raw_data)
+            
+            # BedRock API呼び出し
+            started = time.monotonic()
+            response = self.bedrock.invoke_model(
+                modelId=self.model_id,
+                body=json.dumps(self.build_request_body(raw_data))
+            )
+            result = json.loads(response['body'].read())
+            latency_ms = int((time.monotonic() - started) * 1000)
+            
+            # レスポンス解析
+            return self.result_from_response(result, latency_ms, self.usage.pop_retries(raw_data.id))
+            
+        except Exception as e:
+            if is_throttling_error(e):
+                raise
+            self.usage.pop_retries(raw_data.id)
+            logger.error(f"AI processing failed for raw_data_id {raw_data.id}: {e}")
+            return self.failed_result(str(e))
+    
+    def summarize_pack(self, raw_data_list: List[RawLoanData]) -> List[Dict]:
+        """
+        複数商品を1回の呼び出しで要約（結果は raw_data_list と同じ順）
+        
+        応答は商品ID（p1, p2, ...）をキーにした JSON。解析できなかった商品は
+        単一商品の呼び出し（summarize_loan_data）で要約し直す。
+        """
+        if len(raw_data_list) == 1:
+            return [self.summarize_loan_data(raw_data_list[0])]
+        
+        packed: Dict = {}
+        usage: Dict = {}
+        attempt_key = tuple(raw_data.id for raw_data in raw_data_list)
+        self.usage.note_attempt(attempt_key)
+        try:
+            started = time.monotonic()
+            response = self.bedrock.invoke_model(
+                modelId=self.model_id,
+                body=json.dumps(self._request_body(self._build_multi_prompt(raw_data_list), self.pack_max_tokens))
+            )
+            result = json.loads(response['body'].read())
+            usage = self.usage.record(
+                result.get('usage'),
+                int((time.monotonic() - started) * 1000),
+                self.usage.pop_retries(attempt_key),
+                self.model_id,
+            )
+            text = result['content'][0]['text']
+            parsed = self._parse_ai_response(text)
+            if 'parse_error' not in parsed:
+                packed = parsed
+        except Exception as e:
+            if is_throttling_error(e):
+                raise
+            self.usage.pop_retries(attempt_key)
+            logger.warning(f"Packed AI call failed for {len(raw_data_list)} products: {e}")
+        
+        results = []
+        fallback_count = 0
+        for i, raw_data in enumerate(raw_data_list):
+            ai_summary = packed.get(_pack_key(i))
+            if isinstance(ai_summary, dict) and 'product_analysis' in ai_summary:
+                results.append({
+                    'ai_summary': ai_summary,
+                    'ai_model': self.model_id,
+                    'processing_status': 'completed',
+                    'validation_status': 'valid',
+                    'pack_size': len(raw_data_list),
+                    'usage': usage if i == 0 else {}
+                })
+            else:
+                fallback_count += 1
+                results.append(self.summarize_loan_data(raw_data))
+        
+        if fallback_count:
+            logger.warning(
+                f"Packed response missing {fallback_count}/{len(raw_data_list)} products; fell back to single calls"
+            )
+        return results
+    
+    def _summarize_streaming(self, raw_data: RawLoanData) -> Dict:
+        """ストリーミングで要約（セクションごとに検証し、スキーマ外なら打ち切って続きから再試行）"""
+        text, sections, stats = stream_summary(self.bedrock, self.model_id, self.build_request_body(raw_data))
+        logger.info(
+            f"AI stream for raw_data_id {raw_data.id}: attempts={stats['attempts']}, "
+            f"first_section={stats['first_section_seconds']}, wasted_tokens={stats['wasted_output_tokens']}"
+        )
+        return {
+            'ai_summary': sections,
+            'ai_model': self.model_id,
+            'processing_status': 'completed',
+            'validation_status': 'warning' if stats['missing_sections'] else 'valid',
+            'raw_response': text,
+            'stream_stats': stats,
+            'usage': self.usage.record(
+                stats,
+                int(stats['total_seconds'] * 1000),
+                self.usage.pop_retries(raw_data.id) + stats['attempts'] - 1,
+                self.model_id,
+            )
+        }
+    
+    def _build_prompt(self, raw_data: RawLoanData) -> str:
+        """商品要約用プロンプト（user メッセージ）を構築。指示と JSON 形式は SYSTEM_PROMPT"""
+        return f"""## 入力データ
+{_product_input(raw_data)}
+
+上記の商品について、指定のJSON形式で商品要約と分析を行ってください。
+"""
+
+    def _build_multi_prompt(self, raw_data_list: List[RawLoanData]) -> str:
+        """複数商品をまとめて要約するプロンプト（user メッセージ）を構築（商品IDは p1, p2, ...）"""
+        inputs = '\n\n'.join(
+            f"### 商品 {_pack_key(i)}\n{_product_input(raw_data)}"
+            for i, raw_data in enumerate(raw_data_list)
+        )
+        keys = ', '.join(f'"{_pack_key(i)}": {{...}}' for i in range(len(raw_data_list)))
+        return f"""## 入力データ
+{inputs}
+
+上記の各商品について商品要約と分析を行い、商品IDをキーにした1つのJSONオブジェクト（{{{keys}}}）で回答してください。
+各商品の値は指定のJSON形式とし、商品ごとの分析を混同せず、すべての商品IDについて回答してください。
 """
 
     def _parse_ai_response(self, response_text: str) -> Dict:
@@ -200,11 +442,30 @@ class BedrockAIProcessor:
 class AIProcessingBatch:
     """AI処理バッチメイン処理クラス"""
     
-    def __init__(self):
+    def __init__(
+        self, ai_processor: Optional[BedrockAIProcessor] = None, ai_client=None, fused: Optional[bool] = None
+    ):
+        """
+        初期化
+        
+        Args:
+            ai_processor: AI処理（既定: ai_client を使う BedrockAIProcessor）
+            ai_client: bedrock-runtime と同じ呼び出し方のクライアント（ローカルスタブなど。既定: AI_BACKEND）
+            fused: AI処理結果をその場で loan_products まで反映する（既定: 環境変数 AI_FUSED_INTEGRATION）
+        """
         self.db_config = self._load_db_config()
-        self.ai_processor = BedrockAIProcessor()
+        self.ai_processor = ai_processor or BedrockAIProcessor(client=ai_client)
+        self.executor: Optional[ConcurrentAIExecutor] = None
+        # 1回の呼び出しにまとめる商品数（1 なら商品ごとに呼び出す）
+        self.pack_size = int(os.getenv('AI_PACK_SIZE', '1'))
+        # 融合モード: processed_loan_data と loan_products を同じトランザクションで書く
+        if fused is None:
+            fused = os.getenv('AI_FUSED_INTEGRATION', 'false').lower() in ('true', '1', 'yes')
+        self.integrator: Optional[ProductIntegrationBatch] = ProductIntegrationBatch() if fused else None
+        self.integrated_count = 0
         self.connection = None
         self.cursor = None
+        self.work_queue = None
     
     def _load_db_config(self) -> Dict:
         """データベース設定を読み込み（共通ユーティリティ使用）"""
@@ -224,40 +485,58 @@ class AIProcessingBatch:
             }
     
     def connect_database(self):
-        """データベース接続"""
+        """データベース接続（プロセス共通プールから借りる）"""
         try:
-            self.connection = pymysql.connect(**self.db_config)
+            self.connection = get_connection_pool(self.db_config).acquire()
             self.connection.cursorclass = pymysql.cursors.DictCursor
             self.cursor = self.connection.cursor()
+            self.work_queue = RawDataWorkQueue(self.connection)
+            if self.integrator is not None:
+                # 統合処理も同じ接続・カーソルで書き、AI処理結果と一緒にコミットする
+                self.integrator.connection = self.connection
+                self.integrator.cursor = self.cursor
             logger.info("Database connected successfully")
         except Exception as e:
             logger.error(f"Database connection failed: {e}")
             raise
     
     def close_database(self):
-        """データベース接続終了"""
+        """データベース接続終了（プールへ返却）"""
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.connection:
-            self.connection.close()
-        logger.info("Database connection closed")
+            get_connection_pool(self.db_config).release(self.connection)
+            self.connection = None
+        self.work_queue = None
+        if self.integrator is not None:
+            self.integrator.connection = None
+            self.integrator.cursor = None
+        logger.info("Database connection released")
     
     def get_unprocessed_raw_data(self, limit: int = 10) -> List[RawLoanData]:
-        """未処理の生データを取得"""
-        sql = """
+        """未処理の生データをワークキューからリース付きで取得"""
+        return self.load_raw_data(self.work_queue.claim(limit))
+    
+    def load_raw_data(self, ids: List[int]) -> List[RawLoanData]:
+        """指定IDの生データをプロンプトに使う列だけ取得"""
+        if not ids:
+            return []
+
+        # HTML本文（LONGTEXT / content_blobs）はプロンプトに使わないため取得しない
+        placeholders = ', '.join(['%s'] * len(ids))
+        sql = f"""
             SELECT 
                 r.id, r.institution_id, r.source_url, r.page_title, 
-                r.html_content, r.structured_data, r.scraped_at,
+                r.structured_data, r.scraped_at,
                 f.institution_name
             FROM raw_loan_data r
             JOIN financial_institutions f ON r.institution_id = f.id
-            LEFT JOIN processed_loan_data p ON r.id = p.raw_data_id
-            WHERE p.id IS NULL
+            WHERE r.id IN ({placeholders})
             ORDER BY r.scraped_at DESC
-            LIMIT %s
         """
         
-        self.cursor.execute(sql, (limit,))
+        self.cursor.execute(sql, ids)
         rows = self.cursor.fetchall()
         
         raw_data_list = []
@@ -275,23 +554,71 @@ class AIProcessingBatch:
                 institution_name=row['institution_name'],
                 source_url=row['source_url'],
                 page_title=row['page_title'],
-                html_content=row['html_content'],
                 structured_data=structured_data,
-                scraped_at=row['scraped_at']
+                scraped_at=row['scraped_at'],
+                html_loader=self.load_html_content
             ))
         
         return raw_data_list
     
-    def save_processed_data(self, raw_data_id: int, institution_id: int, ai_result: Dict):
-        """AI処理結果を保存"""
-        sql = """
-            INSERT INTO processed_loan_data (
-                raw_data_id, institution_id, ai_summary, ai_model,
-                processing_status, validation_status, validation_messages, 
-                error_message, processed_at, created_at, updated_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    def load_html_content(self, raw_data_id: int) -> str:
+        """1件分のHTML本文を取得（RawLoanData.html_content の遅延読み込み用）"""
+        self.cursor.execute(
+            """
+            SELECT r.html_content, hb.compression AS html_compression,
+                   hb.data AS html_blob, hb.storage_uri AS html_uri
+            FROM raw_loan_data r
+            LEFT JOIN content_blobs hb ON hb.content_hash = r.html_blob_hash
+            WHERE r.id = %s
+            """,
+            (raw_data_id,)
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return ''
+        return read_content(row['html_content'], row['html_compression'], row['html_blob'], row['html_uri'])
+    
+    def find_cached_summaries(self, cache_keys: List[str]) -> Dict[str, Dict]:
         """
+        要約キャッシュを検索（同じキーで完了済みの最新の要約）
         
+        Returns:
+            Dict[str, Dict]: キャッシュキー → AI処理結果（summarize_loan_data と同じ形式）
+        """
+        if not cache_keys:
+            return {}
+        placeholders = ', '.join(['%s'] * len(cache_keys))
+        self.cursor.execute(
+            f"""
+            SELECT summary_cache_key, ai_summary, ai_model, validation_status
+            FROM processed_loan_data
+            WHERE summary_cache_key IN ({placeholders})
+              AND processing_version = %s
+              AND processing_status = 'completed'
+            ORDER BY id DESC
+            """,
+            (*cache_keys, PROMPT_VERSION)
+        )
+        cached: Dict[str, Dict] = {}
+        for row in self.cursor.fetchall():
+            if row['summary_cache_key'] in cached:
+                continue
+            ai_summary = row['ai_summary']
+            if isinstance(ai_summary, (str, bytes)):
+                ai_summary = json.loads(ai_summary)
+            cached[row['summary_cache_key']] = {
+                'ai_summary': ai_summary,
+                'ai_model': row['ai_model'],
+                'processing_status': 'completed',
+                'validation_status': row['validation_status'] or 'valid',
+                'cache_hit': True
+            }
+        return cached
+    
+    def _processed_row(
+        self, raw_data_id: int, institution_id: int, ai_result: Dict, cache_key: Optional[str] = None
+    ) -> tuple:
+        """processed_loan_data の INSERT パラメータ"""
         now = datetime.now()
         validation_messages = None
         
@@ -299,11 +626,21 @@ class AIProcessingBatch:
         if 'ai_summary' in ai_result and 'data_quality' in ai_result['ai_summary']:
             validation_messages = json.dumps(ai_result['ai_summary']['data_quality'])
         
-        self.cursor.execute(sql, (
+        # AI呼び出しの計測値（キャッシュ流用・同一データの行は呼び出しがないため NULL）
+        usage = ai_result.get('usage') or {}
+        
+        return (
             raw_data_id,
             institution_id,
             json.dumps(ai_result.get('ai_summary', {}), ensure_ascii=False),
             ai_result.get('ai_model', ''),
+            PROMPT_VERSION,
+            cache_key,
+            usage.get('input_tokens'),
+            usage.get('output_tokens'),
+            usage.get('cache_read_input_tokens'),
+            usage.get('latency_ms'),
+            usage.get('retries'),
             ai_result.get('processing_status', 'completed'),
             ai_result.get('validation_status', 'valid'),
             validation_messages,
@@ -311,12 +648,107 @@ class AIProcessingBatch:
             now,
             now,
             now
-        ))
-        
+        )
+    
+    def save_processed_data(
+        self, raw_data_id: int, institution_id: int, ai_result: Dict, cache_key: Optional[str] = None
+    ):
+        """AI処理結果を保存"""
+        self.cursor.execute(
+            PROCESSED_INSERT_SQL, self._processed_row(raw_data_id, institution_id, ai_result, cache_key)
+        )
         return self.cursor.lastrowid
     
-    def run(self, batch_size: int = 5):
-        """バッチ処理実行"""
+    def save_processed_data_many(self, rows: List[tuple]) -> None:
+        """_processed_row で作ったパラメータをまとめて保存（コミットは呼び出し側）"""
+        if rows:
+            self.cursor.executemany(PROCESSED_INSERT_SQL, rows)
+    
+    def _integrate(self, raw_data: RawLoanData, processed_id: int, ai_result: Dict) -> Optional[int]:
+        """
+        融合モード: 保存したAI処理結果をメモリ上のまま loan_products に反映（コミットは呼び出し側）
+        
+        統合に失敗してもAI処理結果は捨てないよう、セーブポイントまで戻して processed_loan_data だけ
+        コミットする（その行は product_integration_batch.py が後で拾う）。
+        """
+        processed_data = ProcessedLoanData(
+            id=processed_id,
+            raw_data_id=raw_data.id,
+            institution_id=raw_data.institution_id,
+            institution_name=raw_data.institution_name,
+            ai_summary=ai_result.get('ai_summary', {}),
+            processing_status=ai_result['processing_status'],
+            validation_status=ai_result.get('validation_status', 'valid'),
+            processed_at=datetime.now()
+        )
+        self.cursor.execute("SAVEPOINT fused_integration")
+        try:
+            loan_product_id = self.integrator.integrate(processed_data, raw_data.structured_data)
+        except Exception as e:
+            logger.warning(f"Fused integration failed for raw_data_id {raw_data.id}; left for integration batch: {e}")
+            self.cursor.execute("ROLLBACK TO SAVEPOINT fused_integration")
+            return None
+        if loan_product_id is None:
+            logger.warning(f"Failed to extract product data for raw_data_id {raw_data.id}")
+            return None
+        self.integrated_count += 1
+        return loan_product_id
+    
+    def _store_result(
+        self, raw_data: RawLoanData, ai_result: Optional[Dict], error: Optional[BaseException], cache_key: str
+    ) -> bool:
+        """
+        1件分の結果を保存してコミット（失敗時はキューへ戻す）
+        
+        Returns:
+            bool: AI処理が完了として保存された場合 True
+        """
+        try:
+            logger.info(f"Processing raw_data_id: {raw_data.id} - {raw_data.institution_name}")
+            
+            if error is not None:
+                # スロットリングの再試行上限など。キューへ戻して後で再処理する
+                raise error
+            
+            # 結果保存（リースを失っていれば他のワーカーに任せる）
+            processed_id = self.save_processed_data(
+                raw_data.id, 
+                raw_data.institution_id, 
+                ai_result,
+                cache_key
+            )
+            if not self.work_queue.complete(raw_data.id):
+                logger.warning(f"Lease lost for raw_data_id {raw_data.id}; discarding result")
+                self.connection.rollback()
+                return False
+            
+            if self.integrator is not None and ai_result['processing_status'] == 'completed':
+                self._integrate(raw_data, processed_id, ai_result)
+            
+            self.connection.commit()
+            
+            if ai_result['processing_status'] == 'completed':
+                logger.info(f"✅ Successfully processed ID: {processed_id}")
+                return True
+            logger.warning(f"⚠️ Processing failed for raw_data_id: {raw_data.id}")
+            return False
+            
+        except Exception as e:
+            logger.error(f"Error processing raw_data_id {raw_data.id}: {e}")
+            self.connection.rollback()
+            self.work_queue.release(raw_data.id)
+            return False
+    
+    def _pack_products(self, raw_data_list: List[RawLoanData]) -> List[List[RawLoanData]]:
+        return pack_products(raw_data_list, self.pack_size)
+    
+    def run(self, batch_size: int = 5) -> Optional[Dict]:
+        """
+        バッチ処理実行
+        
+        Returns:
+            Optional[Dict]: AI呼び出しの実行レポート（UsageMetrics.report。対象がなければ None）
+        """
         logger.info(f"AI Processing Batch started (batch_size: {batch_size})")
         
         try:
@@ -334,36 +766,69 @@ class AIProcessingBatch:
             processed_count = 0
             failed_count = 0
             
+            # 構造化データが同じ行はまとめ、要約キャッシュにあればAIを呼ばずに流用する
+            groups: Dict[str, List[RawLoanData]] = {}
             for raw_data in raw_data_list:
-                try:
-                    logger.info(f"Processing raw_data_id: {raw_data.id} - {raw_data.institution_name}")
-                    
-                    # AI処理実行
-                    ai_result = self.ai_processor.summarize_loan_data(raw_data)
-                    
-                    # 結果保存
-                    processed_id = self.save_processed_data(
-                        raw_data.id, 
-                        raw_data.institution_id, 
-                        ai_result
-                    )
-                    
-                    self.connection.commit()
-                    
-                    if ai_result['processing_status'] == 'completed':
+                key = summary_cache_key(raw_data, self.ai_processor.model_id)
+                groups.setdefault(key, []).append(raw_data)
+            cached = self.find_cached_summaries(list(groups.keys()))
+            
+            cache_hits = 0
+            for key, result in cached.items():
+                for raw_data in groups[key]:
+                    if self._store_result(raw_data, result, None, key):
                         processed_count += 1
-                        logger.info(f"✅ Successfully processed ID: {processed_id}")
+                        cache_hits += 1
                     else:
                         failed_count += 1
-                        logger.warning(f"⚠️ Processing failed for raw_data_id: {raw_data.id}")
-                    
-                except Exception as e:
-                    logger.error(f"Error processing raw_data_id {raw_data.id}: {e}")
-                    self.connection.rollback()
-                    failed_count += 1
-                    continue
             
-            logger.info(f"Batch processing completed: {processed_count} processed, {failed_count} failed")
+            # AI呼び出しは並列に行い、結果は完了した順にこのスレッドで保存・コミットする
+            misses = [rows[0] for key, rows in groups.items() if key not in cached]
+            for raw_data in misses:
+                self.ai_processor.check_prompt_size(raw_data)
+            executor = self.executor or ConcurrentAIExecutor.from_env()
+            if self.pack_size > 1:
+                packs = self._pack_products(misses)
+                call_count = len(packs)
+                packed_results = executor.map(
+                    self.ai_processor.summarize_pack,
+                    packs,
+                    estimate_tokens=self.ai_processor.estimate_pack_tokens,
+                )
+                results = (
+                    (representative, pack_results[i] if pack_results else None, error)
+                    for pack, pack_results, error in packed_results
+                    for i, representative in enumerate(pack)
+                )
+            else:
+                call_count = len(misses)
+                results = executor.map(
+                    self.ai_processor.summarize_loan_data,
+                    misses,
+                    estimate_tokens=self.ai_processor.estimate_tokens,
+                )
+            for representative, ai_result, error in results:
+                key = summary_cache_key(representative, self.ai_processor.model_id)
+                for index, raw_data in enumerate(groups[key]):
+                    # 呼び出しの計測値は代表の行にだけ保存する（他の行は呼び出しを共有しただけ）
+                    if index and ai_result is not None:
+                        ai_result = {k: v for k, v in ai_result.items() if k != 'usage'}
+                    if self._store_result(raw_data, ai_result, error, key):
+                        processed_count += 1
+                    else:
+                        failed_count += 1
+            
+            logger.info(
+                f"Batch processing completed: {processed_count} processed "
+                f"({cache_hits} from cache, {call_count} AI calls), {failed_count} failed"
+                + (
+                    f", {self.integrated_count} integrated ({self.integrator.unchanged_count} unchanged)"
+                    if self.integrator is not None else ""
+                )
+            )
+            report = self.ai_processor.usage.report(products=len(misses))
+            logger.info(f"AI run report: {report}")
+            return report
             
         except Exception as e:
             logger.error(f"Batch processing error: {e}")
@@ -378,11 +843,16 @@ def main():
     parser = argparse.ArgumentParser(description='AI処理バッチ')
     parser.add_argument('--batch-size', type=int, default=5, help='バッチサイズ (default: 5)')
     parser.add_argument('--region', type=str, default='us-east-1', help='AWS region (default: us-east-1)')
+    parser.add_argument('--pack-size', type=int, default=None, help='1回の呼び出しにまとめる商品数 (default: 環境変数 AI_PACK_SIZE または 1)')
+    parser.add_argument('--fused', action='store_true',
+                        help='AI処理結果をその場で loan_products まで反映する (default: 環境変数 AI_FUSED_INTEGRATION)')
+    parser.add_argument('--backend', choices=BACKENDS, default=os.getenv('AI_BACKEND', 'bedrock'),
+                        help='AI処理の呼び出し先 (default: 環境変数 AI_BACKEND または bedrock。local はネットワーク不要のスタブ)')
     
     args = parser.parse_args()
     
-    # 環境変数チェック
-    required_env_vars = ['AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY']
+    # 環境変数チェック（ローカルスタブでは AWS 認証情報は不要）
+    required_env_vars = ['AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'] if args.backend == 'bedrock' else []
     missing_vars = [var for var in required_env_vars if not os.getenv(var)]
     
     if missing_vars:
@@ -390,7 +860,12 @@ def main():
         sys.exit(1)
     
     # バッチ処理実行
-    batch = AIProcessingBatch()
+    batch = AIProcessingBatch(
+        ai_client=create_ai_client(args.backend, region_name=args.region),
+        fused=True if args.fused else None,
+    )
+    if args.pack_size:
+        batch.pack_size = args.pack_size
     batch.run(batch_size=args.batch_size)
 
 if __name__ == '__main__':
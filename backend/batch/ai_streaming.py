@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# /ai_streaming.py
+# Bedrock のストリーミング応答を逐次パースし、スキーマ外の出力を早期に打ち切る
+# なぜ: 完了まで待ってから JSON を探すと、壊れた応答でも最大トークン分の費用と時間を払うため
+# 関連: ai_processing_batch.py, ai_executor.py
+"""
+AI要約のストリーミング呼び出し
+
+invoke_model_with_response_stream のテキスト差分を SummaryStreamParser に流し、
+トップレベルのセクション（product_analysis など）が閉じるたびに JSON として検証する。
+
+打ち切り条件（OffSchemaError）:
+  - JSON の開始前の前置きが長すぎる
+  - 想定外・重複したセクション名、オブジェクトでないセクション
+  - セクションが JSON として解析できない
+
+打ち切った場合は、検証済みのセクションまでを assistant の書き出し（prefill）として
+渡して続きから再生成させる。検証済みの部分は捨てないため、再試行で払うのは残りの分だけになる。
+
+環境変数:
+  - AI_STREAM_RETRY_MAX: 打ち切り後の再試行回数（既定 1）
+  - AI_STREAM_MAX_PREAMBLE: JSON 開始前に許す文字数（既定 300）
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# プロンプトで指定しているトップレベルのセクション
+EXPECTED_SECTIONS = (
+    'product_analysis',
+    'customer_guide',
+    'market_positioning',
+    'risk_assessment',
+    'financial_summary',
+    'actionable_insights',
+    'data_confidence',
+)
+
+JSON_FENCE = '```json\n'
+
+
+class OffSchemaError(ValueError):
+    """ストリーミング中の出力がスキーマから外れた"""
+
+    def __init__(self, reason: str, valid_prefix: str):
+        super().__init__(reason)
+        self.reason = reason
+        self.valid_prefix = valid_prefix
+
+
+class SummaryStreamParser:
+    """
+    要約 JSON の逐次パーサ
+
+    feed() で受け取ったテキストを1文字ずつ走査し、トップレベルの各セクションが
+    閉じた時点で json.loads して検証する。スキーマから外れたら OffSchemaError を送出する。
+    """
+
+    def __init__(self, sections: Iterable[str] = EXPECTED_SECTIONS, max_preamble: int = 300):
+        self.allowed = set(sections)
+        self.max_preamble = max_preamble
+        self.text = ''
+        self.sections: Dict[str, Any] = {}
+        self.done = False
+        self._pos = 0
+        self._json_start: Optional[int] = None
+        self._valid_end: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = 'key'
+        self._token_start = 0
+        self._key: Optional[str] = None
+
+    @property
+    def valid_prefix(self) -> str:
+        """検証済みのセクションまでの JSON テキスト（再試行の書き出しに使う）"""
+        if self._json_start is None:
+            return '{'
+        if self._valid_end is None:
+            return self.text[self._json_start:self._json_start + 1]
+        return self.text[self._json_start:self._valid_end]
+
+    @property
+    def unverified_chars(self) -> int:
+        """まだ検証できていない（打ち切れば捨てる）文字数"""
+        if self._json_start is None:
+            return len(self.text)
+        return len(self.text) - (self._valid_end or self._json_start + 1)
+
+    @property
+    def trailing_chars(self) -> int:
+        """JSON が閉じた後に受け取った文字数"""
+        return len(self.text) - self._pos if self.done else 0
+
+    @property
+    def missing_sections(self) -> List[str]:
+        return [s for s in EXPECTED_SECTIONS if s in self.allowed and s not in self.sections]
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        テキスト差分を追加
+
+        Returns:
+            List[str]: この差分で検証が完了したセクション名
+        """
+        self.text += chunk
+        completed: List[str] = []
+        if self._json_start is None:
+            start = self.text.find('{')
+            if start == -1:
+                if len(self.text) > self.max_preamble:
+                    self._fail('JSON の開始前の出力が長すぎます')
+                return completed
+            if start > self.max_preamble:
+                self._fail('JSON の開始前の出力が長すぎます')
+            self._json_start = start
+            self._pos = start + 1
+            self._depth = 1
+
+        text = self.text
+        while self._pos < len(text) and not self.done:
+            i = self._pos
+            ch = text[i]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._on_key(text[self._token_start:i + 1])
+                continue
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._expect != 'key':
+                        self._fail(f"セクション {self._key} の値がオブジェクトではありません")
+                    self._token_start = i
+                continue
+            if self._depth > 1:
+                if ch in '{[':
+                    self._depth += 1
+                elif ch in '}]':
+                    self._depth -= 1
+                    if self._depth == 1:
+                        completed.append(self._on_section(text[self._token_start:i + 1], i + 1))
+                continue
+            # トップレベル（depth 1）の区切り
+            if ch.isspace():
+                continue
+            if self._expect == 'colon' and ch == ':':
+                self._expect = 'value'
+            elif self._expect == 'value' and ch == '{':
+                self._token_start = i
+                self._depth = 2
+            elif self._expect == 'value':
+                self._fail(f"セクション {self._key} の値がオブジェクトではありません")
+            elif self._expect == 'comma' and ch == ',':
+                self._expect = 'key'
+            elif self._expect in ('comma', 'key') and ch == '}':
+                self._depth = 0
+                self.done = True
+            else:
+                self._fail(f"想定外の文字 {ch!r} があります")
+        return completed
+
+    def finish(self) -> None:
+        """応答の終わりで呼ぶ（JSON が閉じていなければ OffSchemaError）"""
+        if not self.done:
+            self._fail('応答が JSON の途中で終わりました')
+
+    def _on_key(self, token: str) -> None:
+        key = json.loads(token)
+        if key not in self.allowed:
+            self._fail(f"想定外のセクション {key} があります")
+        if key in self.sections:
+            self._fail(f"セクション {key} が重複しています")
+        self._key = key
+        self._expect = 'colon'
+
+    def _on_section(self, token: str, end: int) -> str:
+        try:
+            value = json.loads(token)
+        except json.JSONDecodeError as e:
+            self._fail(f"セクション {self._key} を JSON として解析できません: {e}")
+        self.sections[self._key] = value
+        self._valid_end = end
+        self._expect = 'comma'
+        return self._key
+
+    def _fail(self, reason: str) -> None:
+        raise OffSchemaError(reason, self.valid_prefix)
+
+
+def iter_text_deltas(response: Dict, usage: Dict[str, int]) -> Iterator[str]:
+    """
+    invoke_model_with_response_stream の応答からテキスト差分を取り出す
+
+    トークン数が届けば usage（input_tokens / output_tokens / cache_*_input_tokens）に書き込む。
+    ストリーム中の例外イベントは ClientError として送出する（スロットリングの判定用）。
+    """
+    for event in response['body']:
+        if 'chunk' not in event:
+            for name, detail in event.items():
+                code = name[:1].upper() + name[1:]
+                message = detail.get('message', '') if isinstance(detail, dict) else str(detail)
+                raise ClientError({'Error': {'Code': code, 'Message': message}}, 'InvokeModelWithResponseStream')
+            continue
+        payload = json.loads(event['chunk']['bytes'])
+        kind = payload.get('type')
+        if kind == 'message_start':
+            # input_tokens と、プロンプトキャッシュ利用時は cache_read / cache_creation_input_tokens
+            usage.update(payload.get('message', {}).get('usage', {}))
+        elif kind == 'message_delta':
+            usage['output_tokens'] = payload.get('usage', {}).get('output_tokens', 0)
+        elif kind == 'content_block_delta':
+            text = payload.get('delta', {}).get('text')
+            if text:
+                yield text
+
+
+def _close(response: Dict) -> None:
+    close = getattr(response.get('body'), 'close', None)
+    if close:
+        close()
+
+
+def stream_summary(
+    client,
+    model_id: str,
+    request_body: Dict,
+    retry_max: Optional[int] = None,
+    max_preamble: Optional[int] = None,
+    clock: Callable[[], float] = time.monotonic,
+) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+    """
+    要約をストリーミングで生成し、セクションごとに検証する
+
+    Args:
+        client: bedrock-runtime クライアント
+        model_id: モデルID
+        request_body: invoke_model と同じリクエストボディ
+        retry_max: 打ち切り後の再試行回数（既定: 環境変数 AI_STREAM_RETRY_MAX または 1）
+        max_preamble: JSON 開始前に許す文字数（既定: 環境変数 AI_STREAM_MAX_PREAMBLE または 300）
+
+    Returns:
+        Tuple[str, Dict, Dict]: (応答テキスト, セクション, 統計)
+        統計は attempts / aborts / input_tokens / output_tokens（届いた分）/ wasted_output_tokens /
+        first_section_seconds / total_seconds / missing_sections
+
+    Raises:
+        OffSchemaError: 再試行してもスキーマ外の出力になった場合
+    """
+    if retry_max is None:
+        retry_max = int(os.getenv('AI_STREAM_RETRY_MAX', '1'))
+    if max_preamble is None:
+        max_preamble = int(os.getenv('AI_STREAM_MAX_PREAMBLE', '300'))
+
+    started = clock()
+    stats: Dict[str, Any] = {
+        'attempts': 0,
+        'aborts': [],
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'cache_read_input_tokens': 0,
+        'cache_creation_input_tokens': 0,
+        'wasted_output_tokens': 0,
+        'first_section_seconds': None,
+    }
+    prefill = ''
+
+    while True:
+        stats['attempts'] += 1
+        body = dict(request_body)
+        if prefill:
+            # 検証済みの部分を assistant の書き出しとして渡し、続きから生成させる
+            body['messages'] = list(request_body['messages']) + [{'role': 'assistant', 'content': prefill}]
+        parser = SummaryStreamParser(max_preamble=max_preamble)
+        if prefill:
+            parser.feed(prefill)
+        usage: Dict[str, int] = {}
+        response = client.invoke_model_with_response_stream(modelId=model_id, body=json.dumps(body))
+        try:
+            for delta in iter_text_deltas(response, usage):
+                if parser.feed(delta) and stats['first_section_seconds'] is None:
+                    stats['first_section_seconds'] = clock() - started
+                if parser.done and parser.trailing_chars > max_preamble:
+                    # 閉じの ``` と使用トークン数までは読むが、JSON の後の長い出力は読まない
+                    break
+            parser.finish()
+        except OffSchemaError as e:
+            stats['aborts'].append(e.reason)
+            # 打ち切った時点ではトークン数が届かないため、日本語2文字で1トークンとして見積もる
+            stats['wasted_output_tokens'] += parser.unverified_chars // 2
+            logger.warning(f"AI stream aborted (attempt {stats['attempts']}): {e.reason}")
+            if stats['attempts'] > retry_max:
+                raise
+            prefill = JSON_FENCE + e.valid_prefix + (',' if e.valid_prefix != '{' else '')
+            continue
+        finally:
+            _close(response)
+            for name in ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'):
+                stats[name] += usage.get(name) or 0
+
+        stats['total_seconds'] = clock() - started
+        stats['missing_sections'] = parser.missing_sections
+        return parser.text, parser.sections, stats
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# /ai_usage.py
+# AI呼び出しのトークン数・所要時間・再試行の集計と、プロンプトサイズの見積もり
+# なぜ: 要約1件あたりの費用と待ち時間を把握し、プロンプトの削減をデータで判断するため
+# 関連: ai_processing_batch.py, ai_streaming.py, loanpedia_scraper/database/migrations/006_ai_usage.sql
+"""
+AI呼び出しの計測
+
+- UsageMetrics: 呼び出しごとのトークン数（usage）・所要時間・再試行回数・モデルを記録し、
+  実行単位のレポート（p50/p95 所要時間、商品あたりトークン数など）にまとめる
+- estimate_prompt_size: structured_data のプロンプト上のサイズを送信前に見積もり、
+  大きいフィールドを示す（しきい値超えはレポートの oversized_prompts に集計）
+
+呼び出しごとの値は processed_loan_data の input_tokens / output_tokens /
+cache_read_input_tokens / latency_ms / ai_retries に保存する。
+
+環境変数:
+  - AI_PROMPT_WARN_TOKENS: structured_data の見積もりトークン数の警告しきい値（既定 2000）
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens')
+
+
+def estimate_text_tokens(text: str) -> int:
+    """テキストのトークン数の見積もり（日本語が中心のため、おおよそ2文字で1トークン）"""
+    return len(text) // 2
+
+
+def estimate_prompt_size(structured_data: Dict, top: int = 3) -> Dict[str, Any]:
+    """
+    structured_data がプロンプトで占めるトークン数を見積もる
+
+    Returns:
+        Dict: structured_tokens（全体）と largest_fields（(フィールド名, トークン数) の大きい順 top 件）
+    """
+    def size(value) -> int:
+        return estimate_text_tokens(json.dumps(value, ensure_ascii=False, indent=2, default=str))
+
+    fields = {key: size(value) for key, value in (structured_data or {}).items()}
+    largest = sorted(fields.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {'structured_tokens': size(structured_data or {}), 'largest_fields': largest}
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    """最近傍順位法によるパーセンタイル（値がなければ None）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class UsageMetrics:
+    """AI呼び出しの計測（並列実行のスレッドから呼ばれる）"""
+
+    FIELDS = USAGE_FIELDS
+
+    def __init__(self, prompt_warn_tokens: Optional[int] = None):
+        self.prompt_warn_tokens = prompt_warn_tokens or int(os.getenv('AI_PROMPT_WARN_TOKENS', '2000'))
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cache_hits = 0
+        self.totals = {name: 0 for name in self.FIELDS}
+        self.latencies_ms: List[int] = []
+        self.retries = 0
+        self.oversized_prompts = 0
+        self.oversized_fields: Counter = Counter()
+        self._attempts: Counter = Counter()
+
+    def note_attempt(self, key: Hashable) -> None:
+        """呼び出しの試行を数える（スロットリングで再試行されると同じ key で複数回呼ばれる）"""
+        with self._lock:
+            self._attempts[key] += 1
+
+    def pop_retries(self, key: Hashable) -> int:
+        """key の再試行回数を返して試行の記録を消す"""
+        with self._lock:
+            return max(self._attempts.pop(key, 1) - 1, 0)
+
+    def record(
+        self,
+        usage: Optional[Dict],
+        latency_ms: Optional[int] = None,
+        retries: int = 0,
+        model_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        1回の呼び出しを記録
+
+        Returns:
+            Dict: この呼び出しのトークン数・latency_ms・retries・model_id（processed_loan_data に保存する）
+        """
+        call: Dict[str, Any] = {name: int((usage or {}).get(name) or 0) for name in self.FIELDS}
+        with self._lock:
+            self.calls += 1
+            if call['cache_read_input_tokens']:
+                self.cache_hits += 1
+            for name in self.FIELDS:
+                self.totals[name] += call[name]
+            if latency_ms is not None:
+                self.latencies_ms.append(latency_ms)
+            self.retries += retries
+        call.update(latency_ms=latency_ms, retries=retries, model_id=model_id)
+        return call
+
+    def check_prompt(self, raw_data_id: int, structured_data: Dict) -> Optional[Dict[str, Any]]:
+        """
+        送信前に structured_data のサイズを確認し、しきい値を超えていれば警告して集計
+
+        Returns:
+            Optional[Dict]: しきい値を超えた場合は estimate_prompt_size の結果、それ以外は None
+        """
+        estimate = estimate_prompt_size(structured_data)
+        if estimate['structured_tokens'] <= self.prompt_warn_tokens:
+            return None
+        fields = ', '.join(f"{name}={tokens}" for name, tokens in estimate['largest_fields'])
+        logger.warning(
+            f"Oversized structured_data for raw_data_id {raw_data_id}: "
+            f"~{estimate['structured_tokens']} tokens (largest: {fields})"
+        )
+        with self._lock:
+            self.oversized_prompts += 1
+            self.oversized_fields.update(name for name, _ in estimate['largest_fields'])
+        return estimate
+
+    def summary(self) -> Dict[str, int]:
+        """呼び出し回数・キャッシュヒット数・トークン数の合計"""
+        with self._lock:
+            return {'calls': self.calls, 'cache_hits': self.cache_hits, **self.totals}
+
+    def report(self, products: int) -> Dict[str, Any]:
+        """
+        実行単位のレポート
+
+        Args:
+            products: AIで要約した商品数（キャッシュ流用を除く）
+        """
+        summary = self.summary()
+        with self._lock:
+            latencies = list(self.latencies_ms)
+            retries = self.retries
+            oversized = self.oversized_prompts
+            top_fields = self.oversized_fields.most_common(5)
+        tokens = summary['input_tokens'] + summary['output_tokens'] + summary['cache_read_input_tokens']
+        return {
+            **summary,
+            'products': products,
+            'retries': retries,
+            'latency_p50_ms': percentile(latencies, 50),
+            'latency_p95_ms': percentile(latencies, 95),
+            'tokens_per_product': round(tokens / products, 1) if products else None,
+            'output_tokens_per_product': round(summary['output_tokens'] / products, 1) if products else None,
+            'oversized_prompts': oversized,
+            'oversized_fields': top_fields,
+        }
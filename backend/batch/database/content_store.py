@@ -0,0 +1,245 @@
+"""
+圧縮・重複排除された本文（HTML / 抽出テキスト）の保存と読み出し
+
+raw_loan_data に HTML や抽出テキストを非圧縮で毎回保存すると、同一内容でも
+行ごとに LONGTEXT が積み上がり、テーブルサイズとバッファプールを圧迫する。
+本文は content_blobs に SHA-256 をキーとして zlib 圧縮で1回だけ保存し、
+raw_loan_data からはハッシュで参照する。
+
+退避モード（object_store.get_object_store() が設定されている場合）では、圧縮済みの
+本文をオブジェクトストアに置き、content_blobs には storage_uri のみを記録する。
+
+読み出し側（AIProcessingBatch・確認スクリプト）は read_content / fetch_contents を
+使えば、圧縮形式・退避先・旧来のインライン列（html_content / extracted_text）を
+意識せずに本文を取得できる。
+"""
+
+import hashlib
+import logging
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    from .object_store import ObjectStore, blob_key, read_object
+except ImportError:
+    # Lambda環境では相対インポートが失敗するため、直接インポートを使用
+    from object_store import ObjectStore, blob_key, read_object
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_NONE = 'none'
+COMPRESSION_ZLIB = 'zlib'
+# MySQL の COMPRESS() 形式（先頭4バイトが元サイズ、残りが zlib）。移行時のバックフィルで使用
+COMPRESSION_MYSQL = 'mysql'
+
+# これより小さい本文は圧縮しても効果が薄いため非圧縮で保存
+COMPRESS_MIN_BYTES = 256
+ZLIB_LEVEL = 6
+
+# 同一ハッシュは内容も同一なので、既存行は更新しない
+CONTENT_BLOB_UPSERT_SQL = """
+    INSERT INTO content_blobs (
+        content_hash, compression, original_length, compressed_length, data, storage_uri, created_at
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE content_hash = content_hash
+"""
+
+# 本文（HTML・抽出テキストは str、元PDFは bytes）
+Body = Union[str, bytes]
+
+
+def _to_bytes(body: Optional[Body]) -> bytes:
+    if body is None:
+        return b''
+    return body if isinstance(body, bytes) else body.encode('utf-8')
+
+
+def content_hash(body: Optional[Body]) -> str:
+    """本文の SHA-256（content_blobs のキー）"""
+    return hashlib.sha256(_to_bytes(body)).hexdigest()
+
+
+def compress_content(body: Body) -> Tuple[str, bytes]:
+    """
+    本文を圧縮
+
+    Returns:
+        Tuple[str, bytes]: (圧縮方式, データ)。圧縮で小さくならない場合は非圧縮
+    """
+    raw = _to_bytes(body)
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return COMPRESSION_NONE, raw
+    compressed = zlib.compress(raw, ZLIB_LEVEL)
+    if len(compressed) >= len(raw):
+        return COMPRESSION_NONE, raw
+    return COMPRESSION_ZLIB, compressed
+
+
+def decompress_bytes(compression: Optional[str], data: Optional[bytes]) -> bytes:
+    """content_blobs.data（または退避先のオブジェクト）をバイト列に復元"""
+    if data is None:
+        return b''
+    data = bytes(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    if compression == COMPRESSION_MYSQL:
+        return zlib.decompress(data[4:]) if len(data) > 4 else b''
+    if compression not in (None, COMPRESSION_NONE):
+        raise ValueError(f"Unknown compression: {compression}")
+    return data
+
+
+def decompress_content(compression: Optional[str], data: Optional[bytes]) -> str:
+    """content_blobs.data を文字列に復元"""
+    return decompress_bytes(compression, data).decode('utf-8')
+
+
+def build_blob_row(body: Body, now: datetime, store: Optional[ObjectStore] = None) -> Tuple:
+    """
+    CONTENT_BLOB_UPSERT_SQL のパラメータを構築
+
+    store 指定時は圧縮済みデータをオブジェクトストアへ書き込み、行には
+    storage_uri のみを残す（data は NULL）。
+    """
+    h = content_hash(body)
+    compression, data = compress_content(body)
+    storage_uri = None
+    if store is not None:
+        key = blob_key(h, '.zlib' if compression == COMPRESSION_ZLIB else '')
+        # 同一ハッシュは内容も同一なので、既にあれば再送しない
+        storage_uri = store.uri_for(key) if store.exists(key) else store.put(key, data)
+    return (
+        h,
+        compression,
+        len(_to_bytes(body)),
+        len(data),
+        None if storage_uri else data,
+        storage_uri,
+        now,
+    )
+
+
+def build_blob_rows(
+    bodies: Iterable[Optional[Body]], now: datetime, store: Optional[ObjectStore] = None
+) -> List[Tuple]:
+    """空でない本文をハッシュで重複排除してパラメータ化"""
+    rows: Dict[str, Tuple] = {}
+    for body in bodies:
+        if not body:
+            continue
+        h = content_hash(body)
+        if h not in rows:
+            rows[h] = build_blob_row(body, now, store)
+    return list(rows.values())
+
+
+def blob_hash_or_none(body: Optional[Body]) -> Optional[str]:
+    """raw_loan_data の *_blob_hash 列に入れる値（空の本文は参照しない）"""
+    return content_hash(body) if body else None
+
+
+def store_blobs(
+    cursor,
+    bodies: Iterable[Optional[Body]],
+    now: Optional[datetime] = None,
+    store: Optional[ObjectStore] = None,
+) -> int:
+    """
+    本文を content_blobs に保存（コミットは呼び出し側）
+
+    pymysql の executemany により複数行INSERT 1回で送信する。
+
+    Args:
+        cursor: DBカーソル
+        bodies: 本文（None・空は無視）
+        now: 作成日時
+        store: 退避先（None なら data 列に保存）
+
+    Returns:
+        int: 送信した（重複排除後の）本文数
+    """
+    rows = build_blob_rows(bodies, now or datetime.now(), store)
+    if rows:
+        cursor.executemany(CONTENT_BLOB_UPSERT_SQL, rows)
+    return len(rows)
+
+
+def read_bytes(
+    compression: Optional[str], data: Optional[bytes], storage_uri: Optional[str] = None
+) -> Optional[bytes]:
+    """content_blobs の1行を復元（data も storage_uri もなければ None）"""
+    if data is None and storage_uri:
+        data = read_object(storage_uri)
+    if data is None:
+        return None
+    return decompress_bytes(compression, data)
+
+
+def read_content(
+    inline: Optional[str],
+    compression: Optional[str] = None,
+    data: Optional[bytes] = None,
+    storage_uri: Optional[str] = None,
+) -> str:
+    """
+    本文を透過的に取得
+
+    content_blobs を LEFT JOIN した結果（compression, data, storage_uri）があれば
+    それを復元し、なければ旧来のインライン列の値を返す。
+    """
+    raw = read_bytes(compression, data, storage_uri)
+    if raw is not None:
+        return raw.decode('utf-8')
+    return inline or ''
+
+
+def fetch_contents(cursor, hashes: Iterable[Optional[str]], as_bytes: bool = False) -> Dict[str, Body]:
+    """
+    ハッシュ → 本文 を1回の IN クエリで取得
+
+    Args:
+        cursor: DictCursor
+        hashes: content_blobs.content_hash（None は無視）
+        as_bytes: True ならデコードせずにバイト列で返す（元PDFなど）
+
+    Returns:
+        Dict[str, Body]: 見つかった本文
+    """
+    unique = list(dict.fromkeys(h for h in hashes if h))
+    if not unique:
+        return {}
+    placeholders = ', '.join(['%s'] * len(unique))
+    cursor.execute(
+        "SELECT content_hash, compression, data, storage_uri FROM content_blobs "
+        f"WHERE content_hash IN ({placeholders})",
+        tuple(unique),
+    )
+    found: Dict[str, Body] = {}
+    for row in cursor.fetchall():
+        raw = read_bytes(row['compression'], row['data'], row.get('storage_uri')) or b''
+        found[row['content_hash']] = raw if as_bytes else raw.decode('utf-8')
+    return found
+
+
+def storage_stats(cursor) -> Dict[str, Any]:
+    """content_blobs の件数・元サイズ・圧縮後サイズ・退避件数"""
+    cursor.execute(
+        """
+        SELECT COUNT(*) AS blobs,
+               COALESCE(SUM(original_length), 0) AS original_bytes,
+               COALESCE(SUM(compressed_length), 0) AS stored_bytes,
+               COALESCE(SUM(storage_uri IS NOT NULL), 0) AS offloaded
+        FROM content_blobs
+        """
+    )
+    row = cursor.fetchone() or {}
+    original = int(row.get('original_bytes') or 0)
+    stored = int(row.get('stored_bytes') or 0)
+    return {
+        'blobs': int(row.get('blobs') or 0),
+        'offloaded': int(row.get('offloaded') or 0),
+        'original_bytes': original,
+        'stored_bytes': stored,
+        'compression_ratio': round(original / stored, 2) if stored else None,
+    }
@@ -0,0 +1,88 @@
+"""
+金融機関IDのプロセス内キャッシュ
+
+financial_institutions の内容は実行中に変わらないため、商品保存のたびに
+SELECT（必要なら INSERT）を発行する必要はない。初回に全件を1クエリで読み込み、
+以降はメモリ上で code / name → id を解決する。キャッシュはモジュール変数に
+保持するため、Lambda のウォームコンテナでは呼び出しをまたいで再利用される。
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (id, institution_code, institution_name)
+InstitutionRow = Tuple[int, Optional[str], Optional[str]]
+
+
+class InstitutionCache:
+    """institution_code / institution_name → id のキャッシュ"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_code: Dict[str, int] = {}
+        self._by_name: Dict[str, int] = {}
+        self.loaded = False
+
+    def put(self, institution_id: int, institution_code: Optional[str], institution_name: Optional[str]) -> None:
+        """IDを登録（空のキーは登録しない）"""
+        if institution_id is None:
+            return
+        with self._lock:
+            if institution_code:
+                self._by_code[institution_code] = institution_id
+            if institution_name:
+                self._by_name[institution_name] = institution_id
+
+    def get(self, institution_code: Optional[str], institution_name: Optional[str]) -> Optional[int]:
+        """コード優先でIDを検索（元の SELECT ... WHERE code = %s OR name = %s に相当）"""
+        with self._lock:
+            if institution_code and institution_code in self._by_code:
+                return self._by_code[institution_code]
+            if institution_name and institution_name in self._by_name:
+                return self._by_name[institution_name]
+        return None
+
+    def ensure_loaded(self, loader: Callable[[], Iterable[InstitutionRow]]) -> None:
+        """
+        未読み込みなら loader で全件を取り込む
+
+        Args:
+            loader: (id, code, name) の行を返す関数（1クエリで全件取得する想定）
+        """
+        if self.loaded:
+            return
+        rows = list(loader())
+        for institution_id, code, name in rows:
+            self.put(institution_id, code, name)
+        self.loaded = True
+        logger.info(f"Institution cache preloaded: {len(rows)} institutions")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_code.clear()
+            self._by_name.clear()
+            self.loaded = False
+
+
+_caches: Dict[Hashable, InstitutionCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_institution_cache(key: Hashable) -> InstitutionCache:
+    """接続先（DB）ごとのプロセス共通キャッシュを返す"""
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = InstitutionCache()
+            _caches[key] = cache
+        return cache
+
+
+def clear_institution_caches() -> None:
+    """すべてのキャッシュを破棄（テスト・マスター更新時用）"""
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.clear()
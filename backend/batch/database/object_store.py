@@ -0,0 +1,234 @@
+"""
+本文（HTML / 抽出テキスト / 元PDF）のオブジェクトストア退避
+
+大きな本文を MySQL に持つと行サイズが膨らみ、Data API ではペイロード上限にも
+かかる。退避モードでは本文をオブジェクトストアに書き込み、content_blobs には
+ハッシュと storage_uri（ポインタ）のみを残す。
+
+- S3ObjectStore: 本番用（boto3 の S3 クライアント）
+- LocalObjectStore: テスト・ローカル開発用のファイルシステム実装
+
+環境変数:
+  - RAW_BODY_STORE: s3 / local（未設定なら退避しない）
+  - RAW_BODY_BUCKET, RAW_BODY_PREFIX: S3 の格納先
+  - RAW_BODY_LOCAL_DIR: ローカル実装の格納ディレクトリ
+"""
+
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# boto3は実行時に利用可能
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+
+class ObjectStore(ABC):
+    """オブジェクトストアの共通インターフェース"""
+
+    scheme = ''
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: str = 'application/octet-stream') -> str:
+        """
+        オブジェクトを保存
+
+        Returns:
+            str: 保存先URI（content_blobs.storage_uri に記録する）
+        """
+
+    @abstractmethod
+    def get(self, uri: str) -> bytes:
+        """URI からオブジェクトを取得"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """キーが既に存在するか（同一ハッシュの再送を避けるため）"""
+
+    @abstractmethod
+    def uri_for(self, key: str) -> str:
+        """キーに対応する保存先URI"""
+
+    @abstractmethod
+    def list_keys(self, prefix: str = '') -> List[str]:
+        """プレフィックス配下のキーを昇順で列挙"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """オブジェクトを削除（存在しなければ何もしない）"""
+
+
+class S3ObjectStore(ObjectStore):
+    """S3 実装"""
+
+    scheme = 's3'
+
+    def __init__(self, bucket: str, prefix: str = '', client=None):
+        if client is None:
+            if boto3 is None:
+                raise ImportError("boto3 is required for S3ObjectStore")
+            client = boto3.client('s3')
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.client = client
+
+    def _full_key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def uri_for(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._full_key(key)}"
+
+    def put(self, key: str, data: bytes, content_type: str = 'application/octet-stream') -> str:
+        self.client.put_object(
+            Bucket=self.bucket, Key=self._full_key(key), Body=data, ContentType=content_type
+        )
+        return self.uri_for(key)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._full_key(key))
+            return True
+        except Exception:
+            return False
+
+    def get(self, uri: str) -> bytes:
+        bucket, key = parse_uri(uri)[1].split('/', 1)
+        return self.client.get_object(Bucket=bucket, Key=key)['Body'].read()
+
+    def list_keys(self, prefix: str = '') -> List[str]:
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._full_key(prefix)):
+            for obj in page.get('Contents', []):
+                keys.append(obj['Key'][len(self.prefix) + 1:] if self.prefix else obj['Key'])
+        return sorted(keys)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._full_key(key))
+
+
+class LocalObjectStore(ObjectStore):
+    """ローカルファイルシステム実装（テスト・ローカル開発用）"""
+
+    scheme = 'file'
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def uri_for(self, key: str) -> str:
+        return f"file://{self._path(key).resolve()}"
+
+    def put(self, key: str, data: bytes, content_type: str = 'application/octet-stream') -> str:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 書き込み途中のファイルを読まれないよう一時ファイル経由で置き換える
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return self.uri_for(key)
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def get(self, uri: str) -> bytes:
+        return Path(parse_uri(uri)[1]).read_bytes()
+
+    def list_keys(self, prefix: str = '') -> List[str]:
+        base = self._path(prefix)
+        if not base.exists():
+            return []
+        # 書き込み途中の一時ファイル（先頭が "."）は除く
+        return sorted(
+            p.relative_to(self.root).as_posix()
+            for p in base.rglob('*')
+            if p.is_file() and not p.name.startswith('.')
+        )
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+
+def parse_uri(uri: str) -> Tuple[str, str]:
+    """'s3://bucket/key' → ('s3', 'bucket/key')"""
+    scheme, sep, rest = uri.partition('://')
+    if not sep:
+        raise ValueError(f"Invalid storage uri: {uri}")
+    return scheme, rest
+
+
+def blob_key(content_hash: str, suffix: str = '') -> str:
+    """ハッシュから格納キーを生成（先頭2文字でディレクトリを分散）"""
+    return f"blobs/{content_hash[:2]}/{content_hash}{suffix}"
+
+
+_store_lock = threading.Lock()
+_configured_store: Optional[ObjectStore] = None
+_configured = False
+_readers: Dict[str, ObjectStore] = {}
+
+
+def get_object_store() -> Optional[ObjectStore]:
+    """環境変数に従った退避先（退避しない設定なら None）をプロセス内で共有"""
+    global _configured_store, _configured
+    with _store_lock:
+        if not _configured:
+            mode = os.getenv('RAW_BODY_STORE', '').lower()
+            if mode == 's3':
+                bucket = os.getenv('RAW_BODY_BUCKET')
+                if not bucket:
+                    raise ValueError("RAW_BODY_BUCKET is required when RAW_BODY_STORE=s3")
+                _configured_store = S3ObjectStore(bucket, os.getenv('RAW_BODY_PREFIX', 'raw-bodies'))
+            elif mode == 'local':
+                _configured_store = LocalObjectStore(os.getenv('RAW_BODY_LOCAL_DIR', './raw_bodies'))
+            elif mode:
+                raise ValueError(f"Unknown RAW_BODY_STORE: {mode}")
+            if _configured_store:
+                logger.info(f"Raw body offload enabled: {type(_configured_store).__name__}")
+            _configured = True
+        return _configured_store
+
+
+def set_object_store(store: Optional[ObjectStore]) -> None:
+    """退避先を明示的に設定（テスト用。None で退避しない）"""
+    global _configured_store, _configured
+    with _store_lock:
+        _configured_store = store
+        _configured = True
+        _readers.clear()
+        if store is not None:
+            _readers[store.scheme] = store
+
+
+def reset_object_store() -> None:
+    """設定を破棄し、次回は環境変数から再構成する"""
+    global _configured_store, _configured
+    with _store_lock:
+        _configured_store = None
+        _configured = False
+        _readers.clear()
+
+
+def read_object(uri: str) -> bytes:
+    """storage_uri からオブジェクトを取得（退避設定の有無に関わらず読める）"""
+    scheme, _ = parse_uri(uri)
+    with _store_lock:
+        store = _readers.get(scheme)
+        if store is None:
+            if scheme == 's3':
+                store = S3ObjectStore(bucket='')
+            elif scheme == 'file':
+                store = LocalObjectStore('/')
+            else:
+                raise ValueError(f"Unsupported storage scheme: {scheme}")
+            _readers[scheme] = store
+    return store.get(uri)
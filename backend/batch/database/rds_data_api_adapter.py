@@ -0,0 +1,686 @@
+"""
+RDS Data API アダプター - シンプル実装
+
+Aurora Serverless v2 の Data API を使用したデータベースアクセス
+boto3のrds-dataクライアントを使用してHTTPベースでクエリ実行
+
+- 書き込みは batch_execute_statement をトランザクション内で実行し、
+  パラメータセット数・ペイロードサイズの上限に合わせて自動分割する
+- 読み込みは formatRecordsAs=JSON と列メタデータで Python の型に変換する
+"""
+import base64
+import json
+import logging
+import os
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from . import content_store
+    from .institution_cache import get_institution_cache
+    from .loan_database import compute_content_hash
+    from .object_store import get_object_store
+except ImportError:
+    # Lambda環境では相対インポートが失敗するため、直接インポートを使用
+    import content_store
+    from institution_cache import get_institution_cache
+    from loan_database import compute_content_hash
+    from object_store import get_object_store
+
+# boto3は実行時に利用可能
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+    ClientError = Exception
+    logger.warning("boto3 not available")
+
+
+# batch_execute_statement 1回あたりのパラメータセット数の上限
+DATA_API_MAX_PARAMETER_SETS = 1000
+# Data API のリクエストは最大 4 MiB。JSON化・Base64化のオーバーヘッドを見込んで余裕を持たせる
+DATA_API_MAX_PAYLOAD_BYTES = 3 * 1024 * 1024
+
+CONTENT_BLOB_UPSERT_SQL = """
+    INSERT INTO content_blobs (
+        content_hash, compression, original_length, compressed_length, data, storage_uri
+    ) VALUES (
+        :content_hash, :compression, :original_length, :compressed_length, :data, :storage_uri
+    )
+    ON DUPLICATE KEY UPDATE content_hash = content_hash
+"""
+
+# content_hash の一意キーで冪等に保存する UPSERT（LoanDatabase と同じ列構成）
+RAW_LOAN_DATA_UPSERT_SQL = """
+    INSERT INTO raw_loan_data (
+        institution_id,
+        source_url,
+        page_title,
+        structured_data,
+        content_hash,
+        html_blob_hash,
+        text_blob_hash,
+        source_blob_hash,
+        content_length,
+        scraped_at
+    ) VALUES (
+        :institution_id,
+        :source_url,
+        :page_title,
+        :structured_data,
+        :content_hash,
+        :html_blob_hash,
+        :text_blob_hash,
+        :source_blob_hash,
+        :content_length,
+        NOW()
+    )
+    ON DUPLICATE KEY UPDATE
+        id = LAST_INSERT_ID(id),
+        structured_data = VALUES(structured_data),
+        text_blob_hash = VALUES(text_blob_hash),
+        source_blob_hash = COALESCE(VALUES(source_blob_hash), source_blob_hash),
+        updated_at = NOW()
+"""
+
+
+def to_field(value: Any) -> Dict[str, Any]:
+    """Python の値を Data API の Field 形式に変換"""
+    if value is None:
+        return {"isNull": True}
+    if isinstance(value, bool):
+        return {"booleanValue": value}
+    if isinstance(value, int):
+        return {"longValue": value}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (bytes, bytearray)):
+        return {"blobValue": bytes(value)}
+    if isinstance(value, (dict, list)):
+        return {"stringValue": json.dumps(value, ensure_ascii=False)}
+    return {"stringValue": str(value)}
+
+
+def _type_hint(value: Any) -> Optional[str]:
+    if isinstance(value, Decimal):
+        return "DECIMAL"
+    if isinstance(value, datetime):
+        return "TIMESTAMP"
+    if isinstance(value, date):
+        return "DATE"
+    if isinstance(value, (dict, list)):
+        return "JSON"
+    return None
+
+
+def to_parameters(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    名前付きパラメータの辞書を Data API の SqlParameter のリストに変換
+
+    Decimal / datetime / date / dict・list には typeHint を付与する。
+    """
+    params = []
+    for name, value in values.items():
+        if isinstance(value, datetime):
+            field = {"stringValue": value.strftime("%Y-%m-%d %H:%M:%S.%f")}
+        elif isinstance(value, date):
+            field = {"stringValue": value.isoformat()}
+        else:
+            field = to_field(value)
+        param = {"name": name, "value": field}
+        hint = _type_hint(value)
+        if hint:
+            param["typeHint"] = hint
+        params.append(param)
+    return params
+
+
+def from_field(field: Dict[str, Any]) -> Any:
+    """Data API の Field（formatRecordsAs 未指定時のレコード）を Python の値に変換"""
+    if field.get("isNull"):
+        return None
+    for key in ("longValue", "doubleValue", "booleanValue", "stringValue", "blobValue"):
+        if key in field:
+            return field[key]
+    if "arrayValue" in field:
+        return field["arrayValue"]
+    return None
+
+
+def _convert_json_value(value: Any, type_name: str) -> Any:
+    """formatRecordsAs=JSON の値を列の型名に従って変換"""
+    if value is None:
+        return None
+    type_name = (type_name or "").upper()
+    try:
+        if type_name in ("DATETIME", "TIMESTAMP"):
+            return datetime.fromisoformat(str(value))
+        if type_name == "DATE":
+            return date.fromisoformat(str(value))
+        if type_name in ("DECIMAL", "NUMERIC"):
+            return Decimal(str(value))
+        if type_name == "JSON" and isinstance(value, str):
+            return json.loads(value)
+        if type_name in ("BLOB", "LONGBLOB", "MEDIUMBLOB", "TINYBLOB", "VARBINARY", "BINARY") and isinstance(value, str):
+            return base64.b64decode(value)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Failed to convert Data API value as {type_name}: {e}")
+    return value
+
+
+def map_json_records(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    formatRecordsAs=JSON の応答を列名→値の辞書のリストに変換
+
+    includeResultMetadata=True で得た columnMetadata の型名で日時・DECIMAL・JSON・
+    BLOB を Python の型に変換する。
+    """
+    rows = json.loads(response.get("formattedRecords") or "[]")
+    types = {
+        (col.get("label") or col.get("name")): col.get("typeName", "")
+        for col in response.get("columnMetadata", [])
+    }
+    if not types:
+        return rows
+    return [
+        {key: _convert_json_value(value, types.get(key, "")) for key, value in row.items()}
+        for row in rows
+    ]
+
+
+def _estimate_field_size(field: Dict[str, Any]) -> int:
+    if "blobValue" in field:
+        # 送信時に Base64 化される
+        return (len(field["blobValue"]) + 2) // 3 * 4
+    if "stringValue" in field:
+        return len(field["stringValue"].encode("utf-8"))
+    return 16
+
+
+def estimate_parameter_set_size(parameters: List[Dict[str, Any]]) -> int:
+    """パラメータセットの送信サイズの概算（バイト）"""
+    return sum(len(p["name"]) + 32 + _estimate_field_size(p["value"]) for p in parameters)
+
+
+def chunk_parameter_sets(
+    parameter_sets: List[List[Dict[str, Any]]],
+    max_sets: int = DATA_API_MAX_PARAMETER_SETS,
+    max_bytes: int = DATA_API_MAX_PAYLOAD_BYTES,
+    base_size: int = 0,
+) -> Iterator[List[List[Dict[str, Any]]]]:
+    """
+    パラメータセットを件数とペイロードサイズの上限に収まるように分割
+
+    1セットだけで上限を超える場合はそのセット単独で送る（API側でエラーになれば
+    呼び出し元のトランザクションがロールバックされる）。
+    """
+    chunk: List[List[Dict[str, Any]]] = []
+    size = base_size
+    for params in parameter_sets:
+        params_size = estimate_parameter_set_size(params)
+        if chunk and (len(chunk) >= max_sets or size + params_size > max_bytes):
+            yield chunk
+            chunk, size = [], base_size
+        chunk.append(params)
+        size += params_size
+    if chunk:
+        yield chunk
+
+
+class RDSDataAPIAdapter:
+    """RDS Data API を使用したシンプルなデータベースアダプター"""
+
+    def __init__(
+        self,
+        client=None,
+        db_arn: Optional[str] = None,
+        secret_arn: Optional[str] = None,
+        database: Optional[str] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            client: rds-data クライアント（テスト用のスタブを渡せる。省略時は boto3 で生成）
+            db_arn: クラスターARN（省略時は環境変数 DB_ARN）
+            secret_arn: シークレットARN（省略時は環境変数 DB_SECRET_ARN）
+            database: データベース名（省略時は環境変数 DB_NAME）
+        """
+        if client is None and not BOTO3_AVAILABLE:
+            raise ImportError("boto3 is required for RDS Data API")
+
+        self.db_arn = db_arn or os.getenv("DB_ARN")
+        self.secret_arn = secret_arn or os.getenv("DB_SECRET_ARN")
+        self.database = database or os.getenv("DB_NAME", "loanpedia")
+        self.region = os.getenv("AWS_REGION", "ap-northeast-1")
+
+        if not self.db_arn or not self.secret_arn:
+            raise ValueError(
+                "DB_ARN and DB_SECRET_ARN environment variables are required"
+            )
+
+        self.client = client or boto3.client("rds-data", region_name=self.region)
+        logger.info(
+            f"RDS Data API adapter initialized (database={self.database}, region={self.region})"
+        )
+
+    def connect(self) -> bool:
+        """接続確認（Data APIでは常に利用可能）"""
+        return True
+
+    def disconnect(self) -> None:
+        """切断（Data APIでは不要）"""
+        pass
+
+    def __enter__(self):
+        """コンテキストマネージャー開始"""
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """コンテキストマネージャー終了"""
+        self.disconnect()
+
+    def _base_request(self) -> Dict[str, Any]:
+        return {
+            "resourceArn": self.db_arn,
+            "secretArn": self.secret_arn,
+            "database": self.database,
+        }
+
+    def execute_statement(
+        self,
+        sql: str,
+        parameters: Optional[list] = None,
+        transaction_id: Optional[str] = None,
+        format_records_as_json: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        SQL文を実行
+
+        Args:
+            sql: 実行するSQL文
+            parameters: パラメータ（RDS Data API形式）
+            transaction_id: begin_transaction で得たID（トランザクション内で実行する場合）
+            format_records_as_json: True なら formatRecordsAs=JSON と列メタデータを要求
+
+        Returns:
+            実行結果
+        """
+        try:
+            params = {**self._base_request(), "sql": sql}
+
+            if parameters:
+                params["parameters"] = parameters
+            if transaction_id:
+                params["transactionId"] = transaction_id
+            if format_records_as_json:
+                params["formatRecordsAs"] = "JSON"
+                params["includeResultMetadata"] = True
+
+            response = self.client.execute_statement(**params)
+            return response
+
+        except ClientError as e:
+            logger.error(f"Failed to execute statement: {e}")
+            raise
+
+    def query(
+        self,
+        sql: str,
+        values: Optional[Dict[str, Any]] = None,
+        transaction_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        SELECT を実行し、列名→値（Python の型）の辞書のリストを返す
+
+        Args:
+            sql: 名前付きパラメータ（:name）を含むSQL
+            values: パラメータ名→値
+            transaction_id: トランザクションID
+        """
+        response = self.execute_statement(
+            sql,
+            to_parameters(values) if values else None,
+            transaction_id=transaction_id,
+            format_records_as_json=True,
+        )
+        return map_json_records(response)
+
+    def begin_transaction(self) -> str:
+        """トランザクションを開始してIDを返す"""
+        return self.client.begin_transaction(**self._base_request())["transactionId"]
+
+    def commit_transaction(self, transaction_id: str) -> None:
+        self.client.commit_transaction(
+            resourceArn=self.db_arn, secretArn=self.secret_arn, transactionId=transaction_id
+        )
+
+    def rollback_transaction(self, transaction_id: str) -> None:
+        self.client.rollback_transaction(
+            resourceArn=self.db_arn, secretArn=self.secret_arn, transactionId=transaction_id
+        )
+
+    @contextmanager
+    def transaction(self) -> Iterator[str]:
+        """with 文でトランザクションを張る。例外時はロールバックする"""
+        transaction_id = self.begin_transaction()
+        try:
+            yield transaction_id
+        except Exception:
+            try:
+                self.rollback_transaction(transaction_id)
+            except Exception as e:
+                logger.error(f"Rollback failed: {e}")
+            raise
+        else:
+            self.commit_transaction(transaction_id)
+
+    def batch_execute(
+        self,
+        sql: str,
+        parameter_sets: List[List[Dict[str, Any]]],
+        transaction_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        batch_execute_statement で同一SQLを複数パラメータセットで実行
+
+        上限（パラメータセット数・ペイロードサイズ）に合わせて自動で分割する。
+
+        Returns:
+            List[Dict[str, Any]]: パラメータセット順の updateResults
+        """
+        results: List[Dict[str, Any]] = []
+        base_size = len(sql.encode("utf-8"))
+        for chunk in chunk_parameter_sets(parameter_sets, base_size=base_size):
+            params = {**self._base_request(), "sql": sql, "parameterSets": chunk}
+            if transaction_id:
+                params["transactionId"] = transaction_id
+            try:
+                response = self.client.batch_execute_statement(**params)
+            except ClientError as e:
+                logger.error(f"Failed to batch execute statement: {e}")
+                raise
+            update_results = response.get("updateResults", [])
+            # 応答に件数分の結果がない場合も位置を揃える
+            results.extend(update_results + [{}] * (len(chunk) - len(update_results)))
+        return results
+
+    @staticmethod
+    def _string_or_null(value: Optional[str]) -> Dict[str, Any]:
+        """Data API のパラメータ値（None は NULL）"""
+        return {"isNull": True} if value is None else {"stringValue": value}
+
+    @staticmethod
+    def _generated_id(result: Dict[str, Any]) -> Optional[int]:
+        fields = result.get("generatedFields") or []
+        return from_field(fields[0]) if fields else None
+
+    def _blob_parameter_sets(self, bodies, store=None) -> List[List[Dict[str, Any]]]:
+        """content_blobs 用のパラメータセット（ハッシュで重複排除）"""
+        rows = content_store.build_blob_rows(bodies, datetime.now(), store)
+        return [
+            to_parameters({
+                "content_hash": h,
+                "compression": compression,
+                "original_length": original_length,
+                "compressed_length": compressed_length,
+                "data": data,
+                "storage_uri": storage_uri,
+            })
+            for h, compression, original_length, compressed_length, data, storage_uri, _ in rows
+        ]
+
+    def _store_blobs(self, bodies, store=None, transaction_id: Optional[str] = None) -> None:
+        """
+        本文を content_blobs に圧縮保存（同一ハッシュは何もしない）
+
+        store 指定時は本文をオブジェクトストアへ書き込み、Data API には
+        ポインタ（storage_uri）のみを送るためペイロード上限にかからない。
+        """
+        parameter_sets = self._blob_parameter_sets(bodies, store)
+        if len(parameter_sets) == 1:
+            self.execute_statement(CONTENT_BLOB_UPSERT_SQL, parameter_sets[0], transaction_id)
+        elif parameter_sets:
+            self.batch_execute(CONTENT_BLOB_UPSERT_SQL, parameter_sets, transaction_id)
+
+    def _load_institutions(self):
+        """金融機関マスターを1回のAPI呼び出しで全件取得"""
+        rows = self.query("SELECT id, institution_code, institution_name FROM financial_institutions")
+        return [(r["id"], r.get("institution_code"), r.get("institution_name")) for r in rows]
+
+    def get_or_create_institution(
+        self, institution_code: str, institution_name: str
+    ) -> Optional[int]:
+        """
+        金融機関IDを取得または作成（プロセス内キャッシュ経由）
+
+        Args:
+            institution_code: 金融機関コード
+            institution_name: 金融機関名
+
+        Returns:
+            金融機関ID
+        """
+        try:
+            cache = get_institution_cache((self.db_arn, self.database))
+            cache.ensure_loaded(self._load_institutions)
+
+            institution_id = cache.get(institution_code, institution_name)
+            if institution_id:
+                return institution_id
+
+            # 新規作成。並行実行で同じコードが先に登録されていた場合は
+            # LAST_INSERT_ID(id) により既存IDが generatedFields に返る
+            sql = """
+                INSERT INTO financial_institutions (institution_code, institution_name)
+                VALUES (:code, :name)
+                ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+            """
+            params = to_parameters({"code": institution_code, "name": institution_name})
+
+            response = self.execute_statement(sql, params)
+            institution_id = self._generated_id(response)
+
+            if not institution_id:
+                # generatedFields が返らない場合は登録済みの行を引き直す
+                rows = self.query(
+                    "SELECT id FROM financial_institutions WHERE institution_code = :code",
+                    {"code": institution_code},
+                )
+                if rows:
+                    institution_id = rows[0]["id"]
+
+            cache.put(institution_id, institution_code, institution_name)
+            logger.info(
+                f"Created new institution: {institution_name} (ID={institution_id})"
+            )
+            return institution_id
+
+        except Exception as e:
+            logger.error(f"Failed to get or create institution: {e}")
+            return None
+
+    @staticmethod
+    def _build_structured_data(loan_data: Dict[str, Any]) -> Dict[str, Any]:
+        """structured_dataにすべての商品情報を格納"""
+        return {
+            "product_name": loan_data.get("product_name"),
+            "loan_category": loan_data.get("loan_category"),
+            "min_interest_rate": loan_data.get("min_interest_rate"),
+            "max_interest_rate": loan_data.get("max_interest_rate"),
+            "interest_rate_type": loan_data.get("interest_rate_type"),
+            "min_loan_amount": loan_data.get("min_loan_amount"),
+            "max_loan_amount": loan_data.get("max_loan_amount"),
+            "min_loan_period_months": loan_data.get("min_loan_period_months"),
+            "max_loan_period_months": loan_data.get("max_loan_period_months"),
+            "min_age": loan_data.get("min_age"),
+            "max_age": loan_data.get("max_age"),
+            "repayment_method": loan_data.get("repayment_method"),
+            "application_conditions": loan_data.get("application_conditions"),
+            "features": loan_data.get("features"),
+        }
+
+    @staticmethod
+    def _blob_bodies(loan_data: Dict[str, Any], offload: bool) -> List[Any]:
+        """content_blobs に保存する本文（元PDFはオブジェクトストア退避時のみ保持）"""
+        return [
+            loan_data.get("html_content", "") or "",
+            loan_data.get("extracted_text", "") or "",
+            loan_data.get("source_bytes") if offload else None,
+        ]
+
+    def _raw_parameters(
+        self, loan_data: Dict[str, Any], institution_id: int, offload: bool
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """RAW_LOAN_DATA_UPSERT_SQL のパラメータと content_hash"""
+        html_content, extracted_text, source_bytes = self._blob_bodies(loan_data, offload)
+        # ハッシュは PyMySQL 経路と同じ（商品の識別 + HTML 内容）
+        content_hash = compute_content_hash(loan_data, institution_id)
+        params = to_parameters({
+            "institution_id": institution_id,
+            "source_url": loan_data.get("source_url", ""),
+            "page_title": loan_data.get("product_name", ""),
+            "structured_data": json.dumps(self._build_structured_data(loan_data), ensure_ascii=False),
+            "content_hash": content_hash,
+            "html_blob_hash": content_store.blob_hash_or_none(html_content),
+            "text_blob_hash": content_store.blob_hash_or_none(extracted_text),
+            "source_blob_hash": content_store.blob_hash_or_none(source_bytes),
+            "content_length": len(html_content),
+        })
+        return content_hash, params
+
+    def _fetch_ids_by_hash(self, hashes: List[str], transaction_id: Optional[str] = None) -> Dict[str, int]:
+        """コンテンツハッシュ → raw_loan_data.id を1回のクエリで取得"""
+        if not hashes:
+            return {}
+        names = [f"h{i}" for i in range(len(hashes))]
+        rows = self.query(
+            "SELECT id, content_hash FROM raw_loan_data WHERE content_hash IN ("
+            + ", ".join(f":{n}" for n in names) + ")",
+            dict(zip(names, hashes)),
+            transaction_id=transaction_id,
+        )
+        return {r["content_hash"]: r["id"] for r in rows}
+
+    def save_loan_data(self, loan_data: Dict[str, Any]) -> Optional[int]:
+        """
+        ローンデータを保存（raw_loan_dataテーブル）
+
+        Args:
+            loan_data: ローンデータ
+
+        Returns:
+            保存したレコードのID
+        """
+        try:
+            # 金融機関IDを取得または作成
+            institution_id = self.get_or_create_institution(
+                loan_data.get("institution_code", ""),
+                loan_data.get("institution_name", ""),
+            )
+
+            if not institution_id:
+                logger.error("Failed to get institution_id")
+                return None
+
+            # 本文は content_blobs に圧縮保存し、raw_loan_data からはハッシュで参照する
+            # （TEXT型に収めるための切り詰めも不要になる）
+            # 退避モードでは元PDFも含めてオブジェクトストアに置く
+            store = get_object_store()
+            self._store_blobs(self._blob_bodies(loan_data, store is not None), store)
+
+            # raw_loan_dataに保存（content_hash の一意キーで冪等UPSERT）
+            content_hash, params = self._raw_parameters(loan_data, institution_id, store is not None)
+            response = self.execute_statement(RAW_LOAN_DATA_UPSERT_SQL, params)
+            raw_data_id = self._generated_id(response)
+            if not raw_data_id:
+                # generatedFields が返らない場合はハッシュで引き直す
+                raw_data_id = self._fetch_ids_by_hash([content_hash]).get(content_hash)
+
+            logger.info(f"Saved raw_loan_data with Data API: ID={raw_data_id}")
+            return raw_data_id
+
+        except Exception as e:
+            logger.error(f"Failed to save loan data via Data API: {e}")
+            logger.exception(e)
+            return None
+
+    def save_loan_data_many(
+        self, records: List[Dict[str, Any]], flush_size: Optional[int] = None
+    ) -> List[Optional[int]]:
+        """
+        ローンデータを一括保存
+
+        金融機関ごとに1トランザクションで、content_blobs と raw_loan_data を
+        それぞれ batch_execute_statement でまとめて送る。1金融機関あたりの
+        HTTPS呼び出しは begin / 本文 / 生データ / (ID再取得) / commit の数回で済む。
+
+        Args:
+            records: save_loan_data と同じ形式のローンデータのリスト
+            flush_size: 1回の batch_execute_statement あたりの最大件数
+                        （既定: 環境変数 DB_BULK_FLUSH_SIZE または Data API の上限）
+
+        Returns:
+            List[Optional[int]]: 入力順の raw_loan_data.id（失敗した金融機関分は None）
+        """
+        if flush_size is None:
+            flush_size = int(os.getenv("DB_BULK_FLUSH_SIZE", str(DATA_API_MAX_PARAMETER_SETS)))
+        flush_size = max(1, min(flush_size, DATA_API_MAX_PARAMETER_SETS))
+
+        # 金融機関ごとにグループ化（入力順のインデックスを保持）
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for i, r in enumerate(records):
+            key = (r.get("institution_code", ""), r.get("institution_name", ""))
+            groups.setdefault(key, []).append(i)
+
+        store = get_object_store()
+        offload = store is not None
+        ids: List[Optional[int]] = [None] * len(records)
+        for (code, name), indexes in groups.items():
+            try:
+                institution_id = self.get_or_create_institution(code, name)
+                if not institution_id:
+                    raise ValueError("Failed to get institution_id")
+
+                # 同一内容のレコードは後勝ちで1行にまとめる
+                raw_by_hash: Dict[str, List[Dict[str, Any]]] = {}
+                for i in indexes:
+                    content_hash, params = self._raw_parameters(records[i], institution_id, offload)
+                    raw_by_hash[content_hash] = params
+                blob_sets = self._blob_parameter_sets(
+                    (body for i in indexes for body in self._blob_bodies(records[i], offload)), store
+                )
+
+                hashes = list(raw_by_hash.keys())
+                hash_to_id: Dict[str, int] = {}
+                with self.transaction() as tid:
+                    for start in range(0, len(blob_sets), flush_size):
+                        self.batch_execute(CONTENT_BLOB_UPSERT_SQL, blob_sets[start:start + flush_size], tid)
+                    for start in range(0, len(hashes), flush_size):
+                        chunk = hashes[start:start + flush_size]
+                        results = self.batch_execute(
+                            RAW_LOAN_DATA_UPSERT_SQL, [raw_by_hash[h] for h in chunk], tid
+                        )
+                        for h, result in zip(chunk, results):
+                            generated = self._generated_id(result)
+                            if generated:
+                                hash_to_id[h] = generated
+                    missing = [h for h in hashes if h not in hash_to_id]
+                    if missing:
+                        hash_to_id.update(self._fetch_ids_by_hash(missing, tid))
+            except Exception as e:
+                logger.error(f"Bulk save failed for institution {name or code}, rolled back: {e}")
+                continue
+
+            for i in indexes:
+                ids[i] = hash_to_id.get(compute_content_hash(records[i], institution_id))
+            logger.info(f"Bulk saved {len(indexes)} records for {name or code} via Data API")
+
+        return ids
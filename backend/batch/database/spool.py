@@ -0,0 +1,142 @@
+"""
+DB障害時のローカルスプール
+
+DBに接続できない間、save_scraped_product は指数バックオフで1商品あたり最大
+約31秒待ったうえでデータを捨てていた。スプールを有効にすると、保存できなかった
+レコードを JSONL のセグメントとしてローカル（EFS）または S3 に書き出し、
+DB復旧後に replay_spool（scripts/replay_spool.py）で一括保存の経路から取り込む。
+
+- 1回の書き出しで1セグメント（1オブジェクト）を作る（S3 は追記できないため）
+- content_hash はスプールに持たせない（一意キーには DB で採番する金融機関IDが
+  必要なため）。取り込み時に save_loan_data_many が compute_content_hash で計算して
+  UPSERT するため、同じセグメントを再取り込みしても重複しない
+- 元PDFのバイト列は base64 で保持する
+
+環境変数:
+  - SPOOL_STORE: local / s3（未設定ならスプールしない）
+  - SPOOL_DIR: ローカル実装の格納ディレクトリ（EFS のマウント先など）
+  - SPOOL_BUCKET, SPOOL_PREFIX: S3 の格納先
+"""
+
+import base64
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    from .object_store import LocalObjectStore, ObjectStore, S3ObjectStore
+except ImportError:
+    # Lambda環境では相対インポートが失敗するため、直接インポートを使用
+    from object_store import LocalObjectStore, ObjectStore, S3ObjectStore
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.jsonl'
+
+
+def encode_record(loan_data: Dict[str, Any]) -> Dict[str, Any]:
+    """build_loan_data の結果を JSON にできる形へ変換"""
+    record = {k: v for k, v in loan_data.items() if k != 'source_bytes'}
+    source_bytes = loan_data.get('source_bytes')
+    if source_bytes:
+        record['source_bytes_b64'] = base64.b64encode(source_bytes).decode('ascii')
+    return record
+
+
+def decode_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """encode_record の逆変換（以前のセグメントに含まれる content_hash は捨てる）"""
+    loan_data = {
+        k: v for k, v in record.items() if k not in ('source_bytes_b64', 'spooled_at', 'content_hash')
+    }
+    if record.get('source_bytes_b64'):
+        loan_data['source_bytes'] = base64.b64decode(record['source_bytes_b64'])
+    return loan_data
+
+
+class Spool:
+    """オブジェクトストア上の JSONL セグメント群"""
+
+    def __init__(self, store: ObjectStore, prefix: str = 'spool'):
+        self.store = store
+        self.prefix = prefix.strip('/')
+
+    def append(self, records: List[Dict[str, Any]], label: str = '') -> Optional[str]:
+        """
+        レコードを1セグメントとして書き出す
+
+        Args:
+            records: build_loan_data 形式のレコード
+            label: キーに含める識別子（金融機関コードなど）
+
+        Returns:
+            Optional[str]: セグメントのキー（レコードが空なら None）
+        """
+        if not records:
+            return None
+        now = datetime.now()
+        lines = []
+        for loan_data in records:
+            record = encode_record(loan_data)
+            record['spooled_at'] = now.isoformat()
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        name = f"{now.strftime('%Y%m%dT%H%M%S%f')}-{label or 'records'}-{uuid.uuid4().hex[:8]}"
+        key = f"{self.prefix}/{now.strftime('%Y%m%d')}/{name}{SEGMENT_SUFFIX}"
+        self.store.put(key, ('\n'.join(lines) + '\n').encode('utf-8'), 'application/x-ndjson')
+        logger.warning(f"Spooled {len(records)} records to {self.store.uri_for(key)}")
+        return key
+
+    def segments(self) -> List[str]:
+        """未取り込みのセグメントを古い順に列挙"""
+        return [k for k in self.store.list_keys(self.prefix) if k.endswith(SEGMENT_SUFFIX)]
+
+    def read(self, key: str) -> List[Dict[str, Any]]:
+        """セグメントのレコードを build_loan_data 形式で読み出す"""
+        text = self.store.get(self.store.uri_for(key)).decode('utf-8')
+        return [decode_record(json.loads(line)) for line in text.splitlines() if line.strip()]
+
+    def remove(self, key: str) -> None:
+        self.store.delete(key)
+
+
+_spool_lock = threading.Lock()
+_configured_spool: Optional[Spool] = None
+_configured = False
+
+
+def get_spool() -> Optional[Spool]:
+    """環境変数に従ったスプール（無効なら None）をプロセス内で共有"""
+    global _configured_spool, _configured
+    with _spool_lock:
+        if not _configured:
+            mode = os.getenv('SPOOL_STORE', '').lower()
+            if mode == 's3':
+                bucket = os.getenv('SPOOL_BUCKET')
+                if not bucket:
+                    raise ValueError("SPOOL_BUCKET is required when SPOOL_STORE=s3")
+                _configured_spool = Spool(S3ObjectStore(bucket), os.getenv('SPOOL_PREFIX', 'spool'))
+            elif mode == 'local':
+                _configured_spool = Spool(LocalObjectStore(os.getenv('SPOOL_DIR', './spool')))
+            elif mode:
+                raise ValueError(f"Unknown SPOOL_STORE: {mode}")
+            _configured = True
+        return _configured_spool
+
+
+def set_spool(spool: Optional[Spool]) -> None:
+    """スプールを明示的に設定（テスト用。None でスプールしない）"""
+    global _configured_spool, _configured
+    with _spool_lock:
+        _configured_spool = spool
+        _configured = True
+
+
+def reset_spool() -> None:
+    """設定を破棄し、次回は環境変数から再構成する"""
+    global _configured_spool, _configured
+    with _spool_lock:
+        _configured_spool = None
+        _configured = False
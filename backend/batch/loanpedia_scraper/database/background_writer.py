@@ -0,0 +1,276 @@
+"""
+バックグラウンドDB書き込み
+
+スクレイピングループ内で save_scraped_product を同期的に呼ぶと、DBの遅延や
+リトライ（指数バックオフ）がそのままスクレイピングを止める。BackgroundWriter は
+有界キューに積まれたレコードを専用スレッドでまとめて保存し、スクレイピングの
+スループットをDBの遅延から切り離す。
+
+- キューが満杯なら submit が待つ（メモリを無制限に使わないための背圧）
+- flush_size 件たまるか flush_interval 秒新しいレコードが来なければ一括保存
+- 保存できなかったレコードはライタースレッド内でバックオフしつつ再試行
+- 再試行しても保存できなかったレコードはスプールへ書き出す（spool.py）
+- close() で残りを書き切ってから、レコードごとの結果を返す
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (institution_code, institution_name, [(product_data, raw_data_dict), ...]) → 入力順のID
+SaveMany = Callable[[str, str, List[Tuple[Dict[str, Any], Dict[str, Any]]]], List[Optional[int]]]
+# (institution_code, institution_name, [(product_data, raw_data_dict), ...]) → スプールできたか
+SpoolMany = Callable[[str, str, List[Tuple[Dict[str, Any], Dict[str, Any]]]], bool]
+
+_STOP = object()
+
+
+@dataclass
+class WriteOutcome:
+    """1レコードの保存結果"""
+    key: str
+    success: bool = False
+    raw_data_id: Optional[int] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    done: bool = False
+    spooled: bool = False
+
+
+def _loan_service():
+    try:
+        from . import loan_service
+    except ImportError:
+        # Lambda環境では相対インポートが失敗するため、直接インポートを使用
+        import loan_service
+    return loan_service
+
+
+def _default_save_many(
+    institution_code: str,
+    institution_name: str,
+    items: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+) -> List[Optional[int]]:
+    # 再試行とスプールはライター側で行う
+    return _loan_service().save_scraped_products(
+        institution_code, institution_name, items, spool_failures=False
+    )
+
+
+def _default_spool_many(
+    institution_code: str,
+    institution_name: str,
+    items: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+) -> bool:
+    return _loan_service().spool_scraped_products(institution_code, institution_name, items)
+
+
+class BackgroundWriter:
+    """有界キュー + 専用スレッドでスクレイピング結果を一括保存する"""
+
+    def __init__(
+        self,
+        institution_code: str,
+        institution_name: str,
+        save_many: Optional[SaveMany] = None,
+        spool_many: Optional[SpoolMany] = None,
+        max_queue: Optional[int] = None,
+        flush_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        retry_max: Optional[int] = None,
+        retry_base_delay: Optional[float] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            institution_code: 金融機関コード
+            institution_name: 金融機関名
+            save_many: 一括保存関数（既定: loan_service.save_scraped_products）
+            spool_many: 保存できなかったレコードの書き出し関数（既定: loan_service.spool_scraped_products）
+            max_queue: キューの上限（既定: 環境変数 DB_WRITER_QUEUE_SIZE または 100）
+            flush_size: 1回の一括保存の最大件数（既定: DB_WRITER_FLUSH_SIZE または 20）
+            flush_interval: 新しいレコードを待つ最大秒数（既定: DB_WRITER_FLUSH_INTERVAL または 1.0）
+            retry_max: 保存の最大試行回数（既定: loan_service.default_retry_max()）
+            retry_base_delay: 再試行の初回待ち秒数（既定: DB_RETRY_BASE_DELAY または 1.0）
+        """
+        self.institution_code = institution_code
+        self.institution_name = institution_name
+        self._save_many = save_many or _default_save_many
+        self._spool_many = spool_many or _default_spool_many
+        self.flush_size = max(1, flush_size or int(os.getenv("DB_WRITER_FLUSH_SIZE", "20")))
+        self.flush_interval = (
+            flush_interval if flush_interval is not None
+            else float(os.getenv("DB_WRITER_FLUSH_INTERVAL", "1.0"))
+        )
+        self.retry_max = max(1, retry_max or _loan_service().default_retry_max())
+        self.retry_base_delay = (
+            retry_base_delay if retry_base_delay is not None
+            else float(os.getenv("DB_RETRY_BASE_DELAY", "1.0"))
+        )
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(
+            maxsize=max_queue or int(os.getenv("DB_WRITER_QUEUE_SIZE", "100"))
+        )
+        self._outcomes: Dict[str, WriteOutcome] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._seq = 0
+
+    def start(self) -> "BackgroundWriter":
+        """ライタースレッドを起動"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(
+        self,
+        product_data: Dict[str, Any],
+        raw_data_dict: Dict[str, Any],
+        key: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """
+        保存対象をキューに積む（キューが満杯なら空くまで待つ）
+
+        Args:
+            product_data: 商品データ
+            raw_data_dict: 生データ
+            key: 結果を引くためのキー（省略時は連番）
+            timeout: キューが空くのを待つ最大秒数（超過時は queue.Full）
+
+        Returns:
+            str: 結果のキー
+        """
+        if self._closed:
+            raise RuntimeError("BackgroundWriter is already closed")
+        self.start()
+        with self._lock:
+            self._seq += 1
+            key = key or f"record-{self._seq}"
+            self._outcomes[key] = WriteOutcome(key=key)
+        self._queue.put((key, product_data, raw_data_dict), timeout=timeout)
+        return key
+
+    def _run(self) -> None:
+        pending: List[Tuple[str, Dict[str, Any], Dict[str, Any]]] = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval if pending else None)
+            except queue.Empty:
+                item = None
+
+            stop = item is _STOP
+            if item is not None and not stop:
+                pending.append(item)
+
+            if pending and (stop or item is None or len(pending) >= self.flush_size):
+                self._flush(pending)
+                pending = []
+            if stop:
+                return
+
+    def _flush(self, batch: List[Tuple[str, Dict[str, Any], Dict[str, Any]]]) -> None:
+        """一括保存（保存できなかったレコードのみ再試行）"""
+        remaining = batch
+        error: Optional[str] = None
+        for attempt in range(self.retry_max):
+            if attempt > 0:
+                delay = self.retry_base_delay * (2 ** (attempt - 1))
+                logger.info(f"DB writer retry {attempt + 1}/{self.retry_max} for {len(remaining)} records in {delay}s")
+                time.sleep(delay)
+            try:
+                ids = self._save_many(
+                    self.institution_code,
+                    self.institution_name,
+                    [(product_data, raw_data) for _, product_data, raw_data in remaining],
+                )
+                error = None
+            except Exception as e:
+                logger.warning(f"DB writer flush failed: {e}")
+                ids = [None] * len(remaining)
+                error = str(e)
+
+            retry = []
+            with self._lock:
+                for item, raw_data_id in zip(remaining, ids):
+                    outcome = self._outcomes[item[0]]
+                    outcome.attempts += 1
+                    if raw_data_id:
+                        outcome.success = True
+                        outcome.raw_data_id = raw_data_id
+                        outcome.error = None
+                        outcome.done = True
+                    else:
+                        retry.append(item)
+            remaining = retry
+            if not remaining:
+                break
+
+        spooled = False
+        if remaining:
+            try:
+                spooled = self._spool_many(
+                    self.institution_code,
+                    self.institution_name,
+                    [(product_data, raw_data) for _, product_data, raw_data in remaining],
+                )
+            except Exception:
+                logger.exception("DB writer failed to spool unsaved records")
+
+        with self._lock:
+            for key, _, _ in remaining:
+                outcome = self._outcomes[key]
+                outcome.error = error or "save returned no id"
+                outcome.spooled = bool(spooled)
+                outcome.done = True
+        saved = len(batch) - len(remaining)
+        logger.info(
+            f"DB writer flushed {len(batch)} records: saved={saved}, failed={len(remaining)}, spooled={spooled}"
+        )
+
+    def close(self, timeout: Optional[float] = None) -> Dict[str, WriteOutcome]:
+        """
+        キューを書き切ってスレッドを終了し、レコードごとの結果を返す
+
+        Args:
+            timeout: 書き切りを待つ最大秒数（超過時は未完了のまま結果を返す）
+        """
+        if not self._closed:
+            self._closed = True
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join(timeout)
+                if self._thread.is_alive():
+                    logger.warning("DB writer did not drain within timeout")
+        return self.outcomes
+
+    @property
+    def outcomes(self) -> Dict[str, WriteOutcome]:
+        with self._lock:
+            return {k: WriteOutcome(**vars(v)) for k, v in self._outcomes.items()}
+
+    def summary(self) -> Dict[str, int]:
+        """件数サマリー（queued / saved / failed / spooled / pending）"""
+        outcomes = self.outcomes.values()
+        return {
+            "queued": len(self._outcomes),
+            "saved": sum(1 for o in outcomes if o.success),
+            "failed": sum(1 for o in outcomes if o.done and not o.success),
+            "spooled": sum(1 for o in outcomes if o.spooled),
+            "pending": sum(1 for o in outcomes if not o.done),
+        }
+
+    def __enter__(self) -> "BackgroundWriter":
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,239 @@
+"""
+プロセス共通のデータベース接続プール
+
+商品ごと・HTML結果ごとに pymysql 接続を張り直すと、そのたびに TCP 接続と
+認証のラウンドトリップが発生する。ここではプロセス単位で接続を使い回し、
+Lambda のウォームコンテナでは呼び出しをまたいで接続を再利用する。
+
+- 貸し出し時のヘルスチェック（一定時間使われていない接続のみ ping）
+- 最大接続数（使用中 + 待機中）の上限
+- アイドルタイムアウトを超えた接続の破棄
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import pymysql
+    import pymysql.cursors
+    from pymysql.constants import SERVER_STATUS
+    PYMYSQL_AVAILABLE = True
+except ImportError:
+    PYMYSQL_AVAILABLE = False
+    pymysql = None
+    SERVER_STATUS = None
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhaustedError(Exception):
+    """接続プールから時間内に接続を取得できなかった"""
+
+
+def _default_connect(db_config: Dict[str, Any]):
+    return pymysql.connect(**{**db_config, 'cursorclass': pymysql.cursors.DictCursor})
+
+
+class ConnectionPool:
+    """スレッドセーフな pymysql 接続プール"""
+
+    def __init__(
+        self,
+        db_config: Dict[str, Any],
+        max_size: int = 4,
+        idle_timeout: float = 300.0,
+        validation_interval: float = 30.0,
+        acquire_timeout: float = 30.0,
+        connect_fn: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            db_config: pymysql.connect に渡す接続設定
+            max_size: 最大接続数（使用中 + 待機中）
+            idle_timeout: この秒数以上待機した接続は貸し出さずに破棄する
+            validation_interval: 最終使用からこの秒数以上経過した接続は貸し出し前に ping する
+            acquire_timeout: 上限到達時に空きを待つ最大秒数
+            connect_fn: 接続生成関数（テスト用に差し替え可能）
+        """
+        if connect_fn is None and not PYMYSQL_AVAILABLE:
+            raise ImportError("pymysql is required for ConnectionPool")
+
+        self.db_config = db_config
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.validation_interval = validation_interval
+        self.acquire_timeout = acquire_timeout
+        self._connect_fn = connect_fn or _default_connect
+
+        self._cond = threading.Condition()
+        # (接続, 最終使用時刻) のスタック。直近に返却された接続から再利用する
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0}
+
+    @property
+    def size(self) -> int:
+        """現在の総接続数（使用中 + 待機中）"""
+        with self._cond:
+            return self._in_use + len(self._idle)
+
+    def _close_quietly(self, conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, last_used: float, now: float) -> bool:
+        if now - last_used >= self.idle_timeout:
+            return False
+        if now - last_used < self.validation_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception as e:
+            logger.info(f"Pooled connection failed health check: {e}")
+            return False
+
+    def acquire(self):
+        """
+        接続を借りる
+
+        Returns:
+            利用可能な接続
+
+        Raises:
+            PoolExhaustedError: acquire_timeout 内に空きが出なかった
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                while self._idle:
+                    conn, last_used = self._idle.pop()
+                    if self._is_healthy(conn, last_used, time.monotonic()):
+                        self._in_use += 1
+                        self.stats['reused'] += 1
+                        return conn
+                    self.stats['discarded'] += 1
+                    self._close_quietly(conn)
+
+                if self._in_use < self.max_size:
+                    # 接続生成中も上限を守るため先に枠を確保する
+                    self._in_use += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"No database connection available (max_size={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            conn = self._connect_fn(self.db_config)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats['created'] += 1
+        logger.info("Database connection established (pooled)")
+        return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        """
+        接続を返却する
+
+        Args:
+            conn: acquire で借りた接続
+            discard: True の場合は再利用せずに閉じる（エラー後など）
+        """
+        if conn is None:
+            return
+        if not discard:
+            # 未完了トランザクションを次の利用者へ持ち越さない
+            try:
+                if SERVER_STATUS is not None and conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use = max(0, self._in_use - 1)
+            if discard:
+                self.stats['discarded'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if discard:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        """with 文で接続を借りる。例外時は接続を破棄する"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self) -> None:
+        """待機中の接続をすべて閉じる"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+
+_pools: Dict[Tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(db_config: Dict[str, Any]) -> Tuple:
+    return (
+        db_config.get('host'),
+        db_config.get('port'),
+        db_config.get('user'),
+        db_config.get('database'),
+    )
+
+
+def get_connection_pool(db_config: Dict[str, Any]) -> ConnectionPool:
+    """
+    接続設定ごとのプロセス共通プールを返す（なければ作成）
+
+    プール設定は環境変数で調整できる:
+      - DB_POOL_MAX_SIZE (既定 4)
+      - DB_POOL_IDLE_TIMEOUT 秒 (既定 300)
+      - DB_POOL_VALIDATION_INTERVAL 秒 (既定 30)
+    """
+    key = _pool_key(db_config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                db_config,
+                max_size=int(os.getenv('DB_POOL_MAX_SIZE', '4')),
+                idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+                validation_interval=float(os.getenv('DB_POOL_VALIDATION_INTERVAL', '30')),
+            )
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools() -> None:
+    """すべてのプールの待機中接続を閉じる"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
@@ -38,41 +38,70 @@ CREATE TABLE data_sources (
     INDEX idx_next_scrape (next_scrape_at)
 ) COMMENT 'データソース管理テーブル';
 
--- 3. 生ローンデータ (raw_loan_data)
+-- 3. 本文ストア (content_blobs)
+-- HTML / 抽出テキストを SHA-256 をキーに圧縮して1回だけ保存する
+CREATE TABLE content_blobs (
+    content_hash CHAR(64) PRIMARY KEY COMMENT '本文のSHA-256',
+    compression VARCHAR(10) NOT NULL DEFAULT 'zlib' COMMENT '圧縮方式（zlib / none / mysql）',
+    original_length INT NOT NULL COMMENT '元サイズ（バイト）',
+    compressed_length INT NOT NULL COMMENT '保存サイズ（バイト）',
+    data LONGBLOB COMMENT '圧縮データ（オブジェクトストア退避時は NULL）',
+    storage_uri VARCHAR(1024) COMMENT '退避先URI（s3:// / file://）',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) COMMENT '圧縮本文ストア';
+
+-- 4. 生ローンデータ (raw_loan_data)
 CREATE TABLE raw_loan_data (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
     data_source_id BIGINT COMMENT 'データソースID',
     institution_id BIGINT NOT NULL COMMENT '金融機関ID',
     source_url TEXT NOT NULL COMMENT '取得元URL',
     page_title VARCHAR(200) COMMENT 'ページタイトル',
-    html_content LONGTEXT COMMENT 'HTML内容',
-    extracted_text MEDIUMTEXT COMMENT '抽出テキスト',
+    html_content LONGTEXT COMMENT 'HTML内容（旧形式。新規行は html_blob_hash を使用）',
+    extracted_text MEDIUMTEXT COMMENT '抽出テキスト（旧形式。新規行は text_blob_hash を使用）',
+    html_blob_hash CHAR(64) COMMENT 'HTML本文（content_blobs）',
+    text_blob_hash CHAR(64) COMMENT '抽出テキスト本文（content_blobs）',
+    source_blob_hash CHAR(64) COMMENT '元PDF（content_blobs。オブジェクトストア退避時のみ）',
     structured_data JSON COMMENT '構造化データ',
     content_hash VARCHAR(64) COMMENT 'コンテンツハッシュ',
     content_length INT COMMENT 'コンテンツサイズ',
     http_status INT COMMENT 'HTTPステータス',
     response_headers JSON COMMENT 'レスポンスヘッダー',
     extraction_metadata JSON COMMENT '抽出メタデータ',
+    ai_status ENUM('pending', 'done', 'failed') NOT NULL DEFAULT 'pending' COMMENT 'AI処理の状態',
+    ai_claimed_by VARCHAR(100) COMMENT 'AI処理中のワーカー',
+    ai_available_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT 'AI処理の取得可能日時（取得中はリース期限）',
+    ai_attempts INT NOT NULL DEFAULT 0 COMMENT 'AI処理の取得回数',
     scraped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '取得日時',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
 
     FOREIGN KEY (data_source_id) REFERENCES data_sources(id),
     FOREIGN KEY (institution_id) REFERENCES financial_institutions(id),
+    FOREIGN KEY (html_blob_hash) REFERENCES content_blobs(content_hash),
+    FOREIGN KEY (text_blob_hash) REFERENCES content_blobs(content_hash),
+    FOREIGN KEY (source_blob_hash) REFERENCES content_blobs(content_hash),
     INDEX idx_source_date (data_source_id, scraped_at),
     INDEX idx_institution_date (institution_id, scraped_at),
-    INDEX idx_hash (content_hash),
+    UNIQUE KEY uk_content_hash (content_hash),
+    INDEX idx_ai_work (ai_status, ai_available_at),
     INDEX idx_scraped_date (scraped_at)
 ) COMMENT '生ローンデータテーブル';
 
--- 4. AI処理済みデータ (processed_loan_data)
+-- 5. AI処理済みデータ (processed_loan_data)
 CREATE TABLE processed_loan_data (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
     raw_data_id BIGINT NOT NULL COMMENT '生データID',
     institution_id BIGINT NOT NULL COMMENT '金融機関ID',
     ai_summary JSON NOT NULL COMMENT 'AI要約データ',
     ai_model VARCHAR(50) NOT NULL COMMENT 'AIモデル名',
-    processing_version VARCHAR(20) COMMENT '処理バージョン',
+    processing_version VARCHAR(20) COMMENT '処理バージョン（プロンプトのバージョン）',
+    summary_cache_key CHAR(64) COMMENT '要約キャッシュキー（構造化データ・金融機関・モデル・プロンプトのハッシュ）',
+    input_tokens INT UNSIGNED COMMENT 'AI呼び出しの入力トークン数（キャッシュ読み込み分を除く）',
+    output_tokens INT UNSIGNED COMMENT 'AI呼び出しの出力トークン数',
+    cache_read_input_tokens INT UNSIGNED COMMENT 'プロンプトキャッシュから読んだ入力トークン数',
+    latency_ms INT UNSIGNED COMMENT 'AI呼び出しの所要時間（ミリ秒）',
+    ai_retries TINYINT UNSIGNED COMMENT 'AI呼び出しの再試行回数',
     processing_status ENUM('pending', 'processing', 'completed', 'failed', 'retry') DEFAULT 'pending',
     validation_status ENUM('valid', 'warning', 'error') DEFAULT 'valid',
     validation_messages JSON COMMENT '検証メッセージ',
@@ -86,10 +115,11 @@ CREATE TABLE processed_loan_data (
     INDEX idx_raw_data (raw_data_id),
     INDEX idx_institution_status (institution_id, processing_status),
     INDEX idx_status_date (processing_status, processed_at),
-    INDEX idx_ai_model (ai_model)
+    INDEX idx_ai_model (ai_model),
+    INDEX idx_summary_cache (summary_cache_key)
 ) COMMENT 'AI処理済みデータテーブル';
 
--- 5. 統合ローン商品 (loan_products)
+-- 6. 統合ローン商品 (loan_products)
 CREATE TABLE loan_products (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
     processed_data_id BIGINT NOT NULL COMMENT '処理済みデータID',
@@ -126,7 +156,7 @@ CREATE TABLE loan_products (
     FULLTEXT idx_product_search (product_name, summary)
 ) COMMENT '統合ローン商品テーブル';
 
--- 6. ローン商品変更履歴 (loan_product_history)
+-- 7. ローン商品変更履歴 (loan_product_history)
 CREATE TABLE loan_product_history (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
     loan_product_id BIGINT NOT NULL,
@@ -139,6 +169,27 @@ CREATE TABLE loan_product_history (
     INDEX idx_changed_date (changed_at)
 ) COMMENT 'ローン商品変更履歴テーブル';
 
+-- 8. 統合処理ウォーターマーク (integration_watermarks)
+-- 差分統合（product_integration_batch.py --incremental）でワーカーごとに統合済みの位置を記録する
+CREATE TABLE integration_watermarks (
+    worker_id VARCHAR(100) PRIMARY KEY COMMENT '統合処理のワーカーID',
+    last_processed_id BIGINT NOT NULL DEFAULT 0 COMMENT '統合済みの最大 processed_loan_data.id',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) COMMENT '統合処理ウォーターマークテーブル';
+
+-- 9. 統合処理の失敗 (integration_failures)
+-- 差分統合で失敗した行の試行回数。上限に達した行はデッドレターにしてウォーターマークを通過させる
+CREATE TABLE integration_failures (
+    worker_id VARCHAR(100) NOT NULL COMMENT '統合処理のワーカーID',
+    processed_data_id BIGINT NOT NULL COMMENT '失敗した processed_loan_data.id',
+    attempts INT NOT NULL DEFAULT 1 COMMENT '失敗した回数',
+    last_error TEXT COMMENT '最後のエラー',
+    dead_lettered_at TIMESTAMP NULL COMMENT 'デッドレターにした日時（NULL なら次回の差分統合で再試行）',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (worker_id, processed_data_id),
+    INDEX idx_dead_lettered (worker_id, dead_lettered_at)
+) COMMENT '統合処理失敗テーブル';
+
 -- サンプルデータ挿入（青森県の金融機関）
 INSERT INTO financial_institutions (institution_code, institution_name, institution_name_kana) VALUES
 ('0001', '青森銀行', 'アオモリギンコウ'),
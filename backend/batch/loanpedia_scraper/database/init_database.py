@@ -85,6 +85,7 @@ class DatabaseInitializer:
             expected_tables = [
                 'financial_institutions',
                 'data_sources',
+                'content_blobs',
                 'raw_loan_data',
                 'processed_loan_data',
                 'loan_products',
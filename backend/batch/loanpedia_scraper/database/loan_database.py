@@ -7,8 +7,9 @@ Scrapyパイプラインの機能をBeautifulSoupスクレイパーで使用で
 import hashlib
 import json
 import logging
+import os
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 
 try:
     import pymysql
@@ -17,13 +18,64 @@ except ImportError:
     PYMYSQL_AVAILABLE = False
     pymysql = None
 
+try:
+    from . import content_store
+    from .connection_pool import get_connection_pool
+    from .institution_cache import get_institution_cache
+    from .object_store import get_object_store
+except ImportError:
+    # Lambda環境では相対インポートが失敗するため、直接インポートを使用
+    import content_store
+    from connection_pool import get_connection_pool
+    from institution_cache import get_institution_cache
+    from object_store import get_object_store
+
 logger = logging.getLogger(__name__)
 
 
+def compute_content_hash(loan_data: Dict[str, Any], institution_id: Optional[int]) -> str:
+    """
+    raw_loan_data.content_hash（一意キー）を生成
+
+    1つのページ・PDF から複数の商品を取り出すと HTML 内容が同じになるため、
+    HTML 内容だけでなく商品の識別（金融機関ID・URL・商品名）も含めた SHA-256 にする。
+    migrations/001 の SQL と同じ計算。
+    """
+    identity = '\n'.join([
+        str(institution_id or ''),
+        loan_data.get('source_url') or '',
+        str(loan_data.get('product_name') or ''),
+        content_store.content_hash(loan_data.get('html_content') or ''),
+    ])
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+# content_hash の一意キーで冪等に保存する UPSERT。
+# 既存行の場合も LAST_INSERT_ID(id) により lastrowid に既存IDが入る。
+# 本文は content_blobs に圧縮保存し、ここではハッシュのみ参照する。
+# 元PDF（source_bytes）はオブジェクトストア退避時のみ source_blob_hash で参照する。
+RAW_LOAN_DATA_UPSERT_SQL = """
+    INSERT INTO raw_loan_data (
+        institution_id, source_url, page_title, structured_data, content_hash,
+        html_blob_hash, text_blob_hash, source_blob_hash, content_length,
+        scraped_at, created_at, updated_at
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        id = LAST_INSERT_ID(id),
+        structured_data = VALUES(structured_data),
+        text_blob_hash = VALUES(text_blob_hash),
+        source_blob_hash = COALESCE(VALUES(source_blob_hash), source_blob_hash),
+        updated_at = VALUES(updated_at)
+"""
+
+# RAW_LOAN_DATA_UPSERT_SQL のパラメータ中の content_hash の位置
+RAW_ROW_HASH_INDEX = 4
+
+
 class LoanDatabase:
     """ローンデータベース操作クラス"""
     
-    def __init__(self, db_config: Dict[str, Any]):
+    def __init__(self, db_config: Dict[str, Any], use_pool: bool = True):
         """
         初期化
         
@@ -37,8 +89,10 @@ class LoanDatabase:
                     'port': 3306,
                     'charset': 'utf8mb4'
                 }
+            use_pool: プロセス共通の接続プールから接続を借りるか
         """
         self.db_config = db_config
+        self.use_pool = use_pool
         self.connection = None
         self.cursor = None
         
@@ -52,22 +106,38 @@ class LoanDatabase:
             return False
             
         try:
-            self.connection = pymysql.connect(**self.db_config)
+            if self.use_pool:
+                self.connection = get_connection_pool(self.db_config).acquire()
+            else:
+                self.connection = pymysql.connect(**self.db_config)
+                logger.info("Database connection established")
             self.connection.cursorclass = pymysql.cursors.DictCursor
             self.cursor = self.connection.cursor()
-            logger.info("Database connection established")
             return True
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
             return False
     
-    def disconnect(self):
-        """データベース接続を切断"""
+    def disconnect(self, discard: bool = False):
+        """
+        データベース接続を切断（プール利用時はプールへ返却）
+
+        Args:
+            discard: プール利用時、接続を再利用せずに破棄するか
+        """
         if self.cursor:
-            self.cursor.close()
+            try:
+                self.cursor.close()
+            except Exception:
+                pass
+            self.cursor = None
         if self.connection:
-            self.connection.close()
-        logger.info("Database connection closed")
+            if self.use_pool:
+                get_connection_pool(self.db_config).release(self.connection, discard=discard)
+            else:
+                self.connection.close()
+                logger.info("Database connection closed")
+            self.connection = None
     
     def __enter__(self):
         """コンテキストマネージャーの開始"""
@@ -85,7 +155,7 @@ class LoanDatabase:
         else:
             if self.connection:
                 self.connection.commit()
-        self.disconnect()
+        self.disconnect(discard=bool(exc_type))
     
     def save_loan_data(self, loan_data: Dict[str, Any]) -> Optional[int]:
         """
@@ -136,38 +206,49 @@ class LoanDatabase:
                 self.connection.rollback()
             return None
     
+    def _load_institutions(self):
+        """金融機関マスターを1クエリで全件取得"""
+        self.cursor.execute(
+            "SELECT id, institution_code, institution_name FROM financial_institutions"
+        )
+        return [
+            (row['id'], row['institution_code'], row['institution_name'])
+            for row in self.cursor.fetchall()
+        ]
+
     def get_or_create_institution(self, institution_code: str, institution_name: str) -> Optional[int]:
-        """金融機関マスターからIDを取得、なければ作成"""
+        """金融機関マスターからIDを取得、なければ作成（プロセス内キャッシュ経由）"""
         if not institution_code and not institution_name:
             return None
-            
-        # 既存の金融機関を検索
-        select_sql = """
-            SELECT id FROM financial_institutions 
-            WHERE institution_code = %s OR institution_name = %s
-            LIMIT 1
-        """
-        self.cursor.execute(select_sql, (institution_code, institution_name))
-        result = self.cursor.fetchone()
-        
-        if result:
-            return result['id']
+
+        cache = get_institution_cache(
+            (self.db_config.get('host'), self.db_config.get('port'), self.db_config.get('database'))
+        )
+        cache.ensure_loaded(self._load_institutions)
+
+        institution_id = cache.get(institution_code, institution_name)
+        if institution_id:
+            return institution_id
         
-        # 新規作成
+        # 新規作成。並行実行で同じコードが先に登録されていた場合は
+        # LAST_INSERT_ID(id) により既存IDが lastrowid として返る
         insert_sql = """
             INSERT INTO financial_institutions (institution_code, institution_name, created_at, updated_at)
             VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
         """
         now = datetime.now()
-        self.cursor.execute(insert_sql, (institution_code, institution_name, now, now))
-        return self.cursor.lastrowid
+        self.cursor.execute(insert_sql, (institution_code or None, institution_name, now, now))
+        institution_id = self.cursor.lastrowid
+        # ロールバックでキャッシュと実テーブルが食い違わないよう、マスター登録は即時確定する
+        self.connection.commit()
+        cache.put(institution_id, institution_code, institution_name)
+        return institution_id
     
-    def save_raw_data(self, loan_data: Dict[str, Any], institution_id: Optional[int]) -> int:
-        """生データテーブルに保存"""
-        html_content = loan_data.get('html_content', '')
-        
-        # 構造化データを準備
-        structured_data = {
+    @staticmethod
+    def _build_structured_data(loan_data: Dict[str, Any]) -> Dict[str, Any]:
+        """raw_loan_data.structured_data に格納する辞書を構築"""
+        return {
             'product_name': loan_data.get('product_name'),
             'loan_category': loan_data.get('loan_category'),
             'min_interest_rate': loan_data.get('min_interest_rate'),
@@ -191,77 +272,161 @@ class LoanDatabase:
             'collateral_info': loan_data.get('collateral_info'),
             'features': loan_data.get('features')
         }
-        
-        # コンテンツハッシュを生成
-        content_hash = hashlib.sha256(html_content.encode('utf-8')).hexdigest()
-        
-        # 重複チェック
-        check_sql = "SELECT id FROM raw_loan_data WHERE content_hash = %s"
-        self.cursor.execute(check_sql, (content_hash,))
-        existing = self.cursor.fetchone()
-        
-        if existing:
-            logger.info(f"Duplicate content found, updating: {content_hash[:8]}...")
-            # 既存データを更新
-            update_sql = """
-                UPDATE raw_loan_data SET
-                    structured_data = %s,
-                    updated_at = %s
-                WHERE id = %s
-            """
-            self.cursor.execute(update_sql, (
-                json.dumps(structured_data, ensure_ascii=False),
-                datetime.now(),
-                existing['id']
-            ))
-
-            # 更新時も明示コミット
-            try:
-                if self.connection:
-                    self.connection.commit()
-                    logger.info(
-                        f"Committed update for existing raw_loan_data ID: {existing['id']}"
-                    )
-            except Exception as ce:
-                logger.error(f"Commit failed after update, rolling back: {ce}")
-                if self.connection:
-                    self.connection.rollback()
-                raise
 
-            return existing['id']
-        
-        # 新規保存
-        insert_sql = """
-            INSERT INTO raw_loan_data (
-                institution_id, source_url, page_title, html_content, 
-                structured_data, content_hash, content_length, scraped_at, created_at, updated_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
-        
-        now = datetime.now()
+    @staticmethod
+    def _content_hash(loan_data: Dict[str, Any], institution_id: Optional[int]) -> str:
+        """商品の識別と HTML 内容からコンテンツハッシュを生成"""
+        return compute_content_hash(loan_data, institution_id)
+
+    @staticmethod
+    def _parse_scraped_at(loan_data: Dict[str, Any], default: datetime) -> datetime:
+        """scraped_at（ISO形式文字列）を datetime に変換"""
         scraped_at_str = loan_data.get('scraped_at')
         if scraped_at_str:
             try:
-                scraped_at = datetime.fromisoformat(scraped_at_str)
-            except:
-                scraped_at = now
-        else:
-            scraped_at = now
-        
-        self.cursor.execute(insert_sql, (
+                return datetime.fromisoformat(scraped_at_str)
+            except (TypeError, ValueError):
+                return default
+        return default
+    
+    @staticmethod
+    def _blob_bodies(loan_data: Dict[str, Any], offload: bool) -> List[Any]:
+        """content_blobs に保存する本文（元PDFはオブジェクトストア退避時のみ保持）"""
+        bodies = [loan_data.get('html_content'), loan_data.get('extracted_text')]
+        if offload:
+            bodies.append(loan_data.get('source_bytes'))
+        return bodies
+
+    def _build_raw_row(
+        self, loan_data: Dict[str, Any], institution_id: Optional[int], now: datetime, offload: bool = False
+    ) -> Tuple:
+        """RAW_LOAN_DATA_UPSERT_SQL のパラメータを構築"""
+        html_content = loan_data.get('html_content', '') or ''
+        return (
             institution_id,
             loan_data.get('source_url', ''),
             loan_data.get('page_title', ''),
-            html_content,
-            json.dumps(structured_data, ensure_ascii=False),
-            content_hash,
-            len(html_content) if html_content else 0,
-            scraped_at,
+            json.dumps(self._build_structured_data(loan_data), ensure_ascii=False),
+            self._content_hash(loan_data, institution_id),
+            content_store.blob_hash_or_none(html_content),
+            content_store.blob_hash_or_none(loan_data.get('extracted_text')),
+            content_store.blob_hash_or_none(loan_data.get('source_bytes')) if offload else None,
+            len(html_content),
+            self._parse_scraped_at(loan_data, now),
             now,
-            now
-        ))
-        
+            now,
+        )
+    
+    def save_raw_data(self, loan_data: Dict[str, Any], institution_id: Optional[int]) -> int:
+        """
+        生データテーブルに保存（content_hash をキーに1ラウンドトリップで冪等UPSERT）
+
+        同じ内容が既にあれば structured_data と updated_at のみ更新し、既存IDを返す。
+        HTML・抽出テキストは先に content_blobs へ圧縮保存する（退避モードでは
+        元PDFも含めてオブジェクトストアへ書き込み、ポインタのみ残す）。
+        """
+        now = datetime.now()
+        store = get_object_store()
+        content_store.store_blobs(self.cursor, self._blob_bodies(loan_data, store is not None), now, store)
+        self.cursor.execute(
+            RAW_LOAN_DATA_UPSERT_SQL, self._build_raw_row(loan_data, institution_id, now, store is not None)
+        )
         return self.cursor.lastrowid
+
+    def _fetch_ids_by_hash(self, hashes: List[str]) -> Dict[str, int]:
+        """コンテンツハッシュ → raw_loan_data.id を1回の IN クエリで取得"""
+        if not hashes:
+            return {}
+        placeholders = ', '.join(['%s'] * len(hashes))
+        self.cursor.execute(
+            f"SELECT id, content_hash FROM raw_loan_data WHERE content_hash IN ({placeholders})",
+            tuple(hashes),
+        )
+        found: Dict[str, int] = {}
+        for row in self.cursor.fetchall():
+            found[row['content_hash']] = row['id']
+        return found
+
+    def _save_raw_data_chunk(self, records: List[Dict[str, Any]], institution_id: Optional[int]) -> Dict[str, int]:
+        """
+        同一金融機関のレコード群を一括UPSERT（コミットは呼び出し側）
+
+        Args:
+            records: loan_data 形式のレコード
+            institution_id: 金融機関ID
+
+        Returns:
+            Dict[str, int]: コンテンツハッシュ → raw_loan_data.id
+        """
+        now = datetime.now()
+        store = get_object_store()
+        # 同一チャンク内の重複ハッシュは後勝ち
+        rows = {}
+        for r in records:
+            row = self._build_raw_row(r, institution_id, now, store is not None)
+            rows[row[RAW_ROW_HASH_INDEX]] = row
+
+        # 本文は content_blobs へ（ハッシュで重複排除して複数行INSERT 1回）
+        content_store.store_blobs(
+            self.cursor,
+            (body for r in records for body in self._blob_bodies(r, store is not None)),
+            now,
+            store,
+        )
+
+        # pymysql は INSERT ... VALUES ... ON DUPLICATE KEY UPDATE の executemany を
+        # 複数行INSERTに書き換える。複数行では LAST_INSERT_ID が使えないため、
+        # IDはハッシュで1回引き直す
+        self.cursor.executemany(RAW_LOAN_DATA_UPSERT_SQL, list(rows.values()))
+        return self._fetch_ids_by_hash(list(rows.keys()))
+
+    def save_loan_data_many(self, records: List[Dict[str, Any]], flush_size: Optional[int] = None) -> List[Optional[int]]:
+        """
+        ローンデータを一括保存
+
+        金融機関ごとに1トランザクションで、content_hash をキーにした複数行UPSERTと
+        ID取得用の IN クエリを flush_size 件単位でまとめて実行する。
+
+        Args:
+            records: save_loan_data と同じ形式のローンデータのリスト
+            flush_size: 1ステートメントあたりの最大件数（既定: 環境変数 DB_BULK_FLUSH_SIZE または 100）
+
+        Returns:
+            List[Optional[int]]: 入力順の raw_loan_data.id（失敗した金融機関分は None）
+        """
+        if not self.connection or not self.cursor:
+            logger.warning("Database not connected, skipping bulk save")
+            return [None] * len(records)
+
+        if flush_size is None:
+            flush_size = int(os.getenv('DB_BULK_FLUSH_SIZE', '100'))
+        flush_size = max(1, flush_size)
+
+        # 金融機関ごとにグループ化（入力順のインデックスを保持）
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for i, r in enumerate(records):
+            key = (r.get('institution_code', ''), r.get('institution_name', ''))
+            groups.setdefault(key, []).append(i)
+
+        ids: List[Optional[int]] = [None] * len(records)
+        for (code, name), indexes in groups.items():
+            try:
+                institution_id = self.get_or_create_institution(code, name)
+                hash_to_id: Dict[str, int] = {}
+                for start in range(0, len(indexes), flush_size):
+                    chunk = [records[i] for i in indexes[start:start + flush_size]]
+                    hash_to_id.update(self._save_raw_data_chunk(chunk, institution_id))
+                self.connection.commit()
+            except Exception as e:
+                logger.error(f"Bulk save failed for institution {name or code}, rolling back: {e}")
+                self.connection.rollback()
+                continue
+
+            for i in indexes:
+                ids[i] = hash_to_id.get(self._content_hash(records[i], institution_id))
+            logger.info(f"Bulk saved {len(indexes)} records for {name or code}")
+
+        return ids
     
     def get_latest_data_by_institution(self, institution_code: str) -> Optional[Dict[str, Any]]:
         """指定金融機関の最新データを取得"""
@@ -5,7 +5,7 @@ DB保存サービス層
 環境変数から設定を集約し、リトライやデータ整形もここで行う。
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import os
 import time
 import logging
@@ -13,47 +13,35 @@ from datetime import datetime
 
 try:
     from .loan_database import LoanDatabase, get_database_config
+    from .spool import Spool, get_spool
 except ImportError:
     # Lambda環境では相対インポートが失敗するため、直接インポートを使用
     import loan_database
     LoanDatabase = loan_database.LoanDatabase
     get_database_config = loan_database.get_database_config
+    from spool import Spool, get_spool
 
 logger = logging.getLogger(__name__)
 
+# DB接続に失敗してからこの時刻（time.monotonic）までは接続を試みずにスプールする
+_db_outage_until = 0.0
 
-def save_scraped_product(
+
+def build_loan_data(
     institution_code: str,
     institution_name: str,
     product_data: Dict[str, Any],
     raw_data_dict: Dict[str, Any],
-) -> bool:
-    """
-    スクレイピング結果をDBへ保存（環境変数に基づきスキップ/リトライ）
-    """
-    save_to_db = os.getenv("SAVE_TO_DB", "true").lower()
-    if save_to_db not in ("true", "1", "yes"):
-        logger.info("SAVE_TO_DB is disabled, skipping database save")
-        return True
-
-    if os.getenv("DEBUG_SKIP_DB", "false").lower() in ("true", "1", "yes"):
-        logger.info("DEBUG_SKIP_DB is enabled, skipping database save for debugging")
-        return True
-
-    # DB設定の取得（フォールバック込み）
-    db_config = get_database_config()
-
-    # リトライ設定
-    retry_max = int(os.getenv("DB_RETRY_MAX", "5"))
-    base_delay = float(os.getenv("DB_RETRY_BASE_DELAY", "1.0"))
-
-    # LoanDatabaseの期待する形式に整形
-    loan_data = {
+) -> Dict[str, Any]:
+    """スクレイピング結果を LoanDatabase の期待する形式に整形"""
+    return {
         'institution_code': institution_code,
         'institution_name': institution_name,
         'source_url': raw_data_dict.get('source_url', product_data.get('source_reference', '')),
         'html_content': raw_data_dict.get('html_content', ''),
         'extracted_text': raw_data_dict.get('extracted_text', ''),
+        # 元PDFのバイト列（オブジェクトストア退避時のみ保存される）
+        'source_bytes': raw_data_dict.get('source_bytes'),
         'content_hash': raw_data_dict.get('content_hash', ''),
         'scraping_status': 'success',
         'scraped_at': datetime.now().isoformat(),
@@ -73,6 +61,104 @@ def save_scraped_product(
         'special_features': product_data.get('special_features'),
     }
 
+
+def _db_save_enabled() -> bool:
+    """環境変数に基づきDB保存を行うか判定"""
+    save_to_db = os.getenv("SAVE_TO_DB", "true").lower()
+    if save_to_db not in ("true", "1", "yes"):
+        logger.info("SAVE_TO_DB is disabled, skipping database save")
+        return False
+
+    if os.getenv("DEBUG_SKIP_DB", "false").lower() in ("true", "1", "yes"):
+        logger.info("DEBUG_SKIP_DB is enabled, skipping database save for debugging")
+        return False
+    return True
+
+
+def default_retry_max() -> int:
+    """
+    保存の最大試行回数
+
+    スプールが有効なら失敗したレコードは後で取り込めるため、バックオフで待たずに
+    DB_SPOOL_RETRY_MAX（既定1）回で諦める。
+    """
+    if get_spool() is not None:
+        return int(os.getenv("DB_SPOOL_RETRY_MAX", "1"))
+    return int(os.getenv("DB_RETRY_MAX", "5"))
+
+
+def _note_db_outage() -> None:
+    """接続失敗を記録し、DB_OUTAGE_COOLDOWN_SEC の間は接続を試みない"""
+    global _db_outage_until
+    if get_spool() is not None:
+        _db_outage_until = time.monotonic() + float(os.getenv("DB_OUTAGE_COOLDOWN_SEC", "30"))
+
+
+def _db_outage_active() -> bool:
+    return get_spool() is not None and time.monotonic() < _db_outage_until
+
+
+def spool_records(records: List[Dict[str, Any]], label: str = "") -> bool:
+    """
+    保存できなかったレコードをスプールへ書き出す
+
+    Returns:
+        bool: スプールできた場合 True（スプール無効・書き出し失敗時は False）
+    """
+    spool = get_spool()
+    if spool is None or not records:
+        return False
+    try:
+        spool.append(records, label=label)
+        return True
+    except Exception:
+        logger.exception(f"Failed to spool {len(records)} records; data will be lost")
+        return False
+
+
+def spool_scraped_products(
+    institution_code: str,
+    institution_name: str,
+    items: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+) -> bool:
+    """スクレイピング結果をDBを経由せずスプールへ書き出す"""
+    records = [
+        build_loan_data(institution_code, institution_name, product_data, raw_data_dict)
+        for product_data, raw_data_dict in items
+    ]
+    return spool_records(records, label=institution_code)
+
+
+def save_scraped_product(
+    institution_code: str,
+    institution_name: str,
+    product_data: Dict[str, Any],
+    raw_data_dict: Dict[str, Any],
+) -> bool:
+    """
+    スクレイピング結果をDBへ保存（環境変数に基づきスキップ/リトライ）
+
+    保存できなかった場合、スプールが有効ならレコードをスプールへ書き出す。
+    """
+    if not _db_save_enabled():
+        return True
+
+    # LoanDatabaseの期待する形式に整形
+    loan_data = build_loan_data(institution_code, institution_name, product_data, raw_data_dict)
+
+    # 直前に接続できなかった場合は接続を待たずにスプールする
+    if _db_outage_active():
+        spool_records([loan_data], label=institution_code)
+        return False
+
+    # DB設定の取得（フォールバック込み）
+    db_config = get_database_config()
+
+    # リトライ設定
+    retry_max = max(1, default_retry_max())
+    base_delay = float(os.getenv("DB_RETRY_BASE_DELAY", "1.0"))
+    connect_failed = False
+
     # 接続・保存（指数バックオフ）
     for attempt in range(retry_max):
         try:
@@ -81,14 +167,17 @@ def save_scraped_product(
                 logger.info(f"Waiting {delay} seconds before retry {attempt + 1}")
                 time.sleep(delay)
 
+            # 接続はプロセス共通プールから借りる（成功時は返却して次の商品で再利用）
             db = LoanDatabase(db_config)
             if not db.connect():
                 logger.warning(f"Database connection attempt {attempt + 1} failed (returned False)")
+                connect_failed = True
                 continue
+            connect_failed = False
 
+            saved_id = None
             try:
                 saved_id = db.save_loan_data(loan_data)
-                db.disconnect()
                 if saved_id:
                     logger.info(f"Successfully saved to database (raw_loan_data ID={saved_id})")
                     return True
@@ -97,13 +186,142 @@ def save_scraped_product(
             except Exception:
                 logger.exception("Save operation failed; will retry if attempts remain")
             finally:
+                # 失敗した接続は再利用せず破棄し、リトライでは新しい接続を使う
                 try:
-                    db.disconnect()
+                    db.disconnect(discard=not saved_id)
                 except Exception:
                     pass
         except Exception as e:
             logger.warning(f"Database attempt {attempt + 1} failed with exception: {e}")
 
     logger.error("All database save attempts failed")
+    if connect_failed:
+        _note_db_outage()
+    spool_records([loan_data], label=institution_code)
     return False
 
+
+def _bulk_save(records: List[Dict[str, Any]], flush_size: Optional[int] = None) -> List[Optional[int]]:
+    """build_loan_data 形式のレコードを一括保存（USE_DATA_API に応じて経路を選ぶ）"""
+    if os.getenv("USE_DATA_API", "false").lower() in ("true", "1", "yes"):
+        # Data API ではトランザクション内の batch_execute_statement でまとめて送る
+        try:
+            from .rds_data_api_adapter import RDSDataAPIAdapter
+        except ImportError:
+            from rds_data_api_adapter import RDSDataAPIAdapter
+        try:
+            return RDSDataAPIAdapter().save_loan_data_many(records, flush_size=flush_size)
+        except Exception:
+            logger.exception("Bulk save via Data API failed")
+            return [None] * len(records)
+
+    db = LoanDatabase(get_database_config())
+    if not db.connect():
+        logger.error("Database connection failed; bulk save skipped")
+        _note_db_outage()
+        return [None] * len(records)
+
+    ids: List[Optional[int]] = [None] * len(records)
+    try:
+        ids = db.save_loan_data_many(records, flush_size=flush_size)
+    except Exception:
+        logger.exception("Bulk save operation failed")
+    finally:
+        db.disconnect(discard=any(i is None for i in ids))
+    return ids
+
+
+def save_scraped_products(
+    institution_code: str,
+    institution_name: str,
+    items: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    flush_size: Optional[int] = None,
+    spool_failures: bool = True,
+) -> List[Optional[int]]:
+    """
+    1金融機関分のスクレイピング結果を一括保存
+
+    Args:
+        institution_code: 金融機関コード
+        institution_name: 金融機関名
+        items: (product_data, raw_data_dict) のリスト
+        flush_size: 1ステートメントあたりの最大件数
+        spool_failures: 保存できなかったレコードをスプールへ書き出すか
+            （呼び出し側で再試行する場合は False）
+
+    Returns:
+        List[Optional[int]]: 入力順の raw_loan_data.id（保存無効時・失敗時は None）
+    """
+    if not items or not _db_save_enabled():
+        return [None] * len(items)
+
+    records = [
+        build_loan_data(institution_code, institution_name, product_data, raw_data_dict)
+        for product_data, raw_data_dict in items
+    ]
+
+    if _db_outage_active():
+        ids: List[Optional[int]] = [None] * len(records)
+    else:
+        ids = _bulk_save(records, flush_size=flush_size)
+
+    if spool_failures:
+        spool_records([r for r, i in zip(records, ids) if i is None], label=institution_code)
+    return ids
+
+
+def replay_spool(
+    spool: Optional[Spool] = None,
+    flush_size: Optional[int] = None,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    スプールしたレコードを一括保存の経路で取り込む
+
+    セグメント単位で保存し、全件保存できたセグメントは削除する。一部だけ保存できた
+    場合は残りを新しいセグメントに書き直す。DBに接続できなければそこで止める。
+
+    Args:
+        spool: 取り込むスプール（既定: 環境変数の設定）
+        flush_size: 1ステートメントあたりの最大件数
+        dry_run: True なら件数を数えるだけで保存しない
+
+    Returns:
+        Dict[str, int]: segments / records / saved / remaining
+    """
+    spool = spool or get_spool()
+    stats = {"segments": 0, "records": 0, "saved": 0, "remaining": 0}
+    if spool is None:
+        logger.warning("SPOOL_STORE is not configured; nothing to replay")
+        return stats
+
+    segments = spool.segments()
+    for index, key in enumerate(segments):
+        records = spool.read(key)
+        stats["segments"] += 1
+        stats["records"] += len(records)
+        if dry_run:
+            stats["remaining"] += len(records)
+            continue
+
+        ids = _bulk_save(records, flush_size=flush_size)
+        failed = [r for r, i in zip(records, ids) if i is None]
+        stats["saved"] += len(records) - len(failed)
+        stats["remaining"] += len(failed)
+
+        if not failed:
+            spool.remove(key)
+        elif len(failed) < len(records):
+            spool.append(failed, label="replay")
+            spool.remove(key)
+        else:
+            logger.error(f"Replay of {key} failed; stopping until the database is available")
+            for rest in segments[index + 1:]:
+                count = len(spool.read(rest))
+                stats["segments"] += 1
+                stats["records"] += count
+                stats["remaining"] += count
+            break
+        logger.info(f"Replayed {key}: saved={len(records) - len(failed)}, failed={len(failed)}")
+
+    return stats
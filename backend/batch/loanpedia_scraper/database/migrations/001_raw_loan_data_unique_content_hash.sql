@@ -0,0 +1,57 @@
+-- raw_loan_data.content_hash を一意キー化する
+-- なぜ: 保存を INSERT ... ON DUPLICATE KEY UPDATE の1ラウンドトリップにし、
+--       並行ワーカーによる二重登録を防ぐため
+-- キーは商品の識別（金融機関ID・URL・商品名）と HTML 内容の SHA-256 を組み合わせたもの
+-- （loan_database.compute_content_hash と同じ計算）。1つのページ・PDF から取り出した
+-- 複数の商品は HTML 内容が同じでも別の行のまま残る。
+-- 既存の重複行（同じ商品・同じ内容）は最古IDに集約し、最新行の structured_data を引き継ぐ。
+-- processed_loan_data の参照は残す行へ付け替える。
+-- 適用: mysql -h <host> -u <user> -p app_db < 001_raw_loan_data_unique_content_hash.sql
+
+-- 1. ハッシュを商品の識別 + HTML 内容に統一（Data API 経路では空や別方式のハッシュが入っていた）
+UPDATE raw_loan_data
+SET content_hash = SHA2(CONCAT_WS('\n',
+        COALESCE(institution_id, ''),
+        COALESCE(source_url, ''),
+        COALESCE(NULLIF(JSON_UNQUOTE(JSON_EXTRACT(structured_data, '$.product_name')), 'null'), ''),
+        SHA2(COALESCE(html_content, ''), 256)
+    ), 256);
+
+-- 2. 重複グループを特定
+CREATE TEMPORARY TABLE tmp_raw_loan_data_dedup (
+    content_hash VARCHAR(64) PRIMARY KEY,
+    keep_id BIGINT NOT NULL,
+    latest_id BIGINT NOT NULL
+);
+
+INSERT INTO tmp_raw_loan_data_dedup (content_hash, keep_id, latest_id)
+SELECT content_hash, MIN(id), MAX(id)
+FROM raw_loan_data
+GROUP BY content_hash
+HAVING COUNT(*) > 1;
+
+-- 3. 残す行へ最新の構造化データを反映
+UPDATE raw_loan_data k
+JOIN tmp_raw_loan_data_dedup d ON k.id = d.keep_id
+JOIN raw_loan_data l ON l.id = d.latest_id
+SET k.structured_data = l.structured_data,
+    k.updated_at = l.updated_at;
+
+-- 4. AI処理済みデータの参照を残す行へ付け替え
+UPDATE processed_loan_data p
+JOIN raw_loan_data r ON p.raw_data_id = r.id
+JOIN tmp_raw_loan_data_dedup d ON r.content_hash = d.content_hash
+SET p.raw_data_id = d.keep_id
+WHERE r.id <> d.keep_id;
+
+-- 5. 重複行を削除
+DELETE r FROM raw_loan_data r
+JOIN tmp_raw_loan_data_dedup d ON r.content_hash = d.content_hash
+WHERE r.id <> d.keep_id;
+
+DROP TEMPORARY TABLE tmp_raw_loan_data_dedup;
+
+-- 6. 一意キーに置き換え
+ALTER TABLE raw_loan_data
+    DROP INDEX idx_hash,
+    ADD UNIQUE KEY uk_content_hash (content_hash);
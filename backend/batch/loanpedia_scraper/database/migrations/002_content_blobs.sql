@@ -0,0 +1,51 @@
+-- HTML / 抽出テキストを圧縮・重複排除した content_blobs に移す
+-- なぜ: raw_loan_data に非圧縮の LONGTEXT を行ごとに持つと、テーブルサイズと
+--       バッファプール・書き込みI/Oが本文サイズ分そのまま膨らむため
+-- 既存行は MySQL の COMPRESS() でバックフィルする（compression = 'mysql'）。
+-- 読み出し側は content_store.read_content / fetch_contents で透過的に復元する。
+-- 前提: 001_raw_loan_data_unique_content_hash.sql 適用済み
+-- 適用: mysql -h <host> -u <user> -p app_db < 002_content_blobs.sql
+
+-- 1. 本文ストア
+CREATE TABLE IF NOT EXISTS content_blobs (
+    content_hash CHAR(64) PRIMARY KEY COMMENT '本文のSHA-256',
+    compression VARCHAR(10) NOT NULL DEFAULT 'zlib' COMMENT '圧縮方式（zlib / none / mysql）',
+    original_length INT NOT NULL COMMENT '元サイズ（バイト）',
+    compressed_length INT NOT NULL COMMENT '保存サイズ（バイト）',
+    data LONGBLOB NOT NULL COMMENT '圧縮データ',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) COMMENT '圧縮本文ストア';
+
+-- 2. 参照列
+ALTER TABLE raw_loan_data
+    ADD COLUMN html_blob_hash CHAR(64) COMMENT 'HTML本文（content_blobs）' AFTER extracted_text,
+    ADD COLUMN text_blob_hash CHAR(64) COMMENT '抽出テキスト本文（content_blobs）' AFTER html_blob_hash;
+
+-- 3. HTML のバックフィル（raw_loan_data.content_hash は商品の識別を含むため本文のハッシュを計算し直す）
+INSERT INTO content_blobs (content_hash, compression, original_length, compressed_length, data)
+SELECT SHA2(html_content, 256), 'mysql', LENGTH(html_content), LENGTH(COMPRESS(html_content)), COMPRESS(html_content)
+FROM raw_loan_data
+WHERE html_content IS NOT NULL AND html_content <> ''
+ON DUPLICATE KEY UPDATE content_hash = content_blobs.content_hash;
+
+UPDATE raw_loan_data
+SET html_blob_hash = SHA2(html_content, 256),
+    html_content = NULL
+WHERE html_content IS NOT NULL AND html_content <> '';
+
+-- 4. 抽出テキストのバックフィル
+INSERT INTO content_blobs (content_hash, compression, original_length, compressed_length, data)
+SELECT SHA2(extracted_text, 256), 'mysql', LENGTH(extracted_text), LENGTH(COMPRESS(extracted_text)), COMPRESS(extracted_text)
+FROM raw_loan_data
+WHERE extracted_text IS NOT NULL AND extracted_text <> ''
+ON DUPLICATE KEY UPDATE content_hash = content_blobs.content_hash;
+
+UPDATE raw_loan_data
+SET text_blob_hash = SHA2(extracted_text, 256),
+    extracted_text = NULL
+WHERE extracted_text IS NOT NULL AND extracted_text <> '';
+
+-- 5. 外部キー
+ALTER TABLE raw_loan_data
+    ADD CONSTRAINT fk_raw_html_blob FOREIGN KEY (html_blob_hash) REFERENCES content_blobs(content_hash),
+    ADD CONSTRAINT fk_raw_text_blob FOREIGN KEY (text_blob_hash) REFERENCES content_blobs(content_hash);
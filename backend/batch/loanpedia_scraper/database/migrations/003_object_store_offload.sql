@@ -0,0 +1,14 @@
+-- 本文のオブジェクトストア退避に対応する
+-- なぜ: 大きな本文や元PDFを MySQL に持つと行サイズが膨らみ、Data API では
+--       ペイロード上限にもかかるため。退避時は content_blobs に storage_uri のみ残す
+-- 退避の有効化は環境変数 RAW_BODY_STORE（s3 / local）で行う（object_store.py 参照）
+-- 前提: 002_content_blobs.sql 適用済み
+-- 適用: mysql -h <host> -u <user> -p app_db < 003_object_store_offload.sql
+
+ALTER TABLE content_blobs
+    MODIFY COLUMN data LONGBLOB COMMENT '圧縮データ（オブジェクトストア退避時は NULL）',
+    ADD COLUMN storage_uri VARCHAR(1024) COMMENT '退避先URI（s3:// / file://）' AFTER data;
+
+ALTER TABLE raw_loan_data
+    ADD COLUMN source_blob_hash CHAR(64) COMMENT '元PDF（content_blobs。オブジェクトストア退避時のみ）' AFTER text_blob_hash,
+    ADD CONSTRAINT fk_raw_source_blob FOREIGN KEY (source_blob_hash) REFERENCES content_blobs(content_hash);
@@ -0,0 +1,18 @@
+-- raw_loan_data を AI 処理のワークキューとして使う
+-- なぜ: processed_loan_data との反結合で未処理行を探すと毎回走査が必要で、
+--       複数のAIワーカーを同時に動かすと同じ行を二重に処理するため。
+--       ワーカーは SELECT ... FOR UPDATE SKIP LOCKED でリース付きに行を取得する（work_queue.py 参照）
+-- 前提: MySQL 8.0 以上（SKIP LOCKED）
+-- 適用: mysql -h <host> -u <user> -p app_db < 004_ai_work_queue.sql
+
+ALTER TABLE raw_loan_data
+    ADD COLUMN ai_status ENUM('pending', 'done', 'failed') NOT NULL DEFAULT 'pending' COMMENT 'AI処理の状態' AFTER extraction_metadata,
+    ADD COLUMN ai_claimed_by VARCHAR(100) COMMENT 'AI処理中のワーカー' AFTER ai_status,
+    ADD COLUMN ai_available_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT 'AI処理の取得可能日時（取得中はリース期限）' AFTER ai_claimed_by,
+    ADD COLUMN ai_attempts INT NOT NULL DEFAULT 0 COMMENT 'AI処理の取得回数' AFTER ai_available_at,
+    ADD INDEX idx_ai_work (ai_status, ai_available_at);
+
+-- 既にAI処理済みの行はキューから外す
+UPDATE raw_loan_data r
+JOIN processed_loan_data p ON p.raw_data_id = r.id
+SET r.ai_status = 'done';
@@ -0,0 +1,11 @@
+-- processed_loan_data を要約キャッシュとして引けるようにする
+-- なぜ: 再取得で新しい raw_loan_data 行ができるたびに、構造化データが同じでも
+--       Bedrock で要約し直していたため。キャッシュキーが一致する完了済みの要約を流用する
+--       （ai_processing_batch.py の summary_cache_key / PROMPT_VERSION 参照）
+-- 前提: なし（既存行はキーが NULL のためキャッシュ対象外）
+-- 適用: mysql -h <host> -u <user> -p app_db < 005_summary_cache.sql
+
+ALTER TABLE processed_loan_data
+    MODIFY COLUMN processing_version VARCHAR(20) COMMENT '処理バージョン（プロンプトのバージョン）',
+    ADD COLUMN summary_cache_key CHAR(64) COMMENT '要約キャッシュキー（構造化データ・金融機関・モデル・プロンプトのハッシュ）' AFTER processing_version,
+    ADD INDEX idx_summary_cache (summary_cache_key);
@@ -0,0 +1,12 @@
+-- processed_loan_data に AI呼び出しごとのトークン数・所要時間を記録する
+-- なぜ: 要約1件あたりの費用・待ち時間が分からず、プロンプト削減やモデル選択の効果を測れなかったため
+--       （ai_usage.py の UsageMetrics 参照。キャッシュ流用・同一データの行は呼び出しがないため NULL）
+-- 前提: 005_summary_cache.sql 適用済み
+-- 適用: mysql -h <host> -u <user> -p app_db < 006_ai_usage.sql
+
+ALTER TABLE processed_loan_data
+    ADD COLUMN input_tokens INT UNSIGNED COMMENT 'AI呼び出しの入力トークン数（キャッシュ読み込み分を除く）' AFTER summary_cache_key,
+    ADD COLUMN output_tokens INT UNSIGNED COMMENT 'AI呼び出しの出力トークン数' AFTER input_tokens,
+    ADD COLUMN cache_read_input_tokens INT UNSIGNED COMMENT 'プロンプトキャッシュから読んだ入力トークン数' AFTER output_tokens,
+    ADD COLUMN latency_ms INT UNSIGNED COMMENT 'AI呼び出しの所要時間（ミリ秒）' AFTER cache_read_input_tokens,
+    ADD COLUMN ai_retries TINYINT UNSIGNED COMMENT 'AI呼び出しの再試行回数' AFTER latency_ms;
@@ -0,0 +1,12 @@
+-- 統合処理のワーカーごとのウォーターマーク
+-- なぜ: 未統合データを loan_products との反結合で探すと、processed_loan_data が増えるほど
+--       毎回の走査が重くなるため。差分モードでは最終統合済みの processed_loan_data.id より
+--       大きい行だけを主キーの範囲で読む（product_integration_batch.py の --incremental 参照）
+-- 前提: なし（行がないワーカーは 0 から読む）
+-- 適用: mysql -h <host> -u <user> -p app_db < 007_integration_watermarks.sql
+
+CREATE TABLE IF NOT EXISTS integration_watermarks (
+    worker_id VARCHAR(100) PRIMARY KEY COMMENT '統合処理のワーカーID',
+    last_processed_id BIGINT NOT NULL DEFAULT 0 COMMENT '統合済みの最大 processed_loan_data.id',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) COMMENT '統合処理ウォーターマークテーブル';
@@ -0,0 +1,17 @@
+-- 差分統合で失敗した processed_loan_data の試行回数とデッドレター
+-- なぜ: 失敗した行の手前でウォーターマークを止めるだけだと、必ず失敗する行が1件あるだけで
+--       差分統合がそれ以降に進めなくなるため。INTEGRATION_MAX_ATTEMPTS 回失敗した行は
+--       デッドレターとしてウォーターマークを通過させ、--retry-dead-letters で個別に再試行する
+-- 前提: 007_integration_watermarks.sql
+-- 適用: mysql -h <host> -u <user> -p app_db < 008_integration_failures.sql
+
+CREATE TABLE IF NOT EXISTS integration_failures (
+    worker_id VARCHAR(100) NOT NULL COMMENT '統合処理のワーカーID',
+    processed_data_id BIGINT NOT NULL COMMENT '失敗した processed_loan_data.id',
+    attempts INT NOT NULL DEFAULT 1 COMMENT '失敗した回数',
+    last_error TEXT COMMENT '最後のエラー',
+    dead_lettered_at TIMESTAMP NULL COMMENT 'デッドレターにした日時（NULL なら次回の差分統合で再試行）',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (worker_id, processed_data_id),
+    INDEX idx_dead_lettered (worker_id, dead_lettered_at)
+) COMMENT '統合処理失敗テーブル';
@@ -0,0 +1,197 @@
+"""
+AI処理のワークキュー（raw_loan_data のリース付き取得）
+
+未処理行を processed_loan_data との反結合で毎回探すと、行が増えるほど走査が重く、
+複数ワーカーを同時に動かすと同じ行を二重に処理してしまう。raw_loan_data の
+ai_status / ai_available_at をキューとして使い、
+SELECT ... FOR UPDATE SKIP LOCKED で行をリース付きで取得する。
+
+- 取得可能: ai_status = 'pending' かつ ai_available_at <= NOW()
+- 取得時: ai_available_at をリース期限（NOW() + lease）に進め、ai_claimed_by を記録
+- 完了時: ai_status = 'done'（processed_loan_data の保存と同じトランザクション）
+- 失敗時: すぐ取得可能に戻す（取得回数が上限に達したら 'failed'）
+- ワーカーが落ちた場合はリース期限の経過後に他のワーカーが取得する
+  （取得回数が上限に達した行は、取得時にリース期限切れのものを 'failed' にする）
+
+時刻はすべてDB側の NOW() を使い、ワーカー間の時計のずれの影響を受けない。
+"""
+
+import logging
+import os
+import socket
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SELECT_SQL = """
+    SELECT id FROM raw_loan_data
+    WHERE ai_status = 'pending' AND ai_available_at <= NOW() AND ai_attempts < %s
+    ORDER BY ai_available_at
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+# 取得回数が上限に達したままリース期限が切れた行（最後の取得でワーカーが落ちた）を失敗にする
+EXPIRE_EXHAUSTED_SQL = """
+    UPDATE raw_loan_data
+    SET ai_status = 'failed', ai_claimed_by = NULL
+    WHERE ai_status = 'pending' AND ai_available_at <= NOW() AND ai_attempts >= %s
+    LIMIT %s
+"""
+
+
+def default_worker_id() -> str:
+    """ワーカーID（環境変数 AI_WORKER_ID、未設定なら ホスト名-PID）"""
+    return os.getenv('AI_WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class RawDataWorkQueue:
+    """raw_loan_data を対象にしたリース付きワークキュー"""
+
+    def __init__(
+        self,
+        connection,
+        worker_id: Optional[str] = None,
+        lease_seconds: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+    ):
+        """
+        初期化
+
+        Args:
+            connection: pymysql の接続
+            worker_id: リースの所有者（既定: default_worker_id()）
+            lease_seconds: リース期間（既定: 環境変数 AI_LEASE_SECONDS または 900）
+            max_attempts: 取得回数の上限（既定: 環境変数 AI_MAX_ATTEMPTS または 3）
+        """
+        self.connection = connection
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds or int(os.getenv('AI_LEASE_SECONDS', '900'))
+        self.max_attempts = max_attempts or int(os.getenv('AI_MAX_ATTEMPTS', '3'))
+
+    def claim(self, limit: int) -> List[int]:
+        """
+        未処理行を最大 limit 件リース付きで取得（短いトランザクションで確定）
+
+        Returns:
+            List[int]: 取得した raw_loan_data.id
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(EXPIRE_EXHAUSTED_SQL, (self.max_attempts, limit))
+            if cursor.rowcount:
+                logger.warning(f"Marked {cursor.rowcount} raw_loan_data rows failed after {self.max_attempts} attempts")
+            cursor.execute(CLAIM_SELECT_SQL, (self.max_attempts, limit))
+            ids = [row['id'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()]
+            if ids:
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(
+                    f"""
+                    UPDATE raw_loan_data
+                    SET ai_claimed_by = %s,
+                        ai_available_at = NOW() + INTERVAL %s SECOND,
+                        ai_attempts = ai_attempts + 1
+                    WHERE id IN ({placeholders})
+                    """,
+                    (self.worker_id, self.lease_seconds, *ids),
+                )
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        if ids:
+            logger.info(f"Claimed {len(ids)} raw_loan_data rows as {self.worker_id}")
+        return ids
+
+    def complete(self, raw_data_id: int) -> bool:
+        """
+        処理完了を記録（コミットは呼び出し側で processed_loan_data と一緒に行う）
+
+        Returns:
+            bool: リースを保持していた場合 True（期限切れで他に取られていれば False）
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                """
+                UPDATE raw_loan_data
+                SET ai_status = 'done', ai_claimed_by = NULL
+                WHERE id = %s AND ai_claimed_by = %s AND ai_status = 'pending'
+                """,
+                (raw_data_id, self.worker_id),
+            )
+            return cursor.rowcount == 1
+        finally:
+            cursor.close()
+
+    def lock_held(self, raw_data_ids: List[int]) -> List[int]:
+        """
+        このワーカーがまだリースを保持している行をロックして返す（コミットは呼び出し側）
+
+        ロックしたまま complete_many と processed_loan_data の保存を行えば、
+        途中で他のワーカーに取られることはない。
+        """
+        if not raw_data_ids:
+            return []
+        placeholders = ', '.join(['%s'] * len(raw_data_ids))
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                f"""
+                SELECT id FROM raw_loan_data
+                WHERE id IN ({placeholders}) AND ai_claimed_by = %s AND ai_status = 'pending'
+                FOR UPDATE
+                """,
+                (*raw_data_ids, self.worker_id),
+            )
+            return [row['id'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def complete_many(self, raw_data_ids: List[int]) -> int:
+        """
+        複数行の処理完了を記録（コミットは呼び出し側）
+
+        Returns:
+            int: リースを保持していて完了にできた行数
+        """
+        if not raw_data_ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(raw_data_ids))
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                f"""
+                UPDATE raw_loan_data
+                SET ai_status = 'done', ai_claimed_by = NULL
+                WHERE id IN ({placeholders}) AND ai_claimed_by = %s AND ai_status = 'pending'
+                """,
+                (*raw_data_ids, self.worker_id),
+            )
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def release(self, raw_data_id: int) -> None:
+        """処理に失敗した行をすぐ取得可能に戻す（取得回数が上限なら failed）"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(
+                """
+                UPDATE raw_loan_data
+                SET ai_status = IF(ai_attempts >= %s, 'failed', 'pending'),
+                    ai_claimed_by = NULL,
+                    ai_available_at = NOW()
+                WHERE id = %s AND ai_claimed_by = %s
+                """,
+                (self.max_attempts, raw_data_id, self.worker_id),
+            )
+            self.connection.commit()
+        except Exception as e:
+            logger.warning(f"Failed to release raw_data_id {raw_data_id}; lease will expire: {e}")
+            self.connection.rollback()
+        finally:
+            cursor.close()
@@ -10,9 +10,9 @@ import io
 import re
 import os
 import requests
-import pdfplumber
 
 from .extractors import zenkaku_to_hankaku, clean_rate_cell
+from ..common.pdf_stream import iter_pdf_pages
 
 z2h = zenkaku_to_hankaku
 
@@ -53,15 +53,9 @@ def find_col_index(header_cells: List[str], candidates: List[str]) -> Optional[i
 
 def extract_tables_pdfplumber(pdf_bytes: bytes) -> List[Tuple[int, List[List[str]]]]:
     results: List[Tuple[int, List[List[str]]]] = []
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        for pi, page in enumerate(pdf.pages):
-            try:
-                tables = page.extract_tables()
-            except Exception:
-                tables = []
-            for t in tables or []:
-                norm = [[("" if c is None else str(c)) for c in row] for row in t]
-                results.append((pi, norm))
+    for page in iter_pdf_pages(pdf_bytes, with_text=False, with_tables=True):
+        for t in page.tables:
+            results.append((page.page_index, t))
     return results
 
 
@@ -119,15 +113,14 @@ def table_to_records(table: List[List[str]], source_url: str, page_index: int, a
 def extract_from_pdf_url(url: str) -> List[Dict[str, Any]]:
     pdf_bytes = requests.get(url, timeout=30).content
 
+    # 日付推定用テキストと表を1パスで取得（ページごとにキャッシュを解放）
     as_of: Optional[str] = None
-    try:
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            all_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
-            as_of = guess_date(all_text) or as_of
-    except Exception:
-        pass
-
-    tables = extract_tables_pdfplumber(pdf_bytes)
+    tables: List[Tuple[int, List[List[str]]]] = []
+    for page in iter_pdf_pages(pdf_bytes, with_text=True, with_tables=True):
+        if as_of is None and page.text:
+            as_of = guess_date(page.text)
+        for t in page.tables:
+            tables.append((page.page_index, t))
     cands = pick_candidate_tables(tables, topk=4)
 
     records: List[Dict[str, Any]] = []
@@ -104,6 +104,7 @@ class AoimoriShinkinScraper:
                 if "max_loan_term_months" in loan_data and "max_loan_period_months" not in loan_data:
                     loan_data["max_loan_period_months"] = loan_data["max_loan_term_months"]
 
+                # LoanDatabase はプロセス共通の接続プールから接続を借りて返却する
                 with LoanDatabase(self.db_config) as db:  # type: ignore
                     if db:
                         saved_id = db.save_loan_data(loan_data)  # type: ignore
@@ -1,12 +1,15 @@
 # loan_scraper/pdf_parser.py
 # -*- coding: utf-8 -*-
 from typing import Dict, Tuple, Optional
-import io
 import logging
-import pdfplumber
 
 logger = logging.getLogger(__name__)
 
+try:
+    from loanpedia_scraper.scrapers.common.pdf_stream import iter_pdf_pages
+except ImportError:
+    from ..common.pdf_stream import iter_pdf_pages
+
 try:
     from loanpedia_scraper.scrapers.aomori_michinoku_bank.extractors import extract_age, to_month_range
 except ImportError:
@@ -16,11 +19,8 @@ except ImportError:
 
 
 def pdf_bytes_to_text(b: bytes) -> str:
-    pages = []
-    with pdfplumber.open(io.BytesIO(b)) as pdf:
-        for p in pdf.pages:
-            pages.append(p.extract_text() or "")
-    return "\n".join(pages)
+    # ページ単位で解析・解放し、レイアウトオブジェクトを溜め込まない
+    return "\n".join(p.text or "" for p in iter_pdf_pages(b))
 
 
 def extract_pdf_fields(pdf_text: str) -> Dict:
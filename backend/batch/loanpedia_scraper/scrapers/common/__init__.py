@@ -6,9 +6,17 @@ from .utils import (
     apply_sanity,
     extract_specials,
 )
+from .pdf_stream import (
+    PdfPageResult,
+    PdfStreamStats,
+    iter_pdf_pages,
+)
 
 __all__ = [
     "merge_fields",
     "apply_sanity",
     "extract_specials",
+    "PdfPageResult",
+    "PdfStreamStats",
+    "iter_pdf_pages",
 ]
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+ページ単位ストリーミングPDFリーダー
+
+pdfplumber はページの解析結果（文字・罫線などのレイアウトオブジェクト）を
+ドキュメントを閉じるまで保持し続けるため、大きなPDFでは全ページ分が
+メモリに積み上がる。ここでは1ページずつ結果を yield し、処理済みページの
+キャッシュを明示的に解放することで、ページ数に依存しないメモリ使用量で処理する。
+"""
+
+import io
+import logging
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional
+
+import pdfplumber
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PdfPageResult:
+    """1ページ分の抽出結果"""
+    page_index: int
+    text: Optional[str] = None
+    tables: List[List[List[str]]] = field(default_factory=list)
+
+
+@dataclass
+class PdfStreamStats:
+    """1ドキュメント分の処理統計"""
+    pages: int = 0
+    start_rss_bytes: Optional[int] = None
+    peak_rss_bytes: Optional[int] = None
+
+    @property
+    def peak_rss_mb(self) -> Optional[float]:
+        if self.peak_rss_bytes is None:
+            return None
+        return round(self.peak_rss_bytes / (1024 * 1024), 1)
+
+
+def current_rss_bytes() -> Optional[int]:
+    """
+    現在のプロセスの常駐メモリ量（RSS）をバイトで返す
+
+    Linux では /proc/self/statm から現在値を取得する。取得できない環境では
+    getrusage のプロセス累計ピーク値で代用し、それも無ければ None を返す。
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    if resource is None:
+        return None
+    try:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except Exception:
+        return None
+    # macOS はバイト、Linux はキロバイト単位
+    return int(maxrss) if sys.platform == "darwin" else int(maxrss) * 1024
+
+
+def _release_page(page) -> None:
+    """ページが保持するレイアウトキャッシュを解放"""
+    try:
+        page.close()
+    except AttributeError:
+        # 古い pdfplumber には Page.close が無い
+        try:
+            page.flush_cache()
+        except Exception:
+            pass
+    except Exception:
+        pass
+
+
+def iter_pdf_pages(
+    pdf_bytes: bytes,
+    with_text: bool = True,
+    with_tables: bool = False,
+    normalize: Optional[Callable[[str], str]] = None,
+    stats: Optional[PdfStreamStats] = None,
+) -> Iterator[PdfPageResult]:
+    """
+    PDFを1ページずつ解析して結果を yield する
+
+    各ページの処理後にそのページのキャッシュを解放するため、呼び出し側が
+    結果を溜め込まない限りメモリ使用量はページ数に比例しない。
+
+    Args:
+        pdf_bytes: PDFのバイトデータ
+        with_text: ページテキストを抽出するか
+        with_tables: ページ内の表を抽出するか
+        normalize: 抽出テキストに適用する正規化関数
+        stats: 統計の書き込み先（ページ数・ピークRSS）
+
+    Yields:
+        PdfPageResult: ページ単位の抽出結果
+    """
+    if stats is None:
+        stats = PdfStreamStats()
+    stats.start_rss_bytes = current_rss_bytes()
+    stats.peak_rss_bytes = stats.start_rss_bytes
+
+    def _sample() -> None:
+        rss = current_rss_bytes()
+        if rss is not None and (stats.peak_rss_bytes is None or rss > stats.peak_rss_bytes):
+            stats.peak_rss_bytes = rss
+
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for pi, page in enumerate(pdf.pages):
+            result = PdfPageResult(page_index=pi)
+            try:
+                if with_text:
+                    try:
+                        text = page.extract_text() or ""
+                    except Exception as e:
+                        logger.warning(f"ページ {pi + 1} テキスト抽出エラー: {e}")
+                        text = ""
+                    result.text = normalize(text) if normalize else text
+                if with_tables:
+                    try:
+                        tables = page.extract_tables()
+                    except Exception:
+                        tables = []
+                    for t in tables or []:
+                        result.tables.append(
+                            [[("" if c is None else str(c)) for c in row] for row in t]
+                        )
+            finally:
+                _sample()
+                _release_page(page)
+            stats.pages += 1
+            yield result
+
+    logger.info(
+        f"PDF処理完了: {stats.pages}ページ, ピークRSS={stats.peak_rss_mb}MB"
+    )
+
@@ -308,7 +308,7 @@ class TououShinkinScraper:
                         errors.append({"source": "db", "url": u, "error": f"pdf fetch/parse failed: {e}"})
                         continue
 
-                    raw = {"source_url": u, "html_content": txt, "extracted_text": txt}
+                    raw = {"source_url": u, "html_content": txt, "extracted_text": txt, "source_bytes": b}
                     for it in items:
                         try:
                             ok = bool(save_scraped_product(inst_code, inst_name, it, raw))  # type: ignore[arg-type]
@@ -334,18 +334,44 @@ def get_product_info() -> Dict[str, str]:
 
 
 # ========== 実行ロジック ==========
-def _save_to_database(product_data: Dict[str, Any], raw_data_dict: Dict[str, Any]) -> bool:
-    """
-    スクレイピング結果をデータベースに保存（サービス層に統一）
-    """
-    # 保存制御フラグ
+def _db_save_enabled() -> bool:
+    """保存制御フラグ（SAVE_TO_DB / DEBUG_SKIP_DB）"""
     save_to_db = os.getenv("SAVE_TO_DB", "true").lower()
     if save_to_db not in ("true", "1", "yes"):
         logger.info("SAVE_TO_DB is disabled, skipping database save")
-        return True
+        return False
 
     if os.getenv("DEBUG_SKIP_DB", "false").lower() in ("true", "1", "yes"):
         logger.info("DEBUG_SKIP_DB is enabled, skipping database save for debugging")
+        return False
+    return True
+
+
+def _create_writer():
+    """
+    DB保存用のバックグラウンドライターを起動（保存無効・非同期無効なら None）
+
+    DB_ASYNC_WRITE=false で従来どおり商品ごとに同期保存する。
+    """
+    if not _db_save_enabled():
+        return None
+    if os.getenv("DB_ASYNC_WRITE", "true").lower() not in ("true", "1", "yes"):
+        return None
+    try:
+        from loanpedia_scraper.database.background_writer import BackgroundWriter
+    except ImportError:
+        from database.background_writer import BackgroundWriter  # type: ignore
+    return BackgroundWriter(
+        institution_code="aomori_michinoku",
+        institution_name="青森みちのく銀行",
+    ).start()
+
+
+def _save_to_database(product_data: Dict[str, Any], raw_data_dict: Dict[str, Any]) -> bool:
+    """
+    スクレイピング結果をデータベースに保存（サービス層に統一）
+    """
+    if not _db_save_enabled():
         return True
 
     # 正規化と保存はサービス層へ委譲
@@ -380,9 +406,10 @@ def _save_to_database(product_data: Dict[str, Any], raw_data_dict: Dict[str, Any
         return False
 
 
-def _run_one(product_key: str, reg: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+def _run_one(product_key: str, reg: Dict[str, Dict[str, Any]], writer=None) -> Dict[str, Any]:
     """
     単一スクレイパーを実行して結果を標準化。
+    writer 指定時はDB保存をキューに積むだけで次の商品へ進む（db_saved は _run_many で確定）。
     戻り値:
       {
         "product": "mycar",
@@ -405,7 +432,11 @@ def _run_one(product_key: str, reg: Dict[str, Dict[str, Any]]) -> Dict[str, Any]
             
             # データベースに保存
             raw_data = result.get("raw_data", {})
-            db_saved = _save_to_database(result, raw_data)
+            if writer is not None:
+                writer.submit(result, raw_data, key=product_key)
+                db_saved = None
+            else:
+                db_saved = _save_to_database(result, raw_data)
             
             return {
                 "product": product_key,
@@ -441,27 +472,41 @@ def _run_many(targets: List[str]) -> Tuple[List[Dict[str, Any]], int, int]:
     results: List[Dict[str, Any]] = []
     ok = 0
     ng = 0
-    for key in targets:
-        if key not in reg:
-            results.append(
-                {
-                    "product": key,
-                    "product_name": "(unknown)",
-                    "success": False,
-                    "result": None,
-                    "error": f"Unknown product: {key}",
-                }
-            )
-            ng += 1
-            continue
-        r = _run_one(key, reg)
-        results.append(r)
-        if r["success"]:
-            ok += 1
-        else:
-            ng += 1
-        # 過負荷防止とデータベース負荷軽減
-        time.sleep(SCRAPE_SLEEP_SEC)
+    writer = _create_writer()
+    try:
+        for key in targets:
+            if key not in reg:
+                results.append(
+                    {
+                        "product": key,
+                        "product_name": "(unknown)",
+                        "success": False,
+                        "result": None,
+                        "error": f"Unknown product: {key}",
+                    }
+                )
+                ng += 1
+                continue
+            r = _run_one(key, reg, writer)
+            results.append(r)
+            if r["success"]:
+                ok += 1
+            else:
+                ng += 1
+            # 過負荷防止（DB保存はライタースレッドが並行して行う）
+            time.sleep(SCRAPE_SLEEP_SEC)
+    finally:
+        if writer is not None:
+            # 残りを書き切ってから商品ごとの保存結果を反映
+            outcomes = writer.close()
+            for r in results:
+                outcome = outcomes.get(r["product"])
+                if outcome is not None:
+                    r["db_saved"] = outcome.success
+                    r["db_raw_data_id"] = outcome.raw_data_id
+                    if not outcome.success:
+                        r["db_error"] = outcome.error
+                        r["db_spooled"] = outcome.spooled
     return results, ok, ng
 
 
@@ -531,6 +576,9 @@ def _dispatch(evt: Dict[str, Any]) -> Dict[str, Any]:
         "total_products": len(targets),
         "success_count": ok,
         "error_count": ng,
+        "db_saved_count": sum(1 for r in results if r.get("db_saved") is True),
+        "db_failed_count": sum(1 for r in results if r.get("db_saved") is False),
+        "db_spooled_count": sum(1 for r in results if r.get("db_spooled")),
     }
     body = {
         "success": overall_success,
@@ -141,7 +141,23 @@ def _save(product_data: Dict[str, Any], raw_data_dict: Dict[str, Any]) -> bool:
     )
 
 
-def _run_one(product_key: str, reg: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+def _create_writer():
+    """DB保存用のバックグラウンドライターを起動（保存無効・DB_ASYNC_WRITE=false なら None）"""
+    if os.getenv("SAVE_TO_DB", "true").lower() not in ("true", "1", "yes"):
+        return None
+    if os.getenv("DEBUG_SKIP_DB", "false").lower() in ("true", "1", "yes"):
+        return None
+    if os.getenv("DB_ASYNC_WRITE", "true").lower() not in ("true", "1", "yes"):
+        return None
+    from database.background_writer import BackgroundWriter
+
+    return BackgroundWriter(
+        institution_code="aomori_michinoku",
+        institution_name="青森みちのく銀行",
+    ).start()
+
+
+def _run_one(product_key: str, reg: Dict[str, Dict[str, Any]], writer=None) -> Dict[str, Any]:
     info = reg[product_key]
     name = info["name"]
     cls = info["cls"]
@@ -153,7 +169,12 @@ def _run_one(product_key: str, reg: Dict[str, Dict[str, Any]]) -> Dict[str, Any]
         if result and result.get("scraping_status") == "success":
             logger.info(f"✅ {name} のスクレイピング成功")
             raw_data = result.get("raw_data", {})
-            db_saved = _save(result, raw_data)
+            if writer is not None:
+                # 保存はライタースレッドに任せて次の商品へ進む（結果は _run_many で反映）
+                writer.submit(result, raw_data, key=product_key)
+                db_saved = None
+            else:
+                db_saved = _save(result, raw_data)
             return {
                 "product": product_key,
                 "product_name": name,
@@ -188,12 +209,25 @@ def _run_many(targets: List[str]) -> Tuple[List[Dict[str, Any]], int, int]:
     results: List[Dict[str, Any]] = []
     ok = 0
     ng = 0
-    for key in targets:
-        r = _run_one(key, reg)
-        results.append(r)
-        ok += 1 if r["success"] else 0
-        ng += 0 if r["success"] else 1
-        time.sleep(float(os.getenv("SCRAPE_SLEEP_SEC", "2.0")))
+    writer = _create_writer()
+    try:
+        for key in targets:
+            r = _run_one(key, reg, writer)
+            results.append(r)
+            ok += 1 if r["success"] else 0
+            ng += 0 if r["success"] else 1
+            time.sleep(float(os.getenv("SCRAPE_SLEEP_SEC", "2.0")))
+    finally:
+        if writer is not None:
+            outcomes = writer.close()
+            for r in results:
+                outcome = outcomes.get(r["product"])
+                if outcome is not None:
+                    r["db_saved"] = outcome.success
+                    r["db_raw_data_id"] = outcome.raw_data_id
+                    if not outcome.success:
+                        r["db_error"] = outcome.error
+                        r["db_spooled"] = outcome.spooled
     return results, ok, ng
 
 
@@ -254,6 +288,9 @@ def run(event: Any) -> Dict[str, Any]:
             "total_products": len(targets),
             "success_count": ok,
             "error_count": ng,
+            "db_saved_count": sum(1 for r in results if r.get("db_saved") is True),
+            "db_failed_count": sum(1 for r in results if r.get("db_saved") is False),
+            "db_spooled_count": sum(1 for r in results if r.get("db_spooled")),
         },
         "results": results,
         "timestamp": datetime.now().isoformat(),
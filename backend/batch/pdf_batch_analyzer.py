@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# /pdf_batch_analyzer.py
+# PDFScraperを用いたPDF一括解析（ディレクトリ/グロブ/URLリスト → JSONL）
+# なぜ: 過去に取得した金融機関PDFを大量に素早く仕分けるため
+# 関連: pdf_scraper.py
+"""
+PDF一括解析バッチ: 複数のPDFを並列に解析し、結果をJSONLでストリーム出力する
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+from pdf_scraper import PDFScraper
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PDFAnalysisResult:
+    """1ドキュメント分の解析結果"""
+    source: str
+    success: bool
+    pages: int = 0
+    chars: int = 0
+    elapsed_seconds: float = 0.0
+    matches: List[Dict] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def to_json_line(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+
+def is_url(source: str) -> bool:
+    return source.startswith('http://') or source.startswith('https://')
+
+
+def collect_sources(inputs: Iterable[str], url_list: Optional[str] = None) -> List[str]:
+    """
+    入力指定を解析対象のPDFパス/URL一覧に展開
+
+    Args:
+        inputs: ディレクトリ・グロブパターン・ファイル・URLの混在リスト
+        url_list: 1行1URL（またはパス）のリストファイル。'#'始まりはコメント
+
+    Returns:
+        List[str]: 重複を除いた解析対象一覧（指定順）
+    """
+    sources: List[str] = []
+
+    for item in inputs:
+        if is_url(item):
+            sources.append(item)
+        elif os.path.isdir(item):
+            sources.extend(
+                str(p) for p in sorted(Path(item).rglob('*'))
+                if p.is_file() and p.suffix.lower() == '.pdf'
+            )
+        elif glob.has_magic(item):
+            sources.extend(sorted(glob.glob(item, recursive=True)))
+        else:
+            sources.append(item)
+
+    if url_list:
+        with open(url_list, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    sources.append(line)
+
+    return list(dict.fromkeys(sources))
+
+
+def analyze_source(source: str, timeout: int = 30, scraper: Optional[PDFScraper] = None) -> PDFAnalysisResult:
+    """
+    1ドキュメントを解析（プロセスプールから呼べるようモジュール関数として定義）
+
+    Args:
+        source: PDFのパスまたはURL
+        timeout: URL取得のタイムアウト秒数
+        scraper: 使用するPDFScraper（省略時は新規作成）
+
+    Returns:
+        PDFAnalysisResult: 解析結果
+    """
+    scraper = scraper or PDFScraper()
+    started = time.perf_counter()
+    try:
+        if is_url(source):
+            extracted = scraper.extract_text_from_url(source, timeout=timeout)
+        else:
+            extracted = scraper.extract_text_from_file(source)
+
+        matches: List[Dict] = []
+        if extracted.get('success'):
+            matches = scraper.find_loan_matches_in_pages(extracted.get('page_texts', []))
+
+        return PDFAnalysisResult(
+            source=source,
+            success=bool(extracted.get('success')),
+            pages=extracted.get('pages', 0),
+            chars=len(extracted.get('text', '')),
+            elapsed_seconds=round(time.perf_counter() - started, 4),
+            matches=matches,
+            error=extracted.get('error'),
+        )
+    except Exception as e:
+        return PDFAnalysisResult(
+            source=source,
+            success=False,
+            elapsed_seconds=round(time.perf_counter() - started, 4),
+            error=str(e),
+        )
+
+
+class PDFBatchAnalyzer:
+    """複数PDFを並列解析するクラス"""
+
+    def __init__(self, max_workers: int = 4, use_processes: bool = False, timeout: int = 30):
+        """
+        初期化
+
+        Args:
+            max_workers: 並列数
+            use_processes: Trueならプロセスプール（CPUバウンドな解析向け）、
+                Falseならスレッドプール（URL取得などI/O待ち向け）
+            timeout: URL取得のタイムアウト秒数
+        """
+        self.max_workers = max(1, max_workers)
+        self.use_processes = use_processes
+        self.timeout = timeout
+        # スレッド実行時はロガー等を共有するため1インスタンスを使い回す
+        self.scraper = None if use_processes else PDFScraper()
+
+    def _create_executor(self) -> Executor:
+        if self.use_processes:
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def iter_results(self, sources: Iterable[str]) -> Iterator[PDFAnalysisResult]:
+        """
+        解析結果を完了順に yield する
+
+        同時に保持する未完了タスクは並列数の2倍までに抑え、
+        大量の入力でもPDF本体や結果をメモリに溜め込まない。
+        """
+        source_iter = iter(sources)
+        max_in_flight = self.max_workers * 2
+
+        with self._create_executor() as executor:
+            pending = set()
+
+            def _fill():
+                while len(pending) < max_in_flight:
+                    try:
+                        source = next(source_iter)
+                    except StopIteration:
+                        return
+                    if self.use_processes:
+                        pending.add(executor.submit(analyze_source, source, self.timeout))
+                    else:
+                        pending.add(executor.submit(analyze_source, source, self.timeout, self.scraper))
+
+            _fill()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                _fill()
+
+    def run(self, sources: Iterable[str], out: TextIO) -> Dict[str, float]:
+        """
+        一括解析を実行し、結果をJSONLで書き出す
+
+        Args:
+            sources: 解析対象一覧
+            out: JSONLの出力先
+
+        Returns:
+            Dict: スループットを含む実行サマリー
+        """
+        started = time.perf_counter()
+        documents = succeeded = pages = match_count = 0
+
+        for result in self.iter_results(sources):
+            out.write(result.to_json_line() + '\n')
+            out.flush()
+            documents += 1
+            pages += result.pages
+            match_count += len(result.matches)
+            if result.success:
+                succeeded += 1
+            else:
+                logger.warning(f"解析失敗: {result.source} - {result.error}")
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            'documents': documents,
+            'succeeded': succeeded,
+            'failed': documents - succeeded,
+            'pages': pages,
+            'matches': match_count,
+            'elapsed_seconds': round(elapsed, 3),
+            'docs_per_second': round(documents / elapsed, 3) if elapsed > 0 else 0.0,
+            'pages_per_second': round(pages / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+        logger.info(
+            f"一括解析完了: {documents}件 ({summary['docs_per_second']} docs/s, "
+            f"{summary['pages_per_second']} pages/s)"
+        )
+        return summary
+
+
+def main():
+    """メイン処理"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='PDF一括解析バッチ')
+    parser.add_argument('inputs', nargs='*', help='PDFファイル・ディレクトリ・グロブパターン・URL')
+    parser.add_argument('--url-list', type=str, help='1行1URL（またはパス）のリストファイル')
+    parser.add_argument('--output', '-o', type=str, help='JSONL出力先 (default: 標準出力)')
+    parser.add_argument('--workers', type=int, default=4, help='並列数 (default: 4)')
+    parser.add_argument('--processes', action='store_true', help='スレッドではなくプロセスで並列化')
+    parser.add_argument('--timeout', type=int, default=30, help='URL取得のタイムアウト秒数 (default: 30)')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr,
+    )
+
+    sources = collect_sources(args.inputs, args.url_list)
+    if not sources:
+        logger.error("解析対象のPDFがありません")
+        sys.exit(1)
+
+    analyzer = PDFBatchAnalyzer(max_workers=args.workers, use_processes=args.processes, timeout=args.timeout)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            summary = analyzer.run(sources, out)
+    else:
+        summary = analyzer.run(sources, sys.stdout)
+
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ PyPDF2を使用してPDFファイルからローン情報を抽出する
 """
 
 import os
+import re
 import logging
 from typing import Dict, List, Optional, Union
 from pathlib import Path
@@ -13,6 +14,32 @@ from io import BytesIO
 import requests
 
 
+# ローン情報の抽出パターン（カテゴリ, 値を v で捕捉する正規表現）
+# パターンごとに事前コンパイルして個別に走査する（1本に結合すると、同じ数字を
+# 別パターンが先に消費して「借入 10年」の 10年 などを取りこぼすため）。
+_LOAN_INFO_PATTERNS = [
+    # 金利
+    ('interest_rates', r'(?P<v>\d+\.\d+)%'),
+    ('interest_rates', r'金利[：:\s]*(?P<v>\d+\.\d+)'),
+    ('interest_rates', r'年率[：:\s]*(?P<v>\d+\.\d+)'),
+    ('interest_rates', r'実質年率[：:\s]*(?P<v>\d+\.\d+)'),
+    # 融資金額
+    ('loan_amounts', r'(?P<v>\d+)万円'),
+    ('loan_amounts', r'(?P<v>\d{1,3}(?:,\d{3})*)円'),
+    ('loan_amounts', r'融資額[：:\s]*(?P<v>\d+)'),
+    ('loan_amounts', r'借入[：:\s]*(?P<v>\d+)'),
+    # 期間
+    ('terms', r'(?P<v>\d+)年'),
+    ('terms', r'(?P<v>\d+)ヶ月'),
+    ('terms', r'期間[：:\s]*(?P<v>\d+)'),
+    ('terms', r'返済期間[：:\s]*(?P<v>\d+)'),
+    # 電話番号
+    ('contact_info', r'(?P<v>\d{2,4}-\d{2,4}-\d{4})'),
+]
+
+_LOAN_INFO_REGEXES = [(category, re.compile(pattern)) for category, pattern in _LOAN_INFO_PATTERNS]
+
+
 class PDFScraper:
     """PDFファイルからテキストを抽出するクラス"""
     
@@ -208,6 +235,49 @@ class PDFScraper:
         """
         return self._extract_text_from_bytes(pdf_bytes)
     
+    def find_loan_matches(self, text: str, page: Optional[int] = None, offset: int = 0) -> List[Dict[str, any]]:
+        """
+        ローン情報の候補を位置付きで列挙（出現順）
+
+        Args:
+            text: 検索対象テキスト
+            page: ページ番号（1始まり、不明ならNone）
+            offset: 全文中でのtextの開始位置
+
+        Returns:
+            List[Dict]: マッチ一覧（category, value, start, end, page）
+        """
+        matches = {}
+        for category, regex in _LOAN_INFO_REGEXES:
+            for m in regex.finditer(text):
+                # 同じ値を複数のパターンが捕捉した場合（「融資額 300万円」など）は1件にまとめる
+                matches.setdefault((category, m.start('v'), m.end('v')), {
+                    'category': category,
+                    'value': m.group('v'),
+                    'start': offset + m.start('v'),
+                    'end': offset + m.end('v'),
+                    'page': page,
+                })
+        return sorted(matches.values(), key=lambda match: match['start'])
+
+    def find_loan_matches_in_pages(self, page_texts: List[Dict[str, any]]) -> List[Dict[str, any]]:
+        """
+        ページ単位のテキストからマッチを列挙（位置は連結後の全文基準）
+
+        Args:
+            page_texts: _extract_text_from_bytes が返す page_texts
+
+        Returns:
+            List[Dict]: マッチ一覧
+        """
+        matches = []
+        offset = 0
+        for page in page_texts:
+            matches.extend(self.find_loan_matches(page['text'], page=page['page'], offset=offset))
+            # full_text は '\n\n' で連結されている
+            offset += len(page['text']) + 2
+        return matches
+
     def extract_loan_info(self, text: str) -> Dict[str, any]:
         """
         抽出されたテキストからローン情報を検索
@@ -218,8 +288,6 @@ class PDFScraper:
         Returns:
             Dict: ローン情報
         """
-        import re
-        
         loan_info = {
             'interest_rates': [],
             'loan_amounts': [],
@@ -228,50 +296,12 @@ class PDFScraper:
             'contact_info': []
         }
         
-        # 金利情報の抽出
-        interest_patterns = [
-            r'(\d+\.\d+)%',
-            r'金利[：:\s]*(\d+\.\d+)',
-            r'年率[：:\s]*(\d+\.\d+)',
-            r'実質年率[：:\s]*(\d+\.\d+)'
-        ]
-        
-        for pattern in interest_patterns:
-            matches = re.findall(pattern, text)
-            loan_info['interest_rates'].extend(matches)
-        
-        # 融資金額の抽出
-        amount_patterns = [
-            r'(\d+)万円',
-            r'(\d{1,3}(?:,\d{3})*)円',
-            r'融資額[：:\s]*(\d+)',
-            r'借入[：:\s]*(\d+)'
-        ]
-        
-        for pattern in amount_patterns:
-            matches = re.findall(pattern, text)
-            loan_info['loan_amounts'].extend(matches)
-        
-        # 期間の抽出
-        term_patterns = [
-            r'(\d+)年',
-            r'(\d+)ヶ月',
-            r'期間[：:\s]*(\d+)',
-            r'返済期間[：:\s]*(\d+)'
-        ]
-        
-        for pattern in term_patterns:
-            matches = re.findall(pattern, text)
-            loan_info['terms'].extend(matches)
-        
-        # 電話番号の抽出
-        phone_pattern = r'(\d{2,4}-\d{2,4}-\d{4})'
-        phone_matches = re.findall(phone_pattern, text)
-        loan_info['contact_info'].extend(phone_matches)
+        for match in self.find_loan_matches(text):
+            loan_info[match['category']].append(match['value'])
         
-        # 重複除去
+        # 重複除去（出現順を維持）
         for key in loan_info:
-            loan_info[key] = list(set(loan_info[key]))
+            loan_info[key] = list(dict.fromkeys(loan_info[key]))
         
         return loan_info
 
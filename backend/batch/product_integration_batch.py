@@ -5,14 +5,49 @@
 # 関連: ai_processing_batch.py, loanpedia_scraper/database/loan_database.py, template.yaml, docker-compose.yml
 """
 統合処理バッチ: AI処理済みデータから loan_products テーブルを構築
+
+- 読み込み: processed_loan_data に raw_loan_data.structured_data を JOIN した1クエリを
+  サーバーサイドカーソル（SSDictCursor）で流し読みする（行ごとの SELECT なし）
+- 変更検出: チャンク内の商品キー（金融機関, 商品名, ローン種別）の既存 loan_products を
+  1クエリで読み、PRODUCT_COMPARE_FIELDS をメモリ上で比較する。変更のない商品の内容は書き込まない
+- 書き込み: 新規・変更のある商品だけを chunk_size 件単位の executemany で UPSERT し、
+  変更のあった既存商品は loan_product_history に変更前後の値を記録する。
+  既定（反結合）モードでは、変更のない商品も processed_data_id だけは新しい行に付け替える
+  （付け替えないと同じ行を毎回未統合として読み直す）。差分モードでは一切書き込まない。
+  同じ raw_loan_data をAI処理し直した古い行は反結合の対象外とし、商品の processed_data_id より
+  古い行では商品を書き換えない（新しい内容を古い内容で戻さないため）。
+  チャンク単位でコミットする（チャンクが失敗した場合はそのチャンクだけ1件ずつやり直す）
+
+流し読み中の接続では他のクエリを実行できないため、読み込みはプールから借りた別接続で行う。
+
+未統合データの探し方:
+  - 既定: loan_products との反結合（テーブル全体を走査する）
+  - 差分モード（--incremental）: integration_watermarks に保存したワーカーごとの
+    最終統合済み processed_loan_data.id より大きい行だけを主キーの範囲で読む。
+    ウォーターマークは各チャンクの loan_products と同じトランザクションで進めるため、
+    途中で落ちても次回は未コミットのチャンクから再開する。抽出・保存に失敗した行は
+    integration_failures に試行回数を記録し、ウォーターマークはその直前の ID までしか
+    進めず、次回はその行から再試行する（それ以降の統合済みの行は変更検出により書き込み
+    なしで済む）。INTEGRATION_MAX_ATTEMPTS 回失敗した行はデッドレターにしてウォーター
+    マークを通過させ、--retry-dead-letters で個別に再試行する。
+    採番後にコミットが遅れた行を飛ばさないよう、作成から INTEGRATION_WATERMARK_LAG_SECONDS
+    秒以内の行は次回に回す。同じワーカーIDで同時に実行しないこと。
+
+環境変数:
+  - INTEGRATION_CHUNK_SIZE: 1回の executemany・コミットにまとめる件数（既定 200）
+  - INTEGRATION_INCREMENTAL: true で差分モード（既定 false）
+  - INTEGRATION_WORKER_ID: ウォーターマークのワーカーID（既定 default）
+  - INTEGRATION_WATERMARK_LAG_SECONDS: 差分モードで読まない直近の行の秒数（既定 60）
+  - INTEGRATION_MAX_ATTEMPTS: 差分モードで失敗した行をデッドレターにするまでの回数（既定 3）
 """
 
 import os
 import json
 import pymysql
+import pymysql.cursors
 import logging
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 
 # ログ設定
@@ -22,6 +57,159 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+try:
+    from database.connection_pool import get_connection_pool
+except ImportError:
+    from loanpedia_scraper.database.connection_pool import get_connection_pool
+
+UNINTEGRATED_PROCESSED_SQL = """
+    SELECT 
+        p.id, p.raw_data_id, p.institution_id, p.ai_summary,
+        p.processing_status, p.validation_status, p.processed_at,
+        f.institution_name, r.structured_data
+    FROM processed_loan_data p
+    JOIN financial_institutions f ON p.institution_id = f.id
+    LEFT JOIN raw_loan_data r ON p.raw_data_id = r.id
+    LEFT JOIN loan_products lp ON p.id = lp.processed_data_id
+    WHERE p.processing_status = 'completed' 
+      AND lp.id IS NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM processed_loan_data newer
+          WHERE newer.raw_data_id = p.raw_data_id
+            AND newer.id > p.id
+            AND newer.processing_status = 'completed'
+      )
+    ORDER BY p.processed_at DESC
+    LIMIT %s
+"""
+
+INCREMENTAL_PROCESSED_SQL = """
+    SELECT 
+        p.id, p.raw_data_id, p.institution_id, p.ai_summary,
+        p.processing_status, p.validation_status, p.processed_at,
+        f.institution_name, r.structured_data
+    FROM processed_loan_data p
+    JOIN financial_institutions f ON p.institution_id = f.id
+    LEFT JOIN raw_loan_data r ON p.raw_data_id = r.id
+    WHERE p.id > %s
+      AND p.processing_status = 'completed'
+      AND p.created_at <= NOW() - INTERVAL %s SECOND
+    ORDER BY p.id
+    LIMIT %s
+"""
+
+WATERMARK_UPSERT_SQL = """
+    INSERT INTO integration_watermarks (worker_id, last_processed_id) VALUES (%s, %s)
+    ON DUPLICATE KEY UPDATE last_processed_id = GREATEST(last_processed_id, VALUES(last_processed_id))
+"""
+
+DEAD_LETTER_PROCESSED_SQL = """
+    SELECT 
+        p.id, p.raw_data_id, p.institution_id, p.ai_summary,
+        p.processing_status, p.validation_status, p.processed_at,
+        f.institution_name, r.structured_data
+    FROM integration_failures x
+    JOIN processed_loan_data p ON p.id = x.processed_data_id
+    JOIN financial_institutions f ON p.institution_id = f.id
+    LEFT JOIN raw_loan_data r ON p.raw_data_id = r.id
+    WHERE x.worker_id = %s
+      AND x.dead_lettered_at IS NOT NULL
+    ORDER BY p.id
+    LIMIT %s
+"""
+
+INTEGRATION_FAILURE_UPSERT_SQL = """
+    INSERT INTO integration_failures (worker_id, processed_data_id, attempts, last_error, dead_lettered_at)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        attempts = VALUES(attempts),
+        last_error = VALUES(last_error),
+        dead_lettered_at = COALESCE(dead_lettered_at, VALUES(dead_lettered_at))
+"""
+
+# LOAN_PRODUCT_UPSERT_SQL のパラメータの並び
+LOAN_PRODUCT_COLUMNS = (
+    'processed_data_id', 'institution_id', 'product_name', 'product_code', 'loan_type',
+    'loan_category', 'summary', 'interest_rate_min', 'interest_rate_max', 'interest_rate_type',
+    'loan_amount_min', 'loan_amount_max', 'loan_amount_unit',
+    'loan_term_min', 'loan_term_max', 'loan_term_unit',
+    'repayment_methods', 'application_requirements', 'features',
+    'is_active', 'data_updated_at', 'created_at', 'updated_at',
+)
+PRODUCT_ROW_INDEX = {name: i for i, name in enumerate(LOAN_PRODUCT_COLUMNS)}
+
+# 変更検出で比較する列（UPSERT で更新する内容の列。更新日時・processed_data_id は比較しない）
+PRODUCT_COMPARE_FIELDS = (
+    'summary', 'interest_rate_min', 'interest_rate_max', 'interest_rate_type',
+    'loan_amount_min', 'loan_amount_max', 'loan_term_min', 'loan_term_max',
+    'repayment_methods', 'application_requirements', 'features',
+)
+PRODUCT_JSON_FIELDS = ('repayment_methods', 'application_requirements', 'features')
+PRODUCT_RATE_FIELDS = ('interest_rate_min', 'interest_rate_max')
+PRODUCT_INT_FIELDS = ('loan_amount_min', 'loan_amount_max', 'loan_term_min', 'loan_term_max')
+
+# 変更のない商品を新しい AI処理済みデータに付け替える（反結合で未統合として読み直さないように）
+PRODUCT_RELINK_SQL = """
+    UPDATE loan_products SET processed_data_id = GREATEST(processed_data_id, %s)
+    WHERE institution_id = %s AND product_name = %s AND loan_type = %s
+"""
+
+PRODUCT_HISTORY_INSERT_SQL = """
+    INSERT INTO loan_product_history (
+        loan_product_id, changed_fields, old_values, new_values, changed_at
+    ) VALUES (%s, %s, %s, %s, %s)
+"""
+
+LOAN_PRODUCT_UPSERT_SQL = """
+    INSERT INTO loan_products (
+        processed_data_id, institution_id, product_name, product_code, loan_type, 
+        loan_category, summary, interest_rate_min, interest_rate_max, interest_rate_type,
+        loan_amount_min, loan_amount_max, loan_amount_unit,
+        loan_term_min, loan_term_max, loan_term_unit,
+        repayment_methods, application_requirements, features,
+        is_active, data_updated_at, created_at, updated_at
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+    )
+    ON DUPLICATE KEY UPDATE
+        processed_data_id = GREATEST(processed_data_id, VALUES(processed_data_id)),
+        product_name = VALUES(product_name),
+        loan_type = VALUES(loan_type),
+        summary = VALUES(summary),
+        interest_rate_min = VALUES(interest_rate_min),
+        interest_rate_max = VALUES(interest_rate_max),
+        interest_rate_type = VALUES(interest_rate_type),
+        loan_amount_min = VALUES(loan_amount_min),
+        loan_amount_max = VALUES(loan_amount_max),
+        loan_term_min = VALUES(loan_term_min),
+        loan_term_max = VALUES(loan_term_max),
+        repayment_methods = VALUES(repayment_methods),
+        application_requirements = VALUES(application_requirements),
+        features = VALUES(features),
+        data_updated_at = VALUES(data_updated_at),
+        updated_at = VALUES(updated_at)
+"""
+
+def normalize_product_value(field: str, value):
+    """
+    変更検出用に列の値をそろえる
+    
+    DB から読んだ値（DECIMAL は Decimal、JSON 列は文字列）と、保存用に作った値
+    （float、json.dumps した文字列）を同じ形にして比較できるようにする。
+    """
+    if value is None:
+        return None
+    try:
+        if field in PRODUCT_JSON_FIELDS:
+            return json.loads(value) if isinstance(value, (str, bytes)) else value
+        if field in PRODUCT_RATE_FIELDS:
+            return round(float(value), 4)
+        if field in PRODUCT_INT_FIELDS:
+            return int(value)
+    except (TypeError, ValueError):
+        pass
+    return value
+
 @dataclass
 class ProcessedLoanData:
     """AI処理済みローンデータ"""
@@ -33,14 +221,25 @@ class ProcessedLoanData:
     processing_status: str
     validation_status: str
     processed_at: datetime
+    raw_structured_data: Optional[dict] = None  # JOIN で取得した raw_loan_data.structured_data
 
 class ProductIntegrationBatch:
     """統合処理バッチメイン処理クラス"""
     
-    def __init__(self):
+    def __init__(self, chunk_size: Optional[int] = None, worker_id: Optional[str] = None):
         self.db_config = self._load_db_config()
         self.connection = None
         self.cursor = None
+        self.chunk_size = max(1, chunk_size or int(os.getenv('INTEGRATION_CHUNK_SIZE', '200')))
+        self.worker_id = worker_id or os.getenv('INTEGRATION_WORKER_ID', 'default')
+        self.unchanged_count = 0
+        self.relink_unchanged = True  # 変更のない商品の processed_data_id を付け替える（反結合モード用）
+        self.first_failed_id: Optional[int] = None
+        self.watermark_lag_seconds = int(os.getenv('INTEGRATION_WATERMARK_LAG_SECONDS', '60'))
+        self.max_attempts = max(1, int(os.getenv('INTEGRATION_MAX_ATTEMPTS', '3')))
+        self.track_failures = False
+        self.failure_attempts: Dict[int, int] = {}  # processed_data_id → 記録済みの失敗回数
+        self.pending_failures: List[Tuple] = []  # 次のコミットで書く INTEGRATION_FAILURE_UPSERT_SQL のパラメータ
     
     def _load_db_config(self) -> Dict:
         """データベース設定を読み込み（共通ユーティリティ使用）"""
@@ -59,9 +258,9 @@ class ProductIntegrationBatch:
             }
     
     def connect_database(self):
-        """データベース接続"""
+        """データベース接続（プロセス共通プールから借りる）"""
         try:
-            self.connection = pymysql.connect(**self.db_config)
+            self.connection = get_connection_pool(self.db_config).acquire()
             self.connection.cursorclass = pymysql.cursors.DictCursor
             self.cursor = self.connection.cursor()
             logger.info("Database connected successfully")
@@ -70,56 +269,125 @@ class ProductIntegrationBatch:
             raise
     
     def close_database(self):
-        """データベース接続終了"""
+        """データベース接続終了（プールへ返却）"""
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.connection:
-            self.connection.close()
-        logger.info("Database connection closed")
+            get_connection_pool(self.db_config).release(self.connection)
+            self.connection = None
+        logger.info("Database connection released")
     
     def get_unintegrated_processed_data(self, limit: int = 10) -> List[ProcessedLoanData]:
         """未統合のAI処理済みデータを取得"""
-        sql = """
-            SELECT 
-                p.id, p.raw_data_id, p.institution_id, p.ai_summary,
-                p.processing_status, p.validation_status, p.processed_at,
-                f.institution_name
-            FROM processed_loan_data p
-            JOIN financial_institutions f ON p.institution_id = f.id
-            LEFT JOIN loan_products lp ON p.id = lp.processed_data_id
-            WHERE p.processing_status = 'completed' 
-              AND lp.id IS NULL
-            ORDER BY p.processed_at DESC
-            LIMIT %s
+        return list(self.iter_unintegrated_processed_data(self.cursor, limit))
+    
+    def iter_unintegrated_processed_data(
+        self, cursor, limit: int = 10, after_id: Optional[int] = None
+    ) -> Iterator[ProcessedLoanData]:
         """
+        未統合のAI処理済みデータを元の構造化データ付きで1行ずつ返す
         
-        self.cursor.execute(sql, (limit,))
-        rows = self.cursor.fetchall()
+        Args:
+            cursor: 読み込み用カーソル（SSDictCursor なら結果をまとめて受け取らずに流し読みする）
+            limit: 最大件数
+            after_id: 指定すると反結合の代わりに、この ID より大きい行を ID 順に読む（差分モード）
+        """
+        if after_id is None:
+            cursor.execute(UNINTEGRATED_PROCESSED_SQL, (limit,))
+        else:
+            cursor.execute(INCREMENTAL_PROCESSED_SQL, (after_id, self.watermark_lag_seconds, limit))
+        return self._stream_processed_data(cursor)
+    
+    def iter_dead_lettered_processed_data(self, cursor, limit: int = 10) -> Iterator[ProcessedLoanData]:
+        """このワーカーのデッドレターになった AI処理済みデータを ID 順に1行ずつ返す"""
+        cursor.execute(DEAD_LETTER_PROCESSED_SQL, (self.worker_id, limit))
+        return self._stream_processed_data(cursor)
+    
+    def _stream_processed_data(self, cursor) -> Iterator[ProcessedLoanData]:
+        """実行済みのカーソルから chunk_size 件ずつ受け取って1行ずつ返す"""
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                return
+            for row in rows:
+                yield self._to_processed_data(row)
+    
+    def get_watermark(self) -> int:
+        """このワーカーの最終統合済み processed_loan_data.id（未記録なら 0）"""
+        self.cursor.execute(
+            "SELECT last_processed_id FROM integration_watermarks WHERE worker_id = %s", (self.worker_id,)
+        )
+        row = self.cursor.fetchone()
+        return row['last_processed_id'] if row else 0
+    
+    def save_watermark(self, last_processed_id: int) -> None:
+        """ウォーターマークを進める（戻しはしない。コミットは呼び出し側）"""
+        self.cursor.execute(WATERMARK_UPSERT_SQL, (self.worker_id, last_processed_id))
+    
+    def get_failure_attempts(self) -> Dict[int, int]:
+        """このワーカーで失敗を記録済みの processed_loan_data.id → 失敗回数"""
+        self.cursor.execute(
+            "SELECT processed_data_id, attempts FROM integration_failures WHERE worker_id = %s", (self.worker_id,)
+        )
+        return {row['processed_data_id']: row['attempts'] for row in self.cursor.fetchall()}
+    
+    def _save_failures(self, resolved_ids: List[int]) -> None:
+        """記録待ちの失敗と、統合できた行の失敗記録の削除を書き込む（コミットは呼び出し側）"""
+        if self.pending_failures:
+            self.cursor.executemany(INTEGRATION_FAILURE_UPSERT_SQL, self.pending_failures)
+        if resolved_ids:
+            placeholders = ', '.join(['%s'] * len(resolved_ids))
+            self.cursor.execute(
+                f"DELETE FROM integration_failures WHERE worker_id = %s AND processed_data_id IN ({placeholders})",
+                (self.worker_id, *resolved_ids),
+            )
+    
+    def _failures_saved(self, resolved_ids: List[int]) -> None:
+        """_save_failures の内容をコミットした後の後始末"""
+        self.pending_failures = []
+        for processed_data_id in resolved_ids:
+            self.failure_attempts.pop(processed_data_id, None)
+    
+    def _to_processed_data(self, row: Dict) -> ProcessedLoanData:
+        """SELECT 結果の1行を ProcessedLoanData に変換"""
+        ai_summary = {}
+        if row['ai_summary']:
+            try:
+                ai_summary = json.loads(row['ai_summary'])
+            except json.JSONDecodeError:
+                logger.warning(f"Invalid JSON in ai_summary for ID {row['id']}")
         
-        processed_data_list = []
-        for row in rows:
-            ai_summary = {}
-            if row['ai_summary']:
-                try:
-                    ai_summary = json.loads(row['ai_summary'])
-                except json.JSONDecodeError:
-                    logger.warning(f"Invalid JSON in ai_summary for ID {row['id']}")
-            
-            processed_data_list.append(ProcessedLoanData(
-                id=row['id'],
-                raw_data_id=row['raw_data_id'],
-                institution_id=row['institution_id'],
-                institution_name=row['institution_name'],
-                ai_summary=ai_summary,
-                processing_status=row['processing_status'],
-                validation_status=row['validation_status'],
-                processed_at=row['processed_at']
-            ))
+        raw_structured_data = {}
+        if row.get('structured_data'):
+            try:
+                raw_structured_data = json.loads(row['structured_data'])
+            except (TypeError, json.JSONDecodeError):
+                logger.warning(f"Invalid JSON in structured_data for raw_data_id {row['raw_data_id']}")
         
-        return processed_data_list
+        return ProcessedLoanData(
+            id=row['id'],
+            raw_data_id=row['raw_data_id'],
+            institution_id=row['institution_id'],
+            institution_name=row['institution_name'],
+            ai_summary=ai_summary,
+            processing_status=row['processing_status'],
+            validation_status=row['validation_status'],
+            processed_at=row['processed_at'],
+            raw_structured_data=raw_structured_data
+        )
     
-    def extract_product_data(self, processed_data: ProcessedLoanData) -> Dict:
-        """AI要約データから商品マスター用データを抽出"""
+    def extract_product_data(
+        self, processed_data: ProcessedLoanData, raw_structured_data: Optional[Dict] = None
+    ) -> Dict:
+        """
+        AI要約データから商品マスター用データを抽出
+        
+        Args:
+            processed_data: AI処理済みデータ
+            raw_structured_data: 元の構造化データ（None なら processed_data に JOIN 済みのもの、
+                それもなければ raw_loan_data から取得）
+        """
         ai_summary = processed_data.ai_summary
         
         try:
@@ -132,8 +400,10 @@ class ProductIntegrationBatch:
             actionable_insights = ai_summary.get('actionable_insights', {})
             
             # 元の構造化データから基本情報を取得（Scrapyで抽出済み）
-            raw_data_id = processed_data.raw_data_id
-            raw_structured_data = self._get_raw_structured_data(raw_data_id)
+            if raw_structured_data is None:
+                raw_structured_data = processed_data.raw_structured_data
+            if raw_structured_data is None:
+                raw_structured_data = self._get_raw_structured_data(processed_data.raw_data_id)
             
             # 基本商品情報（Scrapyデータを優先）
             product_name = raw_structured_data.get('product_name', '')
@@ -269,40 +539,9 @@ class ProductIntegrationBatch:
         else:
             return None
     
-    def save_loan_product(self, processed_data: ProcessedLoanData, product_data: Dict) -> int:
-        """統合ローン商品データを保存"""
-        sql = """
-            INSERT INTO loan_products (
-                processed_data_id, institution_id, product_name, product_code, loan_type, 
-                loan_category, summary, interest_rate_min, interest_rate_max, interest_rate_type,
-                loan_amount_min, loan_amount_max, loan_amount_unit,
-                loan_term_min, loan_term_max, loan_term_unit,
-                repayment_methods, application_requirements, features,
-                is_active, data_updated_at, created_at, updated_at
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            )
-            ON DUPLICATE KEY UPDATE
-                product_name = VALUES(product_name),
-                loan_type = VALUES(loan_type),
-                summary = VALUES(summary),
-                interest_rate_min = VALUES(interest_rate_min),
-                interest_rate_max = VALUES(interest_rate_max),
-                interest_rate_type = VALUES(interest_rate_type),
-                loan_amount_min = VALUES(loan_amount_min),
-                loan_amount_max = VALUES(loan_amount_max),
-                loan_term_min = VALUES(loan_term_min),
-                loan_term_max = VALUES(loan_term_max),
-                repayment_methods = VALUES(repayment_methods),
-                application_requirements = VALUES(application_requirements),
-                features = VALUES(features),
-                data_updated_at = VALUES(data_updated_at),
-                updated_at = VALUES(updated_at)
-        """
-        
-        now = datetime.now()
-        
-        self.cursor.execute(sql, (
+    def _product_row(self, processed_data: ProcessedLoanData, product_data: Dict, now: datetime) -> Tuple:
+        """LOAN_PRODUCT_UPSERT_SQL のパラメータ"""
+        return (
             processed_data.id,
             processed_data.institution_id,
             product_data['product_name'],
@@ -326,75 +565,397 @@ class ProductIntegrationBatch:
             product_data['data_updated_at'],
             now,
             now
-        ))
-        
+        )
+    
+    def save_loan_product(self, processed_data: ProcessedLoanData, product_data: Dict) -> int:
+        """統合ローン商品データを保存"""
+        self.cursor.execute(LOAN_PRODUCT_UPSERT_SQL, self._product_row(processed_data, product_data, datetime.now()))
         return self.cursor.lastrowid
     
+    def save_loan_products_many(self, rows: List[Tuple]) -> None:
+        """_product_row で作ったパラメータをまとめて保存（コミットは呼び出し側）"""
+        if rows:
+            self.cursor.executemany(LOAN_PRODUCT_UPSERT_SQL, rows)
+    
+    def integrate(
+        self, processed_data: ProcessedLoanData, raw_structured_data: Optional[Dict] = None
+    ) -> Optional[int]:
+        """
+        1件を既存の loan_products と比較して反映（コミットは呼び出し側）
+        
+        _flush_products と同じく、変更のない商品は内容を書き込まず（relink_unchanged なら
+        processed_data_id だけ付け替える）、変更のあった既存商品は loan_product_history にも記録する。
+        
+        Returns:
+            Optional[int]: loan_products の ID（商品データを抽出できなければ None）
+        """
+        product_data = self.extract_product_data(processed_data, raw_structured_data)
+        if not product_data:
+            return None
+        
+        row = self._product_row(processed_data, product_data, datetime.now())
+        key = self._product_key(row)
+        existing = self._load_current_products([key]).get(key)
+        if existing is None:
+            self.cursor.execute(LOAN_PRODUCT_UPSERT_SQL, row)
+            return self.cursor.lastrowid
+        
+        changes = {} if self._is_stale(existing, row) else self._diff_product(existing, row)
+        if not changes:
+            self.unchanged_count += 1
+            relink = self._relink_row(existing, row)
+            if relink:
+                self.cursor.execute(PRODUCT_RELINK_SQL, relink)
+            return existing['id']
+        self.cursor.execute(LOAN_PRODUCT_UPSERT_SQL, row)
+        self.create_product_history(existing['id'], changes)
+        return existing['id']
+    
+    def _history_row(self, loan_product_id: int, changes: Dict, now: datetime) -> Tuple:
+        """PRODUCT_HISTORY_INSERT_SQL のパラメータ"""
+        new_values = changes.get('new_values', {})
+        return (
+            loan_product_id,
+            json.dumps(list(new_values.keys()), ensure_ascii=False),
+            json.dumps(changes.get('old_values', {}), ensure_ascii=False, default=str),
+            json.dumps(new_values, ensure_ascii=False, default=str),
+            now
+        )
+    
     def create_product_history(self, loan_product_id: int, changes: Dict):
-        """商品変更履歴を記録"""
+        """
+        商品変更履歴を記録
+        
+        Args:
+            loan_product_id: loan_products の ID
+            changes: {'old_values': {列: 変更前}, 'new_values': {列: 変更後}}
+        """
         if not changes:
             return
+        self.cursor.execute(PRODUCT_HISTORY_INSERT_SQL, self._history_row(loan_product_id, changes, datetime.now()))
+    
+    def save_product_history_many(self, rows: List[Tuple]) -> None:
+        """_history_row で作ったパラメータをまとめて保存（コミットは呼び出し側）"""
+        if rows:
+            self.cursor.executemany(PRODUCT_HISTORY_INSERT_SQL, rows)
+    
+    @staticmethod
+    def _product_key(row: Tuple) -> Tuple:
+        """loan_products の一意キー（金融機関ID, 商品名, ローン種別）"""
+        return (
+            row[PRODUCT_ROW_INDEX['institution_id']],
+            row[PRODUCT_ROW_INDEX['product_name']],
+            row[PRODUCT_ROW_INDEX['loan_type']],
+        )
+    
+    def _load_current_products(self, keys: List[Tuple]) -> Dict[Tuple, Dict]:
+        """商品キー → 既存の loan_products 行（比較する列と processed_data_id）を1回の IN クエリで取得"""
+        if not keys:
+            return {}
+        placeholders = ', '.join(['(%s, %s, %s)'] * len(keys))
+        self.cursor.execute(
+            f"""
+            SELECT id, institution_id, product_name, loan_type, processed_data_id,
+                {', '.join(PRODUCT_COMPARE_FIELDS)}
+            FROM loan_products
+            WHERE (institution_id, product_name, loan_type) IN ({placeholders})
+            """,
+            tuple(value for key in keys for value in key),
+        )
+        return {
+            (row['institution_id'], row['product_name'], row['loan_type']): row
+            for row in self.cursor.fetchall()
+        }
+    
+    @staticmethod
+    def _diff_product(current: Dict, row: Tuple) -> Dict:
+        """
+        既存行と保存用パラメータを比較
+        
+        Returns:
+            Dict: 変更があれば {'old_values': {...}, 'new_values': {...}}、なければ空
+        """
+        old_values = {}
+        new_values = {}
+        for field in PRODUCT_COMPARE_FIELDS:
+            old = normalize_product_value(field, current.get(field))
+            new = normalize_product_value(field, row[PRODUCT_ROW_INDEX[field]])
+            if old != new:
+                old_values[field] = old
+                new_values[field] = new
+        return {'old_values': old_values, 'new_values': new_values} if new_values else {}
+    
+    @staticmethod
+    def _is_stale(current: Dict, row: Tuple) -> bool:
+        """既存商品がより新しい AI処理済みデータから作られている（この行で書き換えない）"""
+        return (current.get('processed_data_id') or 0) > row[PRODUCT_ROW_INDEX['processed_data_id']]
+    
+    def _relink_row(self, current: Dict, row: Tuple) -> Optional[Tuple]:
+        """変更のない商品を新しい AI処理済みデータに付け替える PRODUCT_RELINK_SQL のパラメータ（不要なら None）"""
+        processed_data_id = row[PRODUCT_ROW_INDEX['processed_data_id']]
+        if not self.relink_unchanged or processed_data_id <= (current.get('processed_data_id') or 0):
+            return None
+        return (processed_data_id, *self._product_key(row))
+    
+    def _changed_products(
+        self, chunk: List[Tuple[ProcessedLoanData, Tuple]], now: datetime
+    ) -> Tuple[List[Tuple[ProcessedLoanData, Tuple, Optional[Tuple]]], List[Tuple]]:
+        """
+        チャンクのうち書き込みが必要な商品を選ぶ
         
-        sql = """
-            INSERT INTO loan_product_history (
-                loan_product_id, changed_fields, old_values, new_values, changed_at
-            ) VALUES (%s, %s, %s, %s, %s)
+        同じ商品がチャンク内に複数あれば、前の行を反映した後の値と比較する。
+        既存商品より古い AI処理済みデータの行は変更なしとして扱う。
+        
+        Returns:
+            Tuple: (書き込み一覧, 付け替え一覧)
+                書き込み: (AI処理済みデータ, UPSERT のパラメータ, 履歴のパラメータ（新規商品は None）)
+                付け替え: 変更のない商品の PRODUCT_RELINK_SQL のパラメータ（relink_unchanged のときのみ）
         """
+        keys = list(dict.fromkeys(self._product_key(row) for _, row in chunk))
+        current = self._load_current_products(keys)
         
-        self.cursor.execute(sql, (
-            loan_product_id,
-            json.dumps(list(changes.keys()), ensure_ascii=False),
-            json.dumps(changes.get('old_values', {}), ensure_ascii=False),
-            json.dumps(changes.get('new_values', {}), ensure_ascii=False),
-            datetime.now()
-        ))
-    
-    def run(self, batch_size: int = 10):
-        """統合処理バッチ実行"""
-        logger.info(f"Product Integration Batch started (batch_size: {batch_size})")
+        writes = []
+        relinks = {}
+        for processed_data, row in chunk:
+            key = self._product_key(row)
+            existing = current.get(key)
+            history = None
+            if existing is not None:
+                changes = {} if self._is_stale(existing, row) else self._diff_product(existing, row)
+                if not changes:
+                    relink = self._relink_row(existing, row)
+                    if relink:
+                        relinks[key] = relink
+                        current[key] = {**existing, 'processed_data_id': relink[0]}
+                    continue
+                if existing.get('id') is not None:
+                    history = self._history_row(existing['id'], changes, now)
+            writes.append((processed_data, row, history))
+            processed_data_id = row[PRODUCT_ROW_INDEX['processed_data_id']]
+            current[key] = {
+                **(existing or {'id': None}),
+                **{field: row[PRODUCT_ROW_INDEX[field]] for field in PRODUCT_COMPARE_FIELDS},
+                'processed_data_id': max(processed_data_id, (existing or {}).get('processed_data_id') or 0),
+            }
+        return writes, list(relinks.values())
+    
+    def _flush_products(
+        self, chunk: List[Tuple[ProcessedLoanData, Tuple]], watermark: Optional[int] = None
+    ) -> Tuple[int, int]:
+        """
+        1チャンク分を既存の loan_products と比較し、新規・変更のある商品だけを保存してコミット
+        
+        変更のあった既存商品は loan_product_history にも記録する。まとめての保存に失敗した場合は
+        ロールバックし、そのチャンクだけ1件ずつやり直す。失敗を記録する場合（track_failures）は
+        integration_failures の更新も同じトランザクションで行う。
+        
+        Args:
+            chunk: (AI処理済みデータ, LOAN_PRODUCT_UPSERT_SQL のパラメータ) のリスト
+            watermark: 指定すると同じトランザクションでウォーターマークをこの ID まで進める
+                （1件ずつのやり直しで再試行対象の失敗が出れば、その直前の ID まで）
+        
+        Returns:
+            Tuple[int, int]: (統合件数（変更なしを含む）, 失敗件数)
+        """
+        writes, relinks = self._changed_products(chunk, datetime.now())
+        unchanged = len(chunk) - len(writes)
+        self.unchanged_count += unchanged
+        # 失敗を記録済みで、今回統合できた行（失敗記録を消す）
+        resolved_ids = [
+            processed_data.id for processed_data, _ in chunk if processed_data.id in self.failure_attempts
+        ]
+        
+        try:
+            self.save_loan_products_many([row for _, row, _ in writes])
+            self.save_product_history_many([history for _, _, history in writes if history])
+            self._relink_products(relinks)
+            self._save_failures(resolved_ids)
+            if watermark is not None:
+                self.save_watermark(watermark)
+            self.connection.commit()
+            self._failures_saved(resolved_ids)
+            if chunk:
+                logger.info(f"✅ Successfully integrated {len(chunk)} products ({unchanged} unchanged)")
+            return len(chunk), 0
+        except Exception as e:
+            logger.warning(f"Bulk upsert of {len(writes)} products failed, retrying one by one: {e}")
+            self.connection.rollback()
+        
+        integrated_count = unchanged
+        failed_count = 0
+        for processed_data, row, history in writes:
+            try:
+                self.cursor.execute(LOAN_PRODUCT_UPSERT_SQL, row)
+                if history:
+                    self.cursor.execute(PRODUCT_HISTORY_INSERT_SQL, history)
+                self.connection.commit()
+                integrated_count += 1
+            except Exception as e:
+                logger.error(f"Error integrating processed_id {processed_data.id}: {e}")
+                self.connection.rollback()
+                failed_count += 1
+                self._record_failure(processed_data.id, e)
+                if processed_data.id in resolved_ids:
+                    resolved_ids.remove(processed_data.id)
+        if watermark is not None or self.pending_failures or resolved_ids or relinks:
+            self._relink_products(relinks)
+            self._save_failures(resolved_ids)
+            if watermark is not None:
+                self.save_watermark(self._capped_watermark(watermark))
+            self.connection.commit()
+            self._failures_saved(resolved_ids)
+        return integrated_count, failed_count
+    
+    def _relink_products(self, relinks: List[Tuple]) -> None:
+        """変更のない商品の processed_data_id をまとめて付け替える（コミットは呼び出し側）"""
+        if relinks:
+            self.cursor.executemany(PRODUCT_RELINK_SQL, relinks)
+    
+    def _record_failure(self, processed_data_id: int, error) -> None:
+        """
+        失敗した ID を記録
+        
+        track_failures のときは試行回数を数え、max_attempts 回に満たなければウォーターマークを
+        この ID より先に進めない（次回の差分統合で再試行）。max_attempts 回目の失敗では
+        デッドレターにしてウォーターマークを通過させる。
+        """
+        if not self.track_failures:
+            return
+        attempts = self.failure_attempts.get(processed_data_id, 0) + 1
+        self.failure_attempts[processed_data_id] = attempts
+        dead_lettered_at = None
+        if attempts >= self.max_attempts:
+            dead_lettered_at = datetime.now()
+            logger.error(
+                f"processed_id {processed_data_id} failed {attempts} times; dead-lettered "
+                f"(retry with --retry-dead-letters): {error}"
+            )
+        elif self.first_failed_id is None or processed_data_id < self.first_failed_id:
+            self.first_failed_id = processed_data_id
+        self.pending_failures.append(
+            (self.worker_id, processed_data_id, attempts, str(error)[:1000], dead_lettered_at)
+        )
+    
+    def _capped_watermark(self, last_id: int) -> int:
+        """最初に失敗した ID の直前までに抑えたウォーターマーク（次回はその ID から再試行）"""
+        if self.first_failed_id is None:
+            return last_id
+        return min(last_id, self.first_failed_id - 1)
+    
+    def integrate_many(
+        self, processed_data_iter, track_watermark: bool = False, track_failures: Optional[bool] = None
+    ) -> Tuple[int, int, int]:
+        """
+        AI処理済みデータを chunk_size 件ずつまとめて loan_products に反映
+        
+        Args:
+            processed_data_iter: AI処理済みデータ（差分モードでは ID 順）
+            track_watermark: True ならチャンクごとに読み込み済みの最大 ID までウォーターマークを進める
+                （再試行対象の失敗があれば、最初に失敗した ID の直前まで）
+            track_failures: True なら失敗を integration_failures に記録する（既定: track_watermark）。
+                記録済みの失敗回数は事前に failure_attempts に読み込んでおく
+        
+        Returns:
+            Tuple[int, int, int]: (読み込み件数, 統合件数, 失敗件数)
+        """
+        total_count = 0
+        integrated_count = 0
+        failed_count = 0
+        self.unchanged_count = 0
+        self.first_failed_id = None
+        self.track_failures = track_watermark if track_failures is None else track_failures
+        # 差分モードはウォーターマークで読み進めるため、変更のない商品は付け替えも不要
+        self.relink_unchanged = not track_watermark
+        self.pending_failures = []
+        chunk: List[Tuple[ProcessedLoanData, Tuple]] = []
+        last_id: Optional[int] = None
+        flushed_id: Optional[int] = None
+        
+        for processed_data in processed_data_iter:
+            total_count += 1
+            last_id = processed_data.id if last_id is None else max(last_id, processed_data.id)
+            product_data = self.extract_product_data(processed_data)
+            if not product_data:
+                logger.warning(f"Failed to extract product data for processed_id: {processed_data.id}")
+                failed_count += 1
+                self._record_failure(processed_data.id, 'failed to extract product data')
+                continue
+            
+            chunk.append((processed_data, self._product_row(processed_data, product_data, datetime.now())))
+            if len(chunk) >= self.chunk_size:
+                integrated, failed = self._flush_products(
+                    chunk, self._capped_watermark(last_id) if track_watermark else None
+                )
+                integrated_count += integrated
+                failed_count += failed
+                chunk = []
+                flushed_id = last_id
+        
+        # 最後のチャンク（抽出に失敗した行だけでも、その手前まではウォーターマークを進め、失敗を記録する）
+        if chunk or self.pending_failures or (track_watermark and last_id != flushed_id):
+            integrated, failed = self._flush_products(
+                chunk, self._capped_watermark(last_id) if track_watermark else None
+            )
+            integrated_count += integrated
+            failed_count += failed
+        
+        return total_count, integrated_count, failed_count
+    
+    def run(self, batch_size: int = 10, incremental: Optional[bool] = None, retry_dead_letters: bool = False):
+        """
+        統合処理バッチ実行
+        
+        Args:
+            batch_size: 最大件数
+            incremental: True で差分モード（既定: 環境変数 INTEGRATION_INCREMENTAL）
+            retry_dead_letters: True ならこのワーカーのデッドレターだけを再試行する
+                （ウォーターマークは動かさない。統合できた行はデッドレターから外す）
+        """
+        if incremental is None:
+            incremental = os.getenv('INTEGRATION_INCREMENTAL', 'false').lower() in ('true', '1', 'yes')
+        logger.info(
+            f"Product Integration Batch started (batch_size: {batch_size}, chunk_size: {self.chunk_size}, "
+            f"incremental: {incremental}, retry_dead_letters: {retry_dead_letters})"
+        )
         
         try:
             self.connect_database()
             
-            # 未統合のAI処理済みデータを取得
-            processed_data_list = self.get_unintegrated_processed_data(batch_size)
+            after_id = None
+            if incremental or retry_dead_letters:
+                self.failure_attempts = self.get_failure_attempts()
+            if incremental and not retry_dead_letters:
+                after_id = self.get_watermark()
+                logger.info(
+                    f"Integrating processed_id > {after_id} (worker: {self.worker_id}, "
+                    f"{len(self.failure_attempts)} recorded failures)"
+                )
             
-            if not processed_data_list:
+            # 流し読み中の接続には書き込めないため、読み込みは別の接続で行う
+            with get_connection_pool(self.db_config).connection() as read_connection:
+                read_cursor = read_connection.cursor(pymysql.cursors.SSDictCursor)
+                try:
+                    if retry_dead_letters:
+                        total_count, integrated_count, failed_count = self.integrate_many(
+                            self.iter_dead_lettered_processed_data(read_cursor, batch_size),
+                            track_failures=True,
+                        )
+                    else:
+                        total_count, integrated_count, failed_count = self.integrate_many(
+                            self.iter_unintegrated_processed_data(read_cursor, batch_size, after_id),
+                            track_watermark=incremental,
+                        )
+                finally:
+                    read_cursor.close()
+            
+            if not total_count:
                 logger.info("No unintegrated processed data found")
                 return
             
-            logger.info(f"Integrating {len(processed_data_list)} items")
-            
-            integrated_count = 0
-            failed_count = 0
-            
-            for processed_data in processed_data_list:
-                try:
-                    logger.info(f"Integrating processed_id: {processed_data.id} - {processed_data.institution_name}")
-                    
-                    # 商品データ抽出
-                    product_data = self.extract_product_data(processed_data)
-                    
-                    if not product_data:
-                        logger.warning(f"Failed to extract product data for processed_id: {processed_data.id}")
-                        failed_count += 1
-                        continue
-                    
-                    # 商品データ保存
-                    loan_product_id = self.save_loan_product(processed_data, product_data)
-                    
-                    self.connection.commit()
-                    integrated_count += 1
-                    
-                    logger.info(f"✅ Successfully integrated: loan_product_id {loan_product_id}")
-                    
-                except Exception as e:
-                    logger.error(f"Error integrating processed_id {processed_data.id}: {e}")
-                    self.connection.rollback()
-                    failed_count += 1
-                    continue
-            
-            logger.info(f"Integration completed: {integrated_count} integrated, {failed_count} failed")
+            logger.info(
+                f"Integration completed: {integrated_count} integrated ({self.unchanged_count} unchanged), "
+                f"{failed_count} failed"
+            )
             
         except Exception as e:
             logger.error(f"Integration batch error: {e}")
@@ -408,12 +969,24 @@ def main():
     
     parser = argparse.ArgumentParser(description='統合処理バッチ')
     parser.add_argument('--batch-size', type=int, default=10, help='バッチサイズ (default: 10)')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='1回の書き込み・コミットにまとめる件数 (default: INTEGRATION_CHUNK_SIZE or 200)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='ウォーターマークより新しいAI処理済みデータだけを統合する')
+    parser.add_argument('--worker-id', default=None,
+                        help='ウォーターマークのワーカーID (default: INTEGRATION_WORKER_ID or default)')
+    parser.add_argument('--retry-dead-letters', action='store_true',
+                        help='差分統合でデッドレターになったAI処理済みデータだけを再試行する')
     
     args = parser.parse_args()
     
     # バッチ処理実行
-    batch = ProductIntegrationBatch()
-    batch.run(batch_size=args.batch_size)
+    batch = ProductIntegrationBatch(chunk_size=args.chunk_size, worker_id=args.worker_id)
+    batch.run(
+        batch_size=args.batch_size,
+        incremental=True if args.incremental else None,
+        retry_dead_letters=args.retry_dead_letters,
+    )
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI処理のオフライン負荷試験スクリプト
+
+ローカルスタブ（ai_backends.LocalStubRuntimeClient）に対して合成した商品データを要約し、
+並列度・まとめ処理・プロンプトキャッシュ・ストリーミングの設定ごとの処理時間と
+トークン数を比較する。DB・ネットワーク・AWS 認証情報は不要。
+
+同じ構造化データの商品（--duplicate-ratio）はバッチと同じく要約キャッシュキーでまとめ、
+1回だけ要約する。
+
+使い方:
+  python scripts/benchmark_ai.py --products 200 --latency-ms 800 --concurrency 8
+  python scripts/benchmark_ai.py --products 200 --latency-ms 800 --pack-size 3 --prompt-cache
+  python scripts/benchmark_ai.py --products 200 --throttle-rate 0.1 --error-rate 0.02
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+# プロジェクトルートをパスに追加
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from ai_backends import LocalStubRuntimeClient
+from ai_executor import ConcurrentAIExecutor
+from ai_processing_batch import BedrockAIProcessor, RawLoanData, pack_products, summary_cache_key
+
+LOAN_TYPES = ['マイカーローン', '教育ローン', '住宅ローン', 'フリーローン', 'カードローン']
+
+
+def synthetic_products(count: int, duplicate_ratio: float, seed: int) -> List[RawLoanData]:
+    """合成した商品データ（duplicate_ratio の割合で既出の構造化データを再利用）"""
+    rng = random.Random(seed)
+    products: List[RawLoanData] = []
+    for i in range(count):
+        if products and rng.random() < duplicate_ratio:
+            base = rng.choice(products)
+            structured, institution_id = base.structured_data, base.institution_id
+        else:
+            institution_id = rng.randint(1, 5)
+            loan_type = rng.choice(LOAN_TYPES)
+            min_rate = round(rng.uniform(0.5, 5.0), 2)
+            structured = {
+                'product_name': f"{loan_type} {i}",
+                'loan_category': loan_type,
+                'min_interest_rate': min_rate,
+                'max_interest_rate': round(min_rate + rng.uniform(0.5, 10.0), 2),
+                'min_loan_amount': 100000,
+                'max_loan_amount': rng.choice([3000000, 5000000, 10000000]),
+                'max_loan_period_months': rng.choice([60, 120, 180]),
+            }
+        products.append(RawLoanData(
+            id=i + 1, institution_id=institution_id, institution_name=f"金融機関{institution_id}",
+            source_url=f"https://example.com/{i + 1}", page_title=structured['product_name'],
+            structured_data=structured, scraped_at=None,
+        ))
+    return products
+
+
+def run_benchmark(
+    client, products: List[RawLoanData], concurrency: int, pack_size: int, prompt_cache: bool, streaming: bool
+) -> Dict:
+    """1つの設定で全商品を要約し、所要時間・スループット・UsageMetrics のレポートを返す"""
+    processor = BedrockAIProcessor(client=client, streaming=streaming, prompt_cache=prompt_cache)
+    executor = ConcurrentAIExecutor(
+        max_concurrency=concurrency, initial_concurrency=concurrency,
+        requests_per_minute=0, tokens_per_minute=0, retry_base_delay=0.05,
+    )
+
+    groups: Dict[str, List[RawLoanData]] = {}
+    for raw_data in products:
+        groups.setdefault(summary_cache_key(raw_data, processor.model_id), []).append(raw_data)
+    unique = [rows[0] for rows in groups.values()]
+
+    started = time.monotonic()
+    completed = failed = 0
+    if pack_size > 1:
+        for pack, results, error in executor.map(processor.summarize_pack, pack_products(unique, pack_size)):
+            for representative, result in zip(pack, results or [None] * len(pack)):
+                ok = error is None and result['processing_status'] == 'completed'
+                size = len(groups[summary_cache_key(representative, processor.model_id)])
+                completed, failed = (completed + size, failed) if ok else (completed, failed + size)
+    else:
+        for representative, result, error in executor.map(processor.summarize_loan_data, unique):
+            ok = error is None and result['processing_status'] == 'completed'
+            size = len(groups[summary_cache_key(representative, processor.model_id)])
+            completed, failed = (completed + size, failed) if ok else (completed, failed + size)
+    elapsed = time.monotonic() - started
+
+    return {
+        'products': len(products),
+        'unique_products': len(unique),
+        'completed': completed,
+        'failed': failed,
+        'elapsed_seconds': round(elapsed, 3),
+        'products_per_second': round(len(products) / elapsed, 2) if elapsed else None,
+        'throttled': executor.throttled_count,
+        'final_concurrency': int(executor.limiter.limit),
+        'usage': processor.usage.report(products=len(unique)),
+    }
+
+
+def main():
+    """メイン実行関数"""
+    parser = argparse.ArgumentParser(description="ローカルスタブに対する AI処理の負荷試験")
+    parser.add_argument("--products", type=int, default=100, help="商品数")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3, help="既出の構造化データを再利用する割合")
+    parser.add_argument("--concurrency", type=int, default=8, help="同時実行数")
+    parser.add_argument("--pack-size", type=int, default=1, help="1回の呼び出しにまとめる商品数")
+    parser.add_argument("--prompt-cache", action="store_true", help="system プロンプトにキャッシュ指定を付ける")
+    parser.add_argument("--streaming", action="store_true", help="ストリーミングで呼び出す")
+    parser.add_argument("--latency-ms", type=float, default=200, help="スタブの遅延")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="スタブの遅延のばらつき")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="スタブのモデルエラーの割合")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="スタブのスロットリングの割合")
+    parser.add_argument("--seed", type=int, default=0, help="乱数の種")
+    args = parser.parse_args()
+
+    # ai_processing_batch が INFO で設定するため、呼び出しごとのログを抑える
+    logging.getLogger().setLevel(logging.WARNING)
+
+    client = LocalStubRuntimeClient(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, seed=args.seed,
+    )
+    products = synthetic_products(args.products, args.duplicate_ratio, args.seed)
+    result = run_benchmark(client, products, args.concurrency, args.pack_size, args.prompt_cache, args.streaming)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
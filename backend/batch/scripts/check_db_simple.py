@@ -22,6 +22,7 @@ def main():
 
     try:
         from loanpedia_scraper.database.loan_database import LoanDatabase, get_database_config
+        from loanpedia_scraper.database.content_store import read_content, storage_stats
 
         cfg = get_database_config()
         print(f"✅ データベース設定取得成功")
@@ -80,10 +81,12 @@ def main():
                 # 最新3件のサンプル
                 cur.execute(
                     """
-                    SELECT id, source_url, page_title, scraped_at
-                    FROM raw_loan_data
-                    WHERE institution_id = %s
-                    ORDER BY scraped_at DESC
+                    SELECT r.id, r.source_url, r.page_title, r.scraped_at,
+                           r.html_content, hb.compression AS html_compression, hb.data AS html_blob, hb.storage_uri AS html_uri
+                    FROM raw_loan_data r
+                    LEFT JOIN content_blobs hb ON hb.content_hash = r.html_blob_hash
+                    WHERE r.institution_id = %s
+                    ORDER BY r.scraped_at DESC
                     LIMIT 3
                     """,
                     (code,)
@@ -98,6 +101,11 @@ def main():
                             print(f"        URL: {sample['source_url']}")
                             print(f"        タイトル: {sample.get('page_title', 'N/A')}")
                             print(f"        日時: {sample['scraped_at']}")
+                            html = read_content(
+                                sample['html_content'], sample['html_compression'],
+                                sample['html_blob'], sample['html_uri'],
+                            )
+                            print(f"        HTML: {len(html)}文字")
                         else:
                             print(f"\n    [{i}] ID: {sample[0]}")
                             print(f"        URL: {sample[1]}")
@@ -108,6 +116,19 @@ def main():
 
                 print()
 
+            # 本文ストアの圧縮状況
+            stats = storage_stats(cur)
+            print("=" * 70)
+            print("📦 本文ストア (content_blobs)")
+            print("=" * 70)
+            print(f"  本文数: {stats['blobs']}件")
+            print(f"  元サイズ: {stats['original_bytes']:,} bytes")
+            print(f"  保存サイズ: {stats['stored_bytes']:,} bytes")
+            print(f"  オブジェクトストア退避: {stats['offloaded']}件")
+            if stats['compression_ratio']:
+                print(f"  圧縮率: {stats['compression_ratio']}倍")
+            print()
+
             print("=" * 70)
             print("確認完了")
             print("=" * 70)
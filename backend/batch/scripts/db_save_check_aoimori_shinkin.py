@@ -35,6 +35,7 @@ def main() -> None:
         LoanDatabase,
         get_database_config,
     )
+    from loanpedia_scraper.database.content_store import fetch_contents
 
     # テスト用の簡易HTML（商品名/金利/融資額/期間/年齢を含む）
     html = (
@@ -83,11 +84,14 @@ def main() -> None:
                 return
             cur = db.cursor  # type: ignore
             cur.execute(
-                "SELECT id, institution_id, source_url, page_title, scraped_at FROM raw_loan_data WHERE id=%s",
+                "SELECT id, institution_id, source_url, page_title, scraped_at, html_blob_hash FROM raw_loan_data WHERE id=%s",
                 (saved_ids[0] if saved_ids else -1,),
             )
             row = cur.fetchone()
             if row:
+                # 本文は content_blobs から復元して長さのみ表示
+                stored = fetch_contents(cur, [row.get("html_blob_hash")])
+                row["html_length"] = len(stored.get(row.get("html_blob_hash"), ""))
                 print("=== Inserted Row (raw_loan_data) ===")
                 print(json.dumps(row, ensure_ascii=False, default=str, indent=2))
             else:
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+スプール取り込みスクリプト
+
+DB障害中にスプール（SPOOL_STORE / SPOOL_DIR / SPOOL_BUCKET）へ書き出したレコードを
+一括保存の経路で raw_loan_data に取り込む。content_hash で UPSERT するため、
+途中で失敗して再実行しても重複しない。
+
+使い方:
+  SPOOL_STORE=local SPOOL_DIR=/mnt/efs/spool python scripts/replay_spool.py
+  SPOOL_STORE=local SPOOL_DIR=/mnt/efs/spool python scripts/replay_spool.py --dry-run
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+# プロジェクトルートをパスに追加
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from loanpedia_scraper.database.loan_service import replay_spool
+from loanpedia_scraper.database.spool import get_spool
+
+
+def main():
+    """メイン実行関数"""
+    parser = argparse.ArgumentParser(description="スプールしたレコードをDBへ取り込む")
+    parser.add_argument("--flush-size", type=int, default=None, help="1ステートメントあたりの最大件数")
+    parser.add_argument("--dry-run", action="store_true", help="件数を表示するだけで取り込まない")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    spool = get_spool()
+    if spool is None:
+        print("❌ SPOOL_STORE が設定されていません（local / s3）")
+        return 1
+
+    print("=" * 60)
+    print(f"スプール取り込み: {spool.store.uri_for(spool.prefix)}")
+    print("=" * 60)
+
+    stats = replay_spool(spool, flush_size=args.flush_size, dry_run=args.dry_run)
+
+    print(f"segments={stats['segments']} records={stats['records']} "
+          f"saved={stats['saved']} remaining={stats['remaining']}")
+    return 0 if stats["remaining"] == 0 or args.dry_run else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
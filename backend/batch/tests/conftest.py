@@ -39,6 +39,42 @@ def mock_scraper_failure():
     m.scrape_loan_info.side_effect = Exception("mock failure")
     return m
 
+def _build_pdf(page_texts):
+    """テスト用の最小構成PDF（Helveticaで1行ずつ描画）を生成"""
+    n = len(page_texts)
+    font_id = 3 + 2 * n
+    objs = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{3 + 2 * i} 0 R" for i in range(n)), n)).encode(),
+    ]
+    for i, text in enumerate(page_texts):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objs.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        ).encode())
+        objs.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objs.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objs):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+@pytest.fixture
+def make_pdf():
+    """ページごとのテキストから最小構成のPDFバイト列を生成するファクトリ"""
+    return _build_pdf
+
 @pytest.fixture(autouse=True)
 def setup_test_logging():
     """テスト用ログ設定（全テスト自動適用）"""
@@ -0,0 +1,107 @@
+# tests/unit/test_ai_backends.py
+import pytest
+
+import ai_processing_batch as mod
+from ai_backends import LocalStubRuntimeClient, create_ai_client
+from ai_executor import ConcurrentAIExecutor, is_throttling_error
+from ai_streaming import EXPECTED_SECTIONS
+
+
+def _raw(i, name="マイカーローン"):
+    return mod.RawLoanData(
+        id=i, institution_id=1, institution_name="青い森信用金庫", source_url=f"https://example.com/{i}",
+        page_title=name, structured_data={"product_name": f"{name}{i}"}, scraped_at=None,
+    )
+
+
+class TestLocalStubRuntimeClient:
+
+    def test_single_summary_is_schema_valid_and_deterministic(self):
+        """プロンプトの JSON形式どおりの要約を返し、同じリクエストには同じ要約を返すこと"""
+        first = mod.BedrockAIProcessor(client=LocalStubRuntimeClient()).summarize_loan_data(_raw(1))
+        again = mod.BedrockAIProcessor(client=LocalStubRuntimeClient()).summarize_loan_data(_raw(1))
+        other = mod.BedrockAIProcessor(client=LocalStubRuntimeClient()).summarize_loan_data(_raw(2))
+
+        assert first["processing_status"] == "completed"
+        assert set(first["ai_summary"]) == set(EXPECTED_SECTIONS)
+        assert first["ai_summary"] == again["ai_summary"]
+        assert first["ai_summary"] != other["ai_summary"]
+        assert first["usage"]["input_tokens"] > 0 and first["usage"]["output_tokens"] > 0
+
+    def test_packed_prompt_is_answered_per_product(self):
+        processor = mod.BedrockAIProcessor(client=LocalStubRuntimeClient())
+
+        results = processor.summarize_pack([_raw(1), _raw(2), _raw(3)])
+
+        assert processor.bedrock.calls == 1
+        assert all(set(r["ai_summary"]) == set(EXPECTED_SECTIONS) for r in results)
+
+    def test_streaming_passes_section_validation(self):
+        processor = mod.BedrockAIProcessor(client=LocalStubRuntimeClient(), streaming=True)
+
+        result = processor.summarize_loan_data(_raw(1))
+
+        assert result["validation_status"] == "valid"
+        assert result["stream_stats"]["attempts"] == 1
+
+    def test_latency_uses_injected_sleep(self):
+        slept = []
+        client = LocalStubRuntimeClient(latency_ms=250, sleep=slept.append)
+        mod.BedrockAIProcessor(client=client).summarize_loan_data(_raw(1))
+        assert slept == [0.25]
+
+    def test_failures_are_reproducible_for_a_seed(self):
+        """スロットリング・エラーの発生が seed とリクエストで決まり、実行順に依存しないこと"""
+        def outcomes(seed, order):
+            client = LocalStubRuntimeClient(error_rate=0.3, throttle_rate=0.3, seed=seed)
+            processor = mod.BedrockAIProcessor(client=client)
+            result = {}
+            for i in order:
+                try:
+                    result[i] = processor.summarize_loan_data(_raw(i))["processing_status"]
+                except Exception as e:
+                    assert is_throttling_error(e)
+                    result[i] = "throttled"
+            return result
+
+        forward = outcomes(7, range(1, 41))
+        assert forward == outcomes(7, reversed(range(1, 41)))
+        assert set(forward.values()) == {"completed", "failed", "throttled"}
+        assert forward != outcomes(8, range(1, 41))
+
+    def test_throttled_calls_succeed_on_retry(self):
+        client = LocalStubRuntimeClient(throttle_rate=0.5, seed=1)
+        processor = mod.BedrockAIProcessor(client=client)
+        executor = ConcurrentAIExecutor(requests_per_minute=0, tokens_per_minute=0, retry_max=20, retry_base_delay=0)
+
+        results = list(executor.map(processor.summarize_loan_data, [_raw(i) for i in range(1, 21)]))
+
+        assert client.throttled > 0
+        assert all(error is None and r["processing_status"] == "completed" for _, r, error in results)
+
+    def test_prompt_cache_usage(self):
+        """キャッシュ指定があれば2回目以降は cache_read_input_tokens を返すこと"""
+        processor = mod.BedrockAIProcessor(client=LocalStubRuntimeClient(), prompt_cache=True)
+        first = processor.summarize_loan_data(_raw(1))
+        second = processor.summarize_loan_data(_raw(2))
+        assert first["usage"]["cache_creation_input_tokens"] > 0
+        assert second["usage"]["cache_read_input_tokens"] == first["usage"]["cache_creation_input_tokens"]
+
+
+class TestBackendSelection:
+
+    def test_create_local_client_from_env(self, monkeypatch):
+        monkeypatch.setenv("AI_BACKEND", "local")
+        monkeypatch.setenv("AI_STUB_ERROR_RATE", "0.25")
+        client = create_ai_client()
+        assert isinstance(client, LocalStubRuntimeClient)
+        assert client.error_rate == 0.25
+
+    def test_unknown_backend_raises(self):
+        with pytest.raises(ValueError):
+            create_ai_client("openai")
+
+    def test_batch_accepts_injected_client(self):
+        client = LocalStubRuntimeClient()
+        batch = mod.AIProcessingBatch(ai_client=client)
+        assert batch.ai_processor.bedrock is client
@@ -0,0 +1,134 @@
+# tests/unit/test_ai_batch_inference.py
+import json
+from unittest.mock import Mock
+
+import pytest
+
+import ai_processing_batch as mod
+from ai_batch_inference import BatchInferenceBackend, BatchInferenceRunner, LocalBatchBackend
+from tests.unit.test_ai_executor import StubBedrockRuntimeClient
+from tests.unit.test_work_queue import FakeQueueDB
+
+
+def _raw(i, name):
+    return mod.RawLoanData(
+        id=i, institution_id=10, institution_name="青い森信用金庫", source_url=f"https://example.com/{i}",
+        page_title=name, structured_data={"product_name": name}, scraped_at=None,
+    )
+
+
+@pytest.fixture
+def setup(tmp_path):
+    """ローカル実装のバックエンドとDB部分をスタブにした AIProcessingBatch"""
+    client = StubBedrockRuntimeClient()
+    batch = mod.AIProcessingBatch.__new__(mod.AIProcessingBatch)
+    batch.ai_processor = mod.BedrockAIProcessor(client=client)
+    batch.connection = Mock()
+    batch.cursor = Mock()
+    rows = {1: _raw(1, "マイカー"), 2: _raw(2, "マイカー"), 3: _raw(3, "教育"), 4: _raw(4, "住宅")}
+    batch.load_raw_data = lambda ids: [rows[i] for i in ids]
+    batch.find_cached_summaries = lambda keys: {}
+    saved_chunks = []
+    batch.save_processed_data_many = lambda chunk: saved_chunks.append(list(chunk))
+    backend = LocalBatchBackend(str(tmp_path), client, batch.ai_processor.model_id)
+    runner = BatchInferenceRunner(batch, backend, chunk_size=2, poll_interval=0)
+    return batch, backend, runner, client, saved_chunks, rows
+
+
+class TestBatchInference:
+
+    def test_backfill_roundtrip_offline(self, setup, tmp_path):
+        """JSONL を書いて投入・ポーリング・取り込みまでオフラインで流れること"""
+        batch, backend, runner, client, saved_chunks, _ = setup
+        batch.cursor.fetchall.return_value = [{"id": i} for i in (1, 2, 3, 4)]
+
+        job_id = runner.submit("backfill", limit=10, job_name="job-1")
+
+        records = [json.loads(line) for line in (tmp_path / "job-1" / "input.jsonl").read_text().splitlines()]
+        assert len(records) == 3  # 同じ構造化データの 1, 2 は1レコード
+        assert all(set(r) == {"recordId", "modelInput"} for r in records)
+        assert records[0]["modelInput"]["messages"][0]["role"] == "user"
+        assert client.calls == 0
+
+        assert runner.wait(job_id) == "Completed"
+        stats = runner.ingest(job_id)
+
+        assert client.calls == 3
+        assert stats == {"saved": 4, "failed": 0, "lost": 0, "chunks": 2, "missing": 0}
+        assert [len(c) for c in saved_chunks] == [2, 2]
+        assert sorted(r[0] for c in saved_chunks for r in c) == [1, 2, 3, 4]
+        assert batch.connection.commit.call_count == 2
+        row = saved_chunks[0][0]
+        assert json.loads(row[2]) == {"product_analysis": {"executive_summary": "要約"}}
+        assert row[4] == mod.PROMPT_VERSION
+
+    def test_backfill_skips_failed_records(self, setup):
+        """backfill ではエラーになったレコードは保存しないこと"""
+        batch, backend, runner, client, saved_chunks, _ = setup
+        client.throttle_first = 1
+        batch.cursor.fetchall.return_value = [{"id": 3}, {"id": 4}]
+
+        job_id = runner.submit("backfill", job_name="job-2")
+        runner.wait(job_id)
+        stats = runner.ingest(job_id)
+
+        assert stats["saved"] == 1 and stats["failed"] == 1
+        assert sum(len(c) for c in saved_chunks) == 1
+
+    def test_cached_rows_are_not_submitted(self, setup, tmp_path):
+        """キャッシュ済みの行はジョブに含めずその場で取り込むこと"""
+        batch, backend, runner, client, saved_chunks, rows = setup
+        batch.cursor.fetchall.return_value = [{"id": 3}, {"id": 4}]
+        cached_key = mod.summary_cache_key(rows[3], batch.ai_processor.model_id)
+        batch.find_cached_summaries = lambda keys: {
+            cached_key: {"ai_summary": {"s": "cached"}, "ai_model": "m", "processing_status": "completed"}
+        }
+
+        runner.submit("backfill", job_name="job-3")
+
+        assert [r[0] for c in saved_chunks for r in c] == [3]
+        assert len((tmp_path / "job-3" / "input.jsonl").read_text().splitlines()) == 1
+
+    def test_pending_mode_completes_claimed_rows(self, setup):
+        """pending ではワークキューから取得し、取り込み時に done にすること"""
+        batch, backend, runner, client, saved_chunks, _ = setup
+        db = FakeQueueDB(4)
+        batch.connection = db.connection()
+
+        job_id = runner.submit("pending", limit=4, job_name="job-4")
+        assert all(r["ai_claimed_by"] for r in db.rows.values())
+
+        runner.wait(job_id)
+        runner.ingest(job_id)
+
+        assert all(r["ai_status"] == "done" for r in db.rows.values())
+
+    def test_pending_mode_skips_rows_with_lost_lease(self, setup):
+        """リース切れで他のワーカーが取得した行は保存も完了もしないこと"""
+        batch, backend, runner, client, saved_chunks, _ = setup
+        db = FakeQueueDB(4)
+        batch.connection = db.connection()
+
+        job_id = runner.submit("pending", limit=4, job_name="job-6")
+        db.rows[3].update(ai_claimed_by="other")
+        runner.wait(job_id)
+        stats = runner.ingest(job_id)
+
+        assert sorted(r[0] for c in saved_chunks for r in c) == [1, 2, 4]
+        assert stats["saved"] == 3 and stats["lost"] == 1
+        assert db.rows[3]["ai_status"] == "pending" and db.rows[3]["ai_claimed_by"] == "other"
+
+    def test_backend_is_abstract(self):
+        with pytest.raises(TypeError):
+            BatchInferenceBackend()
+
+    def test_ingest_rejects_other_prompt_version(self, setup, monkeypatch):
+        """別のプロンプトバージョンで作ったジョブは取り込まないこと"""
+        batch, backend, runner, client, saved_chunks, _ = setup
+        batch.cursor.fetchall.return_value = [{"id": 3}]
+        job_id = runner.submit("backfill", job_name="job-5")
+        runner.wait(job_id)
+
+        monkeypatch.setattr("ai_batch_inference.PROMPT_VERSION", "v999")
+        with pytest.raises(ValueError):
+            runner.ingest(job_id)
@@ -0,0 +1,147 @@
+# tests/unit/test_ai_executor.py
+import io
+import json
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from ai_executor import AIMDLimiter, ConcurrentAIExecutor, TokenBucket, is_throttling_error
+from ai_processing_batch import BedrockAIProcessor, RawLoanData
+
+
+class StubBedrockRuntimeClient:
+    """遅延とスロットリングを再現する bedrock-runtime クライアント"""
+
+    def __init__(self, latency=0.0, throttle_first=0):
+        self.latency = latency
+        self.throttle_first = throttle_first
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body):
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.throttle_first:
+                raise ClientError(
+                    {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "InvokeModel"
+                )
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            text = '```json\n{"product_analysis": {"executive_summary": "要約"}}\n```'
+            return {"body": io.BytesIO(json.dumps({"content": [{"type": "text", "text": text}]}).encode())}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def _raw(i):
+    return RawLoanData(
+        id=i, institution_id=1, institution_name="青い森信用金庫", source_url=f"https://example.com/{i}",
+        page_title="マイカーローン", structured_data={"product_name": "マイカーローン"}, scraped_at=None,
+    )
+
+
+def _executor(**kwargs):
+    params = dict(max_concurrency=4, initial_concurrency=4, requests_per_minute=0, tokens_per_minute=0,
+                  retry_max=3, retry_base_delay=0)
+    params.update(kwargs)
+    return ConcurrentAIExecutor(**params)
+
+
+class TestTokenBucket:
+
+    def test_waits_for_refill(self):
+        """容量を使い切ると補充されるまで待つこと"""
+        now = [0.0]
+        sleeps = []
+
+        def sleep(s):
+            sleeps.append(s)
+            now[0] += s
+
+        bucket = TokenBucket(60, clock=lambda: now[0], sleep=sleep)  # 1秒に1トークン
+        for _ in range(60):
+            assert bucket.acquire() == 0
+        assert bucket.acquire(2) == pytest.approx(2.0)
+        assert sum(sleeps) == pytest.approx(2.0)
+
+    def test_zero_rate_is_unlimited(self):
+        assert TokenBucket(0).acquire(10 ** 9) == 0
+
+
+class TestAIMDLimiter:
+
+    def test_additive_increase_multiplicative_decrease(self):
+        limiter = AIMDLimiter(initial=4, maximum=8)
+        limiter.on_throttle()
+        assert int(limiter.limit) == 2
+        for _ in range(10):
+            limiter.on_success()
+        assert 4 <= int(limiter.limit) <= 8
+        for _ in range(10):
+            limiter.on_throttle()
+        assert limiter.limit == 1
+
+
+class TestConcurrentAIExecutor:
+
+    def test_runs_calls_concurrently(self):
+        """遅延のある呼び出しが並列に実行されること"""
+        client = StubBedrockRuntimeClient(latency=0.1)
+        processor = BedrockAIProcessor(client=client)
+
+        started = time.monotonic()
+        results = list(_executor().map(processor.summarize_loan_data, [_raw(i) for i in range(8)]))
+        elapsed = time.monotonic() - started
+
+        assert elapsed < 0.6  # 直列なら 0.8 秒
+        assert client.max_in_flight <= 4
+        assert all(err is None and res["processing_status"] == "completed" for _, res, err in results)
+        assert sorted(item.id for item, _, _ in results) == list(range(8))
+
+    def test_throttling_backs_off_and_retries(self):
+        """スロットリングで同時実行数を下げ、再試行して全件成功すること"""
+        client = StubBedrockRuntimeClient(throttle_first=3)
+        executor = _executor()
+
+        results = list(executor.map(BedrockAIProcessor(client=client).summarize_loan_data, [_raw(i) for i in range(4)]))
+
+        assert all(err is None for _, _, err in results)
+        assert executor.throttled_count == 3
+        assert executor.limiter.limit < 4
+
+    def test_retry_exhaustion_yields_error(self):
+        """再試行上限を超えたスロットリングはエラーとして返ること"""
+        client = StubBedrockRuntimeClient(throttle_first=100)
+        results = list(_executor(retry_max=1).map(BedrockAIProcessor(client=client).summarize_loan_data, [_raw(1)]))
+
+        (_, result, error), = results
+        assert result is None
+        assert is_throttling_error(error)
+
+    def test_results_yielded_in_completion_order(self):
+        """完了した順に結果が返ること"""
+        def work(delay):
+            time.sleep(delay)
+            return delay
+
+        order = [res for _, res, _ in _executor().map(work, [0.2, 0.0, 0.1])]
+        assert order == [0.0, 0.1, 0.2]
+
+    def test_token_budget_is_requested(self):
+        """見積もりトークン数がトークンバケットに渡ること"""
+        executor = _executor()
+        requested = []
+        executor.token_bucket.acquire = lambda amount: requested.append(amount) or 0
+        processor = BedrockAIProcessor(client=StubBedrockRuntimeClient())
+
+        list(executor.map(processor.summarize_loan_data, [_raw(1)], estimate_tokens=processor.estimate_tokens))
+
+        assert requested == [processor.estimate_tokens(_raw(1))]
+        assert requested[0] > processor.max_tokens
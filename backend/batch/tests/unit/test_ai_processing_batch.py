@@ -0,0 +1,381 @@
+# tests/unit/test_ai_processing_batch.py
+import io
+import json
+import re
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+
+import ai_processing_batch as mod
+import product_integration_batch as product_mod
+
+
+@pytest.fixture
+def batch():
+    b = mod.AIProcessingBatch.__new__(mod.AIProcessingBatch)
+    b.cursor = Mock()
+    b.work_queue = Mock()
+    b.work_queue.claim.return_value = [1, 2]
+    b.cursor.fetchall.return_value = [
+        {"id": i, "institution_id": 10, "institution_name": "青い森信用金庫", "source_url": f"https://example.com/{i}",
+         "page_title": "マイカーローン", "structured_data": '{"product_name": "マイカーローン"}',
+         "scraped_at": datetime(2024, 4, 1)}
+        for i in (1, 2)
+    ]
+    return b
+
+
+class TestRawDataLoading:
+
+    def test_projection_skips_html(self, batch):
+        """取得クエリがHTML本文の列・content_blobs を読まないこと"""
+        records = batch.get_unprocessed_raw_data(2)
+
+        sql, params = batch.cursor.execute.call_args.args
+        assert "html_content" not in sql
+        assert "content_blobs" not in sql
+        assert params == [1, 2]
+        assert [r.id for r in records] == [1, 2]
+        assert records[0].structured_data == {"product_name": "マイカーローン"}
+
+    def test_records_use_slots(self, batch):
+        """レコードが __dict__ を持たないこと"""
+        record = batch.get_unprocessed_raw_data(2)[0]
+        assert not hasattr(record, "__dict__")
+
+    def test_prompt_does_not_load_html(self, batch):
+        """プロンプト構築でHTML本文が読み込まれないこと"""
+        record = batch.get_unprocessed_raw_data(2)[0]
+        batch.cursor.reset_mock()
+
+        prompt = mod.BedrockAIProcessor._build_prompt(None, record)
+
+        assert "マイカーローン" in prompt
+        batch.cursor.execute.assert_not_called()
+
+    def test_html_content_loaded_lazily_once(self, batch):
+        """html_content は初回参照時に1件分だけ読み込まれること"""
+        record = batch.get_unprocessed_raw_data(2)[0]
+        batch.cursor.reset_mock()
+        batch.cursor.fetchone.return_value = {
+            "html_content": "<html>旧形式</html>", "html_compression": None, "html_blob": None, "html_uri": None,
+        }
+
+        assert record.html_content == "<html>旧形式</html>"
+        assert record.html_content == "<html>旧形式</html>"
+        assert batch.cursor.execute.call_count == 1
+        assert batch.cursor.execute.call_args.args[1] == (1,)
+
+
+def _raw(i, structured, institution_id=10):
+    return mod.RawLoanData(
+        id=i, institution_id=institution_id, institution_name="青い森信用金庫", source_url=f"https://example.com/{i}",
+        page_title="マイカーローン", structured_data=structured, scraped_at=None,
+    )
+
+
+class TestSummaryCache:
+
+    def test_key_is_canonical(self):
+        """キーは構造化データの並び順に依存せず、金融機関・モデル・バージョンで変わること"""
+        a = _raw(1, {"product_name": "A", "max_interest_rate": 3.5})
+        b = _raw(2, {"max_interest_rate": 3.5, "product_name": "A"})
+
+        key = mod.summary_cache_key(a, "model")
+        assert key == mod.summary_cache_key(b, "model")
+        assert key != mod.summary_cache_key(_raw(3, a.structured_data, institution_id=11), "model")
+        assert key != mod.summary_cache_key(a, "other-model")
+        assert key != mod.summary_cache_key(a, "model", prompt_version="v999")
+
+    def test_cache_hits_skip_bedrock_and_duplicates_share_one_call(self, monkeypatch):
+        """キャッシュ済みの行はAIを呼ばず、同じ構造化データの行は1回の呼び出しを共有すること"""
+        from ai_executor import ConcurrentAIExecutor
+
+        cached_row = _raw(1, {"product_name": "既存"})
+        new_rows = [_raw(2, {"product_name": "新規"}), _raw(3, {"product_name": "新規"})]
+
+        b = mod.AIProcessingBatch.__new__(mod.AIProcessingBatch)
+        b.connection = Mock()
+        b.cursor = Mock()
+        b.work_queue = Mock()
+        b.work_queue.complete.return_value = True
+        b.executor = ConcurrentAIExecutor(requests_per_minute=0, tokens_per_minute=0)
+        b.pack_size = 1
+        b.integrator = None
+        b.ai_processor = Mock(model_id="model")
+        b.ai_processor.estimate_tokens.return_value = 0
+        b.ai_processor.summarize_loan_data.return_value = {
+            "ai_summary": {"s": "new"}, "ai_model": "model", "processing_status": "completed",
+        }
+        b.connect_database = lambda: None
+        b.close_database = lambda: None
+        monkeypatch.setattr(b, "get_unprocessed_raw_data", lambda limit: [cached_row, *new_rows])
+
+        cached_key = mod.summary_cache_key(cached_row, "model")
+        b.cursor.fetchall.return_value = [
+            {"summary_cache_key": cached_key, "ai_summary": '{"s": "cached"}', "ai_model": "model",
+             "validation_status": "valid"},
+        ]
+        saved = []
+        monkeypatch.setattr(
+            b, "save_processed_data",
+            lambda raw_id, inst_id, result, key=None: saved.append((raw_id, result["ai_summary"], key)) or raw_id,
+        )
+
+        b.run(batch_size=3)
+
+        assert b.ai_processor.summarize_loan_data.call_count == 1
+        new_key = mod.summary_cache_key(new_rows[0], "model")
+        assert sorted(saved) == [
+            (1, {"s": "cached"}, cached_key), (2, {"s": "new"}, new_key), (3, {"s": "new"}, new_key),
+        ]
+        lookup_sql, lookup_params = b.cursor.execute.call_args_list[0].args
+        assert "processing_version = %s" in lookup_sql
+        assert lookup_params[-1] == mod.PROMPT_VERSION
+
+
+class PackedBedrockClient:
+    """商品IDをキーにした応答を返す invoke_model のスタブ（omit の商品は応答に含めない）"""
+
+    def __init__(self, omit=()):
+        self.omit = set(omit)
+        self.prompts = []
+
+    def invoke_model(self, modelId, body):
+        prompt = json.loads(body)["messages"][0]["content"]
+        self.prompts.append(prompt)
+        keys = re.findall(r"### 商品 (p\d+)", prompt)
+        if keys:
+            answer = {k: {"product_analysis": {"executive_summary": k}} for k in keys if k not in self.omit}
+        else:
+            answer = {"product_analysis": {"executive_summary": "single"}}
+        text = "```json\n" + json.dumps(answer, ensure_ascii=False) + "\n```"
+        return {"body": io.BytesIO(json.dumps({"content": [{"type": "text", "text": text}]}).encode())}
+
+
+class TestProductPacking:
+
+    def test_pack_splits_response_per_product(self):
+        """1回の呼び出しの応答を商品ごとの結果に分けること"""
+        client = PackedBedrockClient()
+        processor = mod.BedrockAIProcessor(client=client)
+        rows = [_raw(i, {"product_name": f"商品{i}"}) for i in (1, 2, 3)]
+
+        results = processor.summarize_pack(rows)
+
+        assert len(client.prompts) == 1
+        assert "## 分析方針" not in client.prompts[0]  # 指示は system プロンプト側で1回だけ
+        assert [r["ai_summary"]["product_analysis"]["executive_summary"] for r in results] == ["p1", "p2", "p3"]
+        assert all(r["processing_status"] == "completed" for r in results)
+
+    def test_missing_products_fall_back_to_single_calls(self):
+        """応答に含まれない商品だけ単一商品の呼び出しで要約し直すこと"""
+        client = PackedBedrockClient(omit={"p2"})
+        processor = mod.BedrockAIProcessor(client=client)
+
+        results = processor.summarize_pack([_raw(1, {"a": 1}), _raw(2, {"b": 2})])
+
+        assert len(client.prompts) == 2
+        assert [r["ai_summary"]["product_analysis"]["executive_summary"] for r in results] == ["p1", "single"]
+
+    def test_run_packs_by_institution_and_loan_category(self, monkeypatch):
+        """run が同じ金融機関・ローン種別ごとにまとめて呼び出し、行ごとに保存すること"""
+        from ai_executor import ConcurrentAIExecutor
+
+        client = PackedBedrockClient()
+        rows = [
+            _raw(1, {"product_name": "A", "loan_category": "マイカーローン"}),
+            _raw(2, {"product_name": "B", "loan_category": "マイカーローン"}),
+            _raw(3, {"product_name": "C", "loan_category": "教育ローン"}),
+        ]
+        b = mod.AIProcessingBatch.__new__(mod.AIProcessingBatch)
+        b.connection = Mock()
+        b.work_queue = Mock()
+        b.work_queue.complete.return_value = True
+        b.executor = ConcurrentAIExecutor(requests_per_minute=0, tokens_per_minute=0)
+        b.ai_processor = mod.BedrockAIProcessor(client=client)
+        b.pack_size = 4
+        b.integrator = None
+        b.connect_database = lambda: None
+        b.close_database = lambda: None
+        monkeypatch.setattr(b, "get_unprocessed_raw_data", lambda limit: rows)
+        monkeypatch.setattr(b, "find_cached_summaries", lambda keys: {})
+        saved = {}
+        monkeypatch.setattr(
+            b, "save_processed_data",
+            lambda raw_id, inst_id, result, key=None: saved.setdefault(raw_id, result["ai_summary"]) and raw_id,
+        )
+
+        b.run(batch_size=3)
+
+        assert len(client.prompts) == 2
+        assert sorted(saved) == [1, 2, 3]
+        assert saved[3] == {"product_analysis": {"executive_summary": "single"}}
+
+
+class RecordingBedrockClient:
+    """リクエストの形を記録し、プロンプトキャッシュの usage を返す invoke_model のスタブ"""
+
+    def __init__(self):
+        self.requests = []
+
+    def invoke_model(self, modelId, body):
+        request = json.loads(body)
+        self.requests.append(request)
+        cached = any("cache_control" in block for block in request.get("system", []))
+        prefix = len(request["system"][0]["text"]) // 2
+        usage = {"input_tokens": len(request["messages"][0]["content"]) // 2, "output_tokens": 50}
+        if cached:
+            usage["cache_read_input_tokens" if len(self.requests) > 1 else "cache_creation_input_tokens"] = prefix
+        else:
+            usage["input_tokens"] += prefix
+        text = '```json\n{"product_analysis": {"executive_summary": "要約"}}\n```'
+        payload = {"content": [{"type": "text", "text": text}], "usage": usage}
+        return {"body": io.BytesIO(json.dumps(payload).encode())}
+
+
+class TestPromptCache:
+
+    def _summarize(self, processor, n=3):
+        for i in range(n):
+            processor.summarize_loan_data(_raw(i, {"product_name": f"商品{i}"}))
+
+    def test_static_prefix_is_system_block_with_cache_control(self):
+        """固定の指示は全呼び出しで同一の system ブロックに置き、キャッシュ指定を付けること"""
+        client = RecordingBedrockClient()
+        processor = mod.BedrockAIProcessor(client=client, prompt_cache=True)
+
+        self._summarize(processor)
+        processor.summarize_pack([_raw(8, {"a": 1}), _raw(9, {"b": 2})])
+
+        systems = [r["system"] for r in client.requests]
+        assert all(s == [{"type": "text", "text": mod.SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+                   for s in systems)
+        user = client.requests[0]["messages"][0]["content"]
+        assert "商品0" in user and "## 分析方針" not in user
+        assert len(user) * 3 < len(mod.SYSTEM_PROMPT)
+
+    def test_cache_disabled_sends_plain_system_block(self):
+        client = RecordingBedrockClient()
+        processor = mod.BedrockAIProcessor(client=client, prompt_cache=False)
+
+        self._summarize(processor, n=1)
+
+        assert client.requests[0]["system"] == [{"type": "text", "text": mod.SYSTEM_PROMPT}]
+
+    def test_usage_metrics_record_cache_hits(self):
+        """呼び出しごとの usage と、キャッシュのヒット数・トークン数が集計されること"""
+        client = RecordingBedrockClient()
+        processor = mod.BedrockAIProcessor(client=client, prompt_cache=True)
+
+        result = processor.summarize_loan_data(_raw(1, {"product_name": "A"}))
+        self._summarize(processor, n=2)
+
+        assert result["usage"]["cache_creation_input_tokens"] > 0
+        summary = processor.usage.summary()
+        assert summary["calls"] == 3
+        assert summary["cache_hits"] == 2
+        assert summary["cache_read_input_tokens"] == 2 * result["usage"]["cache_creation_input_tokens"]
+        assert summary["output_tokens"] == 150
+
+
+class TestFusedIntegration:
+
+    @pytest.fixture
+    def fused(self, monkeypatch):
+        from ai_backends import LocalStubRuntimeClient
+        from ai_executor import ConcurrentAIExecutor
+
+        cursor = Mock(lastrowid=77, rowcount=1)
+        cursor.fetchall.return_value = []  # 既存の loan_products なし
+        connection = Mock()
+        connection.cursor.return_value = cursor
+        pool = Mock()
+        pool.acquire.return_value = connection
+        monkeypatch.setattr(mod, "get_connection_pool", lambda config: pool)
+
+        b = mod.AIProcessingBatch(ai_client=LocalStubRuntimeClient(), fused=True)
+        b.executor = ConcurrentAIExecutor(requests_per_minute=0, tokens_per_minute=0)
+        rows = [_raw(1, {"product_name": "マイカーローン", "loan_category": "マイカーローン", "min_interest_rate": 1.5})]
+        monkeypatch.setattr(b, "get_unprocessed_raw_data", lambda limit: rows)
+        monkeypatch.setattr(b, "find_cached_summaries", lambda keys: {})
+        return b, connection, cursor
+
+    @staticmethod
+    def _statements(cursor):
+        return [" ".join(c.args[0].split())[:40] for c in cursor.execute.call_args_list]
+
+    def test_ai_result_and_product_written_in_one_transaction(self, fused):
+        """AI処理結果をDBから読み直さずに loan_products まで書き、1回だけコミットすること"""
+        b, connection, cursor = fused
+
+        b.run(batch_size=1)
+
+        statements = self._statements(cursor)
+        assert [s.split()[0] for s in statements] == ["INSERT", "UPDATE", "SAVEPOINT", "SELECT", "INSERT"]
+        assert statements[4].startswith("INSERT INTO loan_products")
+        product_params = cursor.execute.call_args_list[4].args[1]
+        assert product_params[0] == 77  # processed_loan_data の ID
+        assert product_params[2] == "マイカーローン"  # 構造化データはメモリから
+        assert product_params[7] == 1.5
+        assert connection.commit.call_count == 1
+        assert b.integrated_count == 1
+
+    def test_integration_failure_keeps_ai_result(self, fused, monkeypatch):
+        """統合に失敗してもセーブポイントまで戻し、AI処理結果はコミットすること"""
+        b, connection, cursor = fused
+        def execute(sql, params=None):
+            if sql is product_mod.LOAN_PRODUCT_UPSERT_SQL:
+                raise RuntimeError("duplicate")
+        cursor.execute.side_effect = execute
+
+        b.run(batch_size=1)
+
+        statements = self._statements(cursor)
+        assert "ROLLBACK TO SAVEPOINT fused_integration" in statements
+        assert connection.commit.call_count == 1
+        connection.rollback.assert_not_called()
+        assert b.integrated_count == 0
+
+    @staticmethod
+    def _existing(b, cursor, **overrides):
+        """1回目の run で保存した内容を既存の loan_products 行として返すようにする"""
+        b.run(batch_size=1)
+        row = next(c.args[1] for c in cursor.execute.call_args_list if c.args[0] is product_mod.LOAN_PRODUCT_UPSERT_SQL)
+        existing = {"id": 5, "institution_id": row[1], "product_name": row[2], "loan_type": row[4]}
+        existing.update({f: row[product_mod.PRODUCT_ROW_INDEX[f]] for f in product_mod.PRODUCT_COMPARE_FIELDS})
+        existing.update(overrides)
+        cursor.reset_mock()
+        cursor.fetchall.return_value = [existing]
+        b.integrated_count = 0
+
+    def test_unchanged_product_is_not_written(self, fused):
+        """融合モードでも変更のない商品は内容も履歴も書き込まないこと"""
+        b, connection, cursor = fused
+        self._existing(b, cursor)
+
+        b.run(batch_size=1)
+
+        statements = self._statements(cursor)
+        assert not any("loan_products" in s and s.startswith("INSERT") for s in statements)
+        assert not any("loan_product_history" in s for s in statements)
+        # 反結合で読み直さないよう processed_data_id だけ新しい行に付け替える
+        relinks = [c.args[1] for c in cursor.execute.call_args_list if c.args[0] is product_mod.PRODUCT_RELINK_SQL]
+        assert relinks == [(77, 10, "マイカーローン", "マイカーローン")]
+        assert b.integrated_count == 1
+        assert b.integrator.unchanged_count == 1
+
+    def test_changed_product_records_history(self, fused):
+        """融合モードで変更のあった既存商品は UPSERT と変更履歴を書くこと"""
+        b, connection, cursor = fused
+        self._existing(b, cursor, interest_rate_min=2.0)
+
+        b.run(batch_size=1)
+
+        statements = self._statements(cursor)
+        assert statements[-2].startswith("INSERT INTO loan_products")
+        assert statements[-1].startswith("INSERT INTO loan_product_history")
+        history = cursor.execute.call_args_list[-1].args[1]
+        assert history[0] == 5
+        assert json.loads(history[1]) == ["interest_rate_min"]
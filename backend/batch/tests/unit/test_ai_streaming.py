@@ -0,0 +1,160 @@
+# tests/unit/test_ai_streaming.py
+import json
+
+import pytest
+
+from ai_executor import is_throttling_error
+from ai_processing_batch import BedrockAIProcessor, RawLoanData
+from ai_streaming import OffSchemaError, SummaryStreamParser, stream_summary
+
+SECTION_A = '"product_analysis": {"executive_summary": "要約", "competitive_advantages": ["低金利"]}'
+SECTION_B = '"customer_guide": {"simple_explanation": "説明 \\"引用\\" {括弧}"}'
+
+
+def _events(text, size=7, output_tokens=None):
+    """テキストを size 文字ずつの content_block_delta イベントにする"""
+    events = [{"chunk": {"bytes": json.dumps({"type": "message_start", "message": {"usage": {"input_tokens": 100}}}).encode()}}]
+    for i in range(0, len(text), size):
+        delta = {"type": "content_block_delta", "delta": {"type": "text_delta", "text": text[i:i + size]}}
+        events.append({"chunk": {"bytes": json.dumps(delta).encode()}})
+    if output_tokens is not None:
+        events.append({"chunk": {"bytes": json.dumps({"type": "message_delta", "usage": {"output_tokens": output_tokens}}).encode()}})
+    return events
+
+
+class StubStream:
+    def __init__(self, events):
+        self.events = events
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for event in self.events:
+            self.consumed += 1
+            yield event
+
+    def close(self):
+        self.closed = True
+
+
+class StubStreamingClient:
+    """応答テキストを順に返す invoke_model_with_response_stream のスタブ（リクエストを記録）"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.streams = []
+
+    def invoke_model_with_response_stream(self, modelId, body):
+        self.requests.append(json.loads(body))
+        stream = StubStream(self.responses.pop(0))
+        self.streams.append(stream)
+        return {"body": stream}
+
+
+class TestSummaryStreamParser:
+
+    def test_sections_validated_as_they_close(self):
+        """セクションが閉じた差分で検証済みとして返ること（文字列中の括弧や引用符は無視）"""
+        parser = SummaryStreamParser()
+        text = "```json\n{" + SECTION_A + ", " + SECTION_B + "}\n```"
+        completed = [name for ch in text for name in parser.feed(ch)]
+
+        assert completed == ["product_analysis", "customer_guide"]
+        assert parser.done
+        assert parser.sections["customer_guide"]["simple_explanation"] == '説明 "引用" {括弧}'
+
+    @pytest.mark.parametrize("text, reason", [
+        ('{"unknown": {}}', "想定外のセクション"),
+        ('{"product_analysis": "text"}', "オブジェクトではありません"),
+        ('{"product_analysis": {"a": 1,}}', "JSON として解析できません"),
+        ("申し訳ありませんが" * 50, "JSON の開始前"),
+    ])
+    def test_off_schema_detected(self, text, reason):
+        with pytest.raises(OffSchemaError, match=reason):
+            SummaryStreamParser().feed(text)
+
+    def test_valid_prefix_keeps_verified_sections(self):
+        """打ち切り時の valid_prefix は検証済みのセクションまでであること"""
+        parser = SummaryStreamParser()
+        with pytest.raises(OffSchemaError) as exc:
+            parser.feed("{" + SECTION_A + ', "oops": 1}')
+        assert json.loads(exc.value.valid_prefix + "}") == {
+            "product_analysis": {"executive_summary": "要約", "competitive_advantages": ["低金利"]}
+        }
+
+
+class TestStreamSummary:
+
+    BODY = {"anthropic_version": "bedrock-2023-05-25", "max_tokens": 4000,
+            "messages": [{"role": "user", "content": "prompt"}]}
+
+    def test_stops_reading_after_document_closes(self):
+        """JSON が閉じた後の長い出力は読まずにストリームを閉じること"""
+        client = StubStreamingClient(_events("```json\n{" + SECTION_A + "}\n```" + "x" * 1000))
+
+        text, sections, stats = stream_summary(client, "model", self.BODY, retry_max=0)
+
+        assert list(sections) == ["product_analysis"]
+        assert stats["attempts"] == 1 and stats["missing_sections"]
+        assert stats["first_section_seconds"] is not None
+        stream = client.streams[0]
+        assert stream.closed and stream.consumed < len(stream.events)
+
+    def test_aborts_early_and_retries_with_verified_prefix(self):
+        """スキーマ外で打ち切り、検証済みの部分を書き出しにして続きから再生成すること"""
+        garbage = ', "unexpected": {"x": 1}' + "y" * 4000
+        client = StubStreamingClient(
+            _events("```json\n{" + SECTION_A + garbage),
+            _events(" " + SECTION_B + "}\n```", output_tokens=30),
+        )
+
+        text, sections, stats = stream_summary(client, "model", self.BODY, retry_max=1)
+
+        assert list(sections) == ["product_analysis", "customer_guide"]
+        first = client.streams[0]
+        assert first.consumed < len(first.events) // 10
+        prefill = client.requests[1]["messages"][-1]
+        assert prefill["role"] == "assistant"
+        assert prefill["content"] == "```json\n{" + SECTION_A + ","
+        assert client.requests[1]["messages"][0] == self.BODY["messages"][0]
+        assert stats["attempts"] == 2
+        assert stats["output_tokens"] == 30
+        assert 0 < stats["wasted_output_tokens"] < 100
+
+    def test_retry_exhaustion_raises(self):
+        client = StubStreamingClient(_events("了解しました。" * 100), _events('{"product_analysis": 1'))
+        with pytest.raises(OffSchemaError):
+            stream_summary(client, "model", self.BODY, retry_max=1)
+        assert client.requests[1]["messages"][-1]["content"] == "```json\n{"
+
+    def test_truncated_response_is_retried(self):
+        """最大トークンで途中終了した場合も続きから再試行すること"""
+        client = StubStreamingClient(
+            _events("{" + SECTION_A + ', "customer_guide": {"simple_'),
+            _events(" " + SECTION_B + "}"),
+        )
+        _, sections, stats = stream_summary(client, "model", self.BODY, retry_max=1)
+        assert list(sections) == ["product_analysis", "customer_guide"]
+        assert stats["aborts"] == ["応答が JSON の途中で終わりました"]
+
+    def test_stream_exception_event_is_throttling(self):
+        client = StubStreamingClient([{"throttlingException": {"message": "slow down"}}])
+        with pytest.raises(Exception) as exc:
+            stream_summary(client, "model", self.BODY)
+        assert is_throttling_error(exc.value)
+
+
+def test_processor_streaming_result():
+    """AI_STREAMING 有効時に検証済みのセクションが ai_summary になること"""
+    client = StubStreamingClient(_events("```json\n{" + SECTION_A + "}\n```"))
+    processor = BedrockAIProcessor(client=client, streaming=True)
+    raw = RawLoanData(id=1, institution_id=1, institution_name="青い森信用金庫", source_url="https://example.com",
+                      page_title="マイカーローン", structured_data={}, scraped_at=None)
+
+    result = processor.summarize_loan_data(raw)
+
+    assert result["processing_status"] == "completed"
+    assert result["validation_status"] == "warning"
+    assert result["ai_summary"]["product_analysis"]["executive_summary"] == "要約"
+    assert result["stream_stats"]["attempts"] == 1
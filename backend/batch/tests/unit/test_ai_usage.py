@@ -0,0 +1,94 @@
+# tests/unit/test_ai_usage.py
+from unittest.mock import Mock
+
+import ai_processing_batch as mod
+from ai_executor import ConcurrentAIExecutor
+from ai_usage import UsageMetrics, estimate_prompt_size, percentile
+from tests.unit.test_ai_executor import StubBedrockRuntimeClient
+
+
+def _raw(i, structured):
+    return mod.RawLoanData(
+        id=i, institution_id=1, institution_name="青い森信用金庫", source_url=f"https://example.com/{i}",
+        page_title="マイカーローン", structured_data=structured, scraped_at=None,
+    )
+
+
+class TestUsageMetrics:
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile([], 50) is None
+
+    def test_report_aggregates_calls(self):
+        """p50/p95 の所要時間と商品あたりのトークン数が集計されること"""
+        metrics = UsageMetrics()
+        for latency in (100, 200, 300, 400, 1000):
+            metrics.record({"input_tokens": 800, "output_tokens": 200}, latency_ms=latency, retries=1, model_id="m")
+
+        report = metrics.report(products=5)
+
+        assert report["calls"] == 5
+        assert report["latency_p50_ms"] == 300
+        assert report["latency_p95_ms"] == 1000
+        assert report["tokens_per_product"] == 1000
+        assert report["output_tokens_per_product"] == 200
+        assert report["retries"] == 5
+
+    def test_prompt_size_flags_oversized_fields(self):
+        """大きい structured_data を送信前に検出し、大きいフィールドを集計すること"""
+        metrics = UsageMetrics(prompt_warn_tokens=500)
+        big = {"product_name": "A", "notes": "注意事項" * 500, "rates": list(range(100))}
+
+        assert estimate_prompt_size(big)["largest_fields"][0][0] == "notes"
+        assert metrics.check_prompt(1, {"product_name": "A"}) is None
+        assert metrics.check_prompt(2, big)["structured_tokens"] > 500
+
+        report = metrics.report(products=2)
+        assert report["oversized_prompts"] == 1
+        assert report["oversized_fields"][0] == ("notes", 1)
+
+
+class TestCallAccounting:
+
+    def test_throttled_call_records_retries_and_latency(self):
+        """スロットリングの再試行回数・所要時間・モデルが結果の usage に入ること"""
+        client = StubBedrockRuntimeClient(latency=0.01, throttle_first=2)
+        processor = mod.BedrockAIProcessor(client=client)
+        executor = ConcurrentAIExecutor(requests_per_minute=0, tokens_per_minute=0, retry_base_delay=0)
+
+        (_, result, error), = executor.map(processor.summarize_loan_data, [_raw(1, {"product_name": "A"})])
+
+        assert error is None
+        assert result["usage"]["retries"] == 2
+        assert result["usage"]["latency_ms"] >= 10
+        assert result["usage"]["model_id"] == processor.model_id
+        assert processor.usage.report(products=1)["retries"] == 2
+
+    def test_usage_persisted_only_on_representative_row(self, monkeypatch):
+        """同じ構造化データの行は呼び出しを共有し、計測値は代表の行にだけ保存されること"""
+        b = mod.AIProcessingBatch.__new__(mod.AIProcessingBatch)
+        b.connection = Mock()
+        b.cursor = Mock()
+        b.work_queue = Mock()
+        b.work_queue.complete.return_value = True
+        b.executor = ConcurrentAIExecutor(requests_per_minute=0, tokens_per_minute=0)
+        b.ai_processor = mod.BedrockAIProcessor(client=StubBedrockRuntimeClient())
+        b.pack_size = 1
+        b.integrator = None
+        b.connect_database = lambda: None
+        b.close_database = lambda: None
+        rows = [_raw(1, {"product_name": "A"}), _raw(2, {"product_name": "A"})]
+        monkeypatch.setattr(b, "get_unprocessed_raw_data", lambda limit: rows)
+        monkeypatch.setattr(b, "find_cached_summaries", lambda keys: {})
+
+        report = b.run(batch_size=2)
+
+        params = [c.args[1] for c in b.cursor.execute.call_args_list if "INSERT INTO processed_loan_data" in c.args[0]]
+        assert len(params) == 2
+        latency_index = 9  # raw_data_id, institution_id, ai_summary, ai_model, version, key, in, out, cache, latency
+        assert params[0][latency_index] is not None
+        assert params[1][6:11] == (None, None, None, None, None)
+        assert report["calls"] == 1 and report["products"] == 1
@@ -0,0 +1,141 @@
+# tests/unit/test_background_writer.py
+import queue
+import threading
+import time
+
+import pytest
+
+from loanpedia_scraper.database.background_writer import BackgroundWriter
+
+
+class RecordingSaver:
+    """save_scraped_products の代わりに呼び出しを記録するスタブ"""
+
+    def __init__(self, fail_first=(), always_fail=(), delay=0.0, gate=None):
+        self.batches = []
+        self.fail_first = set(fail_first)
+        self.always_fail = set(always_fail)
+        self.delay = delay
+        self.gate = gate
+        self._next_id = 0
+
+    def __call__(self, code, name, items):
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.delay)
+        self.batches.append([p["product_name"] for p, _ in items])
+        ids = []
+        for product, _ in items:
+            pname = product["product_name"]
+            if pname in self.always_fail or pname in self.fail_first:
+                self.fail_first.discard(pname)
+                ids.append(None)
+            else:
+                self._next_id += 1
+                ids.append(self._next_id)
+        return ids
+
+
+def _writer(saver, **kwargs):
+    params = dict(flush_size=2, flush_interval=0.05, retry_max=3, retry_base_delay=0)
+    params.update(kwargs)
+    return BackgroundWriter("0001", "テスト銀行", save_many=saver, **params)
+
+
+class TestBackgroundWriter:
+
+    def test_batches_and_reports_outcomes(self):
+        """flush_size 件ずつ一括保存され、レコードごとの結果が返ること"""
+        saver = RecordingSaver()
+        writer = _writer(saver)
+        for i in range(5):
+            writer.submit({"product_name": f"p{i}"}, {}, key=f"k{i}")
+
+        outcomes = writer.close()
+
+        assert [len(b) for b in saver.batches][:2] == [2, 2]
+        assert sum(len(b) for b in saver.batches) == 5
+        assert all(o.success and o.raw_data_id for o in outcomes.values())
+        assert writer.summary() == {"queued": 5, "saved": 5, "failed": 0, "spooled": 0, "pending": 0}
+
+    def test_submit_does_not_wait_for_slow_db(self):
+        """DBが遅くても submit はキューに積むだけで戻ること"""
+        saver = RecordingSaver(delay=0.2)
+        writer = _writer(saver, max_queue=10)
+
+        started = time.monotonic()
+        for i in range(4):
+            writer.submit({"product_name": f"p{i}"}, {})
+        elapsed = time.monotonic() - started
+        outcomes = writer.close()
+
+        assert elapsed < 0.1
+        assert len(outcomes) == 4 and all(o.success for o in outcomes.values())
+
+    def test_retries_only_failed_records(self):
+        """保存できなかったレコードのみ再試行されること"""
+        saver = RecordingSaver(fail_first={"p1"})
+        writer = _writer(saver)
+        writer.submit({"product_name": "p0"}, {}, key="a")
+        writer.submit({"product_name": "p1"}, {}, key="b")
+
+        outcomes = writer.close()
+
+        assert saver.batches == [["p0", "p1"], ["p1"]]
+        assert outcomes["a"].attempts == 1
+        assert outcomes["b"].success and outcomes["b"].attempts == 2
+
+    def test_permanent_failure_recorded(self):
+        """最大試行回数を超えた失敗はエラーとして結果に残ること"""
+        saver = RecordingSaver(always_fail={"bad"})
+        writer = _writer(saver)
+        writer.submit({"product_name": "bad"}, {}, key="x")
+
+        outcomes = writer.close()
+
+        assert outcomes["x"].success is False
+        assert outcomes["x"].attempts == 3
+        assert outcomes["x"].error
+        assert writer.summary()["failed"] == 1
+
+    def test_bounded_queue_applies_backpressure(self):
+        """キューが満杯なら submit が待ち、timeout で queue.Full になること"""
+        gate = threading.Event()
+        writer = _writer(RecordingSaver(gate=gate), max_queue=1, flush_size=1)
+        writer.submit({"product_name": "p0"}, {})  # ライターが取り出して保存中で止まる
+        time.sleep(0.05)
+        writer.submit({"product_name": "p1"}, {})  # キューを埋める
+
+        with pytest.raises(queue.Full):
+            writer.submit({"product_name": "p2"}, {}, timeout=0.05)
+
+        gate.set()
+        outcomes = writer.close()
+        assert sum(o.success for o in outcomes.values()) == 2
+
+    def test_submit_after_close_rejected(self):
+        writer = _writer(RecordingSaver())
+        writer.close()
+        with pytest.raises(RuntimeError):
+            writer.submit({"product_name": "p"}, {})
+
+
+def test_handler_reports_db_outcomes_in_summary(monkeypatch):
+    """ハンドラーの実行結果にライターの保存結果が反映されること"""
+    from loanpedia_scraper.src.handlers import aomori_michinoku_bank as handler
+
+    class FakeScraper:
+        def scrape_loan_info(self):
+            return {"scraping_status": "success", "product_name": "マイカーローン", "raw_data": {}}
+
+    reg = {"mycar": {"name": "マイカーローン", "cls": FakeScraper}, "edu": {"name": "教育ローン", "cls": FakeScraper}}
+    saver = RecordingSaver()
+    monkeypatch.setattr(handler, "_load_registry", lambda: reg)
+    monkeypatch.setattr(handler, "_create_writer", lambda: _writer(saver).start())
+    monkeypatch.setattr(handler, "SCRAPE_SLEEP_SEC", 0)
+
+    results, ok, ng = handler._run_many(["mycar", "edu"])
+
+    assert ok == 2 and ng == 0
+    assert [r["db_saved"] for r in results] == [True, True]
+    assert all(r["db_raw_data_id"] for r in results)
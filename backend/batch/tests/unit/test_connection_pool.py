@@ -0,0 +1,112 @@
+# tests/unit/test_connection_pool.py
+import pytest
+from unittest.mock import Mock, patch
+
+from loanpedia_scraper.database.connection_pool import (
+    ConnectionPool,
+    PoolExhaustedError,
+)
+
+
+def _fake_connect(created):
+    def _connect(db_config):
+        conn = Mock()
+        conn.server_status = 0
+        created.append(conn)
+        return conn
+    return _connect
+
+
+class TestConnectionPool:
+
+    def test_reuses_released_connection(self):
+        """返却した接続が次の貸し出しで再利用されること"""
+        created = []
+        pool = ConnectionPool({}, connect_fn=_fake_connect(created))
+
+        c1 = pool.acquire()
+        pool.release(c1)
+        c2 = pool.acquire()
+
+        assert c1 is c2
+        assert len(created) == 1
+        assert pool.stats == {"created": 1, "reused": 1, "discarded": 0}
+        # 直近に使われた接続は ping しない
+        c2.ping.assert_not_called()
+
+    def test_health_check_discards_dead_connection(self):
+        """ping に失敗した接続は破棄され新しい接続が作られること"""
+        created = []
+        pool = ConnectionPool({}, validation_interval=0, connect_fn=_fake_connect(created))
+
+        c1 = pool.acquire()
+        pool.release(c1)
+        c1.ping.side_effect = Exception("gone away")
+        c2 = pool.acquire()
+
+        assert c2 is not c1
+        c1.close.assert_called_once()
+        assert pool.stats["discarded"] == 1
+
+    def test_idle_timeout_discards_without_ping(self):
+        """アイドルタイムアウトを超えた接続は ping せずに破棄されること"""
+        created = []
+        pool = ConnectionPool({}, idle_timeout=10, connect_fn=_fake_connect(created))
+
+        with patch("loanpedia_scraper.database.connection_pool.time.monotonic", return_value=100.0):
+            c1 = pool.acquire()
+            pool.release(c1)
+        with patch("loanpedia_scraper.database.connection_pool.time.monotonic", return_value=111.0):
+            c2 = pool.acquire()
+
+        assert c2 is not c1
+        c1.ping.assert_not_called()
+        c1.close.assert_called_once()
+
+    def test_max_size_limits_connections(self):
+        """最大接続数に達したら acquire_timeout 後にエラーとなること"""
+        pool = ConnectionPool({}, max_size=1, acquire_timeout=0.01, connect_fn=_fake_connect([]))
+
+        pool.acquire()
+        with pytest.raises(PoolExhaustedError):
+            pool.acquire()
+
+    def test_release_rolls_back_open_transaction(self):
+        """未完了トランザクションは返却時にロールバックされること"""
+        from pymysql.constants import SERVER_STATUS
+
+        pool = ConnectionPool({}, connect_fn=_fake_connect([]))
+        conn = pool.acquire()
+        conn.server_status = SERVER_STATUS.SERVER_STATUS_IN_TRANS
+        pool.release(conn)
+
+        conn.rollback.assert_called_once()
+
+    def test_context_manager_discards_on_error(self):
+        """with ブロックで例外が起きた接続は破棄されること"""
+        pool = ConnectionPool({}, connect_fn=_fake_connect([]))
+
+        with pytest.raises(RuntimeError):
+            with pool.connection() as conn:
+                raise RuntimeError("boom")
+
+        conn.close.assert_called_once()
+        assert pool.size == 0
+
+
+def test_save_scraped_product_reuses_pooled_connection(monkeypatch):
+    """複数商品の保存で接続が使い回されること"""
+    from loanpedia_scraper.database import connection_pool, loan_service
+
+    created = []
+    pool = ConnectionPool({}, connect_fn=_fake_connect(created))
+    monkeypatch.setattr(connection_pool, "_pools", {connection_pool._pool_key({}): pool})
+    monkeypatch.setattr(loan_service, "get_database_config", lambda: {})
+    monkeypatch.setattr(loan_service.LoanDatabase, "save_loan_data", lambda self, data: 1)
+    monkeypatch.setenv("SAVE_TO_DB", "true")
+
+    for _ in range(3):
+        assert loan_service.save_scraped_product("0001", "テスト銀行", {}, {}) is True
+
+    assert len(created) == 1
+    assert pool.stats["reused"] == 2
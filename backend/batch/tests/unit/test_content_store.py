@@ -0,0 +1,81 @@
+# tests/unit/test_content_store.py
+import struct
+import zlib
+from datetime import datetime
+
+from loanpedia_scraper.database.content_store import (
+    COMPRESSION_MYSQL,
+    COMPRESSION_NONE,
+    COMPRESSION_ZLIB,
+    build_blob_rows,
+    compress_content,
+    content_hash,
+    decompress_content,
+    fetch_contents,
+    read_content,
+)
+
+
+class TestCompression:
+
+    def test_roundtrip_compresses_large_text(self):
+        """十分な大きさの本文は zlib で圧縮され、元に戻せること"""
+        html = "<tr><td>金利</td><td>年2.5%</td></tr>" * 200
+        compression, data = compress_content(html)
+
+        assert compression == COMPRESSION_ZLIB
+        assert len(data) < len(html.encode("utf-8"))
+        assert decompress_content(compression, data) == html
+
+    def test_small_text_stored_uncompressed(self):
+        """小さな本文は非圧縮で保存されること"""
+        compression, data = compress_content("短い本文")
+
+        assert compression == COMPRESSION_NONE
+        assert decompress_content(compression, data) == "短い本文"
+
+    def test_decodes_mysql_compress_format(self):
+        """移行で使う MySQL COMPRESS() 形式を復元できること"""
+        raw = "バックフィル済みHTML".encode("utf-8")
+        data = struct.pack("<I", len(raw)) + zlib.compress(raw)
+
+        assert decompress_content(COMPRESSION_MYSQL, data) == "バックフィル済みHTML"
+
+
+class TestBlobRows:
+
+    def test_dedupes_and_skips_empty(self):
+        """同一本文は1行にまとめられ、空の本文は保存しないこと"""
+        rows = build_blob_rows(["<html>a</html>", "", None, "<html>a</html>", "text"], datetime.now())
+
+        assert [r[0] for r in rows] == [content_hash("<html>a</html>"), content_hash("text")]
+
+
+class TestReaders:
+
+    def test_read_content_prefers_blob_and_falls_back_to_inline(self):
+        """blob があれば復元し、なければ旧インライン列を返すこと"""
+        compression, data = compress_content("x" * 1000)
+
+        assert read_content(None, compression, data) == "x" * 1000
+        assert read_content("旧形式のHTML", None, None) == "旧形式のHTML"
+        assert read_content(None) == ""
+
+    def test_fetch_contents_single_query(self):
+        """ハッシュ群を1回の IN クエリで引き、復元して返すこと"""
+        html = "<p>本文</p>" * 100
+        compression, data = compress_content(html)
+        h = content_hash(html)
+
+        class Cursor:
+            executed = []
+
+            def execute(self, sql, params):
+                self.executed.append(params)
+
+            def fetchall(self):
+                return [{"content_hash": h, "compression": compression, "data": data}]
+
+        cur = Cursor()
+        assert fetch_contents(cur, [h, None, h]) == {h: html}
+        assert cur.executed == [(h,)]
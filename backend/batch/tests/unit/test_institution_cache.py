@@ -0,0 +1,99 @@
+# tests/unit/test_institution_cache.py
+import pytest
+from unittest.mock import Mock
+
+from loanpedia_scraper.database.institution_cache import (
+    InstitutionCache,
+    clear_institution_caches,
+)
+from loanpedia_scraper.database.loan_database import LoanDatabase
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    clear_institution_caches()
+    yield
+    clear_institution_caches()
+
+
+class TestInstitutionCache:
+
+    def test_lookup_by_code_then_name(self):
+        """コード優先、なければ名称でIDを解決すること"""
+        cache = InstitutionCache()
+        cache.ensure_loaded(lambda: [(1, "0001", "青森銀行"), (3, None, "青い森信用金庫")])
+
+        assert cache.get("0001", "別名") == 1
+        assert cache.get("", "青い森信用金庫") == 3
+        assert cache.get("9999", "未登録") is None
+
+    def test_loader_called_once(self):
+        """全件読込は1回だけ行われること"""
+        cache = InstitutionCache()
+        loader = Mock(return_value=[(1, "0001", "青森銀行")])
+
+        cache.ensure_loaded(loader)
+        cache.ensure_loaded(loader)
+
+        loader.assert_called_once()
+
+
+class TestLoanDatabaseInstitutionCache:
+
+    def _db(self):
+        db = LoanDatabase({"host": "h", "database": "d"}, use_pool=False)
+        db.connection = Mock()
+        db.cursor = Mock()
+        db.cursor.fetchall.return_value = [
+            {"id": 3, "institution_code": "0003", "institution_name": "青い森信用金庫"},
+        ]
+        return db
+
+    def test_preloaded_once_for_many_products(self):
+        """複数回の呼び出しでもクエリは初回の全件読込のみであること"""
+        db = self._db()
+
+        for _ in range(5):
+            assert db.get_or_create_institution("0003", "青い森信用金庫") == 3
+
+        assert db.cursor.execute.call_count == 1
+
+    def test_insert_fills_cache(self):
+        """未登録の機関は INSERT ... ON DUPLICATE KEY で登録されキャッシュされること"""
+        db = self._db()
+        db.cursor.lastrowid = 7
+
+        assert db.get_or_create_institution("0004", "東奥信用金庫") == 7
+        assert db.get_or_create_institution("0004", "東奥信用金庫") == 7
+
+        insert_sql = db.cursor.execute.call_args_list[1][0][0]
+        assert "ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)" in insert_sql
+        assert db.cursor.execute.call_count == 2
+        db.connection.commit.assert_called_once()
+
+
+class TestRDSDataAPIInstitutionCache:
+
+    def _adapter(self, monkeypatch, client):
+        from loanpedia_scraper.database import rds_data_api_adapter
+
+        monkeypatch.setenv("DB_ARN", "arn:db")
+        monkeypatch.setenv("DB_SECRET_ARN", "arn:secret")
+        monkeypatch.setattr(rds_data_api_adapter.boto3, "client", lambda *a, **k: client)
+        return rds_data_api_adapter.RDSDataAPIAdapter()
+
+    def test_preloaded_once_and_insert_cached(self, monkeypatch):
+        """全件読込は1回で、新規登録分もキャッシュされること"""
+        client = Mock()
+        client.execute_statement.side_effect = [
+            {"formattedRecords": '[{"id": 3, "institution_code": "0003", "institution_name": "青い森信用金庫"}]'},
+            {"generatedFields": [{"longValue": 8}]},
+        ]
+        adapter = self._adapter(monkeypatch, client)
+
+        assert adapter.get_or_create_institution("0003", "青い森信用金庫") == 3
+        assert adapter.get_or_create_institution("0003", "青い森信用金庫") == 3
+        assert adapter.get_or_create_institution("0004", "東奥信用金庫") == 8
+        assert adapter.get_or_create_institution("0004", "東奥信用金庫") == 8
+
+        assert client.execute_statement.call_count == 2
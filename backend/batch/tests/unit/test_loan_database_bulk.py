@@ -0,0 +1,173 @@
+# tests/unit/test_loan_database_bulk.py
+import pytest
+from unittest.mock import Mock
+
+from loanpedia_scraper.database import content_store
+from loanpedia_scraper.database.loan_database import LoanDatabase, RAW_ROW_HASH_INDEX
+from loanpedia_scraper.database.institution_cache import clear_institution_caches
+
+
+@pytest.fixture(autouse=True)
+def _clear_institution_cache():
+    clear_institution_caches()
+    yield
+    clear_institution_caches()
+
+
+class FakeCursor:
+    """raw_loan_data / content_blobs / financial_institutions を模したインメモリのカーソル"""
+
+    def __init__(self, existing_hashes=None):
+        self.rows = {h: i + 1 for i, h in enumerate(existing_hashes or [])}
+        self.blobs = {}
+        self.next_id = len(self.rows) + 1
+        self.round_trips = []
+        self._result = []
+        self.lastrowid = None
+
+    @staticmethod
+    def _label(sql):
+        verb = sql.split()[0].upper()
+        return f"{verb} content_blobs" if "INTO content_blobs" in sql else verb
+
+    def execute(self, sql, params=None):
+        self.round_trips.append(self._label(sql))
+        if "FROM financial_institutions" in sql:
+            self._result = [{"id": 10, "institution_code": "0003", "institution_name": "青い森信用金庫"}]
+        elif "FROM raw_loan_data WHERE content_hash IN" in sql:
+            self._result = [{"id": self.rows[h], "content_hash": h} for h in params if h in self.rows]
+
+        elif "ON DUPLICATE KEY UPDATE" in sql and "raw_loan_data" in sql:
+            self.lastrowid = self._upsert(params)
+
+    def executemany(self, sql, seq):
+        self.round_trips.append(self._label(sql))
+        if "INTO content_blobs" in sql:
+            for row in seq:
+                self.blobs.setdefault(row[0], row)
+        elif sql.strip().startswith("INSERT"):
+            for row in seq:
+                self._upsert(row)
+
+    def _upsert(self, row):
+        # content_hash の一意キーを模す
+        h = row[RAW_ROW_HASH_INDEX]
+        if h not in self.rows:
+            self.rows[h] = self.next_id
+            self.next_id += 1
+        return self.rows[h]
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+
+def _db(cursor):
+    db = LoanDatabase({}, use_pool=False)
+    db.connection = Mock()
+    db.cursor = cursor
+    return db
+
+
+def _record(html, code="0003", name="青い森信用金庫"):
+    return {
+        "institution_code": code,
+        "institution_name": name,
+        "source_url": f"https://example.com/{html}",
+        "html_content": html,
+        "product_name": f"商品{html}",
+    }
+
+
+class TestSaveLoanDataMany:
+
+    def test_upserts_new_and_existing_in_one_transaction(self):
+        """新規・既存とも1回の複数行UPSERTで保存され、入力順のIDが返ること"""
+        existing = LoanDatabase._content_hash(_record("b"), 10)
+        cursor = FakeCursor(existing_hashes=[existing])
+        db = _db(cursor)
+
+        ids = db.save_loan_data_many([_record("a"), _record("b"), _record("c")])
+
+        assert ids[1] == 1
+        assert ids[0] is not None and ids[2] is not None
+        assert len(set(ids)) == 3
+        # 機関マスター読込 + 本文保存 + UPSERT + ID取得
+        assert cursor.round_trips == ["SELECT", "INSERT content_blobs", "INSERT", "SELECT"]
+        db.connection.commit.assert_called_once()
+
+    def test_duplicate_hash_in_batch_resolves_to_same_id(self):
+        """同一内容のレコードは1行に集約され、同じIDが返ること"""
+        cursor = FakeCursor()
+        db = _db(cursor)
+
+        ids = db.save_loan_data_many([_record("a"), _record("a")])
+
+        assert ids[0] == ids[1]
+        assert len(cursor.rows) == 1
+
+    def test_products_from_same_page_are_kept_apart(self):
+        """同じページ・PDF から取り出した複数の商品は、HTML が同じでも別の行になること"""
+        cursor = FakeCursor()
+        db = _db(cursor)
+        page = {"source_url": "https://example.com/rates.pdf", "html_content": "金利一覧"}
+        records = [{**_record("x"), **page, "product_name": name} for name in ("マイカーローン", "教育ローン")]
+
+        ids = db.save_loan_data_many(records)
+
+        assert ids[0] != ids[1]
+        assert len(cursor.rows) == 2
+        # 本文は1回だけ保存
+        assert list(cursor.blobs) == [content_store.content_hash("金利一覧")]
+
+    def test_flush_size_chunks_statements(self):
+        """flush_size 件ごとにステートメントが分割されること"""
+        cursor = FakeCursor()
+        db = _db(cursor)
+
+        ids = db.save_loan_data_many([_record(str(i)) for i in range(5)], flush_size=2)
+
+        assert all(ids)
+        assert cursor.round_trips.count("INSERT") == 3
+        db.connection.commit.assert_called_once()
+
+    def test_one_transaction_per_institution_and_rollback_on_error(self):
+        """金融機関ごとにコミットされ、失敗した機関のみロールバックされること"""
+        cursor = FakeCursor()
+        original = cursor.executemany
+
+        def _fail_for_other(sql, seq):
+            if any(row[0] is None for row in seq if len(row) == 12):
+                raise RuntimeError("boom")
+            return original(sql, seq)
+
+        cursor.executemany = _fail_for_other
+        db = _db(cursor)
+        db.get_or_create_institution = lambda code, name: 10 if code == "0003" else None
+
+        ids = db.save_loan_data_many([_record("a"), _record("x", code="0004", name="東奥信用金庫")])
+
+        assert ids[0] is not None
+        assert ids[1] is None
+        db.connection.commit.assert_called_once()
+        db.connection.rollback.assert_called_once()
+
+    def test_not_connected(self):
+        """未接続時は全件 None を返すこと"""
+        db = LoanDatabase({}, use_pool=False)
+        assert db.save_loan_data_many([_record("a")]) == [None]
+
+
+class TestSaveRawData:
+
+    def test_single_round_trip_upsert(self):
+        """既存ハッシュでも1回の INSERT ... ON DUPLICATE KEY UPDATE で既存IDが返ること"""
+        existing = LoanDatabase._content_hash(_record("b"), 10)
+        cursor = FakeCursor(existing_hashes=[existing])
+        db = _db(cursor)
+
+        assert db.save_raw_data(_record("b"), 10) == 1
+        assert db.save_raw_data(_record("a"), 10) == 2
+        assert cursor.round_trips == ["INSERT content_blobs", "INSERT", "INSERT content_blobs", "INSERT"]
@@ -0,0 +1,149 @@
+# tests/unit/test_object_store.py
+import io
+from unittest.mock import Mock
+
+import pytest
+
+from loanpedia_scraper.database import object_store
+from loanpedia_scraper.database.content_store import (
+    COMPRESSION_ZLIB,
+    build_blob_row,
+    content_hash,
+    fetch_contents,
+    read_content,
+)
+from loanpedia_scraper.database.institution_cache import clear_institution_caches
+from loanpedia_scraper.database.loan_database import LoanDatabase
+from loanpedia_scraper.database.object_store import (
+    LocalObjectStore,
+    S3ObjectStore,
+    get_object_store,
+    reset_object_store,
+    set_object_store,
+)
+
+
+@pytest.fixture(autouse=True)
+def _reset_store():
+    reset_object_store()
+    clear_institution_caches()
+    yield
+    reset_object_store()
+    clear_institution_caches()
+
+
+class FakeS3:
+    """put_object / head_object / get_object のみのS3スタブ"""
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.puts += 1
+        self.objects[(Bucket, Key)] = Body
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise Exception("404")
+        return {}
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+class TestStores:
+
+    def test_local_store_roundtrip(self, tmp_path):
+        """ローカル実装で保存したURIから読み戻せること"""
+        store = LocalObjectStore(str(tmp_path))
+        uri = store.put("blobs/ab/abc", b"data")
+
+        assert uri.startswith("file://")
+        assert store.exists("blobs/ab/abc")
+        assert object_store.read_object(uri) == b"data"
+
+    def test_s3_store_uses_prefix_and_skips_existing(self):
+        """S3 実装はプレフィックス付きで保存し、同一ハッシュは再送しないこと"""
+        s3 = FakeS3()
+        store = S3ObjectStore("bucket", prefix="raw-bodies", client=s3)
+        html = "<html>" + "本文" * 500 + "</html>"
+
+        row1 = build_blob_row(html, None, store)
+        row2 = build_blob_row(html, None, store)
+
+        h = content_hash(html)
+        assert row1[5] == f"s3://bucket/raw-bodies/blobs/{h[:2]}/{h}.zlib"
+        assert row1[4] is None  # data はDBに持たない
+        assert row1 == row2
+        assert s3.puts == 1
+
+        set_object_store(store)
+        assert read_content(None, row1[1], None, row1[5]) == html
+
+    def test_env_configuration(self, monkeypatch, tmp_path):
+        """RAW_BODY_STORE で退避先が選ばれ、未設定なら退避しないこと"""
+        monkeypatch.delenv("RAW_BODY_STORE", raising=False)
+        assert get_object_store() is None
+
+        reset_object_store()
+        monkeypatch.setenv("RAW_BODY_STORE", "local")
+        monkeypatch.setenv("RAW_BODY_LOCAL_DIR", str(tmp_path))
+        assert isinstance(get_object_store(), LocalObjectStore)
+
+        reset_object_store()
+        monkeypatch.setenv("RAW_BODY_STORE", "s3")
+        monkeypatch.delenv("RAW_BODY_BUCKET", raising=False)
+        with pytest.raises(ValueError):
+            get_object_store()
+
+
+class TestOffloadSave:
+
+    def test_save_offloads_bodies_and_keeps_pointer(self, tmp_path):
+        """退避モードでは本文と元PDFがストアに置かれ、行にはハッシュとURIのみ残ること"""
+        set_object_store(LocalObjectStore(str(tmp_path)))
+        cursor = Mock()
+        cursor.fetchall.return_value = []
+        cursor.lastrowid = 1
+        db = LoanDatabase({}, use_pool=False)
+        db.connection = Mock()
+        db.cursor = cursor
+
+        html = "<html>" + "x" * 70000 + "</html>"
+        pdf = b"%PDF-1.4 original bytes"
+        db.save_raw_data({"html_content": html, "extracted_text": "本文", "source_bytes": pdf}, 10)
+
+        blob_sql, blob_rows = cursor.executemany.call_args.args
+        assert "storage_uri" in blob_sql
+        assert [r[0] for r in blob_rows] == [content_hash(html), content_hash("本文"), content_hash(pdf)]
+        assert all(r[4] is None and r[5].startswith("file://") for r in blob_rows)
+
+        raw_params = cursor.execute.call_args.args[1]
+        assert raw_params[7] == content_hash(pdf)  # source_blob_hash
+
+        by_hash = {r[0]: r for r in blob_rows}
+        cur = Mock()
+        cur.fetchall.return_value = [
+            {"content_hash": h, "compression": r[1], "data": None, "storage_uri": r[5]}
+            for h, r in by_hash.items()
+        ]
+        contents = fetch_contents(cur, [content_hash(html)])
+        assert contents[content_hash(html)] == html
+        assert by_hash[content_hash(html)][1] == COMPRESSION_ZLIB
+        assert fetch_contents(cur, [content_hash(pdf)], as_bytes=True)[content_hash(pdf)] == pdf
+
+    def test_source_bytes_discarded_without_offload(self):
+        """退避しない設定では元PDFは保存されないこと"""
+        set_object_store(None)
+        cursor = Mock()
+        cursor.lastrowid = 1
+        db = LoanDatabase({}, use_pool=False)
+        db.connection = Mock()
+        db.cursor = cursor
+
+        db.save_raw_data({"html_content": "<html/>", "source_bytes": b"%PDF"}, 10)
+
+        blob_rows = cursor.executemany.call_args.args[1]
+        assert [r[0] for r in blob_rows] == [content_hash("<html/>")]
+        assert cursor.execute.call_args.args[1][7] is None
@@ -0,0 +1,100 @@
+# tests/unit/test_pdf_batch_analyzer.py
+import io
+import json
+import pytest
+
+from pdf_scraper import PDFScraper
+from pdf_batch_analyzer import PDFBatchAnalyzer, collect_sources
+
+
+class TestFindLoanMatches:
+
+    def test_extract_loan_info(self):
+        """各カテゴリの値が出現順に重複なく抽出されること"""
+        text = "金利：1.5% 実質年率 2.8% 融資額 300万円 1,000円 返済期間 10年 6ヶ月 TEL 017-777-1234 1.5%"
+        info = PDFScraper().extract_loan_info(text)
+
+        assert info["interest_rates"] == ["1.5", "2.8"]
+        assert info["loan_amounts"] == ["300", "1,000"]
+        assert info["terms"] == ["10", "6"]
+        assert info["contact_info"] == ["017-777-1234"]
+        assert info["conditions"] == []
+
+    @pytest.mark.parametrize("text, expected", [
+        ("借入 10年", {"loan_amounts": ["10"], "terms": ["10"]}),
+        ("融資額 300万円", {"loan_amounts": ["300"]}),
+        ("返済期間 6ヶ月", {"terms": ["6"]}),
+    ])
+    def test_patterns_may_share_digits(self, text, expected):
+        """別のパターンが同じ数字を捕捉しても、それぞれのカテゴリに残ること"""
+        info = PDFScraper().extract_loan_info(text)
+
+        assert {k: v for k, v in info.items() if v} == expected
+
+    def test_shared_digits_are_one_match(self):
+        """同じカテゴリで同じ位置を捕捉したパターンは1件のマッチになること"""
+        matches = PDFScraper().find_loan_matches("融資額 300万円")
+
+        assert matches == [{"category": "loan_amounts", "value": "300", "start": 4, "end": 7, "page": None}]
+
+    def test_matches_have_positions_and_pages(self):
+        """マッチの位置が連結後の全文基準で、ページ番号付きで返ること"""
+        page_texts = [{"page": 1, "text": "abc"}, {"page": 2, "text": "金利1.2"}]
+        matches = PDFScraper().find_loan_matches_in_pages(page_texts)
+
+        assert matches == [
+            {"category": "interest_rates", "value": "1.2", "start": 7, "end": 10, "page": 2}
+        ]
+        full_text = "\n\n".join(p["text"] for p in page_texts)
+        assert full_text[7:10] == "1.2"
+
+
+class TestCollectSources:
+
+    def test_directory_glob_and_url_list(self, tmp_path):
+        """ディレクトリ・グロブ・URLリストが重複なく展開されること"""
+        (tmp_path / "a.pdf").write_bytes(b"")
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "b.PDF").write_bytes(b"")
+        (tmp_path / "note.txt").write_text("x")
+        url_list = tmp_path / "urls.txt"
+        url_list.write_text("# comment\nhttps://example.com/x.pdf\n\n")
+
+        sources = collect_sources(
+            [str(tmp_path), str(tmp_path / "*.pdf"), "https://example.com/x.pdf"],
+            url_list=str(url_list),
+        )
+
+        assert sources == [
+            str(tmp_path / "a.pdf"),
+            str(tmp_path / "sub" / "b.PDF"),
+            "https://example.com/x.pdf",
+        ]
+
+
+class TestPDFBatchAnalyzer:
+
+    def test_run_streams_jsonl_and_reports_throughput(self, tmp_path, make_pdf):
+        """全件がJSONLで出力され、スループットが集計されること"""
+        for i in range(3):
+            (tmp_path / f"doc{i}.pdf").write_bytes(make_pdf([f"Rate {i}.5%", "Call 017-777-1234"]))
+        (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+
+        out = io.StringIO()
+        summary = PDFBatchAnalyzer(max_workers=2).run(collect_sources([str(tmp_path)]), out)
+
+        lines = [json.loads(l) for l in out.getvalue().splitlines()]
+        assert len(lines) == 4
+        ok = {l["source"]: l for l in lines if l["success"]}
+        assert len(ok) == 3
+        doc0 = ok[str(tmp_path / "doc0.pdf")]
+        assert doc0["pages"] == 2
+        assert {"category": "interest_rates", "value": "0.5", "page": 1}.items() <= doc0["matches"][0].items()
+        assert doc0["matches"][-1]["page"] == 2
+
+        assert summary["documents"] == 4
+        assert summary["succeeded"] == 3
+        assert summary["failed"] == 1
+        assert summary["pages"] == 6
+        assert summary["docs_per_second"] > 0
+        assert summary["pages_per_second"] > 0
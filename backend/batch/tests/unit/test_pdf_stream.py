@@ -0,0 +1,72 @@
+# tests/unit/test_pdf_stream.py
+import pytest
+from unittest.mock import patch
+
+from loanpedia_scraper.scrapers.common.pdf_stream import (
+    PdfStreamStats,
+    iter_pdf_pages,
+)
+
+
+class TestIterPdfPages:
+
+    def test_yields_one_result_per_page(self, make_pdf):
+        """ページごとに結果が順に返ること"""
+        pdf = make_pdf(["Rate 1.5%", "Rate 2.5%", "Term 10"])
+        pages = list(iter_pdf_pages(pdf))
+
+        assert [p.page_index for p in pages] == [0, 1, 2]
+        assert "1.5%" in pages[0].text
+        assert "Term 10" in pages[2].text
+
+    def test_normalize_is_applied(self, make_pdf):
+        """正規化関数がページテキストに適用されること"""
+        pdf = make_pdf(["abc"])
+        pages = list(iter_pdf_pages(pdf, normalize=str.upper))
+        assert pages[0].text == "ABC"
+
+    def test_text_disabled(self, make_pdf):
+        """テキスト抽出を無効化した場合はtextがNone"""
+        pdf = make_pdf(["abc"])
+        pages = list(iter_pdf_pages(pdf, with_text=False, with_tables=True))
+        assert pages[0].text is None
+        assert pages[0].tables == []
+
+    def test_stats_records_pages_and_peak_rss(self, make_pdf):
+        """統計にページ数とピークRSSが記録されること"""
+        pdf = make_pdf(["a", "b"])
+        stats = PdfStreamStats()
+        for _ in iter_pdf_pages(pdf, stats=stats):
+            pass
+
+        assert stats.pages == 2
+        assert stats.peak_rss_bytes is not None
+        assert stats.peak_rss_bytes >= stats.start_rss_bytes
+        assert stats.peak_rss_mb > 0
+
+    def test_page_cache_released_before_next_page(self, make_pdf):
+        """次のページへ進む前に処理済みページが解放されること"""
+        pdf = make_pdf(["a", "b"])
+        closed = []
+
+        from pdfplumber.page import Page
+        original_close = Page.close
+
+        def _close(self):
+            closed.append(self.page_number)
+            return original_close(self)
+
+        with patch.object(Page, "close", _close):
+            it = iter_pdf_pages(pdf)
+            next(it)
+            assert closed == [1]
+            next(it)
+            assert closed == [1, 2]
+
+
+def test_pdf_bytes_to_text_joins_pages(make_pdf):
+    """既存のpdf_bytes_to_textがストリーミング経由で全ページを連結すること"""
+    from loanpedia_scraper.scrapers.aomori_michinoku_bank.pdf_parser import pdf_bytes_to_text
+
+    text = pdf_bytes_to_text(make_pdf(["first", "second"]))
+    assert text.splitlines() == ["first", "second"]
@@ -0,0 +1,458 @@
+# tests/unit/test_product_integration_batch.py
+import json
+from contextlib import nullcontext
+from datetime import datetime
+from unittest.mock import Mock
+
+import pymysql.cursors
+import pytest
+
+import product_integration_batch as mod
+
+
+def _row(i, name="マイカーローン"):
+    return {
+        "id": i, "raw_data_id": 100 + i, "institution_id": 1, "institution_name": "青い森信用金庫",
+        "ai_summary": json.dumps({"customer_guide": {"simple_explanation": f"{name}の説明"}}, ensure_ascii=False),
+        "processing_status": "completed", "validation_status": "valid", "processed_at": datetime(2025, 1, 1),
+        "structured_data": json.dumps({"product_name": f"{name}{i}", "loan_category": name, "min_interest_rate": 1.5}),
+    }
+
+
+class FakeReadCursor:
+    """SSDictCursor の代わり（fetchmany で少しずつ返す）"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.executed = []
+        self.fetch_sizes = []
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchmany(self, size):
+        self.fetch_sizes.append(size)
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    def make(rows, chunk_size=2):
+        read_cursor = FakeReadCursor(rows)
+        read_connection = Mock()
+        read_connection.cursor.return_value = read_cursor
+        connection = Mock()
+        connection.cursor.return_value.fetchall.return_value = []  # 既存の loan_products なし
+        pool = Mock()
+        pool.acquire.return_value = connection
+        pool.connection.side_effect = lambda: nullcontext(read_connection)
+        monkeypatch.setattr(mod, "get_connection_pool", lambda config: pool)
+
+        b = mod.ProductIntegrationBatch(chunk_size=chunk_size)
+        return b, connection, connection.cursor.return_value, read_connection, read_cursor
+    return make
+
+
+class TestBulkIntegration:
+
+    def test_structured_data_is_joined_and_streamed(self, batch):
+        """構造化データは JOIN で取得し、行ごとの SELECT を発行しないこと"""
+        b, connection, cursor, read_connection, read_cursor = batch([_row(i) for i in range(1, 6)])
+
+        b.run(batch_size=5)
+
+        read_connection.cursor.assert_called_once_with(pymysql.cursors.SSDictCursor)
+        sql, params = read_cursor.executed[0]
+        assert "LEFT JOIN raw_loan_data r" in sql and params == (5,)
+        assert read_cursor.fetch_sizes == [2, 2, 2, 2]
+        assert read_cursor.closed
+        # 書き込み側の SELECT はチャンクごとの既存商品の読み込みだけ
+        statements = [" ".join(c.args[0].split()) for c in cursor.execute.call_args_list]
+        assert len(statements) == 3
+        assert all(sql.startswith("SELECT id, institution_id, product_name, loan_type") for sql in statements)
+
+    def test_upserts_are_chunked(self, batch):
+        """chunk_size 件ずつ executemany で保存し、チャンクごとにコミットすること"""
+        b, connection, cursor, _, _ = batch([_row(i) for i in range(1, 6)])
+
+        b.run(batch_size=5)
+
+        chunks = [c.args[1] for c in cursor.executemany.call_args_list]
+        assert [len(rows) for rows in chunks] == [2, 2, 1]
+        assert all(c.args[0] is mod.LOAN_PRODUCT_UPSERT_SQL for c in cursor.executemany.call_args_list)
+        first = chunks[0][0]
+        assert first[0] == 1  # processed_data_id
+        assert first[2] == "マイカーローン1"  # JOIN した構造化データから
+        assert first[5] == "マイカーローン"
+        assert first[6] == "マイカーローンの説明"
+        assert connection.commit.call_count == 3
+
+    def test_failed_chunk_is_retried_row_by_row(self, batch):
+        """まとめての保存に失敗したチャンクだけ1件ずつやり直し、失敗行以外は保存すること"""
+        b, connection, cursor, _, _ = batch([_row(i) for i in range(1, 4)], chunk_size=3)
+        cursor.executemany.side_effect = RuntimeError("Data too long")
+
+        def execute(sql, row):
+            if sql is mod.LOAN_PRODUCT_UPSERT_SQL and row[0] == 2:
+                raise RuntimeError("Data too long")
+        cursor.execute.side_effect = execute
+
+        b.connect_database()
+        total, integrated, failed = b.integrate_many(
+            b.iter_unintegrated_processed_data(FakeReadCursor([_row(i) for i in range(1, 4)]), 3)
+        )
+
+        assert (total, integrated, failed) == (3, 2, 1)
+        assert connection.rollback.call_count == 2
+        assert connection.commit.call_count == 2
+
+    def test_integrate_accepts_in_memory_structured_data(self):
+        """融合モードの integrate は渡された構造化データを使い、DB から読み直さないこと"""
+        b = mod.ProductIntegrationBatch.__new__(mod.ProductIntegrationBatch)
+        b.cursor = Mock(lastrowid=9)
+        b.cursor.fetchall.return_value = []
+        processed = b._to_processed_data({**_row(1), "structured_data": None})
+
+        assert b.integrate(processed, {"product_name": "教育ローンA", "loan_category": "教育"}) == 9
+
+        sql, params = b.cursor.execute.call_args.args
+        assert sql is mod.LOAN_PRODUCT_UPSERT_SQL
+        assert params[2] == "教育ローンA" and params[5] == "教育ローン"
+
+
+class FakeIntegrationDB:
+    """差分統合で使う processed_loan_data・ウォーターマーク・失敗記録を持つ偽の DB"""
+
+    def __init__(self, monkeypatch, rows, bad_ids=()):
+        self.monkeypatch = monkeypatch
+        self.rows = {row["id"]: row for row in rows}
+        self.bad_ids = set(bad_ids)
+        self.watermark = 0
+        self.failures = {}
+        self.integrated = set()
+        self.products = {}
+        self.read_ids = []
+
+    def read(self, read_cursor, sql, params):
+        if sql is mod.UNINTEGRATED_PROCESSED_SQL:
+            linked = {p["processed_data_id"] for p in self.products.values()}
+            superseded = {
+                i for i, row in self.rows.items()
+                if any(j > i and other["raw_data_id"] == row["raw_data_id"] for j, other in self.rows.items())
+            }
+            ids = sorted((i for i in self.rows if i not in linked | superseded), reverse=True)[:params[0]]
+        elif sql is mod.INCREMENTAL_PROCESSED_SQL:
+            after_id, _, limit = params
+            ids = sorted(i for i in self.rows if i > after_id)[:limit]
+        else:
+            assert sql is mod.DEAD_LETTER_PROCESSED_SQL
+            _, limit = params
+            ids = sorted(i for i, f in self.failures.items() if f["dead_lettered_at"])[:limit]
+        self.read_ids = ids
+        read_cursor.rows = [self.rows[i] for i in ids]
+
+    def execute(self, cursor, sql, params=None):
+        if sql.lstrip().startswith("SELECT last_processed_id"):
+            cursor.fetchone.return_value = {"last_processed_id": self.watermark}
+        elif sql.lstrip().startswith("SELECT processed_data_id, attempts"):
+            cursor.fetchall.return_value = [
+                {"processed_data_id": i, "attempts": f["attempts"]} for i, f in self.failures.items()
+            ]
+        elif sql.lstrip().startswith("SELECT"):
+            keys = {tuple(params[i:i + 3]) for i in range(0, len(params), 3)}
+            cursor.fetchall.return_value = [dict(p) for key, p in self.products.items() if key in keys]
+        elif sql is mod.WATERMARK_UPSERT_SQL:
+            self.watermark = max(self.watermark, params[1])
+        elif sql.startswith("DELETE FROM integration_failures"):
+            for i in params[1:]:
+                self.failures.pop(i, None)
+
+    def executemany(self, sql, params):
+        if sql is mod.LOAN_PRODUCT_UPSERT_SQL:
+            self.integrated.update(row[0] for row in params)
+            for row in params:
+                key = (row[1], row[2], row[4])
+                current = self.products.get(key, {"id": len(self.products) + 1, "processed_data_id": 0})
+                self.products[key] = {
+                    **current,
+                    "institution_id": row[1], "product_name": row[2], "loan_type": row[4],
+                    "processed_data_id": max(current["processed_data_id"], row[0]),
+                    **{f: row[mod.PRODUCT_ROW_INDEX[f]] for f in mod.PRODUCT_COMPARE_FIELDS},
+                }
+        elif sql is mod.PRODUCT_RELINK_SQL:
+            for processed_data_id, *key in params:
+                product = self.products[tuple(key)]
+                product["processed_data_id"] = max(product["processed_data_id"], processed_data_id)
+        elif sql is mod.INTEGRATION_FAILURE_UPSERT_SQL:
+            for _, i, attempts, error, dead_lettered_at in params:
+                previous = self.failures.get(i, {}).get("dead_lettered_at")
+                self.failures[i] = {"attempts": attempts, "dead_lettered_at": previous or dead_lettered_at}
+
+    def batch(self, chunk_size, max_attempts):
+        db = self
+        read_cursor = FakeReadCursor([])
+        read_cursor.execute = lambda sql, params=None: db.read(read_cursor, sql, params)
+        read_connection = Mock()
+        read_connection.cursor.return_value = read_cursor
+        connection = Mock()
+        cursor = connection.cursor.return_value
+        cursor.execute.side_effect = lambda sql, params=None: db.execute(cursor, sql, params)
+        cursor.executemany.side_effect = self.executemany
+        pool = Mock()
+        pool.acquire.return_value = connection
+        pool.connection.side_effect = lambda: nullcontext(read_connection)
+        self.monkeypatch.setattr(mod, "get_connection_pool", lambda config: pool)
+
+        b = mod.ProductIntegrationBatch(chunk_size=chunk_size)
+        b.watermark_lag_seconds = 0
+        b.max_attempts = max_attempts
+        extract = b.extract_product_data
+        b.extract_product_data = lambda p: None if p.id in db.bad_ids else extract(p)
+        return b
+
+
+class TestIncrementalIntegration:
+
+    def test_reads_only_rows_after_watermark(self, batch):
+        """差分モードはウォーターマークより大きい ID を主キー順に読み、反結合を使わないこと"""
+        b, connection, cursor, _, read_cursor = batch([_row(i) for i in (4, 5, 6)], chunk_size=2)
+        b.worker_id = "w1"
+        b.watermark_lag_seconds = 30
+        cursor.fetchone.return_value = {"last_processed_id": 3}
+
+        b.run(batch_size=50, incremental=True)
+
+        cursor.execute.assert_any_call(
+            "SELECT last_processed_id FROM integration_watermarks WHERE worker_id = %s", ("w1",)
+        )
+        sql, params = read_cursor.executed[0]
+        assert sql is mod.INCREMENTAL_PROCESSED_SQL
+        assert "loan_products" not in sql
+        assert params == (3, 30, 50)
+
+    def test_watermark_advances_with_each_chunk(self, batch):
+        """ウォーターマークはチャンクの保存と同じトランザクションで、読み込み済みの最大 ID まで進むこと"""
+        b, connection, cursor, _, _ = batch([], chunk_size=2)
+        manager = Mock()
+        manager.attach_mock(cursor, "cursor")
+        manager.attach_mock(connection.commit, "commit")
+        b.connect_database()
+        rows = [_row(4), _row(5), {**_row(6), "ai_summary": None, "structured_data": None}]
+        extract = b.extract_product_data
+        b.extract_product_data = lambda p: None if p.id == 6 else extract(p)
+
+        total, integrated, failed = b.integrate_many(
+            b.iter_unintegrated_processed_data(FakeReadCursor(rows), 10, after_id=3), track_watermark=True
+        )
+
+        assert (total, integrated, failed) == (3, 2, 1)
+        calls = [(name, args) for name, args, _ in manager.mock_calls]
+        writes = [(name, args) for name, args in calls if name != "cursor.fetchall"
+                  and not (name == "cursor.execute" and args[0].lstrip().startswith("SELECT"))]
+        names = [name for name, _ in writes]
+        assert names == [
+            "cursor.executemany", "cursor.execute", "commit", "cursor.executemany", "cursor.execute", "commit"
+        ]
+        assert writes[1][1] == (mod.WATERMARK_UPSERT_SQL, (b.worker_id, 5))
+        # 抽出に失敗した行は試行回数を記録し、次回に再試行するためその手前までしか進めない
+        sql, failures = writes[3][1]
+        assert sql is mod.INTEGRATION_FAILURE_UPSERT_SQL
+        assert [f[:3] + (f[4],) for f in failures] == [(b.worker_id, 6, 1, None)]
+        assert writes[4][1] == (mod.WATERMARK_UPSERT_SQL, (b.worker_id, 5))
+        assert b.first_failed_id == 6
+
+    def test_watermark_stops_before_first_failed_row(self, batch):
+        """1件ずつのやり直しで失敗した行があれば、後続のチャンクでもその直前までしか進めないこと"""
+        b, connection, cursor, _, _ = batch([], chunk_size=2)
+        b.connect_database()
+        rows = [_row(4), _row(5, name="教育ローン"), _row(6), _row(7, name="教育ローン")]
+
+        def executemany(sql, params):
+            if sql is mod.LOAN_PRODUCT_UPSERT_SQL and params[0][0] == 4:
+                raise Exception("deadlock")
+        cursor.executemany.side_effect = executemany
+
+        def execute(sql, params=None):
+            if sql is mod.LOAN_PRODUCT_UPSERT_SQL and params[0] == 5:
+                raise Exception("data too long")
+        cursor.execute.side_effect = execute
+
+        total, integrated, failed = b.integrate_many(
+            b.iter_unintegrated_processed_data(FakeReadCursor(rows), 10, after_id=3), track_watermark=True
+        )
+
+        assert (total, integrated, failed) == (4, 3, 1)
+        watermarks = [c.args[1][1] for c in cursor.execute.call_args_list if c.args[0] is mod.WATERMARK_UPSERT_SQL]
+        assert watermarks == [4, 4]
+
+    def test_row_failing_every_run_is_dead_lettered(self, monkeypatch):
+        """毎回失敗する行は max_attempts 回で通過させ、batch_size より先の行も統合されること"""
+        db = FakeIntegrationDB(monkeypatch, [_row(i) for i in range(1, 9)], bad_ids={2})
+        b = db.batch(chunk_size=2, max_attempts=3)
+
+        for _ in range(5):
+            b.run(batch_size=3, incremental=True)
+
+        assert db.watermark == 8
+        assert db.integrated == {1, 3, 4, 5, 6, 7, 8}
+        assert db.failures[2]["attempts"] == 3 and db.failures[2]["dead_lettered_at"] is not None
+
+        # 直せばデッドレターの再試行で統合し、失敗記録を消す（ウォーターマークは動かさない）
+        db.bad_ids.clear()
+        b.run(batch_size=10, retry_dead_letters=True)
+
+        assert 2 in db.integrated
+        assert db.failures == {}
+        assert db.watermark == 8
+
+    def test_recovered_row_clears_failure_record(self, monkeypatch):
+        """上限前に統合できた行は失敗記録が消え、ウォーターマークが先へ進むこと"""
+        db = FakeIntegrationDB(monkeypatch, [_row(i) for i in range(1, 5)], bad_ids={2})
+        b = db.batch(chunk_size=2, max_attempts=3)
+
+        b.run(batch_size=10, incremental=True)
+        assert db.watermark == 1 and db.failures[2]["attempts"] == 1
+
+        db.bad_ids.clear()
+        b.run(batch_size=10, incremental=True)
+
+        assert db.watermark == 4
+        assert db.failures == {}
+
+    def test_upsert_moves_product_to_newer_processed_row(self):
+        """既存商品の更新では processed_data_id を新しい（大きい）ID に進めること"""
+        assert "processed_data_id = GREATEST(processed_data_id, VALUES(processed_data_id))" in mod.LOAN_PRODUCT_UPSERT_SQL
+
+
+class TestChangeDetection:
+
+    @pytest.fixture
+    def b(self, batch):
+        b, connection, cursor, _, _ = batch([], chunk_size=10)
+        b.connect_database()
+        return b, connection, cursor
+
+    @staticmethod
+    def _stored(b, processed_row, product_id=7, **overrides):
+        """DB から読んだ形の既存 loan_products 行（DECIMAL は Decimal、JSON 列は MySQL の整形）"""
+        from decimal import Decimal
+
+        processed = b._to_processed_data(processed_row)
+        row = b._product_row(processed, b.extract_product_data(processed), datetime(2025, 1, 1))
+        stored = {
+            "id": product_id, "institution_id": row[1], "product_name": row[2], "loan_type": row[4],
+            "processed_data_id": row[0],
+        }
+        for field in mod.PRODUCT_COMPARE_FIELDS:
+            value = row[mod.PRODUCT_ROW_INDEX[field]]
+            if field in mod.PRODUCT_JSON_FIELDS:
+                value = json.dumps(json.loads(value), separators=(", ", ": "))
+            elif field in mod.PRODUCT_RATE_FIELDS and value is not None:
+                value = Decimal(str(value)).quantize(Decimal("0.0001"))
+            stored[field] = value
+        stored.update(overrides)
+        return stored
+
+    def _integrate(self, b, rows):
+        return b.integrate_many(b.iter_unintegrated_processed_data(FakeReadCursor(rows), 10))
+
+    def test_unchanged_products_are_not_written(self, b):
+        """既存と同じ内容の商品は loan_products にも履歴にも書き込まないこと"""
+        b, connection, cursor = b
+        cursor.fetchall.return_value = [self._stored(b, _row(1)), self._stored(b, _row(2), product_id=8)]
+
+        total, integrated, failed = self._integrate(b, [_row(1), _row(2)])
+
+        assert (total, integrated, failed) == (2, 2, 0)
+        assert b.unchanged_count == 2
+        cursor.executemany.assert_not_called()
+        lookup_sql, params = cursor.execute.call_args.args
+        assert "WHERE (institution_id, product_name, loan_type) IN ((%s, %s, %s), (%s, %s, %s))" in lookup_sql
+        assert params == (1, "マイカーローン1", "マイカーローン", 1, "マイカーローン2", "マイカーローン")
+
+    def test_changed_product_is_written_with_history(self, b):
+        """変更のある商品だけを保存し、変更した列と前後の値を履歴に記録すること"""
+        from decimal import Decimal
+
+        b, connection, cursor = b
+        cursor.fetchall.return_value = [
+            self._stored(b, _row(1), interest_rate_min=Decimal("1.9000")),
+            self._stored(b, _row(2), product_id=8),
+        ]
+
+        self._integrate(b, [_row(1), _row(2), _row(3, name="教育ローン")])
+
+        (product_sql, products), (history_sql, histories) = [c.args for c in cursor.executemany.call_args_list]
+        assert product_sql is mod.LOAN_PRODUCT_UPSERT_SQL
+        assert [p[2] for p in products] == ["マイカーローン1", "教育ローン3"]  # 変更1件 + 新規1件
+        assert history_sql is mod.PRODUCT_HISTORY_INSERT_SQL
+        (product_id, fields, old_values, new_values, _), = histories
+        assert product_id == 7
+        assert json.loads(fields) == ["interest_rate_min"]
+        assert json.loads(old_values) == {"interest_rate_min": 1.9}
+        assert json.loads(new_values) == {"interest_rate_min": 1.5}
+        assert b.unchanged_count == 1
+        assert connection.commit.call_count == 1
+
+    def test_repeated_product_in_chunk_compares_with_previous_row(self, b):
+        """チャンク内で同じ商品が続いた場合、同じ内容の2行目は書き込まないこと"""
+        b, connection, cursor = b
+
+        self._integrate(b, [_row(1), {**_row(2), "structured_data": _row(1)["structured_data"]}])
+
+        (_, products), (relink_sql, relinks) = [c.args for c in cursor.executemany.call_args_list]
+        assert [p[0] for p in products] == [1]
+        # 2行目は内容を書かず、processed_data_id だけを付け替える
+        assert relink_sql is mod.PRODUCT_RELINK_SQL
+        assert relinks == [(2, 1, "マイカーローン1", "マイカーローン")]
+        assert b.unchanged_count == 1
+
+    def test_default_mode_relinks_unchanged_products(self, monkeypatch):
+        """反結合モードを2回実行しても、同じ内容で処理し直した行を毎回読み直さないこと"""
+        db = FakeIntegrationDB(monkeypatch, [_row(1), _row(2)])
+        b = db.batch(chunk_size=10, max_attempts=3)
+        b.run(batch_size=10)
+        assert {p["processed_data_id"] for p in db.products.values()} == {1, 2}
+
+        # 同じ raw_loan_data を同じ内容でAI処理し直した行
+        db.rows.update({3: {**_row(1), "id": 3}, 4: {**_row(2), "id": 4}})
+        db.integrated.clear()
+        b.run(batch_size=10)
+
+        assert db.read_ids == [4, 3]
+        assert db.integrated == set()  # 内容は書き込まない
+        assert {p["processed_data_id"] for p in db.products.values()} == {3, 4}
+
+        b.run(batch_size=10)
+        assert db.read_ids == []
+        assert "newer.raw_data_id = p.raw_data_id" in mod.UNINTEGRATED_PROCESSED_SQL
+
+    def test_older_row_does_not_overwrite_newer_product(self, b):
+        """既存商品より古いAI処理済みデータの行では、内容が違っても書き換えないこと"""
+        b, connection, cursor = b
+        cursor.fetchall.return_value = [self._stored(b, _row(1), interest_rate_min=2.5, processed_data_id=9)]
+
+        self._integrate(b, [_row(1)])
+
+        assert b.unchanged_count == 1
+        cursor.executemany.assert_not_called()
+
+    def test_incremental_mode_does_not_relink(self, b):
+        """差分モードでは変更のない商品に一切書き込まないこと"""
+        b, connection, cursor = b
+        cursor.fetchall.return_value = [self._stored(b, _row(1))]
+
+        b.integrate_many(
+            b.iter_unintegrated_processed_data(FakeReadCursor([{**_row(1), "id": 5}]), 10, after_id=4),
+            track_watermark=True,
+        )
+
+        assert b.unchanged_count == 1
+        assert all(c.args[0] is mod.WATERMARK_UPSERT_SQL for c in cursor.execute.call_args_list
+                   if not c.args[0].lstrip().startswith("SELECT"))
+        cursor.executemany.assert_not_called()
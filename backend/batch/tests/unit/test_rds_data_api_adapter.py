@@ -0,0 +1,213 @@
+# tests/unit/test_rds_data_api_adapter.py
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from loanpedia_scraper.database.institution_cache import clear_institution_caches
+from loanpedia_scraper.database.object_store import reset_object_store
+from loanpedia_scraper.database.rds_data_api_adapter import (
+    RDSDataAPIAdapter,
+    chunk_parameter_sets,
+    map_json_records,
+    to_parameters,
+)
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches(monkeypatch):
+    monkeypatch.delenv("RAW_BODY_STORE", raising=False)
+    monkeypatch.delenv("DB_BULK_FLUSH_SIZE", raising=False)
+    clear_institution_caches()
+    reset_object_store()
+    yield
+    clear_institution_caches()
+    reset_object_store()
+
+
+def _values(params):
+    out = {}
+    for p in params:
+        field = p["value"]
+        out[p["name"]] = None if field.get("isNull") else next(iter(field.values()))
+    return out
+
+
+class StubRdsDataClient:
+    """raw_loan_data / content_blobs / financial_institutions を模した rds-data クライアント"""
+
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.institutions = [{"id": 10, "institution_code": "0003", "institution_name": "青い森信用金庫"}]
+        self.raw = {}
+        self.blobs = {}
+        self.fail_on = fail_on
+        self._pending = None
+
+    def begin_transaction(self, **kwargs):
+        self.calls.append("begin_transaction")
+        self._pending = ({}, {})
+        return {"transactionId": "tx-1"}
+
+    def commit_transaction(self, **kwargs):
+        self.calls.append("commit_transaction")
+        raw, blobs = self._pending
+        self.raw.update(raw)
+        self.blobs.update(blobs)
+        self._pending = None
+        return {"transactionStatus": "Transaction Committed"}
+
+    def rollback_transaction(self, **kwargs):
+        self.calls.append("rollback_transaction")
+        self._pending = None
+        return {"transactionStatus": "Rollback Complete"}
+
+    def _targets(self, kwargs):
+        if kwargs.get("transactionId"):
+            return self._pending
+        return self.raw, self.blobs
+
+    def _upsert(self, sql, values, kwargs):
+        raw, blobs = self._targets(kwargs)
+        if "INTO content_blobs" in sql:
+            blobs.setdefault(values["content_hash"], values)
+            return {"generatedFields": []}
+        if self.fail_on and self.fail_on in values.get("source_url", ""):
+            raise RuntimeError("boom")
+        h = values["content_hash"]
+        known = {**self.raw, **raw}
+        row_id = known[h]["id"] if h in known else len(known) + 1
+        raw[h] = {**values, "id": row_id}
+        return {"generatedFields": [{"longValue": row_id}]}
+
+    def execute_statement(self, **kwargs):
+        self.calls.append("execute_statement")
+        sql = kwargs["sql"]
+        if "FROM financial_institutions" in sql:
+            return {"formattedRecords": json.dumps(self.institutions, ensure_ascii=False)}
+        if "FROM raw_loan_data WHERE content_hash IN" in sql:
+            hashes = set(_values(kwargs.get("parameters", [])).values())
+            rows = [{"id": r["id"], "content_hash": h} for h, r in {**self.raw}.items() if h in hashes]
+            return {"formattedRecords": json.dumps(rows)}
+        return self._upsert(sql, _values(kwargs.get("parameters", [])), kwargs)
+
+    def batch_execute_statement(self, **kwargs):
+        self.calls.append("batch_execute_statement")
+        return {
+            "updateResults": [
+                self._upsert(kwargs["sql"], _values(params), kwargs) for params in kwargs["parameterSets"]
+            ]
+        }
+
+
+def _adapter(client):
+    return RDSDataAPIAdapter(client=client, db_arn="arn:db", secret_arn="arn:secret", database="app_db")
+
+
+def _record(html, code="0003", name="青い森信用金庫"):
+    return {
+        "institution_code": code,
+        "institution_name": name,
+        "source_url": f"https://example.com/{html}",
+        "html_content": f"<html>{html}</html>",
+        "extracted_text": "共通の抽出テキスト",
+        "product_name": f"商品{html}",
+    }
+
+
+class TestBulkSave:
+
+    def test_bulk_save_uses_few_calls_in_one_transaction(self):
+        """1金融機関分が begin / 本文 / 生データ / commit の数回の呼び出しで保存されること"""
+        client = StubRdsDataClient()
+        adapter = _adapter(client)
+
+        ids = adapter.save_loan_data_many([_record("a"), _record("b"), _record("a")])
+
+        assert ids[0] == ids[2]
+        assert len(set(ids)) == 2 and None not in ids
+        assert client.calls == [
+            "execute_statement",  # 金融機関マスター読込
+            "begin_transaction",
+            "batch_execute_statement",  # content_blobs
+            "batch_execute_statement",  # raw_loan_data
+            "commit_transaction",
+        ]
+        # 共通の抽出テキストは1回だけ保存される
+        assert len(client.blobs) == 3
+
+    def test_flush_size_splits_batches(self):
+        """flush_size 件ごとに batch_execute_statement が分割されること"""
+        client = StubRdsDataClient()
+        ids = _adapter(client).save_loan_data_many([_record(str(i)) for i in range(5)], flush_size=2)
+
+        assert all(ids)
+        # 本文6件（HTML5 + 共通テキスト1）→3回、生データ5件→3回
+        assert client.calls.count("batch_execute_statement") == 6
+
+    def test_failed_institution_is_rolled_back(self):
+        """失敗した金融機関のみロールバックされ、他は保存されること"""
+        client = StubRdsDataClient(fail_on="/x")
+        client.institutions.append({"id": 11, "institution_code": "0004", "institution_name": "東奥信用金庫"})
+
+        ids = _adapter(client).save_loan_data_many([_record("a"), _record("x", code="0004", name="東奥信用金庫")])
+
+        assert ids[0] is not None
+        assert ids[1] is None
+        assert client.calls.count("commit_transaction") == 1
+        assert client.calls.count("rollback_transaction") == 1
+        assert all(r["institution_id"] == 10 for r in client.raw.values())
+
+    def test_single_save_still_works(self):
+        """1件保存は generatedFields からIDを得ること"""
+        client = StubRdsDataClient()
+        assert _adapter(client).save_loan_data(_record("a")) == 1
+
+
+class TestParameterMapping:
+
+    def test_to_parameters_types(self):
+        """Python の型が Data API の Field と typeHint に変換されること"""
+        params = {p["name"]: p for p in to_parameters({
+            "n": None, "i": 1, "f": 1.5, "b": True, "s": "x", "blob": b"\x00",
+            "d": Decimal("1.25"), "ts": datetime(2024, 4, 1, 9, 30), "j": {"k": "値"},
+        })}
+
+        assert params["n"]["value"] == {"isNull": True}
+        assert params["i"]["value"] == {"longValue": 1}
+        assert params["f"]["value"] == {"doubleValue": 1.5}
+        assert params["b"]["value"] == {"booleanValue": True}
+        assert params["blob"]["value"] == {"blobValue": b"\x00"}
+        assert params["d"] == {"name": "d", "value": {"stringValue": "1.25"}, "typeHint": "DECIMAL"}
+        assert params["ts"]["typeHint"] == "TIMESTAMP"
+        assert params["ts"]["value"]["stringValue"].startswith("2024-04-01 09:30:00")
+        assert params["j"]["typeHint"] == "JSON"
+        assert json.loads(params["j"]["value"]["stringValue"]) == {"k": "値"}
+
+    def test_map_json_records_uses_column_types(self):
+        """formatRecordsAs=JSON の結果が列の型に従って変換されること"""
+        response = {
+            "formattedRecords": json.dumps([
+                {"id": 1, "rate": "1.250", "scraped_at": "2024-04-01 09:30:00", "data": '{"a": 1}', "name": None}
+            ]),
+            "columnMetadata": [
+                {"label": "id", "typeName": "BIGINT"},
+                {"label": "rate", "typeName": "DECIMAL"},
+                {"label": "scraped_at", "typeName": "TIMESTAMP"},
+                {"label": "data", "typeName": "JSON"},
+                {"label": "name", "typeName": "VARCHAR"},
+            ],
+        }
+
+        assert map_json_records(response) == [
+            {"id": 1, "rate": Decimal("1.250"), "scraped_at": datetime(2024, 4, 1, 9, 30),
+             "data": {"a": 1}, "name": None}
+        ]
+
+    def test_chunking_respects_set_count_and_payload(self):
+        """パラメータセットが件数・ペイロードの上限で分割されること"""
+        sets = [to_parameters({"s": "x" * 100}) for _ in range(10)]
+
+        assert [len(c) for c in chunk_parameter_sets(sets, max_sets=4)] == [4, 4, 2]
+        assert [len(c) for c in chunk_parameter_sets(sets, max_bytes=450)] == [3, 3, 3, 1]
@@ -0,0 +1,167 @@
+# tests/unit/test_spool.py
+import time
+
+import pytest
+
+from loanpedia_scraper.database import loan_service
+from loanpedia_scraper.database.background_writer import BackgroundWriter
+from loanpedia_scraper.database.object_store import LocalObjectStore
+from loanpedia_scraper.database.spool import Spool, decode_record, get_spool, reset_spool, set_spool
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    monkeypatch.setenv("SAVE_TO_DB", "true")
+    monkeypatch.delenv("USE_DATA_API", raising=False)
+    monkeypatch.setattr(loan_service, "_db_outage_until", 0.0)
+    monkeypatch.setattr(loan_service, "get_database_config", lambda: {})
+    s = Spool(LocalObjectStore(str(tmp_path)))
+    set_spool(s)
+    yield s
+    reset_spool()
+
+
+def _down(monkeypatch, calls):
+    """接続に失敗するDB"""
+    def connect(self):
+        calls.append("connect")
+        return False
+    monkeypatch.setattr(loan_service.LoanDatabase, "connect", connect)
+
+
+class TestSpool:
+
+    def test_roundtrip_keeps_source_bytes(self, spool):
+        """書き出したレコードが元PDFごと読み戻せ、一意キーは取り込み時に計算されること"""
+        record = loan_service.build_loan_data(
+            "0001", "テスト銀行", {"product_name": "マイカー"},
+            {"source_url": "https://example.com/a.pdf", "html_content": "<html>本文</html>", "source_bytes": b"%PDF"},
+        )
+        key = spool.append([record], label="0001")
+
+        assert spool.segments() == [key]
+        loaded = spool.read(key)[0]
+        assert "content_hash" not in loaded
+        assert loaded["html_content"] == "<html>本文</html>"
+        assert loaded["source_bytes"] == b"%PDF"
+        assert loaded["product_name"] == "マイカー"
+
+    def test_old_segment_hash_is_dropped(self):
+        """以前のセグメントの content_hash（本文のみのハッシュ）は取り込みに渡さないこと"""
+        assert decode_record({"product_name": "a", "content_hash": "x", "spooled_at": "t"}) == {"product_name": "a"}
+
+    def test_env_configuration(self, monkeypatch, tmp_path):
+        """SPOOL_STORE で有効になり、未設定ならスプールしないこと"""
+        reset_spool()
+        monkeypatch.delenv("SPOOL_STORE", raising=False)
+        assert get_spool() is None
+
+        reset_spool()
+        monkeypatch.setenv("SPOOL_STORE", "local")
+        monkeypatch.setenv("SPOOL_DIR", str(tmp_path))
+        assert isinstance(get_spool().store, LocalObjectStore)
+        reset_spool()
+
+
+class TestOutage:
+
+    def test_outage_spools_without_backoff(self, spool, monkeypatch):
+        """DB障害時はバックオフで待たずにスプールし、以降は接続も試みないこと"""
+        calls = []
+        _down(monkeypatch, calls)
+        monkeypatch.setenv("DB_RETRY_MAX", "5")
+        monkeypatch.setenv("DB_RETRY_BASE_DELAY", "10")
+
+        started = time.monotonic()
+        for i in range(3):
+            saved = loan_service.save_scraped_product(
+                "0001", "テスト銀行", {"product_name": f"p{i}"}, {"html_content": f"<html>{i}</html>"}
+            )
+            assert saved is False
+        elapsed = time.monotonic() - started
+
+        assert elapsed < 1
+        assert calls == ["connect"]
+        records = [r for key in spool.segments() for r in spool.read(key)]
+        assert [r["product_name"] for r in records] == ["p0", "p1", "p2"]
+
+    def test_bulk_failures_are_spooled(self, spool, monkeypatch):
+        """一括保存で保存できなかったレコードだけがスプールされること"""
+        monkeypatch.setattr(loan_service, "_bulk_save", lambda records, flush_size=None: [1, None])
+
+        ids = loan_service.save_scraped_products(
+            "0001", "テスト銀行",
+            [({"product_name": "ok"}, {"html_content": "a"}), ({"product_name": "ng"}, {"html_content": "b"})],
+        )
+
+        assert ids == [1, None]
+        records = [r for key in spool.segments() for r in spool.read(key)]
+        assert [r["product_name"] for r in records] == ["ng"]
+
+    def test_writer_spools_after_single_attempt(self, spool, monkeypatch):
+        """スプール有効時のライターは再試行で待たずにスプールへ回すこと"""
+        calls = []
+        _down(monkeypatch, calls)
+
+        writer = BackgroundWriter("0001", "テスト銀行", flush_size=2, flush_interval=0.05)
+        writer.submit({"product_name": "p0"}, {"html_content": "a"}, key="a")
+        writer.submit({"product_name": "p1"}, {"html_content": "b"}, key="b")
+        outcomes = writer.close()
+
+        assert writer.retry_max == 1
+        assert all(o.spooled and not o.success for o in outcomes.values())
+        assert writer.summary()["spooled"] == 2
+        assert len(spool.segments()) == 1
+
+
+class TestReplay:
+
+    def _spool_records(self, spool, names):
+        return spool.append(
+            [loan_service.build_loan_data("0001", "テスト銀行", {"product_name": n}, {"html_content": n})
+             for n in names],
+            label="0001",
+        )
+
+    def test_replay_saves_and_removes_segments(self, spool, monkeypatch):
+        """全件保存できたセグメントは削除されること"""
+        saved = []
+        monkeypatch.setattr(
+            loan_service, "_bulk_save",
+            lambda records, flush_size=None: saved.extend(records) or list(range(1, len(records) + 1)),
+        )
+        self._spool_records(spool, ["a", "b"])
+        self._spool_records(spool, ["c"])
+
+        stats = loan_service.replay_spool()
+
+        assert stats == {"segments": 2, "records": 3, "saved": 3, "remaining": 0}
+        assert [r["product_name"] for r in saved] == ["a", "b", "c"]
+        assert spool.segments() == []
+
+    def test_partial_replay_rewrites_remaining(self, spool, monkeypatch):
+        """一部だけ保存できた場合は残りが新しいセグメントに書き直されること"""
+        monkeypatch.setattr(loan_service, "_bulk_save", lambda records, flush_size=None: [1, None])
+        self._spool_records(spool, ["a", "b"])
+
+        stats = loan_service.replay_spool()
+
+        assert stats["saved"] == 1 and stats["remaining"] == 1
+        remaining = [r for key in spool.segments() for r in spool.read(key)]
+        assert [r["product_name"] for r in remaining] == ["b"]
+
+    def test_replay_stops_while_db_is_down(self, spool, monkeypatch):
+        """DBに保存できない間はセグメントを残したまま止まること"""
+        calls = []
+        monkeypatch.setattr(
+            loan_service, "_bulk_save",
+            lambda records, flush_size=None: calls.append(len(records)) or [None] * len(records),
+        )
+        first = self._spool_records(spool, ["a"])
+        second = self._spool_records(spool, ["b", "c"])
+
+        stats = loan_service.replay_spool()
+
+        assert calls == [1]
+        assert stats == {"segments": 2, "records": 3, "saved": 0, "remaining": 3}
+        assert spool.segments() == [first, second]
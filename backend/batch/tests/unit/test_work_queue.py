@@ -0,0 +1,205 @@
+# tests/unit/test_work_queue.py
+import re
+from unittest.mock import Mock
+
+from loanpedia_scraper.database.work_queue import RawDataWorkQueue
+
+
+class FakeQueueDB:
+    """raw_loan_data のキュー列だけを持つインメモリDB（NOW() は self.now）"""
+
+    def __init__(self, n):
+        self.now = 0
+        self.rows = {
+            i: {"id": i, "ai_status": "pending", "ai_claimed_by": None, "ai_available_at": 0, "ai_attempts": 0}
+            for i in range(1, n + 1)
+        }
+
+    def connection(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self._result = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        rows = self.db.rows
+        if sql.startswith("UPDATE raw_loan_data SET ai_status = 'failed'"):
+            max_attempts, limit = params
+            expired = [
+                r for r in rows.values()
+                if r["ai_status"] == "pending" and r["ai_available_at"] <= self.db.now
+                and r["ai_attempts"] >= max_attempts
+            ][:limit]
+            for r in expired:
+                r.update(ai_status="failed", ai_claimed_by=None)
+            self.rowcount = len(expired)
+        elif sql.startswith("SELECT id FROM raw_loan_data WHERE id IN"):
+            assert sql.endswith("FOR UPDATE")
+            *ids, worker = params
+            self._result = [
+                {"id": i} for i in ids
+                if rows[i]["ai_claimed_by"] == worker and rows[i]["ai_status"] == "pending"
+            ]
+        elif sql.startswith("SELECT id FROM raw_loan_data"):
+            assert "FOR UPDATE SKIP LOCKED" in sql
+            max_attempts, limit = params
+            ready = [
+                r for r in rows.values()
+                if r["ai_status"] == "pending" and r["ai_available_at"] <= self.db.now
+                and r["ai_attempts"] < max_attempts
+            ]
+            ready.sort(key=lambda r: r["ai_available_at"])
+            self._result = [{"id": r["id"]} for r in ready[:limit]]
+        elif "SET ai_claimed_by = %s" in sql:
+            worker, lease, *ids = params
+            for i in ids:
+                rows[i].update(ai_claimed_by=worker, ai_available_at=self.db.now + lease)
+                rows[i]["ai_attempts"] += 1
+        elif "SET ai_status = 'done'" in sql:
+            *ids, worker = params
+            self.rowcount = 0
+            for raw_id in ids:
+                row = rows[raw_id]
+                if row["ai_claimed_by"] == worker and row["ai_status"] == "pending":
+                    row.update(ai_status="done", ai_claimed_by=None)
+                    self.rowcount += 1
+        elif re.search(r"SET ai_status = IF", sql):
+            max_attempts, raw_id, worker = params
+            row = rows[raw_id]
+            if row["ai_claimed_by"] == worker:
+                row.update(
+                    ai_status="failed" if row["ai_attempts"] >= max_attempts else "pending",
+                    ai_claimed_by=None,
+                    ai_available_at=self.db.now,
+                )
+        else:
+            raise AssertionError(f"unexpected sql: {sql}")
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+
+def _queue(db, worker, **kwargs):
+    params = dict(lease_seconds=60, max_attempts=3)
+    params.update(kwargs)
+    return RawDataWorkQueue(db.connection(), worker_id=worker, **params)
+
+
+class TestRawDataWorkQueue:
+
+    def test_workers_claim_disjoint_batches(self):
+        """複数ワーカーが重複しない行を取得すること"""
+        db = FakeQueueDB(5)
+        a, b = _queue(db, "a"), _queue(db, "b")
+
+        claimed_a = a.claim(3)
+        claimed_b = b.claim(3)
+
+        assert len(claimed_a) == 3
+        assert len(claimed_b) == 2
+        assert not set(claimed_a) & set(claimed_b)
+        assert b.claim(3) == []
+
+    def test_expired_lease_is_reclaimed(self):
+        """リース期限を過ぎた行は他のワーカーが取得でき、元のワーカーは完了できないこと"""
+        db = FakeQueueDB(1)
+        a, b = _queue(db, "a"), _queue(db, "b")
+        assert a.claim(1) == [1]
+
+        db.now = 61
+        assert b.claim(1) == [1]
+        assert a.complete(1) is False
+        assert b.complete(1) is True
+        assert db.rows[1]["ai_status"] == "done"
+
+    def test_release_retries_then_fails(self):
+        """失敗した行はすぐ再取得でき、上限回数で failed になること"""
+        db = FakeQueueDB(1)
+        q = _queue(db, "a", max_attempts=2)
+
+        assert q.claim(1) == [1]
+        q.release(1)
+        assert db.rows[1]["ai_status"] == "pending"
+
+        assert q.claim(1) == [1]
+        q.release(1)
+        assert db.rows[1]["ai_status"] == "failed"
+        assert q.claim(1) == []
+
+    def test_exhausted_row_fails_when_last_lease_expires(self):
+        """最後の取得でワーカーが落ちた行は、リース期限切れ後の取得時に failed になること"""
+        db = FakeQueueDB(1)
+        a, b = _queue(db, "a", max_attempts=1), _queue(db, "b", max_attempts=1)
+        assert a.claim(1) == [1]
+
+        db.now = 30
+        assert b.claim(1) == []
+        assert db.rows[1]["ai_status"] == "pending"
+
+        db.now = 61
+        assert b.claim(1) == []
+        assert db.rows[1]["ai_status"] == "failed"
+        assert db.rows[1]["ai_claimed_by"] is None
+        assert a.complete(1) is False
+
+
+def test_batch_marks_done_or_releases(monkeypatch):
+    """AI処理バッチが成功行を done にし、失敗行をキューへ戻すこと"""
+    import ai_processing_batch as mod
+
+    db = FakeQueueDB(2)
+    conn = db.connection()
+    batch = mod.AIProcessingBatch.__new__(mod.AIProcessingBatch)
+    batch.connection = conn
+    batch.work_queue = _queue(db, "w")
+    batch.work_queue.connection = conn
+    batch.connect_database = lambda: None
+    batch.close_database = lambda: None
+    batch.executor = None
+    batch.pack_size = 1
+    batch.integrator = None
+    batch.ai_processor = Mock()
+    batch.ai_processor.summarize_loan_data.return_value = {"processing_status": "completed"}
+    batch.ai_processor.estimate_tokens.return_value = 0
+    batch.ai_processor.model_id = "model"
+
+    raw = [Mock(id=1, institution_id=1, institution_name="A"), Mock(id=2, institution_id=1, institution_name="A")]
+    monkeypatch.setattr(batch, "get_unprocessed_raw_data", lambda limit: batch.work_queue.claim(limit) and raw)
+
+    def save(raw_data_id, institution_id, ai_result, cache_key=None):
+        if raw_data_id == 2:
+            raise RuntimeError("insert failed")
+        return 100
+
+    monkeypatch.setattr(batch, "save_processed_data", save)
+    monkeypatch.setattr(batch, "find_cached_summaries", lambda keys: {})
+
+    batch.run(batch_size=2)
+
+    assert db.rows[1]["ai_status"] == "done"
+    assert db.rows[2]["ai_status"] == "pending"
+    assert db.rows[2]["ai_claimed_by"] is None